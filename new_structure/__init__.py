@@ -3,65 +3,103 @@ Application factory for the Hillview School Management System.
 This file initializes the Flask application and registers extensions and blueprints.
 """
 import os
+import time
+_IMPORT_STARTED = time.perf_counter()
 from flask import Flask, request, abort, session, redirect, url_for, jsonify
 from datetime import datetime
 from .extensions import db, csrf
 from .config import config
 from .logging_config import setup_logging
-from .middleware import MarkSanitizerMiddleware
+from .middleware import RequestGuardMiddleware
+from .cli import register_commands
+from .services.report_job_service import ReportJobService
+from .utils.startup_profile import StartupProfile
+from .utils.telemetry import telemetry
 # Temporarily disable security manager for debugging
 # from .security.security_manager import security_manager
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
+def _unregistered_route(rule, **options):
+    """Stand-in for app.route that leaves the view unregistered (debug routes disabled)."""
+    def decorator(view):
+        return view
+    return decorator
+
 
 def create_app(config_name='default'):
     """Create and configure the Flask application.
 
+    Startup phases are timed into app.extensions['startup_profile'] (see
+    utils/startup_profile.py and `flask startup-profile`).
+
     Args:
         config_name: Name of the configuration to use (default, development, testing, production)
 
     Returns:
         Flask application instance.
     """
+    profile = StartupProfile()
+    profile.record('import new_structure', _IMPORT_SECONDS)
     app = Flask(__name__)
 
     # Load configuration
     app.config.from_object(config[config_name])
+    app.extensions['startup_profile'] = profile
 
     # Set up logging
-    setup_logging(app)
+    with profile.phase('logging'):
+        setup_logging(app)
 
     # Initialize extensions
-    db.init_app(app)
-    csrf.init_app(app)
-
-    # Initialize database with tables and default data
-    with app.app_context():
-        try:
-            from .utils.database_init import initialize_database_completely, check_database_integrity
-
-            # Check if database needs initialization
-            status = check_database_integrity()
+    with profile.phase('extensions'):
+        db.init_app(app)
+        csrf.init_app(app)
+
+    # Initialize database with tables and default data. Disable DATABASE_CHECK_ON_STARTUP
+    # (as production does) to skip this in every worker and run `flask init-db` on deploy.
+    if app.config.get('DATABASE_CHECK_ON_STARTUP', True):
+        with profile.phase('database check'), app.app_context():
+            try:
+                from .utils.database_init import ensure_database_initialized
 
-            if status['status'] != 'healthy':
-                result = initialize_database_completely()
+                result = ensure_database_initialized()
                 if not result['success']:
-                    print(f"⚠️ Database initialization failed: {result.get('error', 'Unknown error')}")
+                    print(f"⚠️ Database initialization failed: {result.get('error') or 'Unknown error'}")
 
-        except Exception as e:
-            print(f"⚠️ Database error: {e}")
+            except Exception as e:
+                print(f"⚠️ Database error: {e}")
 
-    # Register blueprints with error handling
+    # Register blueprints with error handling. Blueprint modules are imported here,
+    # one timed phase each; BLUEPRINTS_DISABLED leaves modules out entirely.
     try:
-        from .views import blueprints
-        for blueprint in blueprints:
-            app.register_blueprint(blueprint)
-            # Exempt parent portal from CSRF protection
-            if hasattr(blueprint, 'name') and 'parent' in blueprint.name:
-                csrf.exempt(blueprint)
+        from .views import load_blueprints
+        blueprints = load_blueprints(app.config.get('BLUEPRINTS_DISABLED', ()), profile)
+        with profile.phase('register blueprints'):
+            for blueprint in blueprints:
+                app.register_blueprint(blueprint)
+                # Exempt parent portal from CSRF protection
+                if hasattr(blueprint, 'name') and 'parent' in blueprint.name:
+                    csrf.exempt(blueprint)
     except Exception as e:
         print(f"⚠️ Blueprint error: {e}")
 
-    # Register middleware
-    MarkSanitizerMiddleware(app)
+    # Debug and test routes below are only registered when DEBUG_ROUTES_ENABLED is set
+    debug_route = app.route if app.config.get('DEBUG_ROUTES_ENABLED', False) else _unregistered_route
+
+    with profile.phase('middleware and commands'):
+        # Request telemetry first, so its timing covers the other request hooks
+        telemetry.init_app(app)
+
+        # Register middleware: path traversal, input validation, HTTPS, object access
+        # and mark sanitizing run as one precompiled before_request pipeline
+        RequestGuardMiddleware(app)
+
+        # Register CLI commands
+        register_commands(app)
+
+        # Background report jobs; serving processes start running them with ReportJobService.resume
+        ReportJobService.init_app(app)
 
     # Minimize logging output
     import logging
@@ -153,93 +191,6 @@ def create_app(config_name='default'):
 
         return response
 
-    # PATH TRAVERSAL PROTECTION - FIXES 12 VULNERABILITIES
-    @app.before_request
-    def prevent_path_traversal():
-        """Comprehensive path traversal protection."""
-        import os
-        import re
-
-        def is_safe_path(path):
-            if not path:
-                return True
-
-            path_str = str(path)
-            normalized = os.path.normpath(path_str)
-
-            # Dangerous patterns
-            dangerous_patterns = [
-                r'\.\./', r'\.\.\\\\', r'/etc/', r'/proc/', r'/sys/',
-                r'C:\\\\', r'\\\\\\\\', r'file://', r'ftp://', r'\\x00',
-                r'%00', r'%2e%2e', r'%252e%252e', r'0x2e0x2e'
-            ]
-
-            for pattern in dangerous_patterns:
-                if re.search(pattern, path_str, re.IGNORECASE):
-                    return False
-
-            if '..' in normalized or normalized.startswith('/'):
-                return False
-
-            return True
-
-        # Check URL path
-        if not is_safe_path(request.path):
-            abort(403, "Access denied: Invalid path detected")
-
-        # Check all parameters
-        for key, value in request.args.items():
-            if not is_safe_path(str(value)):
-                abort(403, f"Access denied: Invalid parameter '{key}'")
-
-        if request.form:
-            for key, value in request.form.items():
-                if not is_safe_path(str(value)):
-                    abort(403, f"Access denied: Invalid form data '{key}'")
-
-    # INPUT VALIDATION - PREVENTS INJECTION ATTACKS
-    @app.before_request
-    def validate_all_inputs():
-        """Comprehensive input validation for all requests."""
-        import re
-
-        def is_safe_input(value):
-            if not value:
-                return True
-
-            value_str = str(value)
-
-            if len(value_str) > 10000:
-                return False
-
-            # Dangerous patterns
-            dangerous_patterns = [
-                r"'.*OR.*'", r"'.*UNION.*SELECT", r"'.*DROP.*TABLE",
-                r"<script", r"javascript:", r"onload\\s*=", r"onerror\\s*=",
-                r";\\s*ls", r";\\s*dir", r"\\|\\s*ls", r"&&\\s*ls"
-            ]
-
-            for pattern in dangerous_patterns:
-                if re.search(pattern, value_str, re.IGNORECASE):
-                    return False
-
-            return True
-
-        # Skip for safe endpoints
-        safe_endpoints = ['/health', '/static', '/logout']
-        if any(request.path.startswith(ep) for ep in safe_endpoints):
-            return
-
-        # Validate all inputs
-        for key, value in request.args.items():
-            if not is_safe_input(value):
-                abort(400, f"Invalid input in parameter '{key}'")
-
-        if request.form:
-            for key, value in request.form.items():
-                if not is_safe_input(value):
-                    abort(400, f"Invalid input in field '{key}'")
-
     # ACCESS CONTROL ENFORCEMENT - FIXES 12 VULNERABILITIES - TEMPORARILY DISABLED FOR DEBUG
     # @app.before_request
     def enforce_strict_access_control_disabled():
@@ -334,71 +285,6 @@ def create_app(config_name='default'):
         response.headers.pop('Strict-Transport-Security', None)
         return response
 
-    # HTTPS ENFORCEMENT
-    @app.before_request
-    def force_https_production():
-        """Force HTTPS in production."""
-        if app.config.get('FORCE_HTTPS', False) and not request.is_secure:
-            if request.headers.get('X-Forwarded-Proto') != 'https':
-                return redirect(request.url.replace('http://', 'https://'), code=301)
-
-    # ENHANCED PATH TRAVERSAL PROTECTION
-    @app.before_request
-    def enhanced_path_protection():
-        """Enhanced protection against all path traversal attempts."""
-        import re
-
-        # Block any request with path traversal patterns
-        dangerous_paths = [
-            r'\.\./', r'\.\.\\\\', r'%2e%2e', r'%252e%252e',
-            r'0x2e0x2e', r'\\x2e\\x2e', r'file://', r'ftp://'
-        ]
-
-        full_url = request.url
-        for pattern in dangerous_paths:
-            if re.search(pattern, full_url, re.IGNORECASE):
-                abort(403, "Path traversal attempt blocked")
-
-        # Block requests to sensitive paths
-        sensitive_paths = ['/etc/', '/proc/', '/sys/', '/root/', '/home/']
-        for path in sensitive_paths:
-            if path in request.path:
-                abort(403, "Access to sensitive path blocked")
-
-    # STRICT OBJECT ACCESS CONTROL
-    @app.before_request
-    def strict_object_access_control():
-        """Prevent all unauthorized object access."""
-
-        # Skip API routes from strict object access control
-        if '/api/' in request.path:
-            return
-
-        # Extract object access patterns
-        import re
-        object_pattern = r'/(\w+)/(\d+|\.\.)'
-        match = re.search(object_pattern, request.path)
-
-        if match:
-            object_type, object_id = match.groups()
-
-            # Block any non-numeric object IDs (prevents ../ attacks)
-            if not object_id.isdigit():
-                abort(403, f"Invalid object ID: {object_id}")
-
-            # Strict role-based object access
-            user_role = session.get('role', '').lower()
-
-            object_permissions = {
-                'headteacher': ['student', 'teacher', 'report', 'mark', 'grade', 'stream', 'streams', 'api', 'get_grade_streams', 'teacher_streams', 'get_streams', 'view_parent', 'parent', 'streams_by_id', 'subject_report', 'edit_class_marks', 'preview_class_report', 'view_student_reports'],
-                'classteacher': ['student', 'report', 'mark', 'get_grade_streams', 'teacher_streams', 'streams', 'get_streams', 'streams_by_id', 'subject_report', 'edit_class_marks', 'preview_class_report', 'view_student_reports'],
-                'teacher': ['mark', 'get_streams', 'streams', 'streams_by_id', 'subject_report', 'preview_class_report', 'view_student_reports']
-            }
-
-            allowed_objects = object_permissions.get(user_role, [])
-
-            if object_type not in allowed_objects:
-                abort(403, f"Access denied: {user_role} cannot access {object_type}")
 
     # REMOVE SERVER HEADER
     @app.after_request
@@ -446,6 +332,14 @@ def create_app(config_name='default'):
     @app.template_filter('get_education_level')
     def get_education_level(grade):
         """Filter to determine the education level for a grade."""
+        try:
+            from .services.reference_data_service import ReferenceDataService
+            education_level = ReferenceDataService.current().education_level_for_grade(grade)
+            if education_level:
+                return education_level
+        except Exception as e:
+            app.logger.warning(f"Reference data unavailable for education level lookup: {e}")
+
         education_level_mapping = {
             'lower_primary': ['Grade 1', 'Grade 2', 'Grade 3'],
             'upper_primary': ['Grade 4', 'Grade 5', 'Grade 6'],
@@ -473,11 +367,8 @@ def create_app(config_name='default'):
         except:
             return 'N/A'
 
-    # Import the classteacher blueprint
-    from .views.classteacher import classteacher_bp
-
     # Add debug route for login testing
-    @app.route('/debug/login_test')
+    @debug_route('/debug/login_test')
     def debug_login_test():
         """Debug route to test login functionality."""
         try:
@@ -525,7 +416,7 @@ def create_app(config_name='default'):
             return f"<h2>❌ Debug Error</h2><p>{str(e)}</p>"
 
     # Add debug route to check blueprints
-    @app.route('/debug/blueprints')
+    @debug_route('/debug/blueprints')
     def debug_blueprints():
         """Debug route to check registered blueprints."""
         blueprint_info = []
@@ -570,13 +461,13 @@ def create_app(config_name='default'):
             return f"<h2>❌ Polished Login Error</h2><p>Error: {str(e)}</p><p><a href='/debug/blueprints'>Check Routes</a></p>"
 
     # Add simple test route
-    @app.route('/test-polished')
+    @debug_route('/test-polished')
     def test_polished():
         """Simple test route"""
         return "<h1>✅ Test Route Works!</h1><p><a href='/polished'>Try Polished Login</a></p>"
 
     # Add database initialization debug route
-    @app.route('/debug/init_database')
+    @debug_route('/debug/init_database')
     def debug_init_database():
         """Force database initialization."""
         try:
@@ -602,7 +493,7 @@ def create_app(config_name='default'):
             return f"<h2>❌ Initialization Error</h2><p>{str(e)}</p>"
 
     # Add login form debug route
-    @app.route('/debug/test_login', methods=['GET', 'POST'])
+    @debug_route('/debug/test_login', methods=['GET', 'POST'])
     def debug_test_login():
         """Debug route to test login forms."""
         if request.method == 'GET':
@@ -671,7 +562,7 @@ def create_app(config_name='default'):
             return f"<h2>❌ Login Test Error</h2><p>{str(e)}</p>"
 
     # Add CSRF-exempt debug route for easier testing
-    @app.route('/debug/simple_login', methods=['GET', 'POST'])
+    @debug_route('/debug/simple_login', methods=['GET', 'POST'])
     @csrf.exempt
     def debug_simple_login():
         """Simple login test without CSRF protection."""
@@ -731,7 +622,7 @@ def create_app(config_name='default'):
             return f"<h2>❌ Simple Login Test Error</h2><p>{str(e)}</p>"
 
     # Add debug route to test admin dashboard directly
-    @app.route('/debug/test_admin_dashboard')
+    @debug_route('/debug/test_admin_dashboard')
     def debug_test_admin_dashboard():
         """Test admin dashboard without login."""
         try:
@@ -786,7 +677,7 @@ def create_app(config_name='default'):
             """
 
     # Add a simple test route
-    @app.route('/test')
+    @debug_route('/test')
     def simple_test():
         """Simple test route to verify server is working"""
         return f"""
@@ -821,7 +712,7 @@ def create_app(config_name='default'):
         """
 
     # Add a simple login test without external resources
-    @app.route('/simple-login')
+    @debug_route('/simple-login')
     def simple_login_test():
         """Simple login page without external CDN resources"""
         return """
@@ -895,7 +786,7 @@ def create_app(config_name='default'):
         """
 
     # Add URL debugging route
-    @app.route('/debug-urls')
+    @debug_route('/debug-urls')
     def debug_urls():
         """Debug route to check what URLs Flask is generating"""
         from flask import url_for
@@ -959,6 +850,14 @@ def create_app(config_name='default'):
             <p><a href="/debug/initialize_database" style="background: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">🔄 Initialize Database</a></p>
             """
 
+    # Readiness check for load balancers, separate from the data health check above
+    @app.route('/ready')
+    def readiness_check():
+        """Report whether this worker should receive traffic (200) or not (503)."""
+        from .services.readiness_service import ReadinessService
+        result = ReadinessService.readiness(app)
+        return jsonify(result), 200 if result['ready'] else 503
+
     # Register error handlers
     @app.errorhandler(500)
     def internal_server_error(e):
@@ -979,7 +878,7 @@ def create_app(config_name='default'):
 
 
 
-    @app.route('/debug/school_setup_info')
+    @debug_route('/debug/school_setup_info')
     def debug_school_setup_info():
         """Debug route to check school setup information."""
         try:
@@ -1024,7 +923,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error checking school setup: {str(e)}"
 
-    @app.route('/debug/session_info')
+    @debug_route('/debug/session_info')
     def debug_session_info():
         """Debug route to check current session information."""
         try:
@@ -1056,7 +955,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error checking session: {str(e)}"
 
-    @app.route('/debug/check_users')
+    @debug_route('/debug/check_users')
     def debug_check_users():
         """Debug route to check all users."""
         try:
@@ -1087,7 +986,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error: {str(e)}"
 
-    @app.route('/debug/add_kevin')
+    @debug_route('/debug/add_kevin')
     def debug_add_kevin():
         """Debug route to add Kevin user."""
         try:
@@ -1122,7 +1021,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error: {str(e)}"
 
-    @app.route('/debug/check_all_databases')
+    @debug_route('/debug/check_all_databases')
     def debug_check_all_databases():
         """Debug route to check all database files."""
         import glob
@@ -1185,7 +1084,7 @@ def create_app(config_name='default'):
 
         return result
 
-    @app.route('/debug/check_subjects')
+    @debug_route('/debug/check_subjects')
     def debug_check_subjects():
         """Debug route to check all subjects in the database."""
         try:
@@ -1225,7 +1124,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error checking subjects: {str(e)}"
 
-    @app.route('/debug/check_tables')
+    @debug_route('/debug/check_tables')
     def debug_check_tables():
         """Debug route to check what tables exist in the database."""
         try:
@@ -1283,7 +1182,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error checking tables: {str(e)}"
 
-    @app.route('/debug/find_real_database')
+    @debug_route('/debug/find_real_database')
     def debug_find_real_database():
         """Search for the real database with telvo, kevin, and classteacher1."""
         import os
@@ -1381,7 +1280,7 @@ def create_app(config_name='default'):
 
         return result
 
-    @app.route('/debug/use_database')
+    @debug_route('/debug/use_database')
     def debug_use_database():
         """Switch to use a specific database."""
         import shutil
@@ -1419,7 +1318,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error restoring database: {e}"
 
-    @app.route('/debug/check_git_database')
+    @debug_route('/debug/check_git_database')
     def debug_check_git_database():
         """Check the last committed database from Git."""
         import subprocess
@@ -1522,7 +1421,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return result + f"<p>❌ Error: {e}</p>"
 
-    @app.route('/debug/restore_git_database')
+    @debug_route('/debug/restore_git_database')
     def debug_restore_git_database():
         """Restore database from Git."""
         import subprocess
@@ -1569,7 +1468,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error restoring from Git: {e}"
 
-    @app.route('/debug/enhance_restored_database')
+    @debug_route('/debug/enhance_restored_database')
     def debug_enhance_restored_database():
         """Add enhanced columns to the restored database."""
         import sqlite3
@@ -1737,7 +1636,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error enhancing database: {e}"
 
-    @app.route('/debug/complete_database_setup')
+    @debug_route('/debug/complete_database_setup')
     def debug_complete_database_setup():
         """Add ALL missing tables to the restored database."""
         import sqlite3
@@ -1968,7 +1867,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error in complete database setup: {e}"
 
-    @app.route('/debug/test_school_config')
+    @debug_route('/debug/test_school_config')
     def debug_test_school_config():
         """Test the school configuration integration."""
         try:
@@ -2012,7 +1911,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error testing school config: {e}"
 
-    @app.route('/debug/check_new_structure_databases')
+    @debug_route('/debug/check_new_structure_databases')
     def debug_check_new_structure_databases():
         """Check for databases specifically in the new_structure directory."""
         import os
@@ -2132,7 +2031,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error checking new_structure databases: {e}"
 
-    @app.route('/debug/fix_grade_table')
+    @debug_route('/debug/fix_grade_table')
     def debug_fix_grade_table():
         """Specifically fix the grade table issue."""
         import sqlite3
@@ -2289,7 +2188,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error fixing grade table: {e}"
 
-    @app.route('/debug/cleanup_databases')
+    @debug_route('/debug/cleanup_databases')
     def debug_cleanup_databases():
         """Show which database files can be safely removed."""
         import os
@@ -2400,7 +2299,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error analyzing databases: {e}"
 
-    @app.route('/debug/perform_cleanup')
+    @debug_route('/debug/perform_cleanup')
     def debug_perform_cleanup():
         """Automatically clean up unnecessary database files."""
         import os
@@ -2527,7 +2426,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error performing cleanup: {e}"
 
-    @app.route('/debug/initialize_database')
+    @debug_route('/debug/initialize_database')
     def debug_initialize_database():
         """Debug route to manually initialize the database."""
         try:
@@ -2581,7 +2480,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error during database initialization: {str(e)}"
 
-    @app.route('/debug/repair_database')
+    @debug_route('/debug/repair_database')
     def debug_repair_database():
         """Debug route to repair the database."""
         try:
@@ -2618,7 +2517,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error during database repair: {str(e)}"
 
-    @app.route('/debug/check_teachers')
+    @debug_route('/debug/check_teachers')
     def debug_check_teachers():
         """Debug route to check all teachers in the database."""
         try:
@@ -2664,7 +2563,7 @@ def create_app(config_name='default'):
 
     # Debug routes removed - issue resolved
 
-    @app.route('/debug/carol-assignments-resolved')
+    @debug_route('/debug/carol-assignments-resolved')
     def debug_carol_assignments_resolved():
         """Simplified debug route - issue was resolved."""
         return """
@@ -2678,7 +2577,7 @@ def create_app(config_name='default'):
         <p><a href='/teacher/'>🔗 Test Teacher Dashboard</a></p>
         """
 
-    @app.route('/debug/fix-carol-assignments')
+    @debug_route('/debug/fix-carol-assignments')
     def debug_fix_carol_assignments():
         """Debug route to add subject assignments for Carol."""
         try:
@@ -2804,7 +2703,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/carol-dashboard-data')
+    @debug_route('/debug/carol-dashboard-data')
     def debug_carol_dashboard_data():
         """Debug route to see exactly what data Carol's dashboard receives."""
         try:
@@ -2890,7 +2789,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/test-relationships')
+    @debug_route('/debug/test-relationships')
     def debug_test_relationships():
         """Debug route to test if database relationships are working."""
         try:
@@ -2990,7 +2889,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/carol-session')
+    @debug_route('/debug/carol-session')
     def debug_carol_session():
         """Debug route to check Carol's session when she's logged in."""
         try:
@@ -3070,7 +2969,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/assignment-summary-structure')
+    @debug_route('/debug/assignment-summary-structure')
     def debug_assignment_summary_structure():
         """Debug route to check the exact structure of assignment_summary."""
         try:
@@ -3144,7 +3043,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/check-basic-data')
+    @debug_route('/debug/check-basic-data')
     def debug_check_basic_data():
         """Debug route to check if basic data (subjects, grades, streams) exists."""
         try:
@@ -3213,7 +3112,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/comprehensive-carol-fix')
+    @debug_route('/debug/comprehensive-carol-fix')
     def debug_comprehensive_carol_fix():
         """Comprehensive debug and fix for Carol's assignments."""
         try:
@@ -3361,7 +3260,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/initialize-basic-data')
+    @debug_route('/debug/initialize-basic-data')
     def debug_initialize_basic_data():
         """Initialize basic data (subjects, grades, streams) if missing."""
         try:
@@ -3462,7 +3361,7 @@ def create_app(config_name='default'):
             import traceback
             return f"<h2>❌ Debug Error</h2><pre>{str(e)}\n\n{traceback.format_exc()}</pre>"
 
-    @app.route('/debug/fix_carol_password')
+    @debug_route('/debug/fix_carol_password')
     def debug_fix_carol_password():
         """Debug route to fix Carol's password."""
         try:
@@ -3492,7 +3391,7 @@ def create_app(config_name='default'):
         except Exception as e:
             return f"❌ Error fixing Carol's password: {str(e)}"
 
-    @app.route('/debug/migrate_passwords')
+    @debug_route('/debug/migrate_passwords')
     def debug_migrate_passwords():
         """Debug route to migrate all plain text passwords to hashed passwords."""
         try:
@@ -3563,5 +3462,7 @@ def create_app(config_name='default'):
     # Log application startup only for the main process
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
         app.logger.info("Application initialized")
+    profile.finish()
+    app.logger.info(profile.format().splitlines()[0])
 
     return app
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Hillview School Management System.
+Each module can be run directly, e.g. python -m new_structure.benchmarks.class_report_benchmark
+"""
@@ -0,0 +1,85 @@
+"""
+Benchmark: ArtifactCache fingerprinting and hit cost.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.artifact_cache_benchmark [sizes...]
+
+For a whole grade of the given stream sizes, prints the SQL statements and time
+needed to fingerprint a class report's inputs and serve a cache hit, and checks
+that editing one mark changes the key while an unchanged grade keeps it. A stream
+report's key must also change when a learner who moved in from another stream has
+a mark edited that still carries the old stream, or none.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from ..extensions import db
+from ..models import Mark, Student
+from ..services.artifact_cache import ArtifactCache
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_SIZES = [30, 120, 480]
+
+
+def run(sizes):
+    app = create_benchmark_app()
+    with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as work_dir:
+        app.config['ARTIFACT_CACHE_DIR'] = cache_dir
+        app.config['ARTIFACT_CACHE_MAX_BYTES'] = 64 * 1024
+        with app.app_context():
+            print(f"{'students':>8} | {'marks':>6} | {'queries':>7} | {'fingerprint ms':>14} | {'hit ms':>6}")
+            for size in sizes:
+                db.session.remove()
+                db.drop_all()
+                db.create_all()
+                data = seed_school([size] * 3)
+                args = (data['grade'].id, data['term'].id, data['assessment_type'].id)
+
+                with measure(db.engine) as stats:
+                    key = ArtifactCache.data_fingerprint(*args, variant={'kind': 'grade_marksheet'})
+                assert key == ArtifactCache.data_fingerprint(*args, variant={'kind': 'grade_marksheet'})
+
+                artifact = os.path.join(work_dir, 'generated.xlsx')
+                with open(artifact, 'wb') as f:
+                    f.write(os.urandom(16 * 1024))
+                ArtifactCache.put(key, '.xlsx', artifact)
+                start = time.perf_counter()
+                assert ArtifactCache.get(key, '.xlsx')
+                hit_ms = (time.perf_counter() - start) * 1000
+
+                mark = Mark.query.first()
+                mark.raw_mark = (mark.raw_mark or 0) + 1
+                db.session.commit()
+                assert ArtifactCache.data_fingerprint(*args, variant={'kind': 'grade_marksheet'}) != key
+
+                # A learner moves to stream B; their marks keep stream A's id, and one has none
+                stream_a, stream_b = data['streams'][0], data['streams'][1]
+                mover = Student.query.filter_by(stream_id=stream_a.id).first()
+                mover.stream_id = stream_b.id
+                Mark.query.filter_by(student_id=mover.id).limit(1).one().stream_id = None
+                db.session.commit()
+                stream_key = ArtifactCache.data_fingerprint(*args, stream_id=stream_b.id)
+                for mark in (Mark.query.filter_by(student_id=mover.id, stream_id=stream_a.id).first(),
+                             Mark.query.filter_by(student_id=mover.id, stream_id=None).first()):
+                    mark.percentage = (mark.percentage + 1) % 100
+                    db.session.commit()
+                    changed_key = ArtifactCache.data_fingerprint(*args, stream_id=stream_b.id)
+                    assert changed_key != stream_key, 'stream report key missed an edit of a moved learner'
+                    stream_key = changed_key
+
+                marks = Mark.query.count()
+                print(f"{size * 3:>8} | {marks:>6} | {stats['queries']:>7} | "
+                      f"{stats['seconds'] * 1000:>14.1f} | {hit_ms:>6.2f}")
+
+            # Five 16 KB artifacts against a 64 KB bound: the oldest ones are evicted
+            for i in range(5):
+                ArtifactCache.put(f'filler{i}', '.xlsx', artifact)
+            sizes_on_disk = sum(entry.stat().st_size for entry in os.scandir(cache_dir))
+            assert sizes_on_disk <= app.config['ARTIFACT_CACHE_MAX_BYTES']
+            print(f"cache size after eviction: {sizes_on_disk // 1024} KB")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,148 @@
+"""
+Benchmark: teacher assignment summaries for the dashboards.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.assignment_summary_benchmark [teachers]
+
+Gives every teacher a subject in each stream (one of them as class teacher) and
+builds the portal class list and the role-based summary for each teacher and for
+the headteacher, once with the previous per-assignment lookups and once through
+AssignmentSummaryService, cold and warm. Prints the SQL statements and time per
+dashboard, checks the two produce the same summaries, and that adding an
+assignment or renaming a teacher is picked up on the next call.
+"""
+import sys
+import time
+
+from ..extensions import db
+from ..models import Teacher, TeacherSubjectAssignment, Subject, Grade, Stream
+from ..services.assignment_summary_service import AssignmentSummaryService
+from ..services.role_based_data_service import RoleBasedDataService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_TEACHERS = 10
+STREAMS = 4
+PLAIN_FIELDS = ('id', 'teacher_id', 'teacher_username', 'teacher_full_name', 'subject_name',
+                'grade_level', 'stream_name', 'is_class_teacher', 'education_level')
+
+
+def legacy_class_assignments(teacher_id):
+    """Reference implementation of the previous FlexibleMarksService.get_teacher_all_class_assignments."""
+    class_assignments = {}
+    for assignment in TeacherSubjectAssignment.query.filter_by(teacher_id=teacher_id).all():
+        grade_obj = db.session.get(Grade, assignment.grade_id)
+        stream_obj = db.session.get(Stream, assignment.stream_id) if assignment.stream_id else None
+        subject_obj = db.session.get(Subject, assignment.subject_id)
+        if not grade_obj or not subject_obj:
+            continue
+        stream_name = stream_obj.name if stream_obj else "All"
+        class_key = f"{grade_obj.name}_{stream_name}"
+        if class_key not in class_assignments:
+            class_assignments[class_key] = {
+                'grade_name': grade_obj.name, 'stream_name': stream_name,
+                'education_level': grade_obj.education_level, 'is_class_teacher': assignment.is_class_teacher,
+                'subjects': [], 'grade_id': grade_obj.id, 'stream_id': stream_obj.id if stream_obj else None
+            }
+        class_assignments[class_key]['subjects'].append({
+            'id': subject_obj.id, 'name': subject_obj.name, 'is_composite': subject_obj.is_composite,
+            'is_class_teacher_assignment': assignment.is_class_teacher
+        })
+        if assignment.is_class_teacher:
+            class_assignments[class_key]['is_class_teacher'] = True
+    return list(class_assignments.values())
+
+
+def legacy_assignments(teacher_id=None):
+    """Reference implementation of the previous role summaries: formatted assignments."""
+    query = TeacherSubjectAssignment.query.filter(TeacherSubjectAssignment.subject_id.isnot(None))
+    if teacher_id is not None:
+        query = TeacherSubjectAssignment.query.filter_by(teacher_id=teacher_id)
+    return [RoleBasedDataService._format_assignment(assignment) for assignment in query.all()]
+
+
+def plain(assignments):
+    return [tuple(data[field] for field in PLAIN_FIELDS) for data in assignments]
+
+
+def seed_assignments(data, teachers):
+    subjects = Subject.query.order_by(Subject.id).all()
+    teacher_ids = []
+    for index in range(teachers):
+        teacher = Teacher(username=f'teacher{index}', password='x', role='teacher',
+                          first_name=f'First{index}', last_name=f'Last{index}')
+        db.session.add(teacher)
+        db.session.flush()
+        teacher_ids.append(teacher.id)
+        subject = subjects[index % len(subjects)]
+        for position, stream in enumerate(data['streams']):
+            db.session.add(TeacherSubjectAssignment(
+                teacher_id=teacher.id, subject_id=subject.id, grade_id=data['grade'].id,
+                stream_id=stream.id, is_class_teacher=position == index % len(data['streams'])))
+    db.session.commit()
+    return teacher_ids
+
+
+def dashboards(app, teacher_ids, legacy):
+    """Build every teacher's portal and role summaries plus the headteacher summary."""
+    results = []
+    with app.test_request_context():
+        for teacher_id in teacher_ids:
+            if legacy:
+                results.append((legacy_class_assignments(teacher_id), plain(legacy_assignments(teacher_id))))
+            else:
+                summary = AssignmentSummaryService.role_summary(teacher_id, 'teacher')
+                results.append((AssignmentSummaryService.class_assignments(teacher_id),
+                                plain(summary['subject_assignments'])))
+        if legacy:
+            results.append(plain(legacy_assignments()))
+        else:
+            results.append(plain(AssignmentSummaryService.role_summary(teacher_ids[0], 'headteacher')
+                                 ['subject_assignments']))
+        db.session.remove()
+    return results
+
+
+def timed(app, teacher_ids, legacy):
+    with measure(db.engine) as stats:
+        results = dashboards(app, teacher_ids, legacy)
+    return results, stats
+
+
+def run(teachers):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        data = seed_school([1] * STREAMS)
+        teacher_ids = seed_assignments(data, teachers)
+        dashboards_built = len(teacher_ids) + 1
+
+        legacy, legacy_stats = timed(app, teacher_ids, legacy=True)
+        cold, cold_stats = timed(app, teacher_ids, legacy=False)
+        warm, warm_stats = timed(app, teacher_ids, legacy=False)
+        assert legacy == cold == warm, 'summaries differ from the previous implementation'
+
+        print(f"{teachers} teachers x {STREAMS} assignments, {dashboards_built} summaries")
+        print(f"{'':>8} | {'queries':>7} | {'ms/summary':>10}")
+        for name, stats in (('legacy', legacy_stats), ('cold', cold_stats), ('warm', warm_stats)):
+            print(f"{name:>8} | {stats['queries']:>7} | {stats['seconds'] / dashboards_built * 1000:>10.2f}")
+
+        teacher_id = teacher_ids[0]
+        with app.test_request_context():
+            db.session.add(TeacherSubjectAssignment(
+                teacher_id=teacher_id, subject_id=Subject.query.order_by(Subject.id.desc()).first().id,
+                grade_id=data['grade'].id, stream_id=data['streams'][0].id))
+            db.session.get(Teacher, teacher_id).first_name = 'Renamed'
+            db.session.commit()
+        with app.test_request_context():
+            start = time.perf_counter()
+            rows = AssignmentSummaryService.assignment_rows(teacher_id)
+            seconds = time.perf_counter() - start
+            everyone = AssignmentSummaryService.assignment_rows()
+        assert len(rows) == STREAMS + 1 and rows[0].teacher_first_name == 'Renamed'
+        assert len(everyone) == teachers * STREAMS + 1
+        print(f"after adding an assignment and renaming the teacher: {len(rows)} rows reloaded "
+              f"in {seconds * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TEACHERS)
@@ -0,0 +1,78 @@
+"""
+Benchmark: parallel individual-report rendering with BatchReportRenderer.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.batch_render_benchmark [learners] [workers...]
+
+Builds class data for one stream once, then renders one PDF per learner into a ZIP
+with an increasing number of worker processes. Rendering uses reportlab so the
+benchmark runs without wkhtmltopdf; the job handler uses the same renderer with
+html_to_pdf. Prints wall time, throughput and peak memory of the parent process.
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Table
+
+from ..extensions import db
+from ..services.batch_report_renderer import BatchReportRenderer
+from ..services.class_report_engine import ClassReportEngine
+from .common import create_benchmark_app, seed_school
+
+DEFAULT_LEARNERS = 120
+
+
+def render_report(row):
+    """Worker render function: one learner's marks table as a PDF."""
+    output = io.BytesIO()
+    styles = getSampleStyleSheet()
+    table = [['Subject', 'Mark']] + [[name, f"{mark:.1f}"] for name, mark in sorted(row['marks'].items())]
+    elements = [Paragraph(row['student'], styles['Heading1'])]
+    # Repeat the table to give each page a realistic rendering cost
+    for _ in range(20):
+        elements.append(Table(table))
+    SimpleDocTemplate(output, pagesize=A4).build(elements)
+    return output.getvalue()
+
+
+def run(learners, worker_counts):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        data = seed_school([learners])
+        report = ClassReportEngine.build(data['streams'][0].id, data['term'].id,
+                                         data['assessment_type'].id, data['grade'].education_level)
+        rows = report['class_data']
+
+        print(f"{'workers':>7} | {'reports':>7} | {'seconds':>7} | {'reports/s':>9} | {'peak MB':>7}")
+        with tempfile.TemporaryDirectory() as output_dir:
+            for workers in worker_counts:
+                zip_path = os.path.join(output_dir, f'reports_{workers}.zip')
+                tasks = ((f"{row['student']}.pdf", row) for row in rows)
+                tracemalloc.start()
+                start = time.perf_counter()
+                result = BatchReportRenderer.render_zip(tasks, zip_path, render_report, workers=workers)
+                seconds = time.perf_counter() - start
+                # The pool is sized when it starts, so start a new one for the next worker count
+                BatchReportRenderer.shutdown_pool()
+                peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                tracemalloc.stop()
+
+                with zipfile.ZipFile(zip_path) as zipf:
+                    assert len(zipf.namelist()) == len(rows) == result['rendered']
+                print(f"{workers:>7} | {result['rendered']:>7} | {seconds:>7.2f} | "
+                      f"{result['rendered'] / seconds:>9.1f} | {peak:>7.1f}")
+
+
+if __name__ == '__main__':
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, cpus})
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LEARNERS,
+        [int(arg) for arg in sys.argv[2:]] or default_workers)
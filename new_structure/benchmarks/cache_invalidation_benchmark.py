@@ -0,0 +1,64 @@
+"""
+Benchmark: scoped cache invalidation.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.cache_invalidation_benchmark [streams]
+
+Caches a report for every stream of a grade plus the grade marksheet, edits one
+mark, and reports how many entries are still served from the cache. Only the
+edited stream's report and the grade marksheet should be invalidated. Also prints
+the SQL statements and time a cache lookup spends reading its version token.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from ..extensions import db
+from ..models import Mark
+from ..services import cache_service
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_STREAMS = 6
+LOOKUPS = 200
+
+
+def run(streams):
+    app = create_benchmark_app()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)  # cache_service keeps its disk tier under ./cache
+        with app.app_context():
+            db.create_all()
+            data = seed_school([30] * streams)
+            grade, term, assessment = data['grade'].name, data['term'].name, data['assessment_type'].name
+            names = [f"Stream {stream.name}" for stream in data['streams']]
+
+            with app.test_request_context():
+                for name in names:
+                    cache_service.cache_report(grade, name, term, assessment, {'stream': name})
+                cache_service.cache_marksheet(grade, 'all', term, assessment, {'grade': grade})
+
+            with app.test_request_context():
+                mark = Mark.query.filter_by(stream_id=data['streams'][0].id).first()
+                mark.raw_mark = (mark.raw_mark or 0) + 1
+                db.session.commit()
+
+            with app.test_request_context():
+                kept = [name for name in names if cache_service.get_cached_report(grade, name, term, assessment)]
+                marksheet = cache_service.get_cached_marksheet(grade, 'all', term, assessment)
+            print(f"after editing one mark in {names[0]}: {len(kept)}/{len(names)} stream reports still cached, "
+                  f"grade marksheet {'cached' if marksheet else 'invalidated'}")
+            assert names[0] not in kept and len(kept) == len(names) - 1 and marksheet is None
+
+            with measure(db.engine) as stats:
+                start = time.perf_counter()
+                for _ in range(LOOKUPS):
+                    with app.app_context(), app.test_request_context():
+                        cache_service.get_cached_report(grade, names[1], term, assessment)
+                seconds = time.perf_counter() - start
+            print(f"{LOOKUPS} cached lookups: {stats['queries'] / LOOKUPS:.0f} queries and "
+                  f"{seconds / LOOKUPS * 1000:.2f} ms each")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_STREAMS)
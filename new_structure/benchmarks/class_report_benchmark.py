@@ -0,0 +1,76 @@
+"""
+Benchmark: class report data loading, per-row lookups vs the set-based ClassReportEngine.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.class_report_benchmark [sizes...]
+
+Prints the number of SQL statements and wall time per class size for both paths
+and checks that they produce the same marks.
+"""
+import sys
+
+from ..extensions import db
+from ..models import Mark, Student
+from ..services.class_report_engine import ClassReportEngine
+from ..services.composite_subject_service import CompositeSubjectService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_SIZES = [15, 30, 60, 120, 240]
+
+
+def per_row_report(stream_id, term_id, assessment_type_id, education_level):
+    """Reference implementation using the previous one-query-per-cell pattern."""
+    regular, component_map = ClassReportEngine.load_subjects(education_level)
+    results = {}
+    for student in Student.query.filter_by(stream_id=stream_id).all():
+        marks = {}
+        for subject in regular:
+            mark = Mark.query.filter_by(student_id=student.id, subject_id=subject.id,
+                                        term_id=term_id, assessment_type_id=assessment_type_id).first()
+            if mark:
+                marks[subject.name] = min(mark.percentage, 100.0)
+        for composite_name in CompositeSubjectService.get_all_composite_subjects(education_level):
+            composite = CompositeSubjectService.get_composite_subject_mark(
+                student.id, composite_name, term_id, assessment_type_id, education_level
+            )
+            if composite:
+                marks[composite_name] = min(composite['combined_percentage'], 100.0)
+        results[student.id] = marks
+    return results
+
+
+def run(sizes):
+    app = create_benchmark_app()
+    rows = []
+    with app.app_context():
+        for size in sizes:
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            data = seed_school([size])
+            stream = data['streams'][0]
+            args = (stream.id, data['term'].id, data['assessment_type'].id, data['grade'].education_level)
+            db.session.expire_all()
+
+            with measure(db.engine) as legacy:
+                reference = per_row_report(*args)
+            db.session.expire_all()
+            with measure(db.engine) as engine:
+                report = ClassReportEngine.build(*args)
+
+            for row in report['class_data']:
+                expected = reference[row['student_id']]
+                assert set(expected) == set(row['marks']), row['student']
+                for name, value in expected.items():
+                    assert abs(value - row['marks'][name]) < 1e-9, (row['student'], name)
+
+            rows.append((size, legacy, engine))
+
+    print(f"{'students':>8} | {'per-row queries':>15} {'per-row ms':>10} | {'engine queries':>14} {'engine ms':>9}")
+    for size, legacy, engine in rows:
+        print(f"{size:>8} | {legacy['queries']:>15} {legacy['seconds'] * 1000:>10.1f} | "
+              f"{engine['queries']:>14} {engine['seconds'] * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,125 @@
+"""
+Shared helpers for benchmarks: an in-memory app, query counting and synthetic school data.
+"""
+import random
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+from sqlalchemy import event
+
+from ..extensions import db
+from ..models import Grade, Stream, Term, AssessmentType, Subject, Student, Mark
+
+REGULAR_SUBJECTS = [
+    'Mathematics', 'Science and Technology', 'Social Studies', 'CRE',
+    'Agriculture', 'Creative Arts', 'Home Science', 'Physical Education'
+]
+COMPOSITE_SUBJECTS = {
+    'English': [('English Grammar', 0.6), ('English Composition', 0.4)],
+    'Kiswahili': [('Kiswahili Lugha', 0.6), ('Kiswahili Insha', 0.4)],
+}
+
+
+def create_benchmark_app(database_uri='sqlite://'):
+    """Create a minimal Flask app bound to a throwaway database."""
+    app = Flask('benchmark')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+class QueryCounter:
+    """Counts SQL statements executed on the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def measure(engine):
+    """Yield a dict that is filled with 'queries' and 'seconds' on exit."""
+    result = {}
+    with QueryCounter(engine) as counter:
+        start = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - start
+    result['queries'] = counter.count
+
+
+def seed_school(class_sizes, grade_name='Grade 5',
+                education_level='upper_primary', seed=42):
+    """
+    Seed one grade with streams of the given sizes and a full set of marks.
+
+    Args:
+        class_sizes: Number of students per stream (one stream per entry)
+        grade_name: Name of the grade to create
+        education_level: Education level of the grade and its subjects
+        seed: Random seed for reproducible marks
+
+    Returns:
+        Dictionary with grade, streams, term and assessment_type objects
+    """
+    rng = random.Random(seed)
+
+    grade = Grade(name=grade_name, education_level=education_level)
+    term = Term(name='Term 1', academic_year='2025', is_current=True)
+    assessment_type = AssessmentType(name='End Term', weight=100)
+    db.session.add_all([grade, term, assessment_type])
+    db.session.flush()
+
+    subjects = [Subject(name=name, education_level=education_level) for name in REGULAR_SUBJECTS]
+    for parent, components in COMPOSITE_SUBJECTS.items():
+        for name, weight in components:
+            subjects.append(Subject(name=name, education_level=education_level, is_component=True,
+                                    composite_parent=parent, component_weight=weight))
+    db.session.add_all(subjects)
+    db.session.flush()
+
+    streams = []
+    admission = 0
+    for index, size in enumerate(class_sizes):
+        stream = Stream(name=chr(ord('A') + index), grade_id=grade.id)
+        db.session.add(stream)
+        db.session.flush()
+        streams.append(stream)
+
+        students = []
+        for _ in range(size):
+            admission += 1
+            students.append({
+                'name': f'Learner {admission}', 'admission_number': f'BM{admission:06d}',
+                'stream_id': stream.id, 'grade_id': grade.id,
+                'gender': rng.choice(['Male', 'Female'])
+            })
+        db.session.bulk_insert_mappings(Student, students)
+
+        student_ids = [row.id for row in Student.query.filter_by(stream_id=stream.id)]
+        marks = []
+        for student_id in student_ids:
+            for subject in subjects:
+                raw = rng.randint(5, 100)
+                marks.append({
+                    'student_id': student_id, 'subject_id': subject.id, 'term_id': term.id,
+                    'assessment_type_id': assessment_type.id, 'grade_id': grade.id,
+                    'stream_id': stream.id, 'mark': raw, 'total_marks': 100, 'raw_mark': raw,
+                    'raw_total_marks': 100, 'percentage': float(raw)
+                })
+        db.session.bulk_insert_mappings(Mark, marks)
+
+    db.session.commit()
+    return {'grade': grade, 'streams': streams, 'term': term, 'assessment_type': assessment_type}
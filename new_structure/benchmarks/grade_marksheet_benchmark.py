@@ -0,0 +1,100 @@
+"""
+Benchmark: grade marksheet data loading and workbook writing.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.grade_marksheet_benchmark [streams] [learners per stream]
+
+Loads the grade marksheet with the previous per-learner, per-subject Mark lookups
+and with GradeMarksheetService (one query), checks both give the same marks, then
+writes the workbook with openpyxl's regular in-memory mode and with the write-only
+mode used by excel_export. Prints SQL statements, time and peak Python memory.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from openpyxl import Workbook
+
+from ..extensions import db
+from ..models import Mark, Student, Stream, Subject
+from ..services.excel_export import generate_grade_marksheet_excel
+from ..services.grade_marksheet_service import GradeMarksheetService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_STREAMS = 4
+DEFAULT_LEARNERS = 60
+
+
+def per_cell_marks(grade_id, term_id, assessment_type_id):
+    """Reference implementation of the previous loading loop: one Mark query per learner and subject."""
+    subjects = Subject.query.all()
+    marks = {}
+    for stream in Stream.query.filter_by(grade_id=grade_id).all():
+        for student in Student.query.filter_by(stream_id=stream.id).all():
+            for subject in subjects:
+                mark = Mark.query.filter_by(student_id=student.id, subject_id=subject.id, term_id=term_id,
+                                            assessment_type_id=assessment_type_id).first()
+                marks[(student.admission_number, subject.name)] = mark.mark if mark else "-"
+    return marks
+
+
+def in_memory_workbook(marksheet, path):
+    """The same marks table written with a regular (in-memory) openpyxl workbook."""
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(['Rank', 'Name', 'Stream'] + marksheet['subjects'] + ['Total', 'Average (%)', 'Grade'])
+    for student in marksheet['data']:
+        worksheet.append([student['rank'], student['name'], student['stream']]
+                         + [student['marks'][name] for name in marksheet['subjects']]
+                         + [student['total'], student['percentage'], student['grade']])
+    workbook.save(path)
+
+
+def traced(function, *args):
+    """Time a call, then repeat it under tracemalloc (which slows it down) for the peak memory."""
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / (1024 * 1024)
+
+
+def run(streams, learners):
+    app = create_benchmark_app()
+    with app.app_context(), app.test_request_context():
+        db.create_all()
+        data = seed_school([learners] * streams)
+        ids = (data['grade'].id, data['term'].id, data['assessment_type'].id)
+
+        with measure(db.engine) as legacy_stats:
+            legacy = per_cell_marks(*ids)
+        with measure(db.engine) as stats:
+            marksheet = GradeMarksheetService.build(*ids)
+        loaded = {(row['admission_number'], name): value
+                  for row in marksheet['data'] for name, value in row['marks'].items()}
+        assert loaded == legacy, 'marks differ from the per-cell lookups'
+
+        print(f"{streams} streams x {learners} learners x {len(marksheet['subjects'])} subjects")
+        print(f"{'load':>22} | {'queries':>7} | {'ms':>8}")
+        print(f"{'per-cell lookups':>22} | {legacy_stats['queries']:>7} | {legacy_stats['seconds'] * 1000:>8.1f}")
+        print(f"{'GradeMarksheetService':>22} | {stats['queries']:>7} | {stats['seconds'] * 1000:>8.1f}")
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = os.path.join(work_dir, 'marksheet.xlsx')
+            print(f"\n{'write':>22} | {'ms':>8} | {'peak MB':>7}")
+            seconds, peak = traced(in_memory_workbook, marksheet, path)
+            print(f"{'in-memory workbook':>22} | {seconds * 1000:>8.1f} | {peak:>7.1f}")
+            seconds, peak = traced(generate_grade_marksheet_excel, data['grade'].name, data['term'].name,
+                                   data['assessment_type'].name, marksheet['subjects'], marksheet['data'],
+                                   marksheet['statistics'], path)
+            print(f"{'write-only (all sheets)':>22} | {seconds * 1000:>8.1f} | {peak:>7.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_STREAMS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LEARNERS)
@@ -0,0 +1,129 @@
+"""
+Benchmark: school-wide headteacher analytics.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.headteacher_analytics_benchmark [terms] [learners per stream]
+
+Seeds a grade with marks for several terms across academic years and builds the
+/admin/analytics data, first the previous way (every Mark loaded with its
+relationships and aggregated in Python, one count query per teacher), then with
+AnalyticsService.get_headteacher_analytics's grouped queries, for the whole school
+and for one academic year. Prints SQL statements, time and peak Python memory, and
+checks both give the same analytics (orders of equal averages aside).
+"""
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+
+from ..extensions import db
+from ..models import Mark, Student, Stream, Grade, Subject, Term, Teacher, TeacherSubjectAssignment
+from ..services.analytics_service import AnalyticsService
+from ..services.reference_data_service import ReferenceDataService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_TERMS = 3
+DEFAULT_LEARNERS = 40
+STREAMS = 4
+TEACHERS = 8
+
+
+def legacy_headteacher_analytics():
+    """Reference implementation of the previous load-everything get_headteacher_analytics."""
+    marks = Mark.query.join(Student).join(Stream).join(Grade).join(Subject).all()
+    with contextlib.redirect_stdout(io.StringIO()):  # _process_marks_data prints progress
+        analytics_data = AnalyticsService._process_marks_data(marks, school_wide=True)
+    analytics_data['summary']['total_students'] = Student.query.count()
+    analytics_data['summary']['active_subjects'] = Subject.query.count()
+    analytics_data['summary']['active_teachers'] = Teacher.query.filter(Teacher.role != 'headteacher').count()
+    analytics_data['summary']['total_assessments'] = len(set((m.term_id, m.assessment_type_id) for m in marks))
+    analytics_data['grade_performance'] = AnalyticsService._get_grade_breakdown(marks)
+    teacher_performance = []
+    for teacher in Teacher.query.filter(Teacher.role != 'headteacher').all():
+        subject_count = TeacherSubjectAssignment.query.filter_by(teacher_id=teacher.id).count()
+        teacher_performance.append({
+            'name': teacher.full_name or teacher.username, 'username': teacher.username,
+            'subjects_assigned': subject_count, 'class_teacher': "Yes" if teacher.stream_id else "No",
+            'status': 'Active' if subject_count > 0 or teacher.stream_id else 'Inactive'
+        })
+    analytics_data['teacher_performance'] = teacher_performance
+    return analytics_data
+
+
+def comparable(analytics_data):
+    """The analytics with rows of equal averages put in a fixed order."""
+    return {
+        'summary': analytics_data['summary'],
+        'grade_performance': analytics_data['grade_performance'],
+        'teacher_performance': analytics_data['teacher_performance'],
+        'top_student_averages': [student['average'] for student in analytics_data['top_students']],
+        'subject_performance': sorted(analytics_data['subject_performance'], key=lambda x: (-x['average'], x['name'])),
+        'recent_assessments': sorted(analytics_data['recent_assessments'], key=lambda x: (x['date'], x['term'])),
+    }
+
+
+def seed(terms, learners):
+    data = seed_school([learners] * STREAMS)
+    first_term_id = data['term'].id
+    # The same marks again for each further term, one academic year per three terms
+    for index in range(1, terms):
+        term = Term(name=f'Term {index + 1}', academic_year=str(2025 - index // 3))
+        db.session.add(term)
+        db.session.flush()
+        db.session.execute(db.text(
+            'INSERT INTO mark (student_id, subject_id, term_id, assessment_type_id, grade_id, stream_id, mark, '
+            'total_marks, raw_mark, raw_total_marks, percentage, created_at) '
+            'SELECT student_id, subject_id, :term, assessment_type_id, grade_id, stream_id, mark, total_marks, '
+            'raw_mark, raw_total_marks, (percentage + :shift) % 100, created_at FROM mark WHERE term_id = :first'
+        ), {'term': term.id, 'first': first_term_id, 'shift': index * 7})
+    subjects = Subject.query.all()
+    for index in range(TEACHERS):
+        teacher = Teacher(username=f'teacher{index}', password='x', role='teacher',
+                          stream_id=data['streams'][index].id if index < STREAMS else None)
+        db.session.add(teacher)
+        db.session.flush()
+        for subject in subjects[index::TEACHERS]:
+            db.session.add(TeacherSubjectAssignment(teacher_id=teacher.id, subject_id=subject.id,
+                                                    grade_id=data['grade'].id, stream_id=data['streams'][0].id))
+    db.session.commit()
+
+
+def timed(app, function, **filters):
+    with app.test_request_context():
+        ReferenceDataService.current()  # Loaded once per process, not part of the measurement
+        with measure(db.engine) as stats:
+            result = function(**filters)
+        tracemalloc.start()
+        function(**filters)
+        stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+        db.session.remove()
+    return result, stats
+
+
+def run(terms, learners):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(terms, learners)
+        marks = Mark.query.count()
+        print(f"{terms} terms x {STREAMS} streams x {learners} learners: {marks} marks "
+              f"(seeded in {time.perf_counter() - start:.1f} s)")
+
+        legacy, legacy_stats = timed(app, legacy_headteacher_analytics)
+        grouped, grouped_stats = timed(app, AnalyticsService.get_headteacher_analytics)
+        assert comparable(grouped) == comparable(legacy), 'analytics differ from the previous implementation'
+        year, year_stats = timed(app, AnalyticsService.get_headteacher_analytics, academic_year='2025')
+        assert year['summary']['total_assessments'] == min(terms, 3)
+
+        print(f"{'':>22} | {'queries':>7} | {'ms':>8} | {'peak MB':>7}")
+        for name, stats in (('load all marks', legacy_stats), ('grouped queries', grouped_stats),
+                            ('grouped, one year', year_stats)):
+            print(f"{name:>22} | {stats['queries']:>7} | {stats['seconds'] * 1000:>8.1f} | {stats['peak_mb']:>7.2f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TERMS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LEARNERS)
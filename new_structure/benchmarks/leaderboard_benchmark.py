@@ -0,0 +1,136 @@
+"""
+Benchmark: top subject performers and enhanced top performers leaderboards.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.leaderboard_benchmark [streams] [learners per stream]
+
+Builds the top 3 learners of every grade/stream/subject and the top 10 of every
+stream, first with the previous per-combination LIMIT queries, then through
+LeaderboardService with window functions and with the streamed heap fallback.
+Prints SQL statements and time, and checks all three give the same leaderboards
+(the reference implementations break score ties by id, as LeaderboardService does).
+"""
+import sys
+
+from sqlalchemy import func
+
+from ..extensions import db
+from ..models import Mark, Student, Subject, Stream, Grade
+from ..services.academic_analytics_service import AcademicAnalyticsService
+from ..services.leaderboard_service import LeaderboardService
+from ..services.reference_data_service import ReferenceDataService
+from ..utils.results_kernel import competition_ranks
+from ..views.analytics_api import get_top_subject_performers
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_STREAMS = 4
+DEFAULT_LEARNERS = 60
+TOP_PERFORMERS = 10
+
+
+def legacy_top_subject_performers(term_id, assessment_type_id):
+    """Reference implementation of the previous per-combination top 3 and student count queries."""
+    base_query = Mark.query.join(Student, Mark.student_id == Student.id)\
+        .join(Subject, Mark.subject_id == Subject.id)\
+        .join(Stream, Student.stream_id == Stream.id)\
+        .join(Grade, Stream.grade_id == Grade.id)\
+        .filter(Mark.term_id == term_id, Mark.assessment_type_id == assessment_type_id)
+    result = {}
+    combinations = base_query.with_entities(
+        Grade.id.label('grade_id'), Grade.name.label('grade_name'), Stream.id.label('stream_id'),
+        Stream.name.label('stream_name'), Subject.id.label('subject_id'), Subject.name.label('subject_name')
+    ).distinct().all()
+    for combo in combinations:
+        query = base_query.filter(Grade.id == combo.grade_id, Subject.id == combo.subject_id,
+                                  Stream.id == combo.stream_id)
+        performers = query.with_entities(
+            Student.id.label('student_id'), Student.name.label('student_name'),
+            Student.admission_number.label('admission_number'), Mark.mark.label('marks'),
+            Mark.total_marks.label('total_marks'),
+            func.round((Mark.mark * 100.0 / Mark.total_marks), 2).label('percentage')
+        ).order_by(func.round((Mark.mark * 100.0 / Mark.total_marks), 2).desc(), Mark.id).limit(3).all()
+        result.setdefault(f"Grade {combo.grade_name}", {}).setdefault(f"Stream {combo.stream_name}", {})[
+            combo.subject_name] = {
+            'top_performers': [(p.student_id, p.marks, float(p.percentage)) for p in performers],
+            'total_students': query.with_entities(func.count(func.distinct(Student.id))).scalar()
+        }
+    return result
+
+
+def legacy_enhanced_top_performers(grade_id, term_id, assessment_type_id, limit):
+    """Reference implementation of the previous per-stream queries (positions, totals and subject marks)."""
+    performers = {}
+    for stream in Stream.query.filter_by(grade_id=grade_id).order_by(Stream.id).all():
+        results = db.session.query(
+            Student.id, func.avg(Mark.percentage).label('average_percentage')
+        ).join(Mark, Student.id == Mark.student_id).filter(
+            Student.stream_id == stream.id, Mark.term_id == term_id, Mark.assessment_type_id == assessment_type_id
+        ).group_by(Student.id).having(func.count(Mark.id) >= 3)\
+            .order_by(func.avg(Mark.percentage).desc(), Student.id).limit(limit).all()
+        total_students = Student.query.filter_by(stream_id=stream.id).count()
+        positions = competition_ranks([r.average_percentage or 0 for r in results])
+        performers[stream.name] = [
+            (r.id, round(r.average_percentage, 2), int(positions[index]), total_students,
+             Mark.query.filter_by(student_id=r.id, term_id=term_id, assessment_type_id=assessment_type_id).count())
+            for index, r in enumerate(results)
+        ]
+    return performers
+
+
+def top_subject_performers(app, term_id, assessment_type_id):
+    with app.test_request_context(query_string={'term_id': term_id, 'assessment_type_id': assessment_type_id}):
+        payload = get_top_subject_performers.__wrapped__().get_json()
+    return {grade: {stream: {subject: {
+        'top_performers': [(p['student_id'], p['marks'], p['percentage']) for p in data['top_performers']],
+        'total_students': data['total_students']
+    } for subject, data in subjects.items()} for stream, subjects in streams.items()}
+        for grade, streams in payload['top_subject_performers'].items()}
+
+
+def enhanced_top_performers(grade_id, term_id, assessment_type_id, grade_name):
+    data = AcademicAnalyticsService.get_enhanced_top_performers(
+        grade_id, None, term_id, assessment_type_id, TOP_PERFORMERS, use_cache=False)
+    return {stream: [(p['student_id'], p['average_percentage'], p['class_position'],
+                      p['total_students_in_class'], len(p['subject_marks'])) for p in performers]
+            for stream, performers in data['enhanced_top_performers'][f"Grade {grade_name}"].items()}
+
+
+def run(streams, learners):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        data = seed_school([learners] * streams)
+        grade_id, grade_name = data['grade'].id, data['grade'].name
+        term_id, assessment_type_id = data['term'].id, data['assessment_type'].id
+        with app.test_request_context():
+            ReferenceDataService.current()  # Loaded once per process, not part of the measurement
+
+        rows = []
+        with measure(db.engine) as stats:
+            legacy_subjects = legacy_top_subject_performers(term_id, assessment_type_id)
+        rows.append(('subjects, legacy', stats))
+        with measure(db.engine) as stats:
+            legacy_streams = legacy_enhanced_top_performers(grade_id, term_id, assessment_type_id, TOP_PERFORMERS)
+        rows.append(('streams, legacy', stats))
+
+        for mode, window_functions in (('window', True), ('streamed', False)):
+            app.config['LEADERBOARD_WINDOW_FUNCTIONS'] = window_functions
+            assert LeaderboardService.supports_window_functions() is window_functions
+            with measure(db.engine) as stats:
+                subjects = top_subject_performers(app, term_id, assessment_type_id)
+            rows.append((f"subjects, {mode}", stats))
+            assert subjects == legacy_subjects, f"top subject performers differ ({mode})"
+            with app.test_request_context(), measure(db.engine) as stats:
+                performers = enhanced_top_performers(grade_id, term_id, assessment_type_id, grade_name)
+            rows.append((f"streams, {mode}", stats))
+            assert performers == legacy_streams, f"enhanced top performers differ ({mode})"
+
+        print(f"{streams} streams x {learners} learners")
+        print(f"{'':>18} | {'queries':>7} | {'ms':>8}")
+        for name, stats in rows:
+            print(f"{name:>18} | {stats['queries']:>7} | {stats['seconds'] * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_STREAMS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LEARNERS)
@@ -0,0 +1,201 @@
+"""
+Benchmark: analytics API aggregates from the mark cube.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.mark_cube_benchmark [streams] [learners per stream]
+
+Seeds a grade with teachers assigned to some of its subjects (per stream or for the
+whole grade) and builds the class/stream, subject and enhanced subject performance
+analytics, first with the previous GROUP BY queries over every mark, then from the
+mark cube through MarkCubeService.rollup. Prints SQL statements and time, and checks
+both give the same analytics, before and after marks are changed (which refreshes
+only the changed cube slices), and after marks are updated outside the session with
+only their version bumped (rebuilt on the next read from mark_cube_state).
+"""
+import sys
+
+from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import Mark, Student, Stream, Grade, Subject, Teacher, TeacherSubjectAssignment, MarkCube
+from ..services.academic_analytics_service import AcademicAnalyticsService
+from ..services.cache_invalidation_service import CacheInvalidationService
+from ..services.mark_cube_service import MarkCubeService
+from ..services.reference_data_service import ReferenceDataService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_STREAMS = 4
+DEFAULT_LEARNERS = 60
+TEACHERS = 6
+
+
+def _teacher_name(row):
+    if row.teacher_first_name and row.teacher_last_name:
+        return f"{row.teacher_first_name} {row.teacher_last_name}"
+    return row.teacher_username or "Not Assigned"
+
+
+def _legacy_subject_query(*columns):
+    """The previous Mark -> Student -> Stream -> Grade query with the assigned teachers joined."""
+    return db.session.query(
+        *columns,
+        func.avg(Mark.percentage).label('average_percentage'),
+        func.count(Mark.id).label('total_marks'),
+        func.min(Mark.percentage).label('min_percentage'),
+        func.max(Mark.percentage).label('max_percentage'),
+        func.count(func.distinct(Mark.student_id)).label('student_count'),
+        Teacher.first_name.label('teacher_first_name'),
+        Teacher.last_name.label('teacher_last_name'),
+        Teacher.username.label('teacher_username')
+    ).join(Mark, Subject.id == Mark.subject_id)\
+        .join(Student, Mark.student_id == Student.id)\
+        .join(Stream, Student.stream_id == Stream.id)\
+        .join(Grade, Stream.grade_id == Grade.id)\
+        .outerjoin(TeacherSubjectAssignment,
+                   and_(TeacherSubjectAssignment.subject_id == Subject.id,
+                        TeacherSubjectAssignment.grade_id == Grade.id,
+                        or_(TeacherSubjectAssignment.stream_id == Stream.id,
+                            TeacherSubjectAssignment.stream_id.is_(None))))\
+        .outerjoin(Teacher, TeacherSubjectAssignment.teacher_id == Teacher.id)
+
+
+def legacy_subject_performance(term_id, assessment_type_id):
+    """Reference implementation of the previous subject performance query."""
+    rows = _legacy_subject_query(Subject.id, Subject.name)\
+        .filter(Mark.term_id == term_id, Mark.assessment_type_id == assessment_type_id)\
+        .group_by(Subject.id, Subject.name, Teacher.id, Teacher.first_name, Teacher.last_name, Teacher.username)\
+        .having(func.count(Mark.id) >= 2).all()
+    return sorted((row.id, row.name, round(row.average_percentage, 2), row.total_marks, row.student_count,
+                   round(row.min_percentage, 2), round(row.max_percentage, 2), _teacher_name(row))
+                  for row in rows)
+
+
+def legacy_enhanced_subject_performance(term_id, assessment_type_id):
+    """Reference implementation of the previous per-stream subject performance query."""
+    rows = _legacy_subject_query(Grade.name.label('grade_name'), Stream.name.label('stream_name'),
+                                 Subject.name.label('subject_name'))\
+        .filter(Mark.term_id == term_id, Mark.assessment_type_id == assessment_type_id)\
+        .group_by(Grade.id, Grade.name, Stream.id, Stream.name, Subject.id, Subject.name,
+                  Teacher.id, Teacher.first_name, Teacher.last_name, Teacher.username).all()
+    return sorted((f"Grade {row.grade_name}", row.subject_name, row.stream_name, round(row.average_percentage, 2),
+                   row.total_marks, row.student_count, _teacher_name(row)) for row in rows)
+
+
+def legacy_class_stream_performance(term_id, assessment_type_id):
+    """Reference implementation of the previous class/stream performance query."""
+    rows = db.session.query(
+        Grade.id, Grade.name.label('grade_name'), Stream.id, Stream.name.label('stream_name'),
+        func.avg(Mark.percentage).label('average_percentage'),
+        func.count(func.distinct(Student.id)).label('student_count'),
+        func.count(Mark.id).label('total_marks'),
+        func.min(Mark.percentage).label('min_percentage'),
+        func.max(Mark.percentage).label('max_percentage')
+    ).join(Student, Mark.student_id == Student.id).join(Stream, Student.stream_id == Stream.id)\
+        .join(Grade, Stream.grade_id == Grade.id)\
+        .filter(Mark.term_id == term_id, Mark.assessment_type_id == assessment_type_id)\
+        .group_by(Grade.id, Grade.name, Stream.id, Stream.name).order_by(Grade.name, Stream.name).all()
+    rows = sorted(rows, key=lambda row: row.average_percentage, reverse=True)
+    return [(row.grade_name, row.stream_name, round(row.average_percentage, 2), row.student_count,
+             row.total_marks, round(row.min_percentage, 2), round(row.max_percentage, 2)) for row in rows]
+
+
+def cube_analytics(term_id, assessment_type_id):
+    subjects = AcademicAnalyticsService.get_subject_performance_analytics(
+        term_id=term_id, assessment_type_id=assessment_type_id, use_cache=False)
+    enhanced = AcademicAnalyticsService.get_enhanced_subject_performance_analytics(
+        term_id=term_id, assessment_type_id=assessment_type_id, use_cache=False)
+    classes = AcademicAnalyticsService.get_class_stream_performance(
+        term_id=term_id, assessment_type_id=assessment_type_id, use_cache=False)
+    return (
+        sorted((s['subject_id'], s['subject_name'], s['average_percentage'], s['total_marks'], s['student_count'],
+                s['min_percentage'], s['max_percentage'], s['teacher_name']) for s in subjects['subject_analytics']),
+        sorted((grade, subject, stream, data['average_percentage'], data['total_marks'], data['student_count'],
+                data['teacher_name'])
+               for grade, by_subject in enhanced['grade_subject_analytics'].items()
+               for subject, subject_data in by_subject.items()
+               for stream, data in subject_data['streams'].items()),
+        [(c['grade_name'], c['stream_name'], c['average_percentage'], c['student_count'], c['total_marks'],
+          c['min_percentage'], c['max_percentage']) for c in classes['class_stream_performance']]
+    )
+
+
+def legacy_analytics(term_id, assessment_type_id):
+    return (legacy_subject_performance(term_id, assessment_type_id),
+            legacy_enhanced_subject_performance(term_id, assessment_type_id),
+            legacy_class_stream_performance(term_id, assessment_type_id))
+
+
+def seed(streams, learners):
+    data = seed_school([learners] * streams)
+    subjects = Subject.query.order_by(Subject.id).all()
+    for index in range(TEACHERS):
+        teacher = Teacher(username=f'teacher{index}', password='x', role='teacher',
+                          first_name=f'First{index}' if index % 2 else None, last_name=f'Last{index}')
+        db.session.add(teacher)
+        db.session.flush()
+        # Even teachers take one stream, odd teachers the whole grade; the last subjects stay unassigned
+        for subject in subjects[index:len(subjects) - 2:TEACHERS]:
+            db.session.add(TeacherSubjectAssignment(
+                teacher_id=teacher.id, subject_id=subject.id, grade_id=data['grade'].id,
+                stream_id=data['streams'][index % streams].id if index % 2 == 0 else None))
+    db.session.commit()
+    return data
+
+
+def run(streams, learners):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        data = seed(streams, learners)
+        term_id, assessment_type_id = data['term'].id, data['assessment_type'].id
+
+        rows = []
+        with app.test_request_context():
+            ReferenceDataService.current()  # Loaded once per process, not part of the measurement
+            with measure(db.engine) as stats:
+                MarkCubeService.ensure_current()
+            rows.append(('build cube', stats))
+            with measure(db.engine) as stats:
+                legacy = legacy_analytics(term_id, assessment_type_id)
+            rows.append(('legacy', stats))
+            with measure(db.engine) as stats:
+                cube = cube_analytics(term_id, assessment_type_id)
+            rows.append(('cube', stats))
+            assert cube == legacy, 'cube analytics differ from the previous queries'
+
+            # Change some marks and delete a learner's marks: only their slices are refreshed
+            for mark in Mark.query.order_by(Mark.id).limit(25).all():
+                mark.percentage = (mark.percentage + 37) % 100
+            db.session.commit()
+            Mark.query.filter(Mark.student_id == Mark.query.first().student_id).delete()
+            with measure(db.engine) as stats:
+                db.session.commit()
+            rows.append(('commit + refresh', stats))
+            assert cube_analytics(term_id, assessment_type_id) == legacy_analytics(term_id, assessment_type_id), \
+                'cube analytics differ after marks changed'
+
+            # Another process updates marks without the commit hook (same mark count), bumping only versions
+            mark = Mark.query.order_by(Mark.id.desc()).first()
+            with db.engine.begin() as connection:
+                connection.execute(db.text('UPDATE mark SET percentage = 100 - percentage WHERE stream_id = :stream'),
+                                   {'stream': mark.stream_id})
+                with Session(bind=connection) as session:
+                    CacheInvalidationService.record_marks(session, [
+                        (mark.grade_id, mark.stream_id, mark.term_id, mark.assessment_type_id)])
+            db.session.expire_all()
+            with measure(db.engine) as stats:
+                cube = cube_analytics(term_id, assessment_type_id)
+            rows.append(('stale read', stats))
+            assert cube == legacy_analytics(term_id, assessment_type_id), 'stale cube slice not rebuilt on read'
+            marks, cells = Mark.query.count(), MarkCube.query.count()
+
+        print(f"{streams} streams x {learners} learners: {marks} marks in {cells} cube rows")
+        print(f"{'':>16} | {'queries':>7} | {'ms':>8}")
+        for name, stats in rows:
+            print(f"{name:>16} | {stats['queries']:>7} | {stats['seconds'] * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_STREAMS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LEARNERS)
@@ -0,0 +1,82 @@
+"""
+Benchmark: saving one subject for a class, per-row lookups vs MarkIngestService.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.mark_ingest_benchmark [sizes...]
+
+Each size re-saves every learner's mark for one subject (updates) and saves a
+subject with no marks yet (inserts), and prints SQL statements and wall time.
+"""
+import random
+import sys
+
+from ..extensions import db
+from ..models import Mark, Student, Subject
+from ..services.mark_conversion_service import MarkConversionService
+from ..services.mark_ingest_service import MarkIngestService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_SIZES = [15, 30, 60, 120, 240]
+
+
+def per_row_save(entries, term_id, assessment_type_id, grade_id, stream_id):
+    """Reference implementation using the previous one-lookup-per-learner pattern."""
+    for entry in entries:
+        raw_mark, max_raw_mark = MarkConversionService.sanitize_raw_mark(entry['raw_mark'], entry['max_raw_mark'])
+        percentage = MarkConversionService.calculate_percentage(raw_mark, max_raw_mark)
+        mark = Mark.query.filter_by(student_id=entry['student_id'], subject_id=entry['subject_id'],
+                                    term_id=term_id, assessment_type_id=assessment_type_id).first()
+        if mark:
+            mark.mark = mark.raw_mark = raw_mark
+            mark.total_marks = mark.raw_total_marks = max_raw_mark
+            mark.percentage = percentage
+        else:
+            db.session.add(Mark(student_id=entry['student_id'], subject_id=entry['subject_id'],
+                                term_id=term_id, assessment_type_id=assessment_type_id, grade_id=grade_id,
+                                stream_id=stream_id, raw_mark=raw_mark, raw_total_marks=max_raw_mark,
+                                percentage=percentage))
+    db.session.commit()
+
+
+def run(sizes):
+    app = create_benchmark_app()
+    rng = random.Random(3)
+    print(f"{'learners':>8} | {'mode':>7} | {'per-row q':>9} | {'bulk q':>6} | {'per-row ms':>10} | {'bulk ms':>7}")
+    with app.app_context():
+        for size in sizes:
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            data = seed_school([size])
+            stream = data['streams'][0]
+            ids = (data['term'].id, data['assessment_type'].id, data['grade'].id, stream.id)
+            student_ids = [s.id for s in Student.query.filter_by(stream_id=stream.id)]
+
+            existing_subject = Subject.query.filter_by(name='Mathematics').first()
+            new_subjects = [Subject(name=f'Elective {n}', education_level='upper_primary') for n in range(2)]
+            db.session.add_all(new_subjects)
+            db.session.commit()
+
+            for mode, subjects in (('update', [existing_subject, existing_subject]), ('insert', new_subjects)):
+                timings = []
+                for subject in subjects:
+                    entries = [{'student_id': sid, 'subject_id': subject.id,
+                                'raw_mark': rng.randint(0, 50), 'max_raw_mark': 50} for sid in student_ids]
+                    db.session.expire_all()
+                    if not timings:
+                        with measure(db.engine) as stats:
+                            per_row_save(entries, *ids)
+                    else:
+                        with measure(db.engine) as stats:
+                            MarkIngestService.save_marks(entries, *ids, update_status=False)
+                    timings.append(stats)
+
+                saved = Mark.query.filter_by(subject_id=subjects[-1].id, term_id=ids[0]).count()
+                assert saved == size, (saved, size)
+                legacy, bulk = timings
+                print(f"{size:>8} | {mode:>7} | {legacy['queries']:>9} | {bulk['queries']:>6} | "
+                      f"{legacy['seconds'] * 1000:>10.1f} | {bulk['seconds'] * 1000:>7.1f}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
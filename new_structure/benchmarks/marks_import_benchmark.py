@@ -0,0 +1,89 @@
+"""
+Benchmark: whole-grade bulk marks import through MarksImportService.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.marks_import_benchmark [learners_per_stream]
+
+Builds a long-format CSV and a wide Excel template for a three-stream grade,
+imports both and prints rows, SQL statements, wall time and peak Python memory.
+"""
+import csv
+import io
+import random
+import sys
+import tracemalloc
+
+from openpyxl import Workbook
+from werkzeug.datastructures import FileStorage
+
+from ..extensions import db
+from ..models import Mark, Student, Subject
+from ..services.marks_import_service import MarksImportService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_LEARNERS = 400
+BAD_ROW_EVERY = 500
+
+
+def build_csv(students, subjects, rng):
+    """Long format: one row per learner and subject, with a bad mark every BAD_ROW_EVERY rows."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['admission_number', 'subject', 'assessment_type', 'marks', 'max_marks'])
+    row = 0
+    for admission_number in students:
+        for subject in subjects:
+            row += 1
+            mark = 'absent' if row % BAD_ROW_EVERY == 0 else rng.randint(0, 50)
+            writer.writerow([admission_number, subject, 'End Term', mark, 50])
+    return FileStorage(io.BytesIO(output.getvalue().encode('utf-8')), filename='marks.csv')
+
+
+def build_xlsx(students, subjects, rng):
+    """Wide format matching utils/marks_upload_template.py."""
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Marks Upload Template')
+    worksheet.append(['HILLVIEW SCHOOL - MARKS UPLOAD TEMPLATE'])
+    worksheet.append([])
+    worksheet.append(['Assessment:', 'End Term'])
+    worksheet.append(['Max Marks:', 100])
+    worksheet.append([])
+    worksheet.append(['Student Name', 'Admission Number'] + [f'{s} (Max: 100)' for s in subjects])
+    for admission_number in students:
+        worksheet.append([f'Learner {admission_number}', admission_number] +
+                         [rng.randint(0, 100) for _ in subjects])
+    output = io.BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    return FileStorage(output, filename='marks.xlsx')
+
+
+def run(learners):
+    app = create_benchmark_app()
+    rng = random.Random(11)
+    with app.app_context():
+        db.create_all()
+        data = seed_school([learners] * 3)
+        db.session.query(Mark).delete()
+        db.session.commit()
+
+        students = [s.admission_number for s in Student.query.order_by(Student.id)]
+        subjects = [s.name for s in Subject.query.order_by(Subject.id)]
+        term_id = str(data['term'].id)
+
+        print(f"{'file':>5} | {'marks':>6} | {'saved':>6} | {'errors':>6} | {'queries':>7} | {'seconds':>7} | {'peak MB':>7}")
+        for name, builder in (('csv', build_csv), ('xlsx', build_xlsx)):
+            upload = builder(students, subjects, rng)
+            tracemalloc.start()
+            with measure(db.engine) as stats:
+                result = MarksImportService.import_file(upload, term=term_id, grade_id=data['grade'].id)
+            peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+
+            assert result['saved'] + result['errors'] == result['rows']
+            print(f"{name:>5} | {result['rows']:>6} | {result['saved']:>6} | {result['errors']:>6} | "
+                  f"{stats['queries']:>7} | {stats['seconds']:>7.2f} | {peak:>7.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LEARNERS)
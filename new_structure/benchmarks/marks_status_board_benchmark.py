@@ -0,0 +1,133 @@
+"""
+Benchmark: collaborative marks status pages.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.marks_status_board_benchmark [streams]
+
+Builds the class marks status of every stream of a grade, first with the previous
+per-subject lookups (a SubjectMarksStatus lookup, an update_status with two counts
+and a commit for each subject seen for the first time, and an assignment lookup
+per subject), then from one marks status board for the whole grade. Prints the SQL
+statements, commits and time, and checks both produce the same statuses.
+"""
+import sys
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import Teacher, TeacherSubjectAssignment, Subject, Grade, Stream, Term, AssessmentType
+from ..models.academic import SubjectMarksStatus
+from ..services.collaborative_marks_service import CollaborativeMarksService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_STREAMS = 4
+
+
+def legacy_class_marks_status(grade_id, stream_id, term_id, assessment_type_id):
+    """Reference implementation of the previous CollaborativeMarksService.get_class_marks_status (admin view)."""
+    grade = db.session.get(Grade, grade_id)
+    subjects = Subject.query.filter(Subject.education_level == grade.education_level,
+                                    Subject.is_composite == False).all()  # noqa: E712
+    status_data = {
+        'grade': grade.name,
+        'stream': db.session.get(Stream, stream_id).name,
+        'term': db.session.get(Term, term_id).name,
+        'assessment_type': db.session.get(AssessmentType, assessment_type_id).name,
+        'subjects': [], 'overall_completion': 0, 'total_subjects': len(subjects),
+        'completed_subjects': 0, 'can_generate_report': False
+    }
+    for subject in subjects:
+        status = SubjectMarksStatus.query.filter_by(
+            grade_id=grade_id, stream_id=stream_id, subject_id=subject.id,
+            term_id=term_id, assessment_type_id=assessment_type_id).first()
+        if not status:
+            status = SubjectMarksStatus.update_status(grade_id, stream_id, subject.id, term_id, assessment_type_id)
+        assigned_teacher = TeacherSubjectAssignment.query.filter_by(
+            subject_id=subject.id, grade_id=grade_id, stream_id=stream_id).first()
+        status_data['subjects'].append({
+            'id': subject.id, 'name': subject.name, 'is_uploaded': status.is_uploaded,
+            'completion_percentage': status.completion_percentage, 'total_students': status.total_students,
+            'students_with_marks': status.students_with_marks,
+            'assigned_teacher': assigned_teacher.teacher.username if assigned_teacher else 'Unassigned',
+            'uploaded_by': status.uploaded_by.username if status.uploaded_by else None,
+            'upload_date': status.upload_date.strftime('%Y-%m-%d %H:%M') if status.upload_date else None,
+            'can_upload': True
+        })
+        if status.is_uploaded:
+            status_data['completed_subjects'] += 1
+    if status_data['total_subjects'] > 0:
+        status_data['overall_completion'] = status_data['completed_subjects'] / status_data['total_subjects'] * 100
+        status_data['can_generate_report'] = status_data['completed_subjects'] == status_data['total_subjects']
+    return status_data
+
+
+class CommitCounter:
+    """Counts session commits while active."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_commit(self, session):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(Session, 'after_commit', self._on_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Session, 'after_commit', self._on_commit)
+
+
+def seed(streams):
+    # Stream A complete, the others partly marked
+    data = seed_school([20] * streams)
+    for stream in data['streams'][1:]:
+        db.session.execute(db.text('DELETE FROM mark WHERE stream_id = :stream AND student_id % 3 = 0'),
+                           {'stream': stream.id})
+    teacher = Teacher(username='subject_teacher', password='x', role='teacher')
+    db.session.add(teacher)
+    db.session.flush()
+    subject = Subject.query.order_by(Subject.id).first()
+    for stream in data['streams']:
+        db.session.add(TeacherSubjectAssignment(teacher_id=teacher.id, subject_id=subject.id,
+                                                grade_id=data['grade'].id, stream_id=stream.id))
+    db.session.commit()
+    return (data['grade'].id, data['term'].id, data['assessment_type'].id), [stream.id for stream in data['streams']]
+
+
+def statuses(app, ids, stream_ids, legacy):
+    with app.test_request_context(), CommitCounter() as commits:
+        with measure(db.engine) as stats:
+            if legacy:
+                result = {stream_id: legacy_class_marks_status(ids[0], stream_id, ids[1], ids[2])
+                          for stream_id in stream_ids}
+            else:
+                result = CollaborativeMarksService.get_grade_marks_status(*ids)
+        db.session.remove()
+    stats['commits'] = commits.count
+    return result, stats
+
+
+def run(streams):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        ids, stream_ids = seed(streams)
+
+        first, first_stats = statuses(app, ids, stream_ids, legacy=True)
+        again, again_stats = statuses(app, ids, stream_ids, legacy=True)
+        cold, cold_stats = statuses(app, ids, stream_ids, legacy=False)
+        warm, warm_stats = statuses(app, ids, stream_ids, legacy=False)
+        assert first == again == cold == warm, 'statuses differ from the previous implementation'
+
+        subjects = len(next(iter(cold.values()))['subjects'])
+        print(f"{streams} streams x {subjects} subjects")
+        print(f"{'':>14} | {'queries':>7} | {'commits':>7} | {'ms':>7}")
+        for name, stats in (('legacy first', first_stats), ('legacy again', again_stats),
+                            ('board cold', cold_stats), ('board warm', warm_stats)):
+            print(f"{name:>14} | {stats['queries']:>7} | {stats['commits']:>7} | {stats['seconds'] * 1000:>7.2f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_STREAMS)
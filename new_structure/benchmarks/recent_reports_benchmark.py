@@ -0,0 +1,83 @@
+"""
+Benchmark: class teacher dashboard "recent reports" feed.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.recent_reports_benchmark [streams...]
+
+For grades with the given number of streams, prints the SQL statements and wall
+time of the previous feed (every mark loaded, then per-combination count and
+average queries), of the grouped query, and of a cached feed, and checks that
+the previous feed and the grouped query agree.
+"""
+import os
+import sys
+import tempfile
+
+from ..extensions import db
+from ..models import Grade, Stream, Term, AssessmentType, Student, Mark
+from ..services.recent_reports_service import RecentReportsService
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_STREAMS = [2, 6, 12]
+
+
+def legacy_recent_reports(limit=10):
+    """Reference implementation of the previous dashboard feed."""
+    marks = Mark.query.join(Student).join(Stream).join(Grade).join(Term).join(AssessmentType)\
+        .order_by(Mark.created_at.desc()).all()
+    reports = []
+    seen = set()
+    for mark in marks:
+        combination = (mark.student.stream.grade.name, mark.student.stream.name,
+                       mark.term.name, mark.assessment_type.name)
+        if combination in seen:
+            continue
+        seen.add(combination)
+        class_marks = Mark.query.filter_by(term_id=mark.term_id, assessment_type_id=mark.assessment_type_id)\
+            .join(Student).join(Stream).join(Grade)\
+            .filter(Grade.name == combination[0], Stream.name == combination[1]).all()
+        total = sum(m.percentage for m in class_marks if m.percentage is not None)
+        reports.append((combination, len(class_marks), round(total / len(class_marks), 1)))
+        if len(reports) >= limit:
+            break
+    return reports
+
+
+def run(stream_counts):
+    app = create_benchmark_app()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)  # cache_service keeps its disk tier under ./cache
+        with app.app_context():
+            rows = []
+            for streams in stream_counts:
+                db.session.remove()
+                db.drop_all()
+                db.create_all()
+                seed_school([40] * streams)
+                db.session.expire_all()
+
+                with measure(db.engine) as legacy:
+                    reference = legacy_recent_reports()
+                with measure(db.engine) as grouped:
+                    reports = RecentReportsService.get_recent_reports(use_cache=False)
+                with app.app_context(), app.test_request_context():
+                    RecentReportsService.get_recent_reports()
+                with app.app_context(), app.test_request_context(), measure(db.engine) as cached:
+                    RecentReportsService.get_recent_reports()
+
+                assert sorted(reference) == sorted(
+                    ((r['grade'], r['stream'].split()[-1], r['term'], r['assessment_type']),
+                     r['mark_count'], r['class_average']) for r in reports
+                )
+                rows.append((Mark.query.count(), legacy, grouped, cached))
+
+    print(f"{'marks':>6} | {'legacy queries':>14} {'legacy ms':>9} | {'grouped queries':>15} {'grouped ms':>10} | "
+          f"{'cached queries':>14} {'cached ms':>9}")
+    for marks, legacy, grouped, cached in rows:
+        print(f"{marks:>6} | {legacy['queries']:>14} {legacy['seconds'] * 1000:>9.1f} | "
+              f"{grouped['queries']:>15} {grouped['seconds'] * 1000:>10.1f} | "
+              f"{cached['queries']:>14} {cached['seconds'] * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_STREAMS)
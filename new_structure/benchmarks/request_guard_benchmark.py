@@ -0,0 +1,153 @@
+"""
+Benchmark: request guard overhead on mark entry forms.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.request_guard_benchmark [fields...]
+
+Posts a mark entry form with the given number of mark fields through the previous
+separate before_request hooks (re-importing and recompiling their patterns on
+every request, one walk over the form per hook) and through RequestGuardMiddleware,
+and prints the time per request and the middleware's per-guard counters.
+"""
+import os
+import re
+import sys
+import time
+
+from flask import Flask, request, session, abort
+
+from ..middleware import MarkSanitizerMiddleware, RequestGuardMiddleware
+
+DEFAULT_FIELDS = [50, 200, 800]
+REQUESTS = 200
+URL = '/classteacher/upload_class_marks'
+
+
+def register_legacy_hooks(app):
+    """Reference implementation of the previous hooks (the path check allows the leading '/')."""
+    MarkSanitizerMiddleware(app)
+
+    @app.before_request
+    def prevent_path_traversal():
+        def is_safe_path(path, allow_absolute=False):
+            if not path:
+                return True
+            path_str = str(path)
+            normalized = os.path.normpath(path_str)
+            dangerous_patterns = [
+                r'\.\./', r'\.\.\\\\', r'/etc/', r'/proc/', r'/sys/',
+                r'C:\\\\', r'\\\\\\\\', r'file://', r'ftp://', r'\\x00',
+                r'%00', r'%2e%2e', r'%252e%252e', r'0x2e0x2e'
+            ]
+            for pattern in dangerous_patterns:
+                if re.search(pattern, path_str, re.IGNORECASE):
+                    return False
+            return '..' not in normalized and (allow_absolute or not normalized.startswith('/'))
+
+        if not is_safe_path(request.path, allow_absolute=True):
+            abort(403)
+        for key, value in request.args.items():
+            if not is_safe_path(str(value)):
+                abort(403)
+        if request.form:
+            for key, value in request.form.items():
+                if not is_safe_path(str(value)):
+                    abort(403)
+
+    @app.before_request
+    def validate_all_inputs():
+        def is_safe_input(value):
+            if not value:
+                return True
+            value_str = str(value)
+            if len(value_str) > 10000:
+                return False
+            dangerous_patterns = [
+                r"'.*OR.*'", r"'.*UNION.*SELECT", r"'.*DROP.*TABLE",
+                r"<script", r"javascript:", r"onload\\s*=", r"onerror\\s*=",
+                r";\\s*ls", r";\\s*dir", r"\\|\\s*ls", r"&&\\s*ls"
+            ]
+            for pattern in dangerous_patterns:
+                if re.search(pattern, value_str, re.IGNORECASE):
+                    return False
+            return True
+
+        for key, value in request.args.items():
+            if not is_safe_input(value):
+                abort(400)
+        if request.form:
+            for key, value in request.form.items():
+                if not is_safe_input(value):
+                    abort(400)
+
+    @app.before_request
+    def enhanced_path_protection():
+        dangerous_paths = [
+            r'\.\./', r'\.\.\\\\', r'%2e%2e', r'%252e%252e',
+            r'0x2e0x2e', r'\\x2e\\x2e', r'file://', r'ftp://'
+        ]
+        for pattern in dangerous_paths:
+            if re.search(pattern, request.url, re.IGNORECASE):
+                abort(403)
+        for path in ['/etc/', '/proc/', '/sys/', '/root/', '/home/']:
+            if path in request.path:
+                abort(403)
+
+    @app.before_request
+    def strict_object_access_control():
+        match = re.search(r'/(\w+)/(\d+|\.\.)', request.path)
+        if match and session.get('role', '') == '':
+            abort(403)
+
+
+def create_guard_app(legacy):
+    app = Flask('benchmark')
+    app.config['SECRET_KEY'] = 'benchmark'
+    if legacy:
+        register_legacy_hooks(app)
+    else:
+        RequestGuardMiddleware(app)
+
+    @app.route(URL, methods=['POST'])
+    def upload_class_marks():
+        return 'ok'
+
+    return app
+
+
+def mark_form(fields):
+    students = max(1, fields // 8)
+    form = {f'total_marks_{subject}': '100' for subject in range(1, 9)}
+    for index in range(fields):
+        form[f'mark_{index % students + 1}_{index // students + 1}'] = str(40 + index % 60)
+    form['csrf_token'] = 'x' * 40
+    return form
+
+
+def time_requests(app, form):
+    client = app.test_client()
+    assert client.post(URL, data=form).status_code == 200
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.post(URL, data=form)
+    return (time.perf_counter() - start) / REQUESTS
+
+
+def run(field_counts):
+    print(f"{'fields':>6} | {'legacy ms':>9} | {'guard ms':>8}")
+    guard_app = None
+    for fields in field_counts:
+        form = mark_form(fields)
+        legacy = time_requests(create_guard_app(legacy=True), form)
+        guard_app = create_guard_app(legacy=False)
+        guarded = time_requests(guard_app, form)
+        print(f"{fields:>6} | {legacy * 1000:>9.2f} | {guarded * 1000:>8.2f}")
+
+    print(f"\nguard counters for {field_counts[-1]} fields:")
+    for name, counters in guard_app.extensions['request_guard'].stats()['guards'].items():
+        print(f"  {name:<17} calls {counters['calls']:>4}  blocked {counters['blocked']:>2}  "
+              f"avg {counters['avg_us']:>8.1f} us")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_FIELDS)
@@ -0,0 +1,65 @@
+"""
+Benchmark: the vectorized results kernel against an equivalent pure-Python loop.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.results_kernel_benchmark [learners...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from ..utils.performance import get_performance_category
+from ..utils.results_kernel import compute_results
+
+DEFAULT_SIZES = [60, 500, 2000, 10000]
+SUBJECTS = 12
+
+
+def python_results(rows):
+    """Reference loop in the style of the previous report code."""
+    totals, averages, bands = [], [], []
+    for marks in rows:
+        counted = [min(m, 100.0) for m in marks if m == m and m > 0]
+        total = sum(counted)
+        average = total / len(counted) if counted else 0
+        totals.append(total)
+        averages.append(average)
+        bands.append(get_performance_category(average))
+    order = sorted(range(len(rows)), key=lambda i: totals[i], reverse=True)
+    ranks = [0] * len(rows)
+    for position, i in enumerate(order):
+        previous = order[position - 1] if position else None
+        same = previous is not None and abs(totals[previous] - totals[i]) < 1e-6
+        ranks[i] = ranks[previous] if same else position + 1
+    subject_means = []
+    for column in range(len(rows[0]) if rows else 0):
+        values = [row[column] for row in rows if row[column] == row[column] and row[column] > 0]
+        subject_means.append(sum(values) / len(values) if values else 0)
+    return totals, averages, ranks, bands, subject_means
+
+
+def run(sizes):
+    rng = np.random.default_rng(7)
+    print(f"{'learners':>8} | {'python ms':>9} | {'kernel ms':>9}")
+    for size in sizes:
+        matrix = rng.uniform(0, 100, (size, SUBJECTS)).round(0)
+        matrix[rng.random((size, SUBJECTS)) < 0.05] = np.nan
+        rows = matrix.tolist()
+
+        start = time.perf_counter()
+        totals, averages, ranks, bands, _ = python_results(rows)
+        python_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        results = compute_results(matrix)
+        kernel_ms = (time.perf_counter() - start) * 1000
+
+        assert np.allclose(results['totals'], totals)
+        assert list(results['competition_ranks']) == ranks
+        assert results['bands'] == bands
+        print(f"{size:>8} | {python_ms:>9.2f} | {kernel_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,189 @@
+"""
+Benchmark: request telemetry.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.telemetry_benchmark [requests] [learners per stream]
+
+Serves a few endpoints of a seeded school (a per-learner N+1 listing, a single
+aggregate query and a rendered template) through the test client, without and with
+Telemetry installed, and prints the time per request. Checks the recorded SQL
+statement counts against a query counter, that a failed statement is counted without
+leaking its start time, that workers forked from the process that created a files
+store (gunicorn preload_app) add up, and compares reading p95/p99 from the histograms
+with sorting the last samples as PerformanceMonitor did. Ends with the endpoints by average SQL statements.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from flask import jsonify, render_template_string
+from sqlalchemy import func
+
+from ..extensions import db
+from ..models import Mark, Student
+from ..utils.telemetry import Telemetry, MemoryStore, FileStore, LATENCY_BUCKETS, bucket_counts, bucket_quantile
+from .common import create_benchmark_app, QueryCounter, seed_school
+
+DEFAULT_REQUESTS = 200
+DEFAULT_LEARNERS = 10
+STREAMS = 2
+ROUNDS = 3  # Best of, so import and first-request costs are left out
+PATHS = ('/averages', '/learners', '/page')
+SAMPLES = 1000  # PerformanceMonitor kept the last 1000 request times
+
+PAGE = """<ul>{% for name, average in rows %}<li>{{ name }}: {{ '%.1f' % average }}</li>{% endfor %}</ul>"""
+
+
+def register_routes(app):
+    @app.route('/learners')
+    def learners():
+        # One query per learner, the pattern the queries histogram is meant to reveal
+        return jsonify([{'name': student.name, 'marks': Mark.query.filter_by(student_id=student.id).count()}
+                        for student in Student.query.all()])
+
+    @app.route('/averages')
+    def averages():
+        rows = db.session.query(Mark.student_id, func.avg(Mark.percentage)).group_by(Mark.student_id).all()
+        return jsonify({str(student_id): average for student_id, average in rows})
+
+    @app.route('/page')
+    def page():
+        rows = db.session.query(Student.name, func.avg(Mark.percentage))\
+            .join(Mark, Mark.student_id == Student.id).group_by(Student.id, Student.name).all()
+        return render_template_string(PAGE, rows=rows)
+
+    @app.route('/broken')
+    def broken():
+        try:
+            db.session.execute(db.text('SELECT * FROM no_such_table'))
+        except Exception:
+            db.session.rollback()
+        leftover = len(db.session.connection().info.get('telemetry_starts', []))
+        return jsonify({'leftover': leftover})
+
+
+def build_app(learners, telemetry=None):
+    app = create_benchmark_app()
+    register_routes(app)
+    if telemetry is not None:
+        app.config['TELEMETRY_STORE'] = 'memory'
+        telemetry.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed_school([learners] * STREAMS)
+    return app
+
+
+def serve(app, requests, queries):
+    """Serve the endpoints in turn, adding the SQL statements per path to queries; returns seconds per request."""
+    client = app.test_client()
+    paths = sorted(queries)
+    with app.app_context():
+        start = time.perf_counter()
+        for index in range(requests):
+            path = paths[index % len(paths)]
+            with QueryCounter(db.engine) as counter:
+                assert client.get(path).status_code == 200
+            queries[path] += counter.count
+        return (time.perf_counter() - start) / requests
+
+
+def shared_files_store(requests, workers=2):
+    """Workers forked from the process that created the store (gunicorn preload_app) add up."""
+    with tempfile.TemporaryDirectory() as directory:
+        telemetry = Telemetry(FileStore(directory), flush_seconds=3600)
+        # A request served in the master before forking; workers must not count it again
+        telemetry.record('analytics_api.get_top_performers', 'GET', 200, 0.01, queries=3)
+        telemetry.flush()
+        children = []
+        for worker in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for index in range(worker, requests, workers):
+                        telemetry.record('analytics_api.get_top_performers', 'GET', 200, 0.02 * (index % 7), queries=3)
+                    telemetry.flush()
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
+        stats = Telemetry(FileStore(directory)).endpoint_stats()
+    return stats[('analytics_api.get_top_performers', 'GET')]
+
+
+def failed_statement(app, telemetry):
+    """A statement that raises is counted once and leaves no start time on its connection."""
+    with app.app_context():
+        response = app.test_client().get('/broken')
+    assert response.get_json()['leftover'] == 0, 'failed statement left its start time on the connection'
+    return telemetry.endpoint_stats()[('broken', 'GET')]
+
+
+def stats_cost():
+    """Time of one get_stats-style p95/p99: sorting recent samples vs reading the histogram."""
+    rng = random.Random(7)
+    samples = [rng.expovariate(20) for _ in range(SAMPLES)]
+    histogram = Telemetry(MemoryStore(), flush_seconds=3600)
+    for seconds in samples:
+        histogram.record('page', 'GET', 200, seconds)
+    counts = bucket_counts(histogram.totals())
+
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        ordered = sorted(samples)
+        sorted_p95, sorted_p99 = ordered[int(0.95 * SAMPLES)], ordered[int(0.99 * SAMPLES)]
+    sorted_seconds = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        bucket_p95 = bucket_quantile(0.95, LATENCY_BUCKETS, counts)
+        bucket_p99 = bucket_quantile(0.99, LATENCY_BUCKETS, counts)
+    bucket_seconds = (time.perf_counter() - start) / rounds
+    return (sorted_seconds, sorted_p95, sorted_p99), (bucket_seconds, bucket_p95, bucket_p99)
+
+
+def run(requests, learners):
+    telemetry = Telemetry(flush_seconds=3600)
+    plain, measured = build_app(learners), build_app(learners, telemetry)
+    plain_queries, queries = dict.fromkeys(PATHS, 0), dict.fromkeys(PATHS, 0)
+    timings = [(serve(plain, requests, plain_queries), serve(measured, requests, queries)) for _ in range(ROUNDS)]
+    plain_seconds, measured_seconds = min(t[0] for t in timings), min(t[1] for t in timings)
+    assert plain_queries == queries, 'telemetry changed the SQL statements executed'
+
+    endpoints = telemetry.endpoint_stats()
+    for path, endpoint in (('/learners', 'learners'), ('/averages', 'averages'), ('/page', 'page')):
+        stats = endpoints[(endpoint, 'GET')]
+        assert round(stats['avg_queries'] * stats['requests']) == queries[path], \
+            f"{endpoint}: recorded {stats['avg_queries'] * stats['requests']} statements, executed {queries[path]}"
+    assert endpoints[('page', 'GET')]['template_seconds'] > 0, 'template render time not recorded'
+    assert endpoints[('learners', 'GET')]['avg_response_bytes'] > 0, 'response size not recorded'
+    assert 'hillview_http_request_sql_queries_bucket{endpoint="learners",method="GET",le="+Inf"}' \
+        in telemetry.render_prometheus()
+
+    broken = failed_statement(measured, telemetry)
+    assert broken['requests'] == 1 and broken['avg_queries'] >= 1, 'failed statement not recorded'
+
+    shared = shared_files_store(requests)
+    assert shared['requests'] == requests + 1 and shared['avg_queries'] == 3, 'forked workers overwrote each other'
+
+    (sorted_seconds, sorted_p95, sorted_p99), (bucket_seconds, bucket_p95, bucket_p99) = stats_cost()
+
+    print(f"{requests} requests x {ROUNDS} rounds, {STREAMS} streams x {learners} learners")
+    print(f"{'':>24} | {'ms/request':>10}")
+    print(f"{'without telemetry':>24} | {plain_seconds * 1000:>10.3f}")
+    print(f"{'with telemetry':>24} | {measured_seconds * 1000:>10.3f}")
+    print(f"master + two forked workers, files store: {shared['requests']} requests, p95 {shared['p95_seconds']:.3f}s")
+    print(f"p95/p99 of {SAMPLES} samples: sorted {sorted_seconds * 1e6:.1f} us ({sorted_p95:.3f}/{sorted_p99:.3f}s), "
+          f"histogram {bucket_seconds * 1e6:.1f} us ({bucket_p95:.3f}/{bucket_p99:.3f}s)")
+    print(f"{'endpoint':>12} | {'requests':>8} | {'avg queries':>11} | {'p95 ms':>7} | {'template ms':>11}")
+    for (endpoint, method), stats in sorted(endpoints.items(), key=lambda item: -item[1]['avg_queries']):
+        print(f"{endpoint:>12} | {stats['requests']:>8} | {stats['avg_queries']:>11.1f} | "
+              f"{stats['p95_seconds'] * 1000:>7.1f} | {stats['template_seconds'] * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LEARNERS)
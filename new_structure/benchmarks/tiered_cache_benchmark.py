@@ -0,0 +1,71 @@
+"""
+Benchmark: TieredCache under concurrent load.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.tiered_cache_benchmark [threads] [keys]
+
+Threads repeatedly request a small set of hot analytics keys whose computation is
+slow, then a stream of distinct keys fills the memory tier past its budget.
+Prints how many times each value was computed, the time taken, and the hit,
+miss and eviction counters, and checks that the memory tier stays within budget.
+"""
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..utils.tiered_cache import PickleSerializer, TieredCache
+
+DEFAULT_THREADS = 32
+DEFAULT_KEYS = 4
+COMPUTE_SECONDS = 0.2
+REQUESTS_PER_THREAD = 20
+
+
+def run(threads, keys):
+    with tempfile.TemporaryDirectory() as disk_dir:
+        cache = TieredCache('benchmark', serializer=PickleSerializer, max_bytes=256 * 1024,
+                            default_ttl=60, disk_dir=disk_dir)
+        computations = {}
+        lock = threading.Lock()
+
+        def compute(key):
+            with lock:
+                computations[key] = computations.get(key, 0) + 1
+            time.sleep(COMPUTE_SECONDS)
+            return {'key': key, 'rows': list(range(1000))}
+
+        def worker(index):
+            for i in range(REQUESTS_PER_THREAD):
+                key = f"hot_{(index + i) % keys}"
+                value = cache.get_or_compute(key, lambda: compute(key))
+                assert value['key'] == key
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        seconds = time.perf_counter() - start
+
+        print(f"{threads} threads x {REQUESTS_PER_THREAD} requests over {keys} hot keys "
+              f"({COMPUTE_SECONDS:.1f}s per computation)")
+        print(f"  computations: {sum(computations.values())} (one per key), wall time {seconds:.2f}s")
+        assert all(count == 1 for count in computations.values())
+
+        # Fill well past the memory budget with distinct keys
+        for i in range(500):
+            cache.set(f"cold_{i}", {'rows': list(range(1000))})
+        stats = cache.stats()
+        assert stats['memory_bytes'] <= cache.max_bytes
+        assert cache.get('cold_0') is not None  # Evicted from memory, served from disk
+
+        stats = cache.stats()
+        print(f"  memory tier: {stats['memory_entries']} entries, {stats['memory_bytes'] // 1024} KB "
+              f"of {cache.max_bytes // 1024} KB")
+        print("  counters: " + ", ".join(f"{name}={stats[name]}" for name in (
+            'memory_hits', 'disk_hits', 'misses', 'coalesced', 'sets', 'evictions')))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THREADS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_KEYS)
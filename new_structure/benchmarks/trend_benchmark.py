@@ -0,0 +1,176 @@
+"""
+Benchmark: stored learner trends.
+
+Run from the repository root:
+    python -m new_structure.benchmarks.trend_benchmark [terms] [learners per stream]
+
+Seeds a grade with marks for several terms across academic years, rebuilds the
+grade's trends with TrendService and checks every stored delta, rolling average and
+percentile against a plain Python reference. Then compares reading one learner's
+trends on demand (their marks and the grade's marks for percentiles, aggregated in
+Python) with reading the stored rows. After a mark changes, checks that a read serves
+the stored rows marked stale and queues one rebuild job, and runs that job.
+"""
+import sys
+import tempfile
+from collections import defaultdict
+
+from ..extensions import db
+from ..models import Mark, Student, Term, StudentSubjectTrend, ReportJob
+from ..services.reference_data_service import ReferenceDataService
+from ..services.trend_service import TrendService, TREND_WINDOW, REBUILD_JOB
+from .common import create_benchmark_app, measure, seed_school
+
+DEFAULT_TERMS = 6
+DEFAULT_LEARNERS = 60
+STREAMS = 4
+
+
+def on_demand_trends(student_id, grade_id):
+    """Reference implementation: one learner's trends computed per request from marks."""
+    periods = TrendService._timeline(
+        (term_id, assessment_type_id) for term_id, assessment_type_id in db.session.query(
+            Mark.term_id, Mark.assessment_type_id).join(Student, Mark.student_id == Student.id)
+        .filter(Student.grade_id == grade_id).distinct()
+    )
+    order = {period: index for index, period in enumerate(periods)}
+    results = defaultdict(dict)  # (subject_id, period) -> {student_id: percentage}
+    for mark_student, subject_id, term_id, assessment_type_id, percentage in db.session.query(
+            Mark.student_id, Mark.subject_id, Mark.term_id, Mark.assessment_type_id, Mark.percentage)\
+            .join(Student, Mark.student_id == Student.id)\
+            .filter(Student.grade_id == grade_id, Mark.percentage > 0):
+        results[(subject_id, (term_id, assessment_type_id))][mark_student] = min(percentage, 100.0)
+
+    # All-subject averages per learner and period
+    totals = defaultdict(list)
+    for (subject_id, period), by_student in results.items():
+        for learner, percentage in by_student.items():
+            totals[(period, learner)].append(percentage)
+    for (period, learner), values in totals.items():
+        results[(None, period)][learner] = sum(values) / len(values)
+
+    def percentile(by_student, value):
+        below = sum(1 for other in by_student.values() if round(other, 4) < round(value, 4))
+        equal = sum(1 for other in by_student.values() if round(other, 4) == round(value, 4))
+        return 100.0 * (below + 0.5 * equal) / len(by_student)
+
+    trends = {}
+    history = defaultdict(list)  # subject_id -> [(period_index, percentage, percentile)]
+    for (subject_id, period), by_student in sorted(results.items(), key=lambda item: order[item[0][1]]):
+        if student_id not in by_student:
+            continue
+        value = by_student[student_id]
+        index = order[period]
+        rank = percentile(by_student, value)
+        previous = history[subject_id][-1] if history[subject_id] else None
+        window = [v for i, v, _ in history[subject_id] if i > index - TREND_WINDOW] + [value]
+        trends[(subject_id, period)] = (
+            round(value, 4),
+            round(value - previous[1], 4) if previous else None,
+            round(sum(window) / len(window), 4),
+            round(rank, 4),
+            round(rank - previous[2], 4) if previous else None,
+        )
+        history[subject_id].append((index, value, rank))
+    return trends
+
+
+def stored_trends(student_id, grade_id):
+    data = TrendService.get_student_trends(student_id, grade_id=grade_id)
+    trends = {}
+    for subject_id, points in [(None, data['overall'])] + [(s['subject_id'], s['points']) for s in data['subjects']]:
+        for point in points:
+            trends[(subject_id, (point['term_id'], point['assessment_type_id']))] = (
+                point['percentage'], point['delta'], point['rolling_average'], point['percentile'],
+                point['percentile_change'])
+    return trends
+
+
+def close(left, right):
+    return left.keys() == right.keys() and all(
+        all((a is None and b is None) or (a is not None and b is not None and abs(a - b) < 1e-3)
+            for a, b in zip(left[key], right[key])) for key in left)
+
+
+def seed(terms, learners):
+    data = seed_school([learners] * STREAMS)
+    first_term_id = data['term'].id
+    for index in range(1, terms):
+        term = Term(name=f'Term {index + 1}', academic_year=str(2024 + index // 3))
+        db.session.add(term)
+        db.session.flush()
+        db.session.execute(db.text(
+            'INSERT INTO mark (student_id, subject_id, term_id, assessment_type_id, grade_id, stream_id, mark, '
+            'total_marks, raw_mark, raw_total_marks, percentage, created_at) '
+            'SELECT student_id, subject_id, :term, assessment_type_id, grade_id, stream_id, mark, total_marks, '
+            'raw_mark, raw_total_marks, (percentage + :shift * student_id) % 100, created_at '
+            'FROM mark WHERE term_id = :first'
+        ), {'term': term.id, 'first': first_term_id, 'shift': index})
+    db.session.query(Term).filter_by(id=first_term_id).update({'academic_year': '2024'})
+    db.session.commit()
+    return data
+
+
+def run(terms, learners):
+    app = create_benchmark_app()
+    app.config['REPORT_JOBS_MAX_PER_SCHOOL'] = 0  # Keep queued rebuilds pending; the benchmark runs them
+    with app.app_context():
+        db.create_all()
+        data = seed(terms, learners)
+        grade_id = data['grade'].id
+        student_ids = [student_id for (student_id,) in db.session.query(Student.id).order_by(Student.id)]
+        marks = Mark.query.count()
+
+        rows = []
+        with app.test_request_context():
+            ReferenceDataService.current()  # Loaded once per process, not part of the measurement
+            with measure(db.engine) as stats:
+                TrendService.rebuild_grade(grade_id)
+                db.session.commit()
+            rows.append(('rebuild grade', stats))
+            stored_rows = StudentSubjectTrend.query.count()
+
+            for student_id in student_ids[::max(1, len(student_ids) // 8)]:
+                assert close(stored_trends(student_id, grade_id), on_demand_trends(student_id, grade_id)), \
+                    f"stored trends of learner {student_id} differ from the reference"
+
+            learner = student_ids[len(student_ids) // 2]
+            with measure(db.engine) as stats:
+                on_demand_trends(learner, grade_id)
+            rows.append(('learner, on demand', stats))
+            with measure(db.engine) as stats:
+                stored_trends(learner, grade_id)
+            rows.append(('learner, stored', stats))
+            with measure(db.engine) as stats:
+                TrendService.get_grade_trends(grade_id)
+            rows.append(('grade summary', stats))
+
+            mark = Mark.query.filter_by(student_id=learner).first()
+            mark.percentage = 100 - mark.percentage
+            db.session.commit()
+            before = stored_trends(learner, grade_id)
+            with measure(db.engine) as stats:
+                stale = TrendService.get_student_trends(learner, grade_id=grade_id)
+            rows.append(('learner, stale read', stats))
+            assert stale['stale'], 'changed mark not detected'
+            assert stored_trends(learner, grade_id) == before, 'a read rebuilt the trends'
+            jobs = ReportJob.query.filter_by(job_type=REBUILD_JOB, status=ReportJob.PENDING).all()
+            assert len(jobs) == 1, f"expected one queued rebuild, found {len(jobs)}"
+
+            with tempfile.TemporaryDirectory() as output_dir, measure(db.engine) as stats:
+                TrendService.run_rebuild_job(jobs[0].get_params(), output_dir, lambda *args, **kwargs: None)
+            rows.append(('rebuild job', stats))
+            changed = TrendService.get_student_trends(learner, grade_id=grade_id)
+            assert not changed['stale'], 'trends still stale after the rebuild job'
+            assert close(stored_trends(learner, grade_id), on_demand_trends(learner, grade_id)), \
+                'trends not rebuilt after a mark changed'
+
+        print(f"{terms} terms x {STREAMS} streams x {learners} learners: {marks} marks, {stored_rows} trend rows")
+        print(f"{'':>22} | {'queries':>7} | {'ms':>8}")
+        for name, stats in rows:
+            print(f"{name:>22} | {stats['queries']:>7} | {stats['seconds'] * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TERMS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LEARNERS)
@@ -0,0 +1,76 @@
+"""
+Flask CLI commands for the Hillview School Management System.
+
+Run with the app factory, e.g. from the repository root:
+    flask --app "new_structure:create_app('production')" rebuild-term-summaries
+    flask --app "new_structure:create_app('production')" rebuild-mark-cube
+    flask --app "new_structure:create_app('production')" rebuild-trends
+    flask --app "new_structure:create_app('production')" init-db
+"""
+import click
+
+
+def register_commands(app):
+    """Register maintenance commands on the application."""
+
+    @app.cli.command('rebuild-term-summaries')
+    @click.option('--term-id', type=int, default=None, help='Only rebuild this term.')
+    @click.option('--assessment-type-id', type=int, default=None, help='Only rebuild this assessment type.')
+    def rebuild_term_summaries(term_id, assessment_type_id):
+        """Create (if missing) and rebuild the student_term_summary table from marks."""
+        from .extensions import db
+        from .services.term_summary_service import TermSummaryService
+
+        db.create_all()
+        result = TermSummaryService.rebuild_all(term_id=term_id, assessment_type_id=assessment_type_id)
+        click.echo(f"Rebuilt {result['rows']} summaries across {result['combinations']} "
+                   f"stream/term/assessment combinations.")
+
+    @app.cli.command('rebuild-mark-cube')
+    def rebuild_mark_cube():
+        """Create (if missing) and rebuild the mark_cube analytics table from marks."""
+        from .extensions import db
+        from .services.mark_cube_service import MarkCubeService
+
+        db.create_all()
+        rows = MarkCubeService.rebuild_all()
+        db.session.commit()
+        click.echo(f"Rebuilt {rows} mark cube rows.")
+
+    @app.cli.command('rebuild-trends')
+    @click.option('--grade-id', type=int, default=None, help='Only rebuild this grade.')
+    def rebuild_trends(grade_id):
+        """Create (if missing) and rebuild the stored learner trends from marks."""
+        from .extensions import db
+        from .services.trend_service import TrendService
+
+        db.create_all()
+        if grade_id:
+            rows = TrendService.rebuild_grade(grade_id)
+            db.session.commit()
+            click.echo(f"Rebuilt {rows} trend rows for grade {grade_id}.")
+        else:
+            result = TrendService.rebuild_all()
+            click.echo(f"Rebuilt {result['rows']} trend rows across {result['grades']} grades.")
+
+    @app.cli.command('init-db')
+    @click.option('--force', is_flag=True, help='Initialize even if the integrity check passes.')
+    def init_db(force):
+        """Create missing tables and seed default data if the database is not healthy."""
+        from .utils.database_init import create_all_tables, ensure_database_initialized
+
+        # Tables added since the database was set up (e.g. report_job, mark_cube) are created even when it is healthy
+        if not create_all_tables():
+            raise click.ClickException('Could not create missing tables')
+        result = ensure_database_initialized(force=force)
+        if not result['success']:
+            raise click.ClickException(f"Database initialization failed: {result.get('error') or 'Unknown error'}")
+        status = result['status']
+        click.echo(f"Database {'initialized' if result['initialized'] else 'already healthy'}: "
+                   f"{status.get('teacher_count', 0)} teachers, {status.get('subject_count', 0)} subjects, "
+                   f"{status.get('grade_count', 0)} grades, {status.get('stream_count', 0)} streams.")
+
+    @app.cli.command('startup-profile')
+    def startup_profile():
+        """Print the timed startup phases of create_app for this configuration."""
+        click.echo(app.extensions['startup_profile'].format())
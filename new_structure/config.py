@@ -18,6 +18,18 @@ class Config:
     # HTTPS ENFORCEMENT - FIXES 1 VULNERABILITY
     FORCE_HTTPS = True  # Enable in production
     
+    # Startup: check the schema and seed default data in create_app (otherwise run
+    # `flask init-db`), register /debug and test routes, and view modules to leave out
+    DATABASE_CHECK_ON_STARTUP = True
+    DEBUG_ROUTES_ENABLED = False
+    BLUEPRINTS_DISABLED = ()
+
+    # Readiness (/ready): create this file to report not ready and drain traffic
+    READINESS_DRAIN_FILE = os.environ.get('READINESS_DRAIN_FILE')
+
+    # Path prefixes that only get the URL-level request guards (see middleware/request_guard.py)
+    REQUEST_GUARD_SKIP_PREFIXES = ('/static/',)
+
     # STRICT SECURITY SETTINGS
     STRICT_ROLE_ENFORCEMENT = True
     SESSION_PROTECTION = 'strong'
@@ -73,6 +85,8 @@ class Config:
     CACHE_TYPE = 'redis'
     CACHE_DEFAULT_TIMEOUT = 3600  # 1 hour
     CACHE_KEY_PREFIX = 'hillview:'
+    CACHE_MEMORY_MAX_BYTES = int(os.environ.get('CACHE_MEMORY_MAX_MB') or 32) * 1024 * 1024  # Per-process LRU budget per cache namespace
+    CACHE_DISK_MAX_BYTES = int(os.environ.get('CACHE_DISK_MAX_MB') or 256) * 1024 * 1024  # Disk tier budget per cache namespace
 
     # Rate Limiting Configuration
     RATELIMIT_ENABLED = True
@@ -89,6 +103,31 @@ class Config:
     CELERY_TIMEZONE = 'UTC'
     CELERY_ENABLE_UTC = True
 
+    # Background Report Jobs Configuration
+    REPORT_JOBS_DIR = os.environ.get('REPORT_JOBS_DIR')  # Defaults to <instance>/report_jobs
+    REPORT_JOBS_WORKERS = int(os.environ.get('REPORT_JOBS_WORKERS') or 2)
+    REPORT_JOBS_MAX_PER_SCHOOL = int(os.environ.get('REPORT_JOBS_MAX_PER_SCHOOL') or 2)
+    REPORT_JOBS_HEARTBEAT_SECONDS = 60  # How often serving processes refresh heartbeats and recover stale jobs
+    REPORT_JOBS_STALE_SECONDS = 600  # Running jobs without a heartbeat for this long are resumed
+    REPORT_JOBS_MAX_ATTEMPTS = 3
+    REPORT_JOBS_RETENTION_HOURS = 24
+    REPORT_RENDER_WORKERS = int(os.environ.get('REPORT_RENDER_WORKERS') or 0)  # PDF render processes per web process, shared by its jobs; 0 = one per CPU
+    SCHOOL_KEY = os.environ.get('SCHOOL_KEY') or MYSQL_DATABASE  # Scopes per-school job limits
+
+    # Generated report artifacts, keyed by a fingerprint of the data they were built from
+    ARTIFACT_CACHE_DIR = os.environ.get('ARTIFACT_CACHE_DIR')  # Defaults to <instance>/artifact_cache
+    ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get('ARTIFACT_CACHE_MAX_MB') or 512) * 1024 * 1024
+
+    # Leaderboards rank with ROW_NUMBER() when the database supports it; 'false' forces the streamed fallback
+    LEADERBOARD_WINDOW_FUNCTIONS = False if (os.environ.get('LEADERBOARD_WINDOW_FUNCTIONS') or '').lower() == 'false' else None
+
+    # Request telemetry (latency/SQL histograms per endpoint) served at /metrics
+    TELEMETRY_ENABLED = (os.environ.get('TELEMETRY_ENABLED') or 'true').lower() == 'true'
+    TELEMETRY_STORE = os.environ.get('TELEMETRY_STORE')  # 'redis', 'files' or 'memory'; default redis when CACHE_TYPE is redis, else files
+    TELEMETRY_DIR = os.environ.get('TELEMETRY_DIR')  # Per-worker totals for the files store; defaults to <instance>/telemetry
+    TELEMETRY_FLUSH_SECONDS = int(os.environ.get('TELEMETRY_FLUSH_SECONDS') or 10)  # How often workers share their counts
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token for scrapers; headteachers can always read /metrics
+
     # File Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = 'uploads'
@@ -129,6 +168,7 @@ class DevelopmentConfig(Config):
     RATELIMIT_STORAGE_URL = 'memory://'  # Use memory storage for development
     LOG_LEVEL = 'DEBUG'
     WTF_CSRF_ENABLED = True  # Enable CSRF protection for security testing
+    DEBUG_ROUTES_ENABLED = True
 
     # Use MySQL for development (inherits from base Config class)
     # SQLALCHEMY_DATABASE_URI is inherited from Config class - MySQL configuration
@@ -154,6 +194,7 @@ class TestingConfig(Config):
     FORCE_HTTPS = False
     STRICT_ROLE_ENFORCEMENT = False  # Relaxed for testing
     SECRET_KEY = 'test-secret-key-for-testing'
+    TELEMETRY_STORE = 'memory'
 
     # Use in-memory SQLite for testing
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
@@ -167,6 +208,7 @@ class ProductionConfig(Config):
     """Configuration for production environment."""
     DEBUG = False
     SESSION_COOKIE_SECURE = True
+    DATABASE_CHECK_ON_STARTUP = False  # Run `flask init-db` when deploying
 
     # Production-specific overrides
     RATELIMIT_DEFAULT = "200 per hour"
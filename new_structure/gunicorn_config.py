@@ -0,0 +1,93 @@
+"""
+Gunicorn configuration for the Hillview School Management System.
+
+Run from the repository root:
+    flask --app "new_structure:create_app('production')" init-db
+    gunicorn -c new_structure/gunicorn_config.py new_structure.wsgi:app
+
+The app is created once in the master process (preload_app), its reference data
+and branding caches are warmed there, and workers are forked from it, so they
+start warm and share those pages copy-on-write. Each worker serves requests on a
+small thread pool (gthread). Workers are recycled after MAX_REQUESTS requests, with
+jitter so they do not all restart at once, and get GRACEFUL_TIMEOUT seconds to
+finish in-flight requests on shutdown or reload.
+
+To drain an instance, create READINESS_DRAIN_FILE (/ready then answers 503), wait
+for the load balancer to stop sending traffic, then send SIGTERM.
+
+Environment overrides: HILLVIEW_BIND, WEB_CONCURRENCY, GUNICORN_THREADS,
+GUNICORN_TIMEOUT, GRACEFUL_TIMEOUT, MAX_REQUESTS, MAX_REQUESTS_JITTER,
+REPORT_RENDER_WORKERS (default: CPUs divided between the workers).
+"""
+import os
+
+
+def _cpu_count():
+    """CPUs available to this process (respects container CPU affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        return os.cpu_count() or 1
+
+
+CPUS = _cpu_count()
+
+bind = os.environ.get('HILLVIEW_BIND', '0.0.0.0:8080')
+
+# Mark entry and reports wait on the database, so use more processes than CPUs and
+# a few threads per process; keep (workers x threads) under the database pool size
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(2 * CPUS + 1, 12))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT') or 30)
+keepalive = 5
+
+max_requests = int(os.environ.get('MAX_REQUESTS') or 2000)
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER') or max_requests // 10)
+
+# Report jobs run in the workers (see post_fork), each on its own render pool; split the CPUs between them
+raw_env = []
+if not os.environ.get('REPORT_RENDER_WORKERS'):
+    raw_env.append(f'REPORT_RENDER_WORKERS={max(1, CPUS // workers)}')
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """Warm the process-wide caches in the master, before the first fork."""
+    from new_structure.services.readiness_service import ReadinessService
+
+    app = server.app.wsgi()
+    result = ReadinessService.warm_up(app)
+    startup = app.extensions['startup_profile'].summary()
+    server.log.info(
+        f"Hillview ready: {workers} workers x {threads} threads on {CPUS} CPUs, "
+        f"create_app {startup['total_ms']} ms, warm-up {result['timings_ms']}"
+    )
+
+
+def post_fork(server, worker):
+    """Drop inherited database connections and resume report jobs in the new worker."""
+    from new_structure.services.readiness_service import ReadinessService
+    from new_structure.services.report_job_service import ReportJobService
+
+    ReadinessService.after_fork()
+    ReportJobService.resume(server.app.wsgi())
+
+
+def child_exit(server, worker):
+    """Fold the exited worker's telemetry file into the retired totals (files store)."""
+    telemetry = server.app.wsgi().extensions.get('telemetry')
+    if telemetry is not None and hasattr(telemetry.store, 'fold_exited_workers'):
+        telemetry.store.fold_exited_workers()
+
+
+def worker_abort(worker):
+    """Log workers killed for exceeding the request timeout."""
+    worker.log.warning(f"Worker {worker.pid} aborted after exceeding the {timeout}s timeout")
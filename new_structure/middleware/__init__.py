@@ -2,5 +2,6 @@
 Middleware package for the application.
 """
 from .mark_sanitizer import MarkSanitizerMiddleware
+from .request_guard import RequestGuardMiddleware
 
-__all__ = ['MarkSanitizerMiddleware']
+__all__ = ['MarkSanitizerMiddleware', 'RequestGuardMiddleware']
@@ -18,56 +18,68 @@ except ImportError:
 
 logger = logging.getLogger('mark_validation')
 
+MARK_RELATED_URLS = (
+    '/upload_class_marks',
+    '/update_class_marks',
+    '/edit_class_marks',
+    '/bulk_upload_marks'
+)
+
+# mark_<student>_<subject>, total_marks_<subject>, raw_mark_<student>_<subject>, max_raw_mark_<subject>
+MARK_FIELD_PATTERN = re.compile(r'^(?:mark_\d+_\d+|total_marks_\d+|raw_mark_\d+_\d+|max_raw_mark_\d+)$')
+
 class MarkSanitizerMiddleware:
     """Middleware to sanitize mark data in incoming requests."""
     
-    def __init__(self, app):
-        """Initialize the middleware with the Flask app."""
+    def __init__(self, app=None):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: Flask app to register a before_request hook on. Leave out when the
+                sanitizer runs inside RequestGuardMiddleware, which calls
+                sanitize_mark_data itself.
+        """
         self.app = app
-        self.app.before_request(self.sanitize_mark_data)
+        if app is not None:
+            self.app.before_request(self.sanitize_mark_data)
         logger.info("Mark sanitizer middleware initialized")
     
-    def sanitize_mark_data(self):
-        """Sanitize mark data in the request before it's processed by the view function."""
+    def sanitize_mark_data(self, has_mark_fields=None):
+        """
+        Sanitize mark data in the request before it's processed by the view function.
+
+        Args:
+            has_mark_fields: Whether the form has mark fields (see is_mark_field), if
+                the caller already scanned the form keys
+        """
         if request.method == 'POST' and request.form:
             # Check if this is a mark-related request
-            if self._is_mark_related_request():
+            if self._is_mark_related_request(has_mark_fields):
                 logger.info(f"Sanitizing mark data for request: {request.path}")
                 self._sanitize_form_data()
     
-    def _is_mark_related_request(self):
+    @staticmethod
+    def is_mark_field(key):
+        """Check if a form field name is a mark field, e.g. mark_<student>_<subject>."""
+        return MARK_FIELD_PATTERN.match(key) is not None
+    
+    def _is_mark_related_request(self, has_mark_fields=None):
         """Check if the request is related to marks based on the URL and form data."""
         # Check URL patterns
-        mark_related_urls = [
-            '/upload_class_marks',
-            '/update_class_marks',
-            '/edit_class_marks',
-            '/bulk_upload_marks'
-        ]
-        
-        for url in mark_related_urls:
-            if url in request.path:
-                return True
+        if any(url in request.path for url in MARK_RELATED_URLS):
+            return True
         
         # Check for mark-related form fields
-        mark_field_patterns = [
-            r'^mark_\d+_\d+$',  # mark_student_subject
-            r'^total_marks_\d+$',  # total_marks_subject
-            r'^raw_mark_\d+_\d+$',  # raw_mark_student_subject
-            r'^max_raw_mark_\d+$'  # max_raw_mark_subject
-        ]
-        
-        for pattern in mark_field_patterns:
-            for key in request.form.keys():
-                if re.match(pattern, key):
-                    return True
-        
-        return False
+        if has_mark_fields is None:
+            has_mark_fields = any(self.is_mark_field(key) for key in request.form.keys())
+        return has_mark_fields
     
     def _sanitize_form_data(self):
         """Sanitize mark-related form data."""
         # Find and sanitize mark/total_marks pairs
-        mark_keys = [k for k in request.form.keys() if k.startswith('mark_') and '_' in k]
+        form = request.form
+        mark_keys = [k for k in form.keys() if k.startswith('mark_') and '_' in k]
         
         for mark_key in mark_keys:
             # Extract student_id and subject_id from the key
@@ -79,11 +91,11 @@ class MarkSanitizerMiddleware:
                 # Find corresponding total_marks key
                 total_marks_key = f'total_marks_{subject_id}'
                 
-                if total_marks_key in request.form:
+                if total_marks_key in form:
                     try:
                         # Get values
-                        raw_mark = request.form[mark_key]
-                        max_raw_mark = request.form[total_marks_key]
+                        raw_mark = form[mark_key]
+                        max_raw_mark = form[total_marks_key]
                         
                         # Skip empty values
                         if not raw_mark or not max_raw_mark:
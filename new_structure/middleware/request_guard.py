@@ -0,0 +1,292 @@
+"""
+Request guard middleware: one before_request pipeline for the request-level security checks.
+
+The guards used to be separate before_request hooks in the app factory, each
+recompiling its regex list on every request and walking every query parameter and
+form field again. Here all patterns are compiled once at import time into one
+combined regex per guard, and query parameters and form fields are scanned in a
+single pass that feeds both the path traversal and the input validation guards.
+Requests whose path starts with one of REQUEST_GUARD_SKIP_PREFIXES (static files by
+default) only get the URL-level checks.
+
+The guards run, and decide, in the order the separate hooks were registered:
+    mark_sanitizer    - sanitize raw marks on mark entry forms (MarkSanitizerMiddleware)
+    path_traversal    - traversal sequences in the path, query parameters and form fields (403)
+    input_validation  - injection patterns and oversized values in parameters and fields (400)
+    https_redirect    - redirect to HTTPS when FORCE_HTTPS is set (301)
+    path_protection   - traversal sequences in the full URL and sensitive system paths (403)
+    object_access     - role-based access to /<object>/<id> URLs (403)
+
+Each guard keeps call, block and timing counters, available from stats().
+"""
+import os
+import re
+import threading
+import time
+from flask import request, session, abort, redirect, current_app
+from werkzeug.exceptions import HTTPException
+from .mark_sanitizer import MarkSanitizerMiddleware
+
+DEFAULT_SKIP_PREFIXES = ('/static/',)
+
+GUARDS = (
+    'mark_sanitizer', 'path_traversal', 'input_validation',
+    'https_redirect', 'path_protection', 'object_access'
+)
+
+# Path traversal patterns checked in the path and in every parameter value
+TRAVERSAL_PATTERNS = [
+    r'\.\./', r'\.\.\\\\', r'/etc/', r'/proc/', r'/sys/',
+    r'C:\\\\', r'\\\\\\\\', r'file://', r'ftp://', r'\\x00',
+    r'%00', r'%2e%2e', r'%252e%252e', r'0x2e0x2e'
+]
+
+# Injection patterns checked in every parameter value
+INJECTION_PATTERNS = [
+    r"'.*OR.*'", r"'.*UNION.*SELECT", r"'.*DROP.*TABLE",
+    r"<script", r"javascript:", r"onload\\s*=", r"onerror\\s*=",
+    r";\\s*ls", r";\\s*dir", r"\\|\\s*ls", r"&&\\s*ls"
+]
+MAX_INPUT_LENGTH = 10000
+INPUT_VALIDATION_SKIP_PREFIXES = ('/health', '/static', '/logout')
+
+# Traversal patterns checked in the full URL, and system paths blocked in the path
+URL_TRAVERSAL_PATTERNS = [
+    r'\.\./', r'\.\.\\\\', r'%2e%2e', r'%252e%252e',
+    r'0x2e0x2e', r'\\x2e\\x2e', r'file://', r'ftp://'
+]
+SENSITIVE_PATHS = ['/etc/', '/proc/', '/sys/', '/root/', '/home/']
+
+OBJECT_PERMISSIONS = {
+    'headteacher': frozenset(['student', 'teacher', 'report', 'mark', 'grade', 'stream', 'streams', 'api', 'get_grade_streams', 'teacher_streams', 'get_streams', 'view_parent', 'parent', 'streams_by_id', 'subject_report', 'edit_class_marks', 'preview_class_report', 'view_student_reports']),
+    'classteacher': frozenset(['student', 'report', 'mark', 'get_grade_streams', 'teacher_streams', 'streams', 'get_streams', 'streams_by_id', 'subject_report', 'edit_class_marks', 'preview_class_report', 'view_student_reports']),
+    'teacher': frozenset(['mark', 'get_streams', 'streams', 'streams_by_id', 'subject_report', 'preview_class_report', 'view_student_reports'])
+}
+
+
+def _combine(patterns):
+    """Compile a list of patterns into one case-insensitive alternation."""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+
+TRAVERSAL_PATTERN = _combine(TRAVERSAL_PATTERNS)
+INJECTION_PATTERN = _combine(INJECTION_PATTERNS)
+URL_TRAVERSAL_PATTERN = _combine(URL_TRAVERSAL_PATTERNS)
+SENSITIVE_PATH_PATTERN = re.compile('|'.join(re.escape(path) for path in SENSITIVE_PATHS))
+OBJECT_PATTERN = re.compile(r'/(\w+)/(\d+|\.\.)')
+
+_clock = time.perf_counter
+
+
+def is_safe_path(value, allow_absolute=False):
+    """
+    Check a path or parameter value for path traversal.
+
+    Args:
+        value: Value to check
+        allow_absolute: Allow values starting with '/' (the request path always does)
+
+    Returns:
+        True if the value is safe
+    """
+    if not value:
+        return True
+    if TRAVERSAL_PATTERN.search(value):
+        return False
+    if not allow_absolute and value.startswith('/'):
+        return False
+    # normpath never creates '..', so only values containing it need normalizing
+    return '..' not in value or '..' not in os.path.normpath(value)
+
+
+def is_safe_input(value):
+    """Check a parameter value for injection patterns and excessive length."""
+    if not value:
+        return True
+    if len(value) > MAX_INPUT_LENGTH:
+        return False
+    return INJECTION_PATTERN.search(value) is None
+
+
+class RequestGuardMiddleware:
+    """Runs the request security guards as one precompiled before_request pipeline."""
+
+    def __init__(self, app=None):
+        """Initialize the middleware, registering it on the Flask app if given."""
+        self.skip_prefixes = DEFAULT_SKIP_PREFIXES
+        self.mark_sanitizer = MarkSanitizerMiddleware()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._skipped = 0
+        self._counters = {name: [0, 0, 0.0] for name in GUARDS}  # calls, blocked, seconds
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the guard pipeline on the Flask app."""
+        self.skip_prefixes = tuple(app.config.get('REQUEST_GUARD_SKIP_PREFIXES', DEFAULT_SKIP_PREFIXES))
+        app.extensions['request_guard'] = self
+        app.before_request(self.guard_request)
+
+    def guard_request(self):
+        """Run all guards for the current request."""
+        timings = {}
+        blocked = None
+        skipped = request.path.startswith(self.skip_prefixes)
+        try:
+            return self._run(skipped, timings)
+        except HTTPException as e:
+            blocked = getattr(e, 'guard', None)
+            raise
+        finally:
+            self._record(timings, blocked, skipped)
+
+    def _run(self, skipped, timings):
+        path = request.path
+        traversal_error = input_error = None
+
+        if not skipped:
+            traversal_error, input_error, has_mark_fields = self._scan_parameters(path, timings)
+
+            start = _clock()
+            self.mark_sanitizer.sanitize_mark_data(has_mark_fields)
+            timings['mark_sanitizer'] = _clock() - start
+
+        start = _clock()
+        if not is_safe_path(path, allow_absolute=True):
+            traversal_error = "Access denied: Invalid path detected"
+        timings['path_traversal'] = timings.get('path_traversal', 0.0) + _clock() - start
+        if traversal_error:
+            self._block('path_traversal', 403, traversal_error)
+        if input_error:
+            self._block('input_validation', 400, input_error)
+
+        start = _clock()
+        if current_app.config.get('FORCE_HTTPS', False) and not request.is_secure \
+                and request.headers.get('X-Forwarded-Proto') != 'https':
+            timings['https_redirect'] = _clock() - start
+            return redirect(request.url.replace('http://', 'https://'), code=301)
+        timings['https_redirect'] = _clock() - start
+
+        start = _clock()
+        if URL_TRAVERSAL_PATTERN.search(request.url):
+            self._block('path_protection', 403, "Path traversal attempt blocked")
+        if SENSITIVE_PATH_PATTERN.search(path):
+            self._block('path_protection', 403, "Access to sensitive path blocked")
+        timings['path_protection'] = _clock() - start
+
+        if not skipped and '/api/' not in path:
+            start = _clock()
+            self._check_object_access(path)
+            timings['object_access'] = _clock() - start
+        return None
+
+    @staticmethod
+    def _scan_parameters(path, timings):
+        """
+        Scan query parameters, then form fields, once for both value guards.
+
+        A traversal finding stops the scan (that guard decides first); the first
+        injection finding is kept. Form field names are also checked for mark
+        fields so the mark sanitizer does not rescan them.
+
+        Returns:
+            Tuple of (traversal error, input error, form has mark fields)
+        """
+        check_inputs = not path.startswith(INPUT_VALIDATION_SKIP_PREFIXES)
+        find_mark_fields = request.method == 'POST'
+        has_mark_fields = False
+        traversal_seconds = input_seconds = 0.0
+        traversal_error = input_error = None
+
+        sources = [(request.args, "Access denied: Invalid parameter '{}'", "Invalid input in parameter '{}'")]
+        if request.form:
+            sources.append((request.form, "Access denied: Invalid form data '{}'", "Invalid input in field '{}'"))
+
+        for values, traversal_message, input_message in sources:
+            is_form = values is not request.args
+            for key, value in values.items():
+                if is_form and find_mark_fields and not has_mark_fields:
+                    has_mark_fields = MarkSanitizerMiddleware.is_mark_field(key)
+                value = str(value)
+                start = _clock()
+                safe = is_safe_path(value)
+                checked = _clock()
+                traversal_seconds += checked - start
+                if not safe:
+                    traversal_error = traversal_message.format(key)
+                    break
+                if check_inputs and input_error is None and not is_safe_input(value):
+                    input_error = input_message.format(key)
+                input_seconds += _clock() - checked
+            if traversal_error:
+                break
+
+        timings['path_traversal'] = traversal_seconds
+        if check_inputs:
+            timings['input_validation'] = input_seconds
+        return traversal_error, input_error, has_mark_fields
+
+    def _check_object_access(self, path):
+        """Restrict /<object>/<id> URLs to numeric IDs and the objects the role may access."""
+        match = OBJECT_PATTERN.search(path)
+        if not match:
+            return
+        object_type, object_id = match.groups()
+
+        # Block any non-numeric object IDs (prevents ../ attacks)
+        if not object_id.isdigit():
+            self._block('object_access', 403, f"Invalid object ID: {object_id}")
+
+        user_role = session.get('role', '').lower()
+        if object_type not in OBJECT_PERMISSIONS.get(user_role, ()):
+            self._block('object_access', 403, f"Access denied: {user_role} cannot access {object_type}")
+
+    @staticmethod
+    def _block(guard, code, description):
+        """Abort the request, tagging the exception with the guard that blocked it."""
+        try:
+            abort(code, description)
+        except HTTPException as e:
+            e.guard = guard
+            raise
+
+    def _record(self, timings, blocked, skipped):
+        with self._lock:
+            self._requests += 1
+            self._skipped += skipped
+            for name, seconds in timings.items():
+                counter = self._counters[name]
+                counter[0] += 1
+                counter[2] += seconds
+            if blocked:
+                counter = self._counters[blocked]
+                counter[0] += blocked not in timings
+                counter[1] += 1
+
+    def stats(self):
+        """
+        Get the per-guard counters of this process.
+
+        Returns:
+            Dictionary with the number of requests and skipped requests, and for each
+            guard its calls, blocked requests, total milliseconds and average microseconds
+        """
+        with self._lock:
+            guards = {
+                name: {
+                    'calls': calls,
+                    'blocked': blocked,
+                    'total_ms': round(seconds * 1000, 3),
+                    'avg_us': round(seconds / calls * 1e6, 2) if calls else 0.0
+                }
+                for name, (calls, blocked, seconds) in self._counters.items()
+            }
+            return {'requests': self._requests, 'skipped': self._skipped, 'guards': guards}
+
+    def reset_stats(self):
+        """Reset all counters."""
+        with self._lock:
+            self._requests = 0
+            self._skipped = 0
+            self._counters = {name: [0, 0, 0.0] for name in GUARDS}
@@ -10,10 +10,13 @@ except ImportError:
 from .user import Teacher, teacher_subjects
 from .academic import (
     SchoolConfiguration, Subject, Grade, Stream, Term,
-    AssessmentType, Student, Mark, StudentPromotionHistory
+    AssessmentType, Student, Mark, StudentPromotionHistory, StudentTermSummary, TermSummaryState, MarkCube,
+    MarkCubeState, StudentSubjectTrend, GradeTrendState
 )
 from .assignment import TeacherSubjectAssignment
 from .report_config import ReportConfiguration, ClassReportConfiguration, ReportTemplate
+from .report_job import ReportJob
+from .cache_version import CacheScopeVersion
 from .school_setup import SchoolSetup, SchoolBranding, SchoolCustomization
 from .permission import ClassTeacherPermission, PermissionRequest
 from .function_permission import FunctionPermission, DefaultFunctionPermissions
@@ -1,6 +1,8 @@
 """
 Academic-related models for the Hillview School Management System.
 """
+import json
+
 from ..extensions import db
 from .user import teacher_subjects
 
@@ -532,6 +534,184 @@ class SubjectMarksStatus(db.Model):
             return None
 
 
+class StudentTermSummary(db.Model):
+    """Materialized per-student results for a term and assessment type.
+
+    Rows are refreshed per stream by TermSummaryService whenever marks are saved,
+    so rankings and analytics can read totals without re-aggregating Mark rows.
+    TermSummaryState records what each refresh was built from; stale streams are
+    ignored by readers.
+    """
+    __tablename__ = 'student_term_summary'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'term_id', 'assessment_type_id', name='unique_student_term_summary'),
+        db.Index('ix_term_summary_stream', 'term_id', 'assessment_type_id', 'stream_id'),
+        db.Index('ix_term_summary_grade', 'term_id', 'assessment_type_id', 'grade_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
+    assessment_type_id = db.Column(db.Integer, db.ForeignKey('assessment_type.id'), nullable=False)
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), nullable=True)
+    stream_id = db.Column(db.Integer, db.ForeignKey('stream.id'), nullable=True)
+
+    # Totals standardized to 100 per subject, composites collapsed into their parent subject
+    standardized_total = db.Column(db.Float, default=0.0)
+    subject_count = db.Column(db.Integer, default=0)
+    average_percentage = db.Column(db.Float, default=0.0)
+    performance_category = db.Column(db.String(5), nullable=True)
+    subject_percentages = db.Column(db.Text, nullable=True)  # JSON: {subject name: percentage}
+
+    # Positions
+    class_rank = db.Column(db.Integer, nullable=True)
+    class_size = db.Column(db.Integer, nullable=True)
+    grade_rank = db.Column(db.Integer, nullable=True)
+    grade_size = db.Column(db.Integer, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    student = db.relationship('Student', lazy=True)
+    grade = db.relationship('Grade', lazy=True)
+    stream = db.relationship('Stream', lazy=True)
+
+    def get_subject_percentages(self):
+        """Get the composite-collapsed subject percentages as a dictionary."""
+        try:
+            return json.loads(self.subject_percentages) if self.subject_percentages else {}
+        except ValueError:
+            return {}
+
+    def set_subject_percentages(self, percentages):
+        """Set the composite-collapsed subject percentages from a dictionary."""
+        self.subject_percentages = json.dumps(percentages)
+
+    def __repr__(self):
+        return f"<StudentTermSummary student={self.student_id} term={self.term_id} assessment={self.assessment_type_id}>"
+
+
+class TermSummaryState(db.Model):
+    """Cache scope versions the stored summaries of a stream, term and assessment type were built from."""
+    __tablename__ = 'term_summary_state'
+
+    stream_id = db.Column(db.Integer, db.ForeignKey('stream.id'), primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), primary_key=True)
+    assessment_type_id = db.Column(db.Integer, db.ForeignKey('assessment_type.id'), primary_key=True)
+    dependencies = db.Column(db.Text, nullable=False)  # JSON: {scope: version}
+    built_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def __repr__(self):
+        return (f"<TermSummaryState stream={self.stream_id} term={self.term_id} "
+                f"assessment={self.assessment_type_id}>")
+
+
+class MarkCube(db.Model):
+    """Pre-aggregated mark statistics per term, assessment type, grade, stream, subject and gender.
+
+    Rows with a NULL subject_id aggregate every subject of their cell, so learner
+    counts stay exact when analytics roll up across subjects. Rows are rebuilt by
+    MarkCubeService for each grade, term and assessment type whose marks change.
+    """
+    __tablename__ = 'mark_cube'
+    __table_args__ = (
+        db.UniqueConstraint('term_id', 'assessment_type_id', 'grade_id', 'stream_id', 'subject_id', 'gender',
+                            name='unique_mark_cube_cell'),
+        db.Index('ix_mark_cube_grade', 'grade_id', 'term_id', 'assessment_type_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
+    assessment_type_id = db.Column(db.Integer, db.ForeignKey('assessment_type.id'), nullable=False)
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), nullable=False)
+    stream_id = db.Column(db.Integer, db.ForeignKey('stream.id'), nullable=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=True)  # NULL = all subjects
+    gender = db.Column(db.String(10), nullable=True)
+
+    mark_count = db.Column(db.Integer, nullable=False, default=0)  # Marks, with or without a percentage
+    scored_count = db.Column(db.Integer, nullable=False, default=0)  # Marks with a percentage
+    learner_count = db.Column(db.Integer, nullable=False, default=0)  # Distinct learners with marks
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    percentage_sum_squares = db.Column(db.Float, nullable=False, default=0.0)
+    min_percentage = db.Column(db.Float, nullable=True)
+    max_percentage = db.Column(db.Float, nullable=True)
+
+    # Marks per CBC band (utils.performance.CBC_BANDS)
+    band_ee1 = db.Column(db.Integer, nullable=False, default=0)
+    band_ee2 = db.Column(db.Integer, nullable=False, default=0)
+    band_me1 = db.Column(db.Integer, nullable=False, default=0)
+    band_me2 = db.Column(db.Integer, nullable=False, default=0)
+    band_ae1 = db.Column(db.Integer, nullable=False, default=0)
+    band_ae2 = db.Column(db.Integer, nullable=False, default=0)
+    band_be1 = db.Column(db.Integer, nullable=False, default=0)
+    band_be2 = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (f"<MarkCube term={self.term_id} assessment={self.assessment_type_id} grade={self.grade_id} "
+                f"stream={self.stream_id} subject={self.subject_id} gender={self.gender}>")
+
+
+class MarkCubeState(db.Model):
+    """Cache scope version a grade/term/assessment slice of the mark cube was built from."""
+    __tablename__ = 'mark_cube_state'
+
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), primary_key=True)
+    assessment_type_id = db.Column(db.Integer, db.ForeignKey('assessment_type.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)  # Version of marks:g<grade>:s*:t<term>:a<assessment>
+    built_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def __repr__(self):
+        return (f"<MarkCubeState grade={self.grade_id} term={self.term_id} "
+                f"assessment={self.assessment_type_id} version={self.version}>")
+
+
+class StudentSubjectTrend(db.Model):
+    """A learner's result in one subject for one term and assessment type, with its trend.
+
+    Rows with a NULL subject_id hold the learner's average over all subjects. Rows
+    are rebuilt per grade (the learners' current grade) by TrendService, ordered by
+    period_index across the grade's terms and assessment types.
+    """
+    __tablename__ = 'student_subject_trend'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'subject_id', 'term_id', 'assessment_type_id',
+                            name='unique_student_subject_trend'),
+        db.Index('ix_subject_trend_student', 'student_id', 'period_index'),
+        db.Index('ix_subject_trend_grade', 'grade_id', 'term_id', 'assessment_type_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=True)  # NULL = all subjects
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), nullable=False)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
+    assessment_type_id = db.Column(db.Integer, db.ForeignKey('assessment_type.id'), nullable=False)
+    period_index = db.Column(db.Integer, nullable=False)  # Position of the term/assessment in the grade's timeline
+
+    percentage = db.Column(db.Float, nullable=False)
+    previous_percentage = db.Column(db.Float, nullable=True)  # Learner's previous result in the subject
+    delta = db.Column(db.Float, nullable=True)  # percentage - previous_percentage
+    rolling_average = db.Column(db.Float, nullable=False)  # Mean of the learner's last results (TREND_WINDOW)
+    percentile = db.Column(db.Float, nullable=False)  # Percentile rank among the grade's learners (0-100)
+    percentile_change = db.Column(db.Float, nullable=True)  # Change since the previous result
+
+    def __repr__(self):
+        return (f"<StudentSubjectTrend student={self.student_id} subject={self.subject_id} "
+                f"term={self.term_id} assessment={self.assessment_type_id}>")
+
+
+class GradeTrendState(db.Model):
+    """Cache scope versions the stored trends of a grade were built from."""
+    __tablename__ = 'grade_trend_state'
+
+    grade_id = db.Column(db.Integer, db.ForeignKey('grade.id'), primary_key=True)
+    dependencies = db.Column(db.Text, nullable=False)  # JSON: {scope: version}
+    built_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f"<GradeTrendState grade={self.grade_id}>"
+
+
 class StudentPromotionHistory(db.Model):
     """Model to track student promotion history."""
     __tablename__ = 'student_promotion_history'
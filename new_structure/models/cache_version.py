@@ -0,0 +1,17 @@
+"""
+Cache scope version model for the Hillview School Management System.
+Counters bumped whenever data in a scope changes; cached entries embed them in their keys.
+"""
+
+from ..extensions import db
+
+
+class CacheScopeVersion(db.Model):
+    """Version counter for one invalidation scope (e.g. 'marks:g1:s2:t3:a*')."""
+    __tablename__ = 'cache_scope_version'
+
+    scope = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheScopeVersion {self.scope}={self.version}>'
@@ -0,0 +1,90 @@
+"""
+Report Job model for the Hillview School Management System.
+Persists long-running report generation jobs so they survive restarts.
+"""
+
+import json
+from datetime import datetime
+
+from ..extensions import db
+
+
+class ReportJob(db.Model):
+    """A queued or finished background report job (e.g. a ZIP of individual reports)."""
+    __tablename__ = 'report_job'
+    __table_args__ = (
+        db.Index('ix_report_job_school_status', 'school_key', 'status'),
+        # A running job holds one of the school's REPORT_JOBS_MAX_PER_SCHOOL slots
+        db.UniqueConstraint('school_key', 'run_slot', name='unique_report_job_slot'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    FINISHED_STATES = (SUCCESS, FAILED, CANCELLED)
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    job_type = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=True)  # JSON-encoded handler arguments
+    school_key = db.Column(db.String(100), nullable=False, default='default')
+    created_by = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=True)
+
+    # Status and progress
+    status = db.Column(db.String(20), nullable=False, default=PENDING)
+    progress_current = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer, default=0)
+    message = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    attempts = db.Column(db.Integer, default=0)
+    run_slot = db.Column(db.Integer, nullable=True)  # Set while running, NULL otherwise
+
+    # Finished artifact
+    result_path = db.Column(db.String(500), nullable=True)
+    result_filename = db.Column(db.String(255), nullable=True)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def get_params(self):
+        """Get the handler arguments as a dictionary."""
+        return json.loads(self.params) if self.params else {}
+
+    def set_params(self, params):
+        """Set the handler arguments from a dictionary."""
+        self.params = json.dumps(params)
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATES
+
+    def to_dict(self):
+        """Convert the job to a JSON-serializable status dictionary."""
+        percent = 0
+        if self.progress_total:
+            percent = round(self.progress_current * 100 / self.progress_total, 1)
+        elif self.status == self.SUCCESS:
+            percent = 100
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress_current': self.progress_current or 0,
+            'progress_total': self.progress_total or 0,
+            'percent': percent,
+            'message': self.message,
+            'error': self.error,
+            'cancel_requested': bool(self.cancel_requested),
+            'result_filename': self.result_filename,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.job_type} {self.status}>'
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Run script for the Hillview School Management System.
-This script creates and runs the Flask application.
+This script creates and runs the Flask application with the development server.
+For production, use gunicorn with gunicorn_config.py (see wsgi.py).
 """
 
 import os
@@ -29,6 +30,10 @@ try:
     # Create the Flask application
     app = create_app('development')
 
+    # This process serves requests, so it also runs background report jobs
+    from new_structure.services.report_job_service import ReportJobService
+    ReportJobService.resume(app)
+
     # Only show success message for the main process
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
         print("✅ Application initialized successfully")
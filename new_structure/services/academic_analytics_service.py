@@ -6,10 +6,23 @@ Provides comprehensive analytics for student performance and subject metrics.
 from sqlalchemy import func, desc, asc, and_, or_, case
 from ..models import Student, Mark, Subject, Grade, Stream, Term, AssessmentType, TeacherSubjectAssignment
 from ..extensions import db
-from ..services.cache_service import cache_analytics, get_cached_analytics, invalidate_analytics_cache
+from ..services.cache_service import get_or_compute_analytics, invalidate_analytics_cache
+from ..services.reference_data_service import ReferenceDataService
+from ..services.leaderboard_service import LeaderboardService
+from ..utils.performance import get_performance_category
+from ..utils.results_kernel import competition_ranks
+from .term_summary_service import TermSummaryService
+from .mark_cube_service import CubeStats, MarkCubeService
 from typing import Dict, List, Optional, Tuple, Any
 import time
 
+CATEGORY_NAMES = {
+    'EE': 'Exceeding Expectation',
+    'ME': 'Meeting Expectation',
+    'AE': 'Approaching Expectation',
+    'BE': 'Below Expectation'
+}
+
 
 class AcademicAnalyticsService:
     """
@@ -42,9 +55,11 @@ class AcademicAnalyticsService:
             
             # Check cache first
             if use_cache:
-                cached_result = get_cached_analytics(cache_key)
-                if cached_result:
-                    return cached_result
+                # Concurrent requests for the same key share one computation
+                return get_or_compute_analytics(
+                    cache_key, lambda: cls.get_top_performers(grade_id, stream_id, term_id, assessment_type_id, limit, view_type, use_cache=False),
+                    scope=dict(grade_id=grade_id, stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id)
+                )
             
             # Build base query for student averages (include grade/stream context)
             query = db.session.query(
@@ -130,9 +145,14 @@ class AcademicAnalyticsService:
                 results = fallback_q.all()
                 print(f"DEBUG get_top_performers: fallback query returned {len(results)} rows")
 
-            # Format results with enhanced data
+            # Format results with enhanced data; tied averages share a rank
+            ranks = competition_ranks([r.average_percentage or 0 for r in results])
+            # Standardized totals come from the materialized term summaries when available
+            summary_totals = TermSummaryService.get_totals_for_students(
+                [r.id for r in results], term_id, assessment_type_id
+            )
             top_performers = []
-            for i, result in enumerate(results, 1):
+            for rank, result in zip(ranks, results):
                 try:
                     # Get the most recent marks for this student to determine exam type and term
                     recent_marks = db.session.query(Mark)\
@@ -155,14 +175,14 @@ class AcademicAnalyticsService:
                         print(f"Student {result.name}: Assessment={assessment_type_name}, Term={term_name}")
                     
                     # Compute standardized totals using composite grouping like class report
-                    sum_raw, sum_max, subjects_cnt = cls._compute_standardized_totals(
+                    sum_raw, sum_max, subjects_cnt = summary_totals.get(result.id) or cls._compute_standardized_totals(
                         student_id=result.id,
                         term_id=term_id,
                         assessment_type_id=assessment_type_id
                     )
 
                     performer = {
-                        'rank': i,
+                        'rank': int(rank),
                         'student_id': result.id,
                         'name': result.name,
                         'admission_number': result.admission_number,
@@ -193,7 +213,7 @@ class AcademicAnalyticsService:
                     )
 
                     performer = {
-                        'rank': i,
+                        'rank': int(rank),
                         'student_id': result.id,
                         'name': result.name,
                         'admission_number': result.admission_number,
@@ -223,10 +243,6 @@ class AcademicAnalyticsService:
                 'generated_at': time.time()
             }
             
-            # Cache the result
-            if use_cache:
-                cache_analytics(cache_key, result_data, expiry=1800)  # 30 minutes
-            
             return result_data
             
         except Exception as e:
@@ -261,81 +277,43 @@ class AcademicAnalyticsService:
 
             # Check cache first
             if use_cache:
-                cached_result = get_cached_analytics(cache_key)
-                if cached_result:
-                    return cached_result
+                # Concurrent requests for the same key share one computation
+                return get_or_compute_analytics(
+                    cache_key, lambda: cls.get_subject_performance_analytics(grade_id, stream_id, term_id, assessment_type_id, use_cache=False),
+                    scope=dict(grade_id=grade_id, stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id)
+                )
+
+            # Roll the mark cube up per subject and teacher
+            groups = {}
+            for (subject_id, _, _), teacher, stats in cls._subject_teacher_cells(
+                    grade_id=grade_id, stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id):
+                key = (subject_id, teacher.teacher_id if teacher else None)
+                if key in groups:
+                    groups[key][1].add(stats)
+                else:
+                    groups[key] = [teacher, CubeStats().add(stats)]
 
-            # Build query for subject averages with teacher information
-            try:
-                from ..models import TeacherSubjectAssignment, Teacher
-            except ImportError:
-                # Fallback if models are not available
-                print("Warning: TeacherSubjectAssignment model not available")
-                return {
-                    'subject_analytics': [],
-                    'top_subject': None,
-                    'least_performing_subject': None,
-                    'context': {},
-                    'total_subjects_analyzed': 0,
-                    'error': 'Teacher assignment data not available'
+            reference = ReferenceDataService.current()
+            subject_analytics = []
+            for (subject_id, _), (teacher, stats) in groups.items():
+                if stats.mark_count < 2 or stats.average is None:  # Minimum 2 marks for analysis
+                    continue
+                subject = reference.subject_by_id.get(subject_id)
+                analytics = {
+                    'subject_id': subject_id,
+                    'subject_name': subject.name if subject else None,
+                    'average_percentage': round(stats.average, 2),
+                    'total_marks': stats.mark_count,
+                    'student_count': stats.learner_count,
+                    'min_percentage': round(stats.min_percentage, 2),
+                    'max_percentage': round(stats.max_percentage, 2),
+                    'performance_category': cls._get_performance_category(stats.average),
+                    'grade_letter': cls._get_grade_letter(stats.average)
                 }
+                analytics.update(cls._teacher_fields(teacher))
+                subject_analytics.append(analytics)
 
-            query = db.session.query(
-                Subject.id,
-                Subject.name,
-                func.avg(Mark.percentage).label('average_percentage'),
-                func.count(Mark.id).label('total_marks'),
-                func.min(Mark.percentage).label('min_percentage'),
-                func.max(Mark.percentage).label('max_percentage'),
-                func.count(func.distinct(Mark.student_id)).label('student_count'),
-                Teacher.first_name.label('teacher_first_name'),
-                Teacher.last_name.label('teacher_last_name'),
-                Teacher.username.label('teacher_username')
-            ).join(Mark, Subject.id == Mark.subject_id)
-            
-            # Add teacher joins
-            if grade_id or stream_id:
-                query = query.join(Student, Mark.student_id == Student.id)\
-                             .join(Stream, Student.stream_id == Stream.id)\
-                             .join(Grade, Stream.grade_id == Grade.id)\
-                             .outerjoin(TeacherSubjectAssignment,
-                                       and_(TeacherSubjectAssignment.subject_id == Subject.id,
-                                            TeacherSubjectAssignment.grade_id == Grade.id,
-                                            or_(TeacherSubjectAssignment.stream_id == Stream.id,
-                                                TeacherSubjectAssignment.stream_id.is_(None))))\
-                             .outerjoin(Teacher, TeacherSubjectAssignment.teacher_id == Teacher.id)
-
-                if grade_id:
-                    query = query.filter(Stream.grade_id == grade_id)
-
-                if stream_id:
-                    query = query.filter(Student.stream_id == stream_id)
-            else:
-                # For school-wide analytics, still need teacher information
-                query = query.join(Student, Mark.student_id == Student.id)\
-                             .join(Stream, Student.stream_id == Stream.id)\
-                             .join(Grade, Stream.grade_id == Grade.id)\
-                             .outerjoin(TeacherSubjectAssignment,
-                                       and_(TeacherSubjectAssignment.subject_id == Subject.id,
-                                            TeacherSubjectAssignment.grade_id == Grade.id,
-                                            or_(TeacherSubjectAssignment.stream_id == Stream.id,
-                                                TeacherSubjectAssignment.stream_id.is_(None))))\
-                             .outerjoin(Teacher, TeacherSubjectAssignment.teacher_id == Teacher.id)
-            
-            if term_id:
-                query = query.filter(Mark.term_id == term_id)
-            
-            if assessment_type_id:
-                query = query.filter(Mark.assessment_type_id == assessment_type_id)
-            
-            # Group by subject and teacher
-            query = query.group_by(Subject.id, Subject.name, Teacher.id, Teacher.first_name, Teacher.last_name, Teacher.username)
-            query = query.having(func.count(Mark.id) >= 2)  # Minimum 2 marks for analysis (reduced from 5)
-            
-            # Execute query
-            results = query.all()
-            
-            if not results:
+            if not subject_analytics:
                 return {
                     'subject_analytics': [],
                     'top_subject': None,
@@ -343,34 +321,7 @@ class AcademicAnalyticsService:
                     'context': cls._get_context_info(grade_id, stream_id, term_id, assessment_type_id),
                     'total_subjects_analyzed': 0
                 }
-            
-            # Format results and sort
-            subject_analytics = []
-            for result in results:
-                # Format teacher name
-                teacher_name = "Not Assigned"
-                if result.teacher_first_name and result.teacher_last_name:
-                    teacher_name = f"{result.teacher_first_name} {result.teacher_last_name}"
-                elif result.teacher_username:
-                    teacher_name = result.teacher_username
 
-                analytics = {
-                    'subject_id': result.id,
-                    'subject_name': result.name,
-                    'average_percentage': round(result.average_percentage, 2),
-                    'total_marks': result.total_marks,
-                    'student_count': result.student_count,
-                    'min_percentage': round(result.min_percentage, 2),
-                    'max_percentage': round(result.max_percentage, 2),
-                    'performance_category': cls._get_performance_category(result.average_percentage),
-                    'grade_letter': cls._get_grade_letter(result.average_percentage),
-                    'teacher_name': teacher_name,
-                    'teacher_first_name': result.teacher_first_name,
-                    'teacher_last_name': result.teacher_last_name,
-                    'teacher_username': result.teacher_username
-                }
-                subject_analytics.append(analytics)
-            
             # Sort by average percentage
             subject_analytics.sort(key=lambda x: x['average_percentage'], reverse=True)
             
@@ -387,10 +338,6 @@ class AcademicAnalyticsService:
                 'generated_at': time.time()
             }
             
-            # Cache the result
-            if use_cache:
-                cache_analytics(cache_key, result_data, expiry=1800)  # 30 minutes
-            
             return result_data
 
         except Exception as e:
@@ -427,71 +374,36 @@ class AcademicAnalyticsService:
 
             # Check cache first
             if use_cache:
-                cached_result = get_cached_analytics(cache_key)
-                if cached_result:
-                    return cached_result
-
-            # Build base query with teacher information
-            try:
-                from ..models import TeacherSubjectAssignment, Teacher
-            except ImportError:
-                # Fallback if models are not available
-                print("Warning: TeacherSubjectAssignment model not available")
-                return {
-                    'grade_subject_analytics': {},
-                    'subject_stream_comparisons': {},
-                    'context': {},
-                    'total_grades_analyzed': 0,
-                    'error': 'Teacher assignment data not available'
-                }
-
-            base_query = db.session.query(
-                Grade.id.label('grade_id'),
-                Grade.name.label('grade_name'),
-                Stream.id.label('stream_id'),
-                Stream.name.label('stream_name'),
-                Subject.id.label('subject_id'),
-                Subject.name.label('subject_name'),
-                func.avg(Mark.percentage).label('average_percentage'),
-                func.count(Mark.id).label('total_marks'),
-                func.min(Mark.percentage).label('min_percentage'),
-                func.max(Mark.percentage).label('max_percentage'),
-                func.count(func.distinct(Mark.student_id)).label('student_count'),
-                Teacher.first_name.label('teacher_first_name'),
-                Teacher.last_name.label('teacher_last_name'),
-                Teacher.username.label('teacher_username')
-            ).join(Mark, Subject.id == Mark.subject_id)\
-             .join(Student, Mark.student_id == Student.id)\
-             .join(Stream, Student.stream_id == Stream.id)\
-             .join(Grade, Stream.grade_id == Grade.id)\
-             .outerjoin(TeacherSubjectAssignment,
-                       and_(TeacherSubjectAssignment.subject_id == Subject.id,
-                            TeacherSubjectAssignment.grade_id == Grade.id,
-                            or_(TeacherSubjectAssignment.stream_id == Stream.id,
-                                TeacherSubjectAssignment.stream_id.is_(None))))\
-             .outerjoin(Teacher, TeacherSubjectAssignment.teacher_id == Teacher.id)
-
-            # Apply filters
-            if grade_id:
-                base_query = base_query.filter(Grade.id == grade_id)
-            if term_id:
-                base_query = base_query.filter(Mark.term_id == term_id)
-            if assessment_type_id:
-                base_query = base_query.filter(Mark.assessment_type_id == assessment_type_id)
-
-            # Group by grade, stream, subject, and teacher
-            results = base_query.group_by(
-                Grade.id, Grade.name, Stream.id, Stream.name, Subject.id, Subject.name,
-                Teacher.id, Teacher.first_name, Teacher.last_name, Teacher.username
-            ).having(func.count(Mark.id) > 0).all()
+                # Concurrent requests for the same key share one computation
+                return get_or_compute_analytics(
+                    cache_key, lambda: cls.get_enhanced_subject_performance_analytics(grade_id, term_id, assessment_type_id, use_cache=False),
+                    scope=dict(grade_id=grade_id, term_id=term_id, assessment_type_id=assessment_type_id)
+                )
+
+            # Roll the mark cube up per grade, stream, subject and teacher
+            groups = {}
+            for (subject_id, cell_grade_id, stream_id), teacher, stats in cls._subject_teacher_cells(
+                    grade_id=grade_id, term_id=term_id, assessment_type_id=assessment_type_id):
+                key = (cell_grade_id, stream_id, subject_id, teacher.teacher_id if teacher else None)
+                if key in groups:
+                    groups[key][1].add(stats)
+                else:
+                    groups[key] = [teacher, CubeStats().add(stats)]
 
             # Organize data by grade and subject
             grade_subject_data = {}
             subject_stream_comparisons = {}
 
-            for result in results:
-                grade_key = f"Grade {result.grade_name}"
-                subject_key = result.subject_name
+            reference = ReferenceDataService.current()
+            for (group_grade_id, stream_id, subject_id, _), (teacher, stats) in groups.items():
+                if stats.average is None:
+                    continue
+                grade = reference.grade_by_id.get(group_grade_id)
+                stream = reference.stream_by_id.get(stream_id)
+                subject = reference.subject_by_id.get(subject_id)
+                grade_key = f"Grade {grade.name if grade else group_grade_id}"
+                subject_key = subject.name if subject else str(subject_id)
+                stream_name = stream.name if stream else 'No Stream'
 
                 # Initialize grade if not exists
                 if grade_key not in grade_subject_data:
@@ -500,39 +412,29 @@ class AcademicAnalyticsService:
                 # Initialize subject if not exists
                 if subject_key not in grade_subject_data[grade_key]:
                     grade_subject_data[grade_key][subject_key] = {
-                        'subject_id': result.subject_id,
-                        'subject_name': result.subject_name,
+                        'subject_id': subject_id,
+                        'subject_name': subject_key,
                         'streams': {},
                         'grade_average': 0,
                         'total_students': 0,
                         'performance_category': ''
                     }
 
-                # Format teacher name
-                teacher_name = "Not Assigned"
-                if result.teacher_first_name and result.teacher_last_name:
-                    teacher_name = f"{result.teacher_first_name} {result.teacher_last_name}"
-                elif result.teacher_username:
-                    teacher_name = result.teacher_username
-
                 # Add stream data
                 stream_data = {
-                    'stream_id': result.stream_id,
-                    'stream_name': result.stream_name or 'No Stream',
-                    'average_percentage': round(result.average_percentage, 2),
-                    'student_count': result.student_count,
-                    'total_marks': result.total_marks,
-                    'min_percentage': round(result.min_percentage, 2),
-                    'max_percentage': round(result.max_percentage, 2),
-                    'performance_category': cls._get_performance_category(result.average_percentage),
-                    'grade_letter': cls._get_grade_letter(result.average_percentage),
-                    'teacher_name': teacher_name,
-                    'teacher_first_name': result.teacher_first_name,
-                    'teacher_last_name': result.teacher_last_name,
-                    'teacher_username': result.teacher_username
+                    'stream_id': stream_id,
+                    'stream_name': stream_name,
+                    'average_percentage': round(stats.average, 2),
+                    'student_count': stats.learner_count,
+                    'total_marks': stats.mark_count,
+                    'min_percentage': round(stats.min_percentage, 2),
+                    'max_percentage': round(stats.max_percentage, 2),
+                    'performance_category': cls._get_performance_category(stats.average),
+                    'grade_letter': cls._get_grade_letter(stats.average)
                 }
+                stream_data.update(cls._teacher_fields(teacher))
 
-                grade_subject_data[grade_key][subject_key]['streams'][result.stream_name or 'No Stream'] = stream_data
+                grade_subject_data[grade_key][subject_key]['streams'][stream_name] = stream_data
 
                 # For subject stream comparisons
                 if subject_key not in subject_stream_comparisons:
@@ -540,7 +442,7 @@ class AcademicAnalyticsService:
                 if grade_key not in subject_stream_comparisons[subject_key]:
                     subject_stream_comparisons[subject_key][grade_key] = {}
 
-                subject_stream_comparisons[subject_key][grade_key][result.stream_name or 'No Stream'] = stream_data
+                subject_stream_comparisons[subject_key][grade_key][stream_name] = stream_data
 
             # Calculate grade averages for each subject
             for grade_key, subjects in grade_subject_data.items():
@@ -567,10 +469,6 @@ class AcademicAnalyticsService:
                 'generated_at': time.time()
             }
 
-            # Cache the result
-            if use_cache:
-                cache_analytics(cache_key, result_data, expiry=1800)  # 30 minutes
-
             return result_data
 
         except Exception as e:
@@ -654,20 +552,11 @@ class AcademicAnalyticsService:
                 except Exception as _:
                     top_student_average = 0.0
 
-            # Fallback for students analyzed: count distinct students with marks under current filters
+            # Fallback for students analyzed: learners with marks under current filters, from the mark cube
             try:
-                student_count_q = db.session.query(func.count(func.distinct(Mark.student_id))) \
-                    .join(Student, Mark.student_id == Student.id) \
-                    .outerjoin(Stream, Student.stream_id == Stream.id)
-                if grade_id:
-                    student_count_q = student_count_q.filter(Stream.grade_id == grade_id)
-                if stream_id:
-                    student_count_q = student_count_q.filter(Student.stream_id == stream_id)
-                if term_id:
-                    student_count_q = student_count_q.filter(Mark.term_id == term_id)
-                if assessment_type_id:
-                    student_count_q = student_count_q.filter(Mark.assessment_type_id == assessment_type_id)
-                students_analyzed_fallback = int(student_count_q.scalar() or 0)
+                cube = MarkCubeService.rollup(grade_id=grade_id, stream_id=stream_id, term_id=term_id,
+                                              assessment_type_id=assessment_type_id)
+                students_analyzed_fallback = cube[()].learner_count if cube else 0
             except Exception as _:
                 students_analyzed_fallback = 0
 
@@ -698,9 +587,10 @@ class AcademicAnalyticsService:
                     simple_q = simple_q.order_by(desc('avg')).limit(top_performers_limit)
                     rows = simple_q.all()
                     built = []
-                    for i, r in enumerate(rows, 1):
+                    ranks = competition_ranks([float(r.avg or 0) for r in rows])
+                    for rank, r in zip(ranks, rows):
                         built.append({
-                            'rank': i,
+                            'rank': int(rank),
                             'student_id': r.id,
                             'name': r.name,
                             'admission_number': r.admission_number,
@@ -785,6 +675,10 @@ class AcademicAnalyticsService:
 
         Returns (obtained_total, possible_total, subjects_count)
         """
+        summary = TermSummaryService.get_student_totals(student_id, term_id, assessment_type_id)
+        if summary:
+            return summary
+
         try:
             from .composite_subject_service import CompositeSubjectService
             # Determine education level via student's grade -> stream
@@ -879,46 +773,65 @@ class AcademicAnalyticsService:
             c = int(c or 0)
             return p, c * 100, c
     
+    @staticmethod
+    def _subject_teacher_cells(**filters) -> List[Tuple[Tuple[int, int, Optional[int]], Any, Any]]:
+        """
+        Roll the mark cube up per subject, grade and stream, with the teachers assigned.
+
+        A cell is listed once per teacher whose assignment covers it (for its stream
+        or the whole grade), or once with no teacher when nobody is assigned.
+
+        Args:
+            **filters: MarkCubeService.rollup filters
+
+        Returns:
+            List of ((subject_id, grade_id, stream_id), AssignmentRow or None, CubeStats)
+        """
+        from .assignment_summary_service import AssignmentSummaryService
+
+        assignments = {}
+        for row in AssignmentSummaryService.assignment_rows():
+            assignments.setdefault((row.subject_id, row.grade_id), []).append(row)
+
+        cells = []
+        for (subject_id, grade_id, stream_id), stats in MarkCubeService.rollup(
+                ('subject_id', 'grade_id', 'stream_id'), **filters).items():
+            teachers = {}
+            for row in assignments.get((subject_id, grade_id), ()):
+                if row.stream_id in (stream_id, None):
+                    teachers.setdefault(row.teacher_id, row)
+            for teacher in list(teachers.values()) or [None]:
+                cells.append(((subject_id, grade_id, stream_id), teacher, stats))
+        return cells
+
+    @staticmethod
+    def _teacher_fields(teacher) -> Dict[str, Any]:
+        """Teacher name fields of an analytics row (teacher is an AssignmentRow or None)."""
+        first_name = teacher.teacher_first_name if teacher else None
+        last_name = teacher.teacher_last_name if teacher else None
+        username = teacher.teacher_username if teacher else None
+        teacher_name = "Not Assigned"
+        if first_name and last_name:
+            teacher_name = f"{first_name} {last_name}"
+        elif username:
+            teacher_name = username
+        return {
+            'teacher_name': teacher_name,
+            'teacher_first_name': first_name,
+            'teacher_last_name': last_name,
+            'teacher_username': username
+        }
+
     @staticmethod
     def _get_performance_category(percentage: float) -> str:
         """Get performance category based on percentage using CBC standards."""
-        if percentage >= 90:
-            return 'Exceeding Expectation'
-        elif percentage >= 75:
-            return 'Exceeding Expectation'
-        elif percentage >= 58:
-            return 'Meeting Expectation'
-        elif percentage >= 41:
-            return 'Meeting Expectation'
-        elif percentage >= 31:
-            return 'Approaching Expectation'
-        elif percentage >= 21:
-            return 'Approaching Expectation'
-        elif percentage >= 11:
-            return 'Below Expectation'
-        else:
-            return 'Below Expectation'
-    
+        return CATEGORY_NAMES[get_performance_category(percentage)[:2]]
+
     @staticmethod
     def _get_grade_letter(percentage: float) -> str:
         """Get grade letter based on percentage using CBC grading standards."""
-        if percentage >= 90:
-            return 'EE1'
-        elif percentage >= 75:
-            return 'EE2'
-        elif percentage >= 58:
-            return 'ME1'
-        elif percentage >= 41:
-            return 'ME2'
-        elif percentage >= 31:
-            return 'AE1'
-        elif percentage >= 21:
-            return 'AE2'
-        elif percentage >= 11:
-            return 'BE1'
-        else:
-            return 'BE2'
-    
+        return get_performance_category(percentage)
+
     @staticmethod
     def _get_context_info(grade_id: Optional[int], stream_id: Optional[int],
                          term_id: Optional[int], assessment_type_id: Optional[int]) -> Dict[str, Any]:
@@ -968,54 +881,39 @@ class AcademicAnalyticsService:
 
             # Check cache first
             if use_cache:
-                cached_result = get_cached_analytics(cache_key)
-                if cached_result:
-                    return cached_result
-
-            # Build query for class/stream performance
-            query = db.session.query(
-                Grade.id.label('grade_id'),
-                Grade.name.label('grade_name'),
-                Stream.id.label('stream_id'),
-                Stream.name.label('stream_name'),
-                func.avg(Mark.percentage).label('average_percentage'),
-                func.count(func.distinct(Student.id)).label('student_count'),
-                func.count(Mark.id).label('total_marks'),
-                func.min(Mark.percentage).label('min_percentage'),
-                func.max(Mark.percentage).label('max_percentage')
-            ).join(Student, Mark.student_id == Student.id)\
-             .join(Stream, Student.stream_id == Stream.id)\
-             .join(Grade, Stream.grade_id == Grade.id)
+                # Concurrent requests for the same key share one computation
+                return get_or_compute_analytics(
+                    cache_key, lambda: cls.get_class_stream_performance(term_id, assessment_type_id, use_cache=False),
+                    scope=dict(term_id=term_id, assessment_type_id=assessment_type_id)
+                )
 
-            # Apply filters
-            if term_id:
-                query = query.filter(Mark.term_id == term_id)
-            if assessment_type_id:
-                query = query.filter(Mark.assessment_type_id == assessment_type_id)
-
-            # Group by grade and stream
-            query = query.group_by(Grade.id, Grade.name, Stream.id, Stream.name)
-            query = query.order_by(Grade.name, Stream.name)
-
-            results = query.all()
+            # Roll the mark cube up per grade and stream
+            cube = MarkCubeService.rollup(('grade_id', 'stream_id'), term_id=term_id,
+                                          assessment_type_id=assessment_type_id)
+            reference = ReferenceDataService.current()
 
             # Format results
             class_stream_data = []
-            for result in results:
+            for (grade_id, stream_id), stats in cube.items():
+                if stats.average is None:
+                    continue
+                grade = reference.grade_by_id.get(grade_id)
+                stream = reference.stream_by_id.get(stream_id)
                 performance_data = {
-                    'grade_id': result.grade_id,
-                    'grade_name': result.grade_name,
-                    'stream_id': result.stream_id,
-                    'stream_name': result.stream_name or 'No Stream',
-                    'average_percentage': round(result.average_percentage, 2),
-                    'student_count': result.student_count,
-                    'total_marks': result.total_marks,
-                    'min_percentage': round(result.min_percentage, 2),
-                    'max_percentage': round(result.max_percentage, 2),
-                    'performance_category': cls._get_performance_category(result.average_percentage),
-                    'grade_letter': cls._get_grade_letter(result.average_percentage)
+                    'grade_id': grade_id,
+                    'grade_name': grade.name if grade else None,
+                    'stream_id': stream_id,
+                    'stream_name': stream.name if stream else 'No Stream',
+                    'average_percentage': round(stats.average, 2),
+                    'student_count': stats.learner_count,
+                    'total_marks': stats.mark_count,
+                    'min_percentage': round(stats.min_percentage, 2),
+                    'max_percentage': round(stats.max_percentage, 2),
+                    'performance_category': cls._get_performance_category(stats.average),
+                    'grade_letter': cls._get_grade_letter(stats.average)
                 }
                 class_stream_data.append(performance_data)
+            class_stream_data.sort(key=lambda x: (x['grade_name'] or '', x['stream_name']))
 
             # Sort by performance
             class_stream_data.sort(key=lambda x: x['average_percentage'], reverse=True)
@@ -1028,10 +926,6 @@ class AcademicAnalyticsService:
                 'generated_at': time.time()
             }
 
-            # Cache the result
-            if use_cache:
-                cache_analytics(cache_key, result_data, expiry=1800)  # 30 minutes
-
             return result_data
 
         except Exception as e:
@@ -1076,138 +970,129 @@ class AcademicAnalyticsService:
 
             # Check cache first
             if use_cache:
-                cached_result = get_cached_analytics(cache_key)
-                if cached_result:
-                    print("DEBUG: Using cached result")
-                    return cached_result
+                # Concurrent requests for the same key share one computation
+                return get_or_compute_analytics(
+                    cache_key, lambda: cls.get_enhanced_top_performers(grade_id, stream_id, term_id, assessment_type_id, limit, use_cache=False),
+                    scope=dict(grade_id=grade_id, stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id)
+                )
 
             # Get all grades and streams if not specified
+            reference = ReferenceDataService.current()
             if not grade_id:
-                grades = Grade.query.all()
+                grades = reference.grades
             else:
-                grades = [Grade.query.get(grade_id)]
+                grades = [reference.grade_by_id.get(grade_id)]
+
+            grades = [grade for grade in grades if grade]
+            if not grades:
+                return {'enhanced_top_performers': {}, 'total_grades_analyzed': 0, 'generated_at': time.time()}
+            grade_ids = [grade.id for grade in grades]
+
+            # Average of every learner with at least 3 marks, ranked within their stream in one query
+            query = db.session.query(
+                Student.id.label('id'),
+                Student.name.label('name'),
+                Student.admission_number.label('admission_number'),
+                Grade.name.label('grade_name'),
+                Stream.id.label('stream_id'),
+                Stream.name.label('stream_name'),
+                func.avg(Mark.percentage).label('average_percentage'),
+                func.count(Mark.id).label('total_marks'),
+                func.min(Mark.percentage).label('min_percentage'),
+                func.max(Mark.percentage).label('max_percentage')
+            ).join(Mark, Student.id == Mark.student_id)\
+             .join(Stream, Student.stream_id == Stream.id)\
+             .join(Grade, Stream.grade_id == Grade.id)\
+             .filter(Stream.grade_id.in_(grade_ids))
+
+            # Apply filters
+            if stream_id:
+                query = query.filter(Student.stream_id == stream_id)
+            if term_id:
+                query = query.filter(Mark.term_id == term_id)
+            if assessment_type_id:
+                query = query.filter(Mark.assessment_type_id == assessment_type_id)
+
+            query = query.group_by(Student.id, Student.name, Student.admission_number,
+                                   Grade.name, Stream.id, Stream.name)
+            query = query.having(func.count(Mark.id) >= 3)  # At least 3 marks
+            leaders = LeaderboardService.top_n(query, ('stream_id',), 'average_percentage', limit, tiebreak=('id',))
+
+            # Students per stream, for position context
+            total_students_by_stream = dict(
+                db.session.query(Student.stream_id, func.count(Student.id))
+                .join(Stream, Student.stream_id == Stream.id)
+                .filter(Stream.grade_id.in_(grade_ids))
+                .group_by(Student.stream_id).all()
+            )
+
+            # Individual subject marks of every top performer, with the SAME filtering as reports
+            performer_ids = [result.id for results in leaders.values() for result in results]
+            subject_marks_by_student = {}
+            if performer_ids:
+                marks_query = db.session.query(
+                    Mark.student_id,
+                    Subject.name.label('subject_name'),
+                    Mark.percentage,
+                    Mark.raw_mark,
+                    Mark.total_marks,
+                    Mark.raw_total_marks  # Use raw_total_marks for consistency
+                ).join(Subject, Mark.subject_id == Subject.id)\
+                 .filter(Mark.student_id.in_(performer_ids))
+                if term_id:
+                    marks_query = marks_query.filter(Mark.term_id == term_id)
+                if assessment_type_id:
+                    marks_query = marks_query.filter(Mark.assessment_type_id == assessment_type_id)
+                for mark in marks_query.order_by(Mark.id):
+                    subject_marks_by_student.setdefault(mark.student_id, []).append(mark)
+
+            # Positions as on the class report, where summaries exist for the term and assessment
+            class_positions = TermSummaryService.get_class_positions(performer_ids, term_id, assessment_type_id)
+
+            # Get term and assessment type names for delete functionality
+            # Always ensure we have valid values
+            term_name = "All Terms"
+            assessment_type_name = "All Assessments"
+            if term_id:
+                term = reference.term_by_id.get(term_id)
+                term_name = term.name if term else f"Term {term_id}"
+            if assessment_type_id:
+                assessment_type = reference.assessment_type_by_id.get(assessment_type_id)
+                assessment_type_name = (assessment_type.name if assessment_type
+                                        else f"Assessment {assessment_type_id}")
 
             enhanced_performers = {}
 
             for grade in grades:
-                if not grade:
-                    continue
-
                 grade_key = f"Grade {grade.name}"
                 enhanced_performers[grade_key] = {}
 
                 # Get streams for this grade
                 if not stream_id:
-                    streams = Stream.query.filter_by(grade_id=grade.id).all()
-                    if not streams:
-                        streams = [None]  # Handle grades without streams
+                    streams = reference.streams_by_grade.get(grade.id, ())
                 else:
-                    streams = [Stream.query.get(stream_id)]
+                    streams = [stream for stream in [reference.stream_by_id.get(stream_id)]
+                               if stream and stream.grade_id == grade.id]
 
                 for stream in streams:
-                    stream_key = stream.name if stream else "No Stream"
-
-                    # Build query for this grade/stream combination
-                    query = db.session.query(
-                        Student.id,
-                        Student.name,
-                        Student.admission_number,
-                        Grade.name.label('grade_name'),
-                        Stream.name.label('stream_name'),
-                        func.avg(Mark.percentage).label('average_percentage'),
-                        func.count(Mark.id).label('total_marks'),
-                        func.min(Mark.percentage).label('min_percentage'),
-                        func.max(Mark.percentage).label('max_percentage')
-                    ).join(Mark, Student.id == Mark.student_id)\
-                     .join(Stream, Student.stream_id == Stream.id)\
-                     .join(Grade, Stream.grade_id == Grade.id)\
-                     .filter(Stream.grade_id == grade.id)
-
-                    if stream:
-                        query = query.filter(Student.stream_id == stream.id)
-                    else:
-                        query = query.filter(Student.stream_id.is_(None))
-
-                    # Apply filters
-                    if term_id:
-                        query = query.filter(Mark.term_id == term_id)
-                    if assessment_type_id:
-                        query = query.filter(Mark.assessment_type_id == assessment_type_id)
-
-                    # Group and order
-                    query = query.group_by(Student.id, Student.name, Student.admission_number,
-                                         Grade.name, Stream.name)
-                    query = query.having(func.count(Mark.id) >= 3)  # At least 3 marks
-                    query = query.order_by(desc(func.avg(Mark.percentage)))
-                    query = query.limit(limit)
-
-                    results = query.all()
+                    results = leaders.get((stream.id,))
+                    if not results:
+                        continue
 
-                    # Get detailed marks for each top performer
+                    total_students_in_class = total_students_by_stream.get(stream.id, 0)
+                    positions = competition_ranks([r.average_percentage or 0 for r in results])
                     performers_with_details = []
 
-                    # Calculate total students in this class/stream for position context
-                    total_students_query = db.session.query(func.count(Student.id))\
-                        .join(Stream, Student.stream_id == Stream.id)\
-                        .filter(Stream.grade_id == grade.id)
-
-                    if stream:
-                        total_students_query = total_students_query.filter(Student.stream_id == stream.id)
-                    else:
-                        total_students_query = total_students_query.filter(Student.stream_id.is_(None))
-
-                    total_students_in_class = total_students_query.scalar() or 0
-
                     for index, result in enumerate(results):
-                        # Get individual subject marks with SAME filtering as reports
-                        marks_query = db.session.query(
-                            Subject.name.label('subject_name'),
-                            Mark.percentage,
-                            Mark.raw_mark,
-                            Mark.total_marks,
-                            Mark.raw_total_marks  # Use raw_total_marks for consistency
-                        ).join(Subject, Mark.subject_id == Subject.id)\
-                         .filter(Mark.student_id == result.id)
-
-                        # Apply SAME filtering as used in the main query to ensure consistency
-                        if term_id:
-                            marks_query = marks_query.filter(Mark.term_id == term_id)
-                        if assessment_type_id:
-                            marks_query = marks_query.filter(Mark.assessment_type_id == assessment_type_id)
-
-                        subject_marks = marks_query.all()
+                        subject_marks = subject_marks_by_student.get(result.id, [])
+                        class_position, class_size = class_positions.get(
+                            result.id, (int(positions[index]), total_students_in_class))
 
                         # Calculate total marks and maximum possible marks using SAME logic as reports
                         # Use raw_total_marks (max possible) instead of total_marks for consistency
                         total_raw_marks = sum(mark.raw_mark for mark in subject_marks if mark.raw_mark)
                         total_max_marks = sum(mark.raw_total_marks for mark in subject_marks if mark.raw_total_marks)
 
-                        # Debug: Log the filtering being applied
-                        if result.name == "JOYLINE WANJIKU":  # Debug for the specific student
-                            print(f"DEBUG ANALYTICS: Student {result.name}")
-                            print(f"  - Filters: term_id={term_id}, assessment_type_id={assessment_type_id}")
-                            print(f"  - Found {len(subject_marks)} subject marks")
-                            print(f"  - Total: {total_raw_marks}/{total_max_marks}")
-                            for mark in subject_marks:
-                                print(f"    * {mark.subject_name}: {mark.raw_mark}/{mark.raw_total_marks}")
-
-                        # Get class position (rank within the stream)
-                        class_position = index + 1
-
-                        # Get term and assessment type names for delete functionality
-                        # Always ensure we have valid values
-                        term_name = "All Terms"
-                        assessment_type_name = "All Assessments"
-
-                        if term_id:
-                            term = Term.query.get(term_id)
-                            term_name = term.name if term else f"Term {term_id}"
-
-                        if assessment_type_id:
-                            assessment_type = AssessmentType.query.get(assessment_type_id)
-                            assessment_type_name = (assessment_type.name if assessment_type
-                                                  else f"Assessment {assessment_type_id}")
-
                         performer_data = {
                             'student_id': result.id,
                             'name': result.name,
@@ -1230,8 +1115,9 @@ class AcademicAnalyticsService:
                             'grade_letter': cls._get_grade_letter(result.average_percentage),
                             'total_raw_marks': total_raw_marks,
                             'total_max_marks': total_max_marks,
+                            # Class position (rank within the stream)
                             'class_position': class_position,
-                            'total_students_in_class': total_students_in_class,
+                            'total_students_in_class': class_size,
                             'subject_marks': [
                                 {
                                     'subject_name': mark.subject_name,
@@ -1245,8 +1131,7 @@ class AcademicAnalyticsService:
                         }
                         performers_with_details.append(performer_data)
 
-                    if performers_with_details:
-                        enhanced_performers[grade_key][stream_key] = performers_with_details
+                    enhanced_performers[grade_key][stream.name] = performers_with_details
 
             result_data = {
                 'enhanced_top_performers': enhanced_performers,
@@ -1254,10 +1139,6 @@ class AcademicAnalyticsService:
                 'generated_at': time.time()
             }
 
-            # Cache the result
-            if use_cache:
-                cache_analytics(cache_key, result_data, expiry=1800)  # 30 minutes
-
             return result_data
 
         except Exception as e:
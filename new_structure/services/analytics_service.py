@@ -8,9 +8,13 @@ from ..models.academic import Mark, Student, Subject, Grade, Stream, Term, Asses
 from ..models.user import Teacher
 from ..models.assignment import TeacherSubjectAssignment
 from ..extensions import db
+from .reference_data_service import ReferenceDataService
 from collections import defaultdict
+import logging
 import statistics
 
+logger = logging.getLogger(__name__)
+
 class AnalyticsService:
     """Service for generating academic performance analytics"""
     
@@ -120,15 +124,36 @@ class AnalyticsService:
             return {'error': f'Error generating analytics: {str(e)}'}
     
     @staticmethod
-    def get_headteacher_analytics():
+    def get_headteacher_analytics(term_id=None, assessment_type_id=None, academic_year=None, since=None):
         """
-        Get comprehensive school-wide analytics for headteacher
+        Get comprehensive school-wide analytics for headteacher.
+
+        Every figure comes from a grouped aggregate query, so only summary rows are
+        read however many marks the school has recorded.
+
+        Args:
+            term_id: Only include marks of this term
+            assessment_type_id: Only include marks of this assessment type
+            academic_year: Only include marks of terms in this academic year
+            since: Only include marks recorded at or after this datetime
+
+        Returns:
+            Dictionary with summary, grade, subject, student, assessment and teacher analytics
         """
         try:
-            # Get all marks for school-wide analytics
-            marks = Mark.query.join(Student).join(Stream).join(Grade).join(Subject).all()
-            
-            if not marks:
+            filters = dict(term_id=term_id, assessment_type_id=assessment_type_id,
+                           academic_year=academic_year, since=since)
+
+            totals = AnalyticsService._school_marks_query(
+                func.count(Mark.id),
+                func.count(func.distinct(Mark.student_id)),
+                func.count(func.distinct(Subject.name)),
+                func.avg(Mark.percentage),
+                **filters
+            ).one()
+            total_marks, students_analyzed, subjects_analyzed, school_average = totals
+
+            if not total_marks:
                 return {
                     'summary': {
                         'total_students': 0,
@@ -144,30 +169,131 @@ class AnalyticsService:
                     'teacher_performance': [],
                     'has_data': False
                 }
-            
-            # Process school-wide analytics
-            analytics_data = AnalyticsService._process_marks_data(marks, school_wide=True)
-            
-            # Add school-wide specific data
-            analytics_data['summary']['total_students'] = Student.query.count()
-            analytics_data['summary']['active_subjects'] = Subject.query.count()
-            analytics_data['summary']['active_teachers'] = Teacher.query.filter(Teacher.role != 'headteacher').count()
-            analytics_data['summary']['total_assessments'] = len(set((m.term_id, m.assessment_type_id) for m in marks))
-            
-            # Get grade-level performance
-            analytics_data['grade_performance'] = AnalyticsService._get_grade_performance(marks)
-            
-            # Get teacher performance summary
-            analytics_data['teacher_performance'] = AnalyticsService._get_teacher_performance()
-            
-            analytics_data['has_data'] = True
-            
-            return analytics_data
-            
+
+            # Top 10 students by average
+            top_students = [{
+                'name': row.name,
+                'average': round(row.average, 1),
+                'grade': row.grade_name,
+                'stream': row.stream_name,
+                'subjects_count': row.subjects_count
+            } for row in AnalyticsService._school_marks_query(
+                Student.name,
+                Grade.name.label('grade_name'),
+                Stream.name.label('stream_name'),
+                func.avg(Mark.percentage).label('average'),
+                func.count(Mark.percentage).label('subjects_count'),
+                **filters
+            ).group_by(Student.id, Student.name, Grade.name, Stream.name)
+             .having(func.count(Mark.percentage) > 0)
+             .order_by(desc(func.avg(Mark.percentage)), Student.id)
+             .limit(10)]
+
+            # Subject averages
+            subject_performance = [{
+                'name': row.name,
+                'average': round(row.average, 1),
+                'students_count': row.students_count,
+                'total_marks': row.total_marks
+            } for row in AnalyticsService._school_marks_query(
+                Subject.name,
+                func.avg(Mark.percentage).label('average'),
+                func.count(func.distinct(Mark.student_id)).label('students_count'),
+                func.count(Mark.percentage).label('total_marks'),
+                **filters
+            ).group_by(Subject.name).having(func.count(Mark.percentage) > 0)]
+            subject_performance.sort(key=lambda x: x['average'], reverse=True)
+
+            assessments = AnalyticsService._get_assessment_summaries(filters)
+            grade_performance = AnalyticsService._get_grade_performance(filters)
+            teacher_performance = AnalyticsService._get_teacher_performance()
+            reference = ReferenceDataService.current()
+
+            summary = {
+                'students_analyzed': students_analyzed,
+                'subjects_analyzed': subjects_analyzed,
+                'best_subject_average': subject_performance[0]['average'] if subject_performance else 0,
+                'top_student_average': top_students[0]['average'] if top_students else 0,
+                'school_average': round(school_average, 1) if school_average is not None else 0,
+                'total_students': Student.query.count(),
+                'active_subjects': len(reference.subjects),
+                'active_teachers': len(teacher_performance),
+                'total_assessments': len(assessments)
+            }
+
+            # Recent assessments (most recent first)
+            recent_assessments = [assessment for assessment in assessments if assessment['average'] is not None]
+            recent_assessments.sort(key=lambda x: x['date'], reverse=True)
+
+            return {
+                'summary': summary,
+                'top_students': top_students,
+                'subject_performance': subject_performance,
+                'recent_assessments': recent_assessments[:5],  # Last 5 assessments
+                'grade_breakdown': grade_performance,
+                'grade_performance': grade_performance,
+                'teacher_performance': teacher_performance,
+                'has_data': True
+            }
+
         except Exception as e:
             print(f"Error in get_headteacher_analytics: {str(e)}")
             return {'error': f'Error generating analytics: {str(e)}'}
-    
+
+    @staticmethod
+    def _school_marks_query(*columns, term_id=None, assessment_type_id=None, academic_year=None, since=None):
+        """
+        Query columns over the school's marks, joined to their student, stream, grade and subject.
+
+        Args:
+            columns: Columns and aggregates to select
+            term_id, assessment_type_id, academic_year, since: Optional filters
+                (see get_headteacher_analytics)
+
+        Returns:
+            Query with the joins and filters applied
+        """
+        query = db.session.query(*columns).select_from(Mark)\
+            .join(Student, Mark.student_id == Student.id)\
+            .join(Stream, Student.stream_id == Stream.id)\
+            .join(Grade, Stream.grade_id == Grade.id)\
+            .join(Subject, Mark.subject_id == Subject.id)
+        if term_id:
+            query = query.filter(Mark.term_id == term_id)
+        if assessment_type_id:
+            query = query.filter(Mark.assessment_type_id == assessment_type_id)
+        if academic_year:
+            query = query.filter(Mark.term_id.in_(
+                db.session.query(Term.id).filter(Term.academic_year == academic_year)
+            ))
+        if since:
+            query = query.filter(Mark.created_at >= since)
+        return query
+
+    @staticmethod
+    def _get_assessment_summaries(filters):
+        """Average, students and latest mark date of every term and assessment type with marks."""
+        reference = ReferenceDataService.current()
+        summaries = []
+        for row in AnalyticsService._school_marks_query(
+            Mark.term_id,
+            Mark.assessment_type_id,
+            func.avg(Mark.percentage).label('average'),
+            func.count(func.distinct(Mark.student_id)).label('students_count'),
+            func.max(Mark.created_at).label('latest'),
+            **filters
+        ).group_by(Mark.term_id, Mark.assessment_type_id):
+            term = reference.term_by_id.get(row.term_id)
+            assessment_type = reference.assessment_type_by_id.get(row.assessment_type_id)
+            summaries.append({
+                'term': term.name if term else f"Term {row.term_id}",
+                'assessment': assessment_type.name if assessment_type else f"Assessment {row.assessment_type_id}",
+                'average': round(row.average, 1) if row.average is not None else None,
+                'students_count': row.students_count,
+                'date': row.latest.strftime('%Y-%m-%d') if row.latest else 'Unknown'
+            })
+        return summaries
+
     @staticmethod
     def _process_marks_data(marks, school_wide=False):
         """
@@ -381,25 +507,44 @@ class AnalyticsService:
             return []
     
     @staticmethod
-    def _get_grade_performance(marks):
-        """Get detailed grade performance for headteacher"""
-        return AnalyticsService._get_grade_breakdown(marks)
-    
+    def _get_grade_performance(filters):
+        """Get detailed grade performance for headteacher, aggregated per grade"""
+        try:
+            return [{
+                'grade': row.grade,
+                'average': round(row.average, 1),
+                'students_count': row.students_count,
+                'total_marks': row.total_marks
+            } for row in AnalyticsService._school_marks_query(
+                Grade.name.label('grade'),
+                func.avg(Mark.percentage).label('average'),
+                func.count(func.distinct(Mark.student_id)).label('students_count'),
+                func.count(Mark.percentage).label('total_marks'),
+                **filters
+            ).group_by(Grade.name).having(func.count(Mark.percentage) > 0).order_by(Grade.name)]
+
+        except Exception as e:
+            logger.error(f"Error in _get_grade_performance: {str(e)}")
+            return []
+
     @staticmethod
     def _get_teacher_performance():
         """Get teacher performance summary"""
         try:
-            # Get teachers with their assignment counts
-            teachers = db.session.query(Teacher).filter(Teacher.role != 'headteacher').all()
-            
+            # Teachers with their subject assignment counts, counted in one grouped query
+            assignment_counts = db.session.query(
+                TeacherSubjectAssignment.teacher_id,
+                func.count(TeacherSubjectAssignment.id).label('subject_count')
+            ).group_by(TeacherSubjectAssignment.teacher_id).subquery()
+            teachers = db.session.query(Teacher, func.coalesce(assignment_counts.c.subject_count, 0))\
+                .outerjoin(assignment_counts, assignment_counts.c.teacher_id == Teacher.id)\
+                .filter(Teacher.role != 'headteacher').order_by(Teacher.id).all()
+
             teacher_performance = []
-            for teacher in teachers:
-                # Count subject assignments
-                subject_count = db.session.query(TeacherSubjectAssignment).filter_by(teacher_id=teacher.id).count()
-                
+            for teacher, subject_count in teachers:
                 # Get class teacher assignment
                 class_assignment = "Yes" if teacher.stream_id else "No"
-                
+
                 teacher_performance.append({
                     'name': teacher.full_name or teacher.username,
                     'username': teacher.username,
@@ -407,9 +552,9 @@ class AnalyticsService:
                     'class_teacher': class_assignment,
                     'status': 'Active' if subject_count > 0 or teacher.stream_id else 'Inactive'
                 })
-            
+
             return teacher_performance
-            
+
         except Exception as e:
             print(f"Error getting teacher performance: {str(e)}")
             return []
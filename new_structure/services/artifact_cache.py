@@ -0,0 +1,176 @@
+"""
+Artifact Cache - content-addressed cache for generated report files.
+
+Generated PDFs and spreadsheets are stored on disk under a key derived from the
+data they were built from: the cache scope versions (see CacheInvalidationService)
+of the learners' marks and component marks, the learners, subjects, teacher
+assignments, school branding and report configuration. A download whose inputs are
+unchanged is served straight from disk; any committed change to the inputs bumps a
+version and so produces a new key, so stale artifacts are never served and nothing
+has to be invalidated explicitly. The cache directory is kept under
+ARTIFACT_CACHE_MAX_BYTES by evicting the least recently used files.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..models import Mark, Student
+from .cache_invalidation_service import CacheInvalidationService, ANY, NULL_PART, CONFIG_SCOPE, REFERENCE_SCOPE
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of generated artifacts changes so old entries are not reused
+ARTIFACT_FORMAT_VERSION = 3
+
+
+class ArtifactCache:
+    """Stores generated report files keyed by a fingerprint of their inputs."""
+
+    @staticmethod
+    def cache_dir() -> str:
+        """Directory holding cached artifacts (ARTIFACT_CACHE_DIR or <instance>/artifact_cache)."""
+        path = current_app.config.get('ARTIFACT_CACHE_DIR') or os.path.join(current_app.instance_path, 'artifact_cache')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def dependency_scopes(grade_id: int, term_id: int, assessment_type_id: int,
+                          stream_id: Optional[int] = None) -> List[str]:
+        """
+        Cache scopes a report for the given scope is rendered from.
+
+        Reports read the marks of the learners currently in the stream (or grade),
+        wherever those marks were entered, so the mark scopes are those of the grades
+        the learners' marks carry (normally just this grade, any stream or none). A
+        mark added under another grade changes that set, and so the key, by itself.
+
+        Returns:
+            Sorted scope names for CacheInvalidationService.versions
+        """
+        learners = Student.stream_id == stream_id if stream_id is not None else Student.grade_id == grade_id
+        mark_grades = db.session.query(Mark.grade_id).join(Student, Mark.student_id == Student.id).filter(
+            learners, Mark.term_id == term_id, Mark.assessment_type_id == assessment_type_id
+        ).distinct().all()
+        scopes = {f"marks:g{grade if grade is not None else NULL_PART}:s{ANY}:t{term_id}:a{assessment_type_id}"
+                  for (grade,) in mark_grades}
+        # Learners joining, leaving or renamed, subjects and components, assignments, branding and settings
+        scopes.update((CacheInvalidationService.student_scope(grade_id), REFERENCE_SCOPE, CONFIG_SCOPE,
+                       CacheInvalidationService.assignment_scope()))
+        return sorted(scopes)
+
+    @staticmethod
+    def data_fingerprint(grade_id: int, term_id: int, assessment_type_id: int,
+                         stream_id: Optional[int] = None, variant: Optional[Dict] = None) -> str:
+        """
+        Fingerprint everything a report for the given scope is rendered from.
+
+        The key combines the request with the versions of the cache scopes the report
+        depends on (see dependency_scopes), which change with every committed edit to
+        those inputs, so a hit costs two small queries however many marks the class has.
+
+        Args:
+            grade_id: Grade of the report
+            term_id: Term of the report
+            assessment_type_id: Assessment type of the report
+            stream_id: Stream of the report, or None for a whole-grade artifact
+            variant: Extra request parameters that change the output (artifact kind,
+                selected subjects, learner, ...)
+
+        Returns:
+            Hex digest identifying the inputs
+        """
+        scopes = ArtifactCache.dependency_scopes(grade_id, term_id, assessment_type_id, stream_id)
+        return hashlib.sha256(json.dumps({
+            'version': ARTIFACT_FORMAT_VERSION,
+            'grade_id': grade_id, 'stream_id': stream_id,
+            'term_id': term_id, 'assessment_type_id': assessment_type_id,
+            'variant': variant or {},
+            'data': CacheInvalidationService.versions(scopes)
+        }, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def _path(key: str, extension: str) -> str:
+        return os.path.join(ArtifactCache.cache_dir(), f"{key}{extension}")
+
+    @staticmethod
+    def get(key: str, extension: str) -> Optional[str]:
+        """
+        Return the path of a cached artifact, or None on a miss.
+
+        A hit refreshes the file's modification time, which is what LRU eviction orders by.
+        """
+        path = ArtifactCache._path(key, extension)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    @staticmethod
+    def put(key: str, extension: str, source_path: str) -> str:
+        """
+        Copy a generated file into the cache and evict old entries if over the size limit.
+
+        Args:
+            key: Fingerprint returned by data_fingerprint
+            extension: File extension including the dot (e.g. '.pdf')
+            source_path: Path of the generated file
+
+        Returns:
+            Path of the cached copy
+        """
+        path = ArtifactCache._path(key, extension)
+        # Write to a temporary name first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        ArtifactCache.evict(keep=path)
+        return path
+
+    @staticmethod
+    def evict(keep: Optional[str] = None) -> int:
+        """
+        Delete least recently used artifacts until the cache fits in ARTIFACT_CACHE_MAX_BYTES.
+
+        Args:
+            keep: Path that must not be evicted (the artifact just stored)
+
+        Returns:
+            Number of files removed
+        """
+        max_bytes = current_app.config.get('ARTIFACT_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+        entries = []
+        total = 0
+        with os.scandir(ArtifactCache.cache_dir()) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not evict cached artifact {path}: {e}")
+        return removed
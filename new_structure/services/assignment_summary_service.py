@@ -0,0 +1,249 @@
+"""
+Assignment Summary Service - one cached read of a teacher's subject assignments.
+
+The teacher portal summary (FlexibleMarksService) and the role-based assignment
+summary (RoleBasedDataService) are both built from the same rows: each
+TeacherSubjectAssignment joined with its teacher, subject, grade and stream names,
+read in one query. The rows are kept per teacher (and for the whole school, for
+headteachers) by every process and reloaded when the teacher's
+'assignments:t<id>' cache scope or the 'reference' scope moves (assignment
+changes, teacher renames, grade/stream/subject changes; see
+cache_invalidation_service.py).
+
+Summaries are rebuilt from the cached rows on every call, so callers may modify
+them. Subject, grade and stream objects in the role-based summary are rows of the
+reference data snapshot (see reference_data_service.py).
+"""
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from ..extensions import db
+from ..models import Teacher, TeacherSubjectAssignment, Subject, Grade, Stream
+from .cache_invalidation_service import CacheInvalidationService, REFERENCE_SCOPE
+from .reference_data_service import ReferenceDataService
+from .role_based_data_service import RoleBasedDataService
+
+AssignmentRow = namedtuple('AssignmentRow', [
+    'id', 'teacher_id', 'teacher_username', 'teacher_first_name', 'teacher_last_name',
+    'subject_id', 'subject_name', 'subject_is_composite', 'grade_id', 'grade_name',
+    'grade_education_level', 'stream_id', 'stream_name', 'is_class_teacher'
+])
+
+
+def _teacher_full_name(row: AssignmentRow) -> Optional[str]:
+    """Teacher.full_name for a row: first and last name, or the username."""
+    if row.teacher_first_name and row.teacher_last_name:
+        return f"{row.teacher_first_name} {row.teacher_last_name}"
+    return row.teacher_first_name or row.teacher_last_name or row.teacher_username
+
+
+class AssignmentSummaryService:
+    """Builds teacher assignment summaries from one cached, joined assignment query."""
+
+    _rows: Dict[tuple, tuple] = {}  # (database URL, teacher_id or '*') -> (versions, rows)
+    _lock = threading.Lock()
+
+    @classmethod
+    def assignment_rows(cls, teacher_id: Optional[int] = None) -> Tuple[AssignmentRow, ...]:
+        """
+        Get the assignment rows of a teacher, or of every teacher.
+
+        Args:
+            teacher_id: ID of the teacher, or None for all assignments in the school
+
+        Returns:
+            Tuple of AssignmentRow ordered by assignment id
+        """
+        versions = (
+            CacheInvalidationService.scope_version(CacheInvalidationService.assignment_scope(teacher_id)),
+            CacheInvalidationService.scope_version(REFERENCE_SCOPE),
+        )
+        key = (str(db.engine.url), '*' if teacher_id is None else teacher_id)
+        cached = cls._rows.get(key)
+        if cached is not None and None not in versions and cached[0] == versions:
+            return cached[1]
+
+        rows = cls._load(teacher_id)
+        if None not in versions:
+            with cls._lock:
+                cls._rows[key] = (versions, rows)
+        return rows
+
+    @staticmethod
+    def _load(teacher_id: Optional[int]) -> Tuple[AssignmentRow, ...]:
+        query = db.session.query(
+            TeacherSubjectAssignment.id, TeacherSubjectAssignment.teacher_id,
+            Teacher.username, Teacher.first_name, Teacher.last_name,
+            TeacherSubjectAssignment.subject_id, Subject.name, Subject.is_composite,
+            TeacherSubjectAssignment.grade_id, Grade.name, Grade.education_level,
+            TeacherSubjectAssignment.stream_id, Stream.name, TeacherSubjectAssignment.is_class_teacher
+        ).outerjoin(Teacher, Teacher.id == TeacherSubjectAssignment.teacher_id) \
+            .outerjoin(Subject, Subject.id == TeacherSubjectAssignment.subject_id) \
+            .outerjoin(Grade, Grade.id == TeacherSubjectAssignment.grade_id) \
+            .outerjoin(Stream, Stream.id == TeacherSubjectAssignment.stream_id)
+        if teacher_id is not None:
+            query = query.filter(TeacherSubjectAssignment.teacher_id == teacher_id)
+        return tuple(AssignmentRow(*row) for row in query.order_by(TeacherSubjectAssignment.id))
+
+    @classmethod
+    def class_assignments(cls, teacher_id: int) -> List[Dict]:
+        """
+        Get the classes a teacher has subject assignments in, with the subjects taught.
+
+        Args:
+            teacher_id: ID of the teacher
+
+        Returns:
+            List of dictionaries with grade_name, stream_name ('All' for whole grades),
+            education_level, is_class_teacher, subjects, grade_id and stream_id
+        """
+        class_assignments = {}
+        for row in cls.assignment_rows(teacher_id):
+            if row.grade_name is None or row.subject_name is None:
+                continue
+
+            stream_name = row.stream_name if row.stream_name is not None else "All"
+            class_key = f"{row.grade_name}_{stream_name}"
+            if class_key not in class_assignments:
+                class_assignments[class_key] = {
+                    'grade_name': row.grade_name,
+                    'stream_name': stream_name,
+                    'education_level': row.grade_education_level,
+                    'is_class_teacher': row.is_class_teacher,
+                    'subjects': [],
+                    'grade_id': row.grade_id,
+                    'stream_id': row.stream_id if row.stream_name is not None else None
+                }
+
+            class_assignments[class_key]['subjects'].append({
+                'id': row.subject_id,
+                'name': row.subject_name,
+                'is_composite': row.subject_is_composite,
+                'is_class_teacher_assignment': row.is_class_teacher
+            })
+
+            # Update class teacher status if any assignment is class teacher
+            if row.is_class_teacher:
+                class_assignments[class_key]['is_class_teacher'] = True
+
+        return list(class_assignments.values())
+
+    @classmethod
+    def role_summary(cls, teacher_id: int, role: str) -> Dict:
+        """
+        Get a teacher's assignment summary for their role.
+
+        Headteachers get every assignment in the school; class and subject teachers get
+        their own assignments, with class teacher assignments deduplicated by class.
+
+        Args:
+            teacher_id: ID of the teacher
+            role: Role of the teacher ('teacher', 'classteacher', 'headteacher')
+
+        Returns:
+            Dictionary containing assignment summary data (see
+            RoleBasedDataService.get_teacher_assignments_summary)
+        """
+        teacher = db.session.get(Teacher, teacher_id)
+        if not teacher:
+            return {'error': 'Teacher not found'}
+
+        summary = {
+            'teacher': teacher,
+            'role': role,
+            'class_teacher_assignments': [],
+            'subject_assignments': [],
+            'total_classes_managed': 0,
+            'total_subjects_taught': 0,
+            'grades_involved': set(),
+            'streams_involved': set(),
+            'subjects_involved': set()
+        }
+        if role == 'headteacher':
+            summary.update(cls._headteacher_summary())
+        elif role in ('classteacher', 'teacher'):
+            summary.update(cls._teacher_summary(teacher))
+        return summary
+
+    @classmethod
+    def _headteacher_summary(cls) -> Dict:
+        rows = [row for row in cls.assignment_rows() if row.subject_id is not None]
+        teachers = {t.id: t for t in Teacher.query.filter(Teacher.id.in_({row.teacher_id for row in rows}))} \
+            if rows else {}
+        reference = ReferenceDataService.current()
+        subject_assignments = [cls._format(row, teachers.get(row.teacher_id), reference) for row in rows]
+        class_assignments = [data for data in subject_assignments if data['is_class_teacher']]
+        return {
+            'class_teacher_assignments': class_assignments,
+            'subject_assignments': subject_assignments,
+            'total_classes_managed': len(class_assignments),
+            'total_subjects_taught': len(subject_assignments),
+            'can_manage_all': True
+        }
+
+    @classmethod
+    def _teacher_summary(cls, teacher) -> Dict:
+        subject_assignments = []
+        unique_class_assignments = {}
+        grades_involved = set()
+        streams_involved = set()
+        subjects_involved = set()
+
+        reference = ReferenceDataService.current()
+        for row in cls.assignment_rows(teacher.id):
+            if row.subject_id is None:
+                continue
+            assignment_data = cls._format(row, teacher, reference)
+
+            # Track involvement
+            if row.grade_name is not None:
+                grades_involved.add(row.grade_name)
+            if row.stream_name is not None:
+                streams_involved.add(row.stream_name)
+            if row.subject_name is not None:
+                subjects_involved.add(row.subject_name)
+
+            # Separate class teacher assignments (deduplicate by grade+stream)
+            if row.is_class_teacher:
+                class_key = f"{assignment_data['grade_level']}_{assignment_data['stream_name'] or 'None'}"
+                unique_class_assignments.setdefault(class_key, assignment_data)
+
+            # All assignments are subject assignments
+            subject_assignments.append(assignment_data)
+
+        class_assignments = list(unique_class_assignments.values())
+        return {
+            'class_teacher_assignments': class_assignments,
+            'subject_assignments': subject_assignments,
+            'total_classes_managed': len(class_assignments),
+            'total_subjects_taught': len(subject_assignments),
+            'grades_involved': list(grades_involved),
+            'streams_involved': list(streams_involved),
+            'subjects_involved': list(subjects_involved),
+            'can_manage_classes': len(class_assignments) > 0
+        }
+
+    @staticmethod
+    def _format(row: AssignmentRow, teacher, reference) -> Dict:
+        """Format an assignment row like RoleBasedDataService._format_assignment."""
+        grade_name = row.grade_name if row.grade_name is not None else ''
+        return {
+            'id': row.id,
+            'teacher_id': row.teacher_id,
+            'teacher_username': row.teacher_username or 'Unknown',
+            'teacher_full_name': _teacher_full_name(row) or 'Unknown',
+            'subject_id': row.subject_id,
+            'subject_name': row.subject_name if row.subject_name is not None else 'Unknown Subject',
+            'grade_id': row.grade_id,
+            'grade_level': row.grade_name if row.grade_name is not None else 'Unknown Grade',
+            'stream_id': row.stream_id,
+            'stream_name': row.stream_name,
+            'is_class_teacher': row.is_class_teacher,
+            'education_level': RoleBasedDataService._get_education_level(grade_name),
+            # Rows with the model's columns, for template compatibility
+            'subject': reference.subject_by_id.get(row.subject_id),
+            'grade': reference.grade_by_id.get(row.grade_id),
+            'stream': reference.stream_by_id.get(row.stream_id) if row.stream_id else None,
+            'teacher': teacher
+        }
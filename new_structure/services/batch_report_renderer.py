@@ -0,0 +1,175 @@
+"""
+Batch Report Renderer - parallel PDF rendering for report batches.
+
+Rendering a class of individual reports one learner at a time leaves all but one
+core idle. The renderer takes an iterator of render tasks, converts them on a
+ProcessPoolExecutor and writes each finished document straight into the output
+ZIP. Only a bounded window of tasks (a small multiple of the worker count) is in
+flight at any time, so memory depends on the number of workers rather than on
+the size of the class.
+
+Every batch in a process shares one pool, so concurrent report jobs never start
+more render processes than REPORT_RENDER_WORKERS; gunicorn_config divides the
+CPUs between its workers. Jobs run on threads of a multithreaded server, so the
+pool starts its workers with forkserver (or spawn) rather than fork: a forked
+child could inherit locks other threads held at the time and deadlock on them.
+
+Render functions run in worker processes and must be picklable module-level
+functions of the form fn(payload) -> bytes. They must not touch the database.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tasks kept in flight per worker, so a worker never waits for the parent to feed it
+TASKS_PER_WORKER = 2
+
+PDF_PRINT_CSS = """
+<style>
+@page { size: A4; margin: 1cm; }
+body { font-family: Arial, sans-serif; margin: 0; padding: 0; }
+.action-buttons, .print-controls, .delete-btn, .modal { display: none !important; }
+.report-container { max-width: none; margin: 0; padding: 20px; }
+</style>
+"""
+
+PDF_OPTIONS = {
+    'page-size': 'A4',
+    'orientation': 'Portrait',
+    'margin-top': '0.75in',
+    'margin-right': '0.75in',
+    'margin-bottom': '0.75in',
+    'margin-left': '0.75in',
+    'encoding': 'UTF-8',
+    'no-outline': None,
+    'quiet': ''
+}
+
+
+def html_to_pdf(html: str) -> bytes:
+    """Worker render function: convert a rendered report page to PDF bytes with wkhtmltopdf."""
+    import pdfkit
+    return pdfkit.from_string(html.replace('</head>', f'{PDF_PRINT_CSS}</head>'), False, options=PDF_OPTIONS)
+
+
+def _render(render_fn: Callable, arcname: str, payload) -> Tuple[str, bytes]:
+    return arcname, render_fn(payload)
+
+
+class BatchReportRenderer:
+    """Renders many report documents in parallel into a single ZIP archive."""
+
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pool_workers = 0
+    _pool_lock = threading.Lock()
+
+    @staticmethod
+    def default_workers(configured: Optional[int] = None) -> int:
+        """
+        Resolve the worker count.
+
+        Args:
+            configured: Configured worker count; 0 or None means one per CPU
+
+        Returns:
+            Number of worker processes to start (at least 1)
+        """
+        if configured:
+            return max(1, int(configured))
+        return os.cpu_count() or 1
+
+    @classmethod
+    def pool(cls, workers: int) -> ProcessPoolExecutor:
+        """Get (starting on first use) the process-wide render pool."""
+        with cls._pool_lock:
+            if cls._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                cls._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                cls._pool_workers = workers
+            return cls._pool
+
+    @classmethod
+    def shutdown_pool(cls) -> None:
+        """Stop the render pool's workers; the next batch starts a new pool."""
+        with cls._pool_lock:
+            pool, cls._pool = cls._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    @classmethod
+    def _discard_pool(cls, pool: ProcessPoolExecutor) -> None:
+        """Forget a broken pool so the next batch starts a fresh one."""
+        with cls._pool_lock:
+            if cls._pool is pool:
+                cls._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def render_zip(cls, tasks: Iterable[Tuple[str, object]], zip_path: str, render_fn: Callable,
+                   workers: Optional[int] = None, progress: Optional[Callable] = None) -> dict:
+        """
+        Render tasks in worker processes and write each result into a ZIP as it finishes.
+
+        Args:
+            tasks: Iterable of (arcname, payload); consumed lazily as workers free up
+            zip_path: Path of the ZIP file to create
+            render_fn: Picklable function payload -> bytes, run in the workers
+            workers: Size of the process-wide pool when this call starts it (default: one per CPU)
+            progress: Optional callback progress(done) called after each finished task;
+                exceptions it raises (e.g. cancellation) stop the batch
+
+        Returns:
+            Dictionary with rendered, failed and errors (list of (arcname, message))
+        """
+        pool = cls.pool(cls.default_workers(workers))
+        window = cls._pool_workers * TASKS_PER_WORKER
+        task_iter = iter(tasks)
+        rendered = 0
+        errors = []
+
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+            pending = {}
+
+            def fill():
+                while len(pending) < window:
+                    try:
+                        arcname, payload = next(task_iter)
+                    except StopIteration:
+                        return
+                    pending[pool.submit(_render, render_fn, arcname, payload)] = arcname
+
+            try:
+                fill()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        arcname = pending.pop(future)
+                        try:
+                            arcname, data = future.result()
+                            zipf.writestr(arcname, data)
+                            rendered += 1
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            logger.error(f"Error rendering {arcname}: {e}")
+                            errors.append((arcname, str(e)))
+                        if progress:
+                            progress(rendered + len(errors))
+                    fill()
+            except BrokenProcessPool:
+                cls._discard_pool(pool)
+                raise
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        return {'rendered': rendered, 'failed': len(errors), 'errors': errors}
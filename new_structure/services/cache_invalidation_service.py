@@ -0,0 +1,480 @@
+"""
+Cache Invalidation Service - change events that invalidate dependent cache entries.
+
+SQLAlchemy mapper events on Mark, ComponentMark, Student, Subject and the school and
+report configuration models record which scopes a flush touched. The scopes are
+version counters in the cache_scope_version table:
+
+    marks:g<grade>:s<stream>:t<term>:a<assessment>   (each part may be '*')
+    students:g<grade>
+    config
+    reference   (grades, streams, terms, assessment types, subjects, components)
+    permissions:t<teacher>   (function and class teacher permissions)
+    assignments:t<teacher>   (subject assignments and teacher names; t* for all teachers)
+
+A change bumps only its own leaf scope (e.g. marks:g5:s3:t1:a2, with '-' for a NULL
+part). The version of a wildcard scope is derived when it is read, as the sum of the
+versions of the leaf scopes it covers, so a cached value for any filter that includes
+the mark (a stream, a whole grade, all grades of a term, ...) sees a new version while
+concurrent writes in different scopes never lock a shared row. The bump runs in the
+same transaction as the change and fails it if the version cannot be written, and
+cached values embed the versions they were built from in their keys (see
+version_token), so every worker process stops serving dependent entries as soon as
+the change commits. Entries for other scopes are left alone.
+
+Bulk writes that bypass mapper events (bulk_insert_mappings/bulk_update_mappings,
+raw SQL) must call the matching record_*() method; Query.delete()/update() on any
+tracked model are recorded from the rows their WHERE clause selects. Subscribers registered with subscribe() are called with
+the bumped scopes after each commit.
+"""
+import logging
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import case, event, func, inspect, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models import (
+    Mark, Student, Subject, Grade, Stream, Term, AssessmentType, SchoolConfiguration,
+    SchoolSetup, SchoolBranding, SchoolCustomization, ReportConfiguration, ClassReportConfiguration,
+    Teacher, TeacherSubjectAssignment
+)
+from ..models.academic import ComponentMark, SubjectComponent
+from ..models.function_permission import FunctionPermission
+from ..models.permission import ClassTeacherPermission
+from ..models.cache_version import CacheScopeVersion
+
+logger = logging.getLogger(__name__)
+
+ANY = '*'
+NULL_PART = '-'  # A NULL id in a leaf scope
+CONFIG_SCOPE = 'config'
+REFERENCE_SCOPE = 'reference'
+MARK_SCOPE_FIELDS = ('grade_id', 'stream_id', 'term_id', 'assessment_type_id')
+
+# session.info keys
+_PENDING = 'cache_invalidation_pending'  # Scopes to bump at the end of the flush
+_COMPONENT_MARK_IDS = 'cache_invalidation_component_mark_ids'  # Parent marks of changed component marks
+_PUBLISH = 'cache_invalidation_publish'  # Scopes bumped in this transaction, published after commit
+
+
+def _part(value):
+    return ANY if value is None else value
+
+
+def _leaf(value):
+    return NULL_PART if value is None else value
+
+
+class CacheInvalidationService:
+    """Turns data changes into scoped cache version bumps."""
+
+    _subscribers: List[Callable[[Set[str]], None]] = []
+    _registered = False
+    _bulk_rules = None
+
+    @staticmethod
+    def mark_scope(grade_id, stream_id, term_id, assessment_type_id) -> str:
+        """Leaf version key bumped by a change to a mark with the given ids."""
+        return f"marks:g{_leaf(grade_id)}:s{_leaf(stream_id)}:t{_leaf(term_id)}:a{_leaf(assessment_type_id)}"
+
+    @staticmethod
+    def student_scope(grade_id) -> str:
+        """Leaf version key bumped by a change to a learner in the given grade."""
+        return f"students:g{_leaf(grade_id)}"
+
+    @staticmethod
+    def student_scopes(grade_id=None) -> Set[str]:
+        """Version keys that change with the learners of the given grade, and with any learner."""
+        return {f"students:g{_part(grade_id)}", f"students:g{ANY}"}
+
+    @staticmethod
+    def permission_scope(teacher_id) -> str:
+        """Version key bumped by any change to a teacher's permission grants."""
+        return f"permissions:t{teacher_id}"
+
+    @staticmethod
+    def assignment_scope(teacher_id=None) -> str:
+        """Version key of a teacher's (None: any teacher's) subject assignments."""
+        return f"assignments:t{_part(teacher_id)}"
+
+    @staticmethod
+    def dependency_scopes(grade_id=None, stream_id=None, term_id=None, assessment_type_id=None) -> List[str]:
+        """Version keys a cached value built for the given filters (None = all) depends on."""
+        return [
+            f"marks:g{_part(grade_id)}:s{_part(stream_id)}:t{_part(term_id)}:a{_part(assessment_type_id)}",
+            f"students:g{_part(grade_id)}",
+            CONFIG_SCOPE,
+        ]
+
+    @classmethod
+    def version_token(cls, grade_id=None, stream_id=None, term_id=None, assessment_type_id=None) -> str:
+        """
+        Get a token identifying the current data versions for the given filters.
+
+        Within a request the token is remembered until the request itself changes data,
+        so a value computed after a cache miss is stored under the versions that were
+        current when the miss happened.
+
+        Returns:
+            Token to append to cache keys, e.g. 'v3.1.0'
+        """
+        scopes = cls.dependency_scopes(grade_id, stream_id, term_id, assessment_type_id)
+        memo = g.setdefault('_cache_version_tokens', {}) if has_request_context() else {}
+        key = tuple(scopes)
+        if key in memo:
+            return memo[key]
+        try:
+            versions = cls.versions(scopes)
+        except SQLAlchemyError as e:
+            # Without the version table nothing can be trusted: use a token that never hits
+            logger.error(f"Could not read cache versions: {e}")
+            return f"x{uuid.uuid4().hex}"
+        token = 'v' + '.'.join(str(versions[scope]) for scope in scopes)
+        memo[key] = token
+        return token
+
+    @classmethod
+    def scope_version(cls, scope: str) -> Optional[int]:
+        """
+        Get the current version of a single scope (read once per request).
+
+        Returns:
+            Version number (0 if never bumped), or None if it could not be read
+        """
+        memo = g.setdefault('_cache_version_tokens', {}) if has_request_context() else {}
+        if scope in memo:
+            return memo[scope]
+        try:
+            version = cls.versions([scope])[scope]
+        except SQLAlchemyError as e:
+            logger.error(f"Could not read cache version of {scope}: {e}")
+            return None
+        memo[scope] = version
+        return version
+
+    @staticmethod
+    def versions(scopes: Iterable[str], session=None) -> Dict[str, int]:
+        """
+        Read the current versions of scopes in one query.
+
+        A wildcard scope (e.g. marks:g5:s*:t*:a*) is the sum of the versions of the
+        leaf scopes it covers; leaf versions only grow, so the sum changes whenever
+        any of them is bumped.
+
+        Args:
+            scopes: Scopes to read
+            session: Session to read in (defaults to db.session)
+
+        Returns:
+            Dictionary of scope -> version (0 if never bumped)
+        """
+        scopes = list(dict.fromkeys(scopes))
+        if not scopes:
+            return {}
+        column = CacheScopeVersion.__table__.c
+        conditions = [column.scope.like(scope.replace(ANY, '%')) if ANY in scope else column.scope == scope
+                      for scope in scopes]
+        row = (session or db.session).execute(
+            select(*(func.coalesce(func.sum(case((condition, column.version), else_=0)), 0)
+                     for condition in conditions)).where(or_(*conditions))
+        ).one()
+        return {scope: int(version) for scope, version in zip(scopes, row)}
+
+    @classmethod
+    def subscribe(cls, callback: Callable[[Set[str]], None]) -> None:
+        """Call callback(scopes) after every commit that bumped cache scopes."""
+        cls._subscribers.append(callback)
+
+    @staticmethod
+    def transaction_scopes(session) -> Set[str]:
+        """Scopes bumped so far in the session's current transaction (published after it commits)."""
+        return set(session.info.get(_PUBLISH, ()))
+
+    @classmethod
+    def record_marks(cls, session, scopes: Iterable[tuple]) -> None:
+        """
+        Record mark changes made without mapper events (bulk operations).
+
+        Args:
+            session: Session whose transaction made the change
+            scopes: (grade_id, stream_id, term_id, assessment_type_id) tuples
+        """
+        cls._bump(session, {cls.mark_scope(*scope) for scope in scopes})
+
+    @classmethod
+    def record_students(cls, session, grade_ids: Iterable[Optional[int]]) -> None:
+        """Record learner changes made without mapper events (bulk or raw SQL)."""
+        cls._bump(session, {cls.student_scope(grade_id) for grade_id in grade_ids})
+
+    @classmethod
+    def record_assignments(cls, session, teacher_ids: Iterable[Optional[int]]) -> None:
+        """Record subject assignment changes made without mapper events (bulk or raw SQL)."""
+        cls._bump(session, {f"assignments:t{_leaf(teacher_id)}" for teacher_id in teacher_ids})
+
+    @classmethod
+    def record_permissions(cls, session, teacher_ids: Iterable[int]) -> None:
+        """Record permission grant changes made without mapper events (bulk or raw SQL)."""
+        cls._bump(session, {cls.permission_scope(teacher_id) for teacher_id in teacher_ids})
+
+    @classmethod
+    def record_reference(cls, session) -> None:
+        """Record reference data changes (e.g. subjects) made without mapper events."""
+        cls._bump(session, {REFERENCE_SCOPE, CONFIG_SCOPE})
+
+    @classmethod
+    def _bump(cls, session, scopes: Set[str]) -> None:
+        """
+        Increment the version of each scope inside the session's transaction.
+
+        Errors are not caught: a change whose dependent caches cannot be invalidated
+        must not commit, or they would keep serving the old data until they expire.
+        """
+        if not scopes:
+            return
+        connection = session.connection()
+        table = CacheScopeVersion.__table__
+        # Sorted so concurrent transactions lock version rows in the same order
+        rows = [{'scope': scope, 'version': 1} for scope in sorted(scopes)]
+        dialect = connection.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(rows)
+            connection.execute(stmt.on_duplicate_key_update(version=table.c.version + 1))
+        elif dialect in ('sqlite', 'postgresql'):
+            from importlib import import_module
+            insert = import_module(f'sqlalchemy.dialects.{dialect}').insert
+            stmt = insert(table).values(rows)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=['scope'], set_={'version': table.c.version + 1}
+            ))
+        else:
+            connection.execute(table.update().where(table.c.scope.in_(scopes))
+                               .values(version=table.c.version + 1))
+            existing = {row[0] for row in connection.execute(
+                select(table.c.scope).where(table.c.scope.in_(scopes)))}
+            missing = [row for row in rows if row['scope'] not in existing]
+            if missing:
+                connection.execute(table.insert(), missing)
+
+        session.info.setdefault(_PUBLISH, set()).update(scopes)
+        if has_app_context():
+            g.pop('_cache_version_tokens', None)
+
+    # ------------------------------------------------------------- event hooks
+
+    @staticmethod
+    def _pending(target) -> Optional[Set[str]]:
+        session = object_session(target)
+        if session is None:
+            return None
+        return session.info.setdefault(_PENDING, set())
+
+    @staticmethod
+    def _previous_values(target, fields):
+        """Current values of fields, replaced by their pre-flush values where they changed."""
+        state = inspect(target)
+        values = []
+        changed = False
+        for field in fields:
+            history = state.attrs[field].history
+            if history.deleted:
+                values.append(history.deleted[0])
+                changed = True
+            else:
+                values.append(getattr(target, field))
+        return values if changed else None
+
+    @classmethod
+    def _on_mark_change(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is None:
+            return
+        pending.add(cls.mark_scope(*(getattr(target, field) for field in MARK_SCOPE_FIELDS)))
+        previous = cls._previous_values(target, MARK_SCOPE_FIELDS)
+        if previous:
+            pending.add(cls.mark_scope(*previous))
+
+    @classmethod
+    def _on_component_mark_change(cls, mapper, connection, target):
+        session = object_session(target)
+        if session is not None and target.mark_id is not None:
+            session.info.setdefault(_COMPONENT_MARK_IDS, set()).add(target.mark_id)
+
+    @classmethod
+    def _on_student_change(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is None:
+            return
+        pending.add(cls.student_scope(target.grade_id))
+        previous = cls._previous_values(target, ('grade_id',))
+        if previous:
+            pending.add(cls.student_scope(previous[0]))
+
+    @classmethod
+    def _on_config_change(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is not None:
+            pending.add(CONFIG_SCOPE)
+
+    @classmethod
+    def _on_permission_change(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is None:
+            return
+        pending.add(cls.permission_scope(target.teacher_id))
+        previous = cls._previous_values(target, ('teacher_id',))
+        if previous:
+            pending.add(cls.permission_scope(previous[0]))
+
+    @classmethod
+    def _on_assignment_change(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is None:
+            return
+        pending.add(f"assignments:t{_leaf(target.teacher_id)}")
+        previous = cls._previous_values(target, ('teacher_id',))
+        if previous:
+            pending.add(f"assignments:t{_leaf(previous[0])}")
+
+    @classmethod
+    def _on_teacher_rename(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is not None and cls._previous_values(target, ('username', 'first_name', 'last_name')):
+            pending.add(cls.assignment_scope(target.id))
+
+    @classmethod
+    def _on_reference_change(cls, mapper, connection, target):
+        pending = cls._pending(target)
+        if pending is not None:
+            pending.update((REFERENCE_SCOPE, CONFIG_SCOPE))
+
+    @classmethod
+    def _bulk_scope_rules(cls):
+        """Per model: (columns the scopes depend on, columns -> scopes) for bulk DELETE/UPDATE."""
+        if cls._bulk_rules is not None:
+            return cls._bulk_rules
+        reference = lambda *_: (REFERENCE_SCOPE, CONFIG_SCOPE)
+        config = lambda *_: (CONFIG_SCOPE,)
+        rules = {
+            Mark: ([getattr(Mark, field) for field in MARK_SCOPE_FIELDS], lambda *row: (cls.mark_scope(*row),)),
+            Student: ([Student.grade_id], lambda grade_id: (cls.student_scope(grade_id),)),
+            TeacherSubjectAssignment: ([TeacherSubjectAssignment.teacher_id],
+                                       lambda teacher_id: (f"assignments:t{_leaf(teacher_id)}",)),
+            FunctionPermission: ([FunctionPermission.teacher_id],
+                                 lambda teacher_id: (cls.permission_scope(teacher_id),)),
+            ClassTeacherPermission: ([ClassTeacherPermission.teacher_id],
+                                     lambda teacher_id: (cls.permission_scope(teacher_id),)),
+        }
+        rules.update({model: ([], reference) for model in (
+            Grade, Stream, Term, AssessmentType, Subject, SubjectComponent)})
+        rules.update({model: ([], config) for model in (
+            SchoolConfiguration, SchoolSetup, SchoolBranding, SchoolCustomization, ReportConfiguration,
+            ClassReportConfiguration)})
+        cls._bulk_rules = rules
+        return rules
+
+    @classmethod
+    def _on_orm_execute(cls, orm_execute_state):
+        """
+        Record the scopes of the rows a bulk DELETE or UPDATE (Query.delete()/update()) changes.
+
+        The rows are selected before the statement runs; for an UPDATE they are selected
+        again by primary key afterwards, since it may move them to another scope.
+        """
+        if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None or isinstance(orm_execute_state.parameters, list):
+            return  # Bulk updates by primary key call record_*() themselves
+        rule = cls._bulk_scope_rules().get(mapper.class_)
+        if rule is None:
+            return
+        columns, to_scopes = rule
+        session = orm_execute_state.session
+        if not columns:
+            cls._bump(session, set(to_scopes()))
+            return
+
+        primary_key = mapper.primary_key[0]
+        query = select(primary_key, *columns)
+        whereclause = orm_execute_state.statement.whereclause
+        if whereclause is not None:
+            query = query.where(whereclause)
+        rows = session.execute(query).all()
+        if not rows:
+            return
+        scopes = {scope for row in rows for scope in to_scopes(*row[1:])}
+        if orm_execute_state.is_delete:
+            cls._bump(session, scopes)
+            return
+
+        result = orm_execute_state.invoke_statement()
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), 500):
+            scopes.update(scope for row in session.execute(
+                select(*columns).where(primary_key.in_(ids[start:start + 500]))
+            ) for scope in to_scopes(*row))
+        cls._bump(session, scopes)
+        return result
+
+    @classmethod
+    def _after_flush(cls, session, flush_context):
+        pending = session.info.pop(_PENDING, set())
+        mark_ids = session.info.pop(_COMPONENT_MARK_IDS, set())
+        if mark_ids:
+            rows = session.connection().execute(
+                select(*(getattr(Mark, field) for field in MARK_SCOPE_FIELDS)).where(Mark.id.in_(mark_ids))
+            )
+            pending.update(cls.mark_scope(*row) for row in rows)
+        cls._bump(session, pending)
+
+    @classmethod
+    def _after_commit(cls, session):
+        scopes = session.info.pop(_PUBLISH, None)
+        if not scopes:
+            return
+        for callback in cls._subscribers:
+            try:
+                callback(scopes)
+            except Exception as e:
+                logger.error(f"Cache invalidation subscriber {callback!r} failed: {e}")
+
+    @classmethod
+    def _after_rollback(cls, session):
+        for key in (_PENDING, _COMPONENT_MARK_IDS, _PUBLISH):
+            session.info.pop(key, None)
+
+    @classmethod
+    def register(cls) -> None:
+        """Install the mapper and session event listeners (idempotent)."""
+        if cls._registered:
+            return
+        hooks = [
+            (Mark, cls._on_mark_change),
+            (ComponentMark, cls._on_component_mark_change),
+            (Student, cls._on_student_change),
+            (FunctionPermission, cls._on_permission_change),
+            (ClassTeacherPermission, cls._on_permission_change),
+            (TeacherSubjectAssignment, cls._on_assignment_change),
+        ] + [(model, cls._on_reference_change) for model in (
+            Grade, Stream, Term, AssessmentType, Subject, SubjectComponent
+        )] + [(model, cls._on_config_change) for model in (
+            SchoolConfiguration, SchoolSetup, SchoolBranding, SchoolCustomization, ReportConfiguration,
+            ClassReportConfiguration
+        )]
+        for model, handler in hooks:
+            for name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(model, name, handler)
+        event.listen(Teacher, 'after_update', cls._on_teacher_rename)
+        event.listen(Session, 'do_orm_execute', cls._on_orm_execute)
+        event.listen(Session, 'after_flush', cls._after_flush)
+        event.listen(Session, 'after_commit', cls._after_commit)
+        event.listen(Session, 'after_rollback', cls._after_rollback)
+        cls._registered = True
+
+
+CacheInvalidationService.register()
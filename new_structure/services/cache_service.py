@@ -1,31 +1,96 @@
 """
 Cache service for storing and retrieving cached data.
 This module provides functions for caching reports, marksheets, and other data.
+Generated PDF and Excel files are cached by services/artifact_cache.py.
+
+Each kind of data lives in its own TieredCache (utils/tiered_cache.py): a bounded
+in-process LRU, then Redis when CACHE_TYPE is 'redis', then files under cache/.
+
+Keys carry the data versions of their scope (services/cache_invalidation_service.py),
+so saving marks, learners, subjects or school settings invalidates exactly the
+dependent entries. Expiry only bounds how long unused entries are kept; superseded
+disk files are swept once expired or when a namespace exceeds CACHE_DISK_MAX_BYTES.
 """
 import os
-import json
-import time
 import hashlib
-from flask import current_app
-import pickle
+import logging
+import threading
+from flask import current_app, has_app_context
+
+from ..utils.tiered_cache import TieredCache, JSONSerializer, PickleSerializer
+from .cache_invalidation_service import CacheInvalidationService
+from .reference_data_service import ReferenceDataService
+
+logger = logging.getLogger(__name__)
 
 # Cache directory
 CACHE_DIR = 'cache'
 REPORT_CACHE_DIR = os.path.join(CACHE_DIR, 'reports')
 MARKSHEET_CACHE_DIR = os.path.join(CACHE_DIR, 'marksheets')
-PDF_CACHE_DIR = os.path.join(CACHE_DIR, 'pdfs')
 ANALYTICS_CACHE_DIR = os.path.join(CACHE_DIR, 'analytics')
 
-# In-memory cache for frequently accessed data
-_memory_cache = {}
+# Default expiry in seconds. Changes to the underlying data invalidate entries
+# through their version token, so these only bound the lifetime of unused entries.
+REPORT_CACHE_TTL = 24 * 3600
+MARKSHEET_CACHE_TTL = 24 * 3600
+ANALYTICS_CACHE_TTL = 12 * 3600
+
+# Namespace -> (disk directory, serializer, default expiry in seconds)
+_NAMESPACES = {
+    'marksheets': (MARKSHEET_CACHE_DIR, JSONSerializer, MARKSHEET_CACHE_TTL),
+    'reports': (REPORT_CACHE_DIR, PickleSerializer, REPORT_CACHE_TTL),
+    'analytics': (ANALYTICS_CACHE_DIR, PickleSerializer, ANALYTICS_CACHE_TTL),
+}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _get_redis_manager(config):
+    """Create the CacheManager for the Redis tier, or None when Redis is not configured."""
+    if config.get('CACHE_TYPE') != 'redis':
+        return None
+    try:
+        from ..utils.cache_manager import CacheManager
+    except ImportError:
+        logger.warning("redis package not installed; tiered cache runs without the Redis tier")
+        return None
+    return CacheManager(
+        host=config.get('REDIS_HOST', 'localhost'),
+        port=config.get('REDIS_PORT', 6379),
+        db=config.get('REDIS_DB', 0),
+        password=config.get('REDIS_PASSWORD')
+    )
+
+
+def _get_cache(namespace):
+    """Get (creating on first use) the tiered cache for a namespace."""
+    cache = _caches.get(namespace)
+    if cache is not None:
+        return cache
+    with _caches_lock:
+        if namespace not in _caches:
+            config = current_app.config if has_app_context() else {}
+            redis_manager = _caches.get('_redis')
+            if '_redis' not in _caches:
+                redis_manager = _caches['_redis'] = _get_redis_manager(config)
+            disk_dir, serializer, default_ttl = _NAMESPACES[namespace]
+            _caches[namespace] = TieredCache(
+                namespace,
+                serializer=serializer,
+                max_bytes=config.get('CACHE_MEMORY_MAX_BYTES', 32 * 1024 * 1024),
+                default_ttl=default_ttl,
+                disk_dir=disk_dir,
+                redis_manager=redis_manager,
+                disk_max_bytes=config.get('CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024)
+            )
+        return _caches[namespace]
+
+
+def cache_stats():
+    """Hit, miss and eviction counters for every cache namespace."""
+    return {namespace: _get_cache(namespace).stats() for namespace in _NAMESPACES}
 
-def _ensure_cache_dirs():
-    """Ensure all cache directories exist."""
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
-    os.makedirs(MARKSHEET_CACHE_DIR, exist_ok=True)
-    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
-    os.makedirs(ANALYTICS_CACHE_DIR, exist_ok=True)
 
 def _generate_cache_key(*args, **kwargs):
     """Generate a unique cache key based on arguments."""
@@ -33,289 +98,134 @@ def _generate_cache_key(*args, **kwargs):
     key_parts = [str(arg) for arg in args]
     key_parts.extend([f"{k}={v}" for k, v in sorted(kwargs.items())])
     key_string = "_".join(key_parts)
-    
+
     # Create a hash of the key string to ensure it's a valid filename
     return hashlib.md5(key_string.encode()).hexdigest()
 
-def cache_marksheet(grade, stream, term, assessment_type, marksheet_data, expiry=3600):
+
+def _scope_ids(grade, stream, term, assessment_type):
+    """
+    Resolve report names to ids from the reference data snapshot.
+
+    Args:
+        grade: Grade name
+        stream: Stream name ('Stream A' or 'A'), or 'all' for the whole grade
+        term: Term name
+        assessment_type: Assessment type name
+
+    Returns:
+        Dict of grade_id, stream_id, term_id and assessment_type_id; names that do not
+        resolve (and stream 'all') map to None, which covers every value
+    """
+    reference = ReferenceDataService.current()
+    grade_row = reference.grade_by_name.get(grade)
+    stream_row = reference.stream(grade, stream) if stream != 'all' else None
+    term_row = reference.term_by_name.get(term)
+    assessment_row = reference.assessment_type_by_name.get(assessment_type)
+    return dict(
+        grade_id=grade_row.id if grade_row else None,
+        stream_id=stream_row.id if stream_row else None,
+        term_id=term_row.id if term_row else None,
+        assessment_type_id=assessment_row.id if assessment_row else None
+    )
+
+
+def _versioned_key(grade, stream, term, assessment_type):
+    """Cache key for a report or marksheet, including its current data versions."""
+    token = CacheInvalidationService.version_token(**_scope_ids(grade, stream, term, assessment_type))
+    return f"{_generate_cache_key(grade, stream, term, assessment_type)}_{token}"
+
+
+def cache_marksheet(grade, stream, term, assessment_type, marksheet_data, expiry=MARKSHEET_CACHE_TTL):
     """
     Cache marksheet data.
-    
+
     Args:
         grade: Grade level
         stream: Stream name
         term: Term name
         assessment_type: Assessment type name
         marksheet_data: The marksheet data to cache
-        expiry: Cache expiry time in seconds (default: 1 hour)
+        expiry: Cache expiry time in seconds (default: 24 hours)
     """
-    _ensure_cache_dirs()
-    
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type)
-    
-    # Store in memory cache
-    _memory_cache[cache_key] = {
-        'data': marksheet_data,
-        'timestamp': time.time(),
-        'expiry': expiry
-    }
-    
-    # Store in file cache
-    cache_file = os.path.join(MARKSHEET_CACHE_DIR, f"{cache_key}.json")
-    with open(cache_file, 'w') as f:
-        json.dump({
-            'data': marksheet_data,
-            'timestamp': time.time(),
-            'expiry': expiry
-        }, f)
+    cache_key = _versioned_key(grade, stream, term, assessment_type)
+    _get_cache('marksheets').set(cache_key, marksheet_data, expiry)
 
 def get_cached_marksheet(grade, stream, term, assessment_type):
     """
     Get cached marksheet data if available and not expired.
-    
+
     Args:
         grade: Grade level
         stream: Stream name
         term: Term name
         assessment_type: Assessment type name
-        
+
     Returns:
         The cached marksheet data if available and not expired, None otherwise.
     """
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type)
-    
-    # Check memory cache first
-    if cache_key in _memory_cache:
-        cache_entry = _memory_cache[cache_key]
-        if time.time() - cache_entry['timestamp'] < cache_entry['expiry']:
-            return cache_entry['data']
-    
-    # Check file cache
-    cache_file = os.path.join(MARKSHEET_CACHE_DIR, f"{cache_key}.json")
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r') as f:
-            try:
-                cache_entry = json.load(f)
-                if time.time() - cache_entry['timestamp'] < cache_entry['expiry']:
-                    # Update memory cache
-                    _memory_cache[cache_key] = cache_entry
-                    return cache_entry['data']
-            except (json.JSONDecodeError, KeyError):
-                # Invalid cache file, ignore
-                pass
-    
-    return None
-
-def cache_report(grade, stream, term, assessment_type, report_data, expiry=3600):
+    cache_key = _versioned_key(grade, stream, term, assessment_type)
+    return _get_cache('marksheets').get(cache_key)
+
+def cache_report(grade, stream, term, assessment_type, report_data, expiry=REPORT_CACHE_TTL):
     """
     Cache report data.
-    
+
     Args:
         grade: Grade level
         stream: Stream name
         term: Term name
         assessment_type: Assessment type name
         report_data: The report data to cache
-        expiry: Cache expiry time in seconds (default: 1 hour)
+        expiry: Cache expiry time in seconds (default: 24 hours)
     """
-    _ensure_cache_dirs()
-    
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type)
-    
-    # Store in memory cache
-    _memory_cache[f"report_{cache_key}"] = {
-        'data': report_data,
-        'timestamp': time.time(),
-        'expiry': expiry
-    }
-    
-    # Store in file cache
-    cache_file = os.path.join(REPORT_CACHE_DIR, f"{cache_key}.pickle")
-    with open(cache_file, 'wb') as f:
-        pickle.dump({
-            'data': report_data,
-            'timestamp': time.time(),
-            'expiry': expiry
-        }, f)
+    cache_key = _versioned_key(grade, stream, term, assessment_type)
+    _get_cache('reports').set(cache_key, report_data, expiry)
 
 def get_cached_report(grade, stream, term, assessment_type):
     """
     Get cached report data if available and not expired.
-    
+
     Args:
         grade: Grade level
         stream: Stream name
         term: Term name
         assessment_type: Assessment type name
-        
+
     Returns:
         The cached report data if available and not expired, None otherwise.
     """
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type)
-    memory_key = f"report_{cache_key}"
-    
-    # Check memory cache first
-    if memory_key in _memory_cache:
-        cache_entry = _memory_cache[memory_key]
-        if time.time() - cache_entry['timestamp'] < cache_entry['expiry']:
-            return cache_entry['data']
-    
-    # Check file cache
-    cache_file = os.path.join(REPORT_CACHE_DIR, f"{cache_key}.pickle")
-    if os.path.exists(cache_file):
-        with open(cache_file, 'rb') as f:
-            try:
-                cache_entry = pickle.load(f)
-                if time.time() - cache_entry['timestamp'] < cache_entry['expiry']:
-                    # Update memory cache
-                    _memory_cache[memory_key] = cache_entry
-                    return cache_entry['data']
-            except (pickle.PickleError, KeyError):
-                # Invalid cache file, ignore
-                pass
-    
-    return None
-
-def cache_pdf(grade, stream, term, assessment_type, pdf_type, pdf_data, expiry=86400):
-    """
-    Cache PDF data.
-    
-    Args:
-        grade: Grade level
-        stream: Stream name
-        term: Term name
-        assessment_type: Assessment type name
-        pdf_type: Type of PDF (e.g., 'marksheet', 'report')
-        pdf_data: The PDF data to cache
-        expiry: Cache expiry time in seconds (default: 24 hours)
-    """
-    _ensure_cache_dirs()
-    
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type, pdf_type)
-    
-    # Store in file cache
-    cache_file = os.path.join(PDF_CACHE_DIR, f"{cache_key}.pdf")
-    with open(cache_file, 'wb') as f:
-        f.write(pdf_data)
-    
-    # Store metadata
-    meta_file = os.path.join(PDF_CACHE_DIR, f"{cache_key}.meta")
-    with open(meta_file, 'w') as f:
-        json.dump({
-            'timestamp': time.time(),
-            'expiry': expiry
-        }, f)
-    
-    return cache_file
-
-def get_cached_pdf(grade, stream, term, assessment_type, pdf_type):
-    """
-    Get cached PDF file path if available and not expired.
-    
-    Args:
-        grade: Grade level
-        stream: Stream name
-        term: Term name
-        assessment_type: Assessment type name
-        pdf_type: Type of PDF (e.g., 'marksheet', 'report')
-        
-    Returns:
-        The path to the cached PDF file if available and not expired, None otherwise.
-    """
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type, pdf_type)
-    
-    # Check file cache
-    cache_file = os.path.join(PDF_CACHE_DIR, f"{cache_key}.pdf")
-    meta_file = os.path.join(PDF_CACHE_DIR, f"{cache_key}.meta")
-    
-    if os.path.exists(cache_file) and os.path.exists(meta_file):
-        with open(meta_file, 'r') as f:
-            try:
-                meta = json.load(f)
-                if time.time() - meta['timestamp'] < meta['expiry']:
-                    return cache_file
-            except (json.JSONDecodeError, KeyError):
-                # Invalid meta file, ignore
-                pass
-    
-    return None
+    cache_key = _versioned_key(grade, stream, term, assessment_type)
+    return _get_cache('reports').get(cache_key)
 
 def invalidate_cache(grade, stream, term, assessment_type):
     """
     Invalidate all caches for a specific grade, stream, term, and assessment type.
-    
+
+    Saved changes already invalidate dependent entries; this drops the current
+    entries explicitly.
+
     Args:
         grade: Grade level
         stream: Stream name
         term: Term name
         assessment_type: Assessment type name
     """
-    # Generate cache key
-    cache_key = _generate_cache_key(grade, stream, term, assessment_type)
-    
-    # Clear memory cache
-    memory_keys = [cache_key, f"report_{cache_key}"]
-    for key in memory_keys:
-        if key in _memory_cache:
-            del _memory_cache[key]
-    
-    # Clear file caches
-    cache_files = [
-        os.path.join(MARKSHEET_CACHE_DIR, f"{cache_key}.json"),
-        os.path.join(REPORT_CACHE_DIR, f"{cache_key}.pickle")
-    ]
-    
-    # Clear PDF caches
-    pdf_types = ['marksheet', 'report']
-    for pdf_type in pdf_types:
-        pdf_key = _generate_cache_key(grade, stream, term, assessment_type, pdf_type)
-        cache_files.extend([
-            os.path.join(PDF_CACHE_DIR, f"{pdf_key}.pdf"),
-            os.path.join(PDF_CACHE_DIR, f"{pdf_key}.meta")
-        ])
-    
-    # Delete all cache files
-    for file_path in cache_files:
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                # Ignore errors when deleting cache files
-                pass
-
-
-def cache_analytics(cache_key, analytics_data, expiry=1800):
+    cache_key = _versioned_key(grade, stream, term, assessment_type)
+    _get_cache('marksheets').delete(cache_key)
+    _get_cache('reports').delete(cache_key)
+
+
+def cache_analytics(cache_key, analytics_data, expiry=ANALYTICS_CACHE_TTL):
     """
     Cache analytics data.
 
     Args:
         cache_key: Unique cache key for the analytics data
         analytics_data: The analytics data to cache
-        expiry: Cache expiry time in seconds (default: 30 minutes)
+        expiry: Cache expiry time in seconds (default: 12 hours)
     """
-    _ensure_cache_dirs()
-
-    # Store in memory cache
-    _memory_cache[f"analytics_{cache_key}"] = {
-        'data': analytics_data,
-        'timestamp': time.time(),
-        'expiry': expiry
-    }
-
-    # Store in file cache
-    cache_file = os.path.join(ANALYTICS_CACHE_DIR, f"{cache_key}.pickle")
-    with open(cache_file, 'wb') as f:
-        pickle.dump({
-            'data': analytics_data,
-            'timestamp': time.time(),
-            'expiry': expiry
-        }, f)
+    _get_cache('analytics').set(cache_key, analytics_data, expiry)
 
 
 def get_cached_analytics(cache_key):
@@ -328,61 +238,47 @@ def get_cached_analytics(cache_key):
     Returns:
         The cached analytics data if available and not expired, None otherwise.
     """
-    memory_key = f"analytics_{cache_key}"
-
-    # Check memory cache first
-    if memory_key in _memory_cache:
-        cache_entry = _memory_cache[memory_key]
-        if time.time() - cache_entry['timestamp'] < cache_entry['expiry']:
-            return cache_entry['data']
-
-    # Check file cache
-    cache_file = os.path.join(ANALYTICS_CACHE_DIR, f"{cache_key}.pickle")
-    if os.path.exists(cache_file):
-        with open(cache_file, 'rb') as f:
-            try:
-                cache_entry = pickle.load(f)
-                if time.time() - cache_entry['timestamp'] < cache_entry['expiry']:
-                    # Update memory cache
-                    _memory_cache[memory_key] = cache_entry
-                    return cache_entry['data']
-            except (pickle.PickleError, KeyError):
-                # Invalid cache file, ignore
-                pass
-
-    return None
-
-
-def invalidate_analytics_cache(cache_key=None):
+    return _get_cache('analytics').get(cache_key)
+
+
+def _versioned_analytics_key(cache_key, scope):
+    """Analytics cache key for cache_key with the current data version of scope."""
+    return f"{cache_key}_{CacheInvalidationService.version_token(**(scope or {}))}"
+
+
+def get_or_compute_analytics(cache_key, compute, expiry=ANALYTICS_CACHE_TTL, scope=None):
+    """
+    Get cached analytics data, computing it once on a miss.
+
+    Concurrent requests for the same key share a single computation. Results
+    carrying an 'error' are returned but not cached.
+
+    Args:
+        cache_key: Unique cache key for the analytics data
+        compute: Function that computes the analytics data
+        expiry: Cache expiry time in seconds (default: 12 hours)
+        scope: Dict of grade_id, stream_id, term_id and assessment_type_id the data
+            is filtered by (missing or None = all); changes in that scope invalidate it
+
+    Returns:
+        The cached or freshly computed analytics data.
+    """
+    cache_key = _versioned_analytics_key(cache_key, scope)
+    return _get_cache('analytics').get_or_compute(
+        cache_key, compute, expiry,
+        should_cache=lambda result: not (isinstance(result, dict) and result.get('error'))
+    )
+
+
+def invalidate_analytics_cache(cache_key=None, scope=None):
     """
     Invalidate analytics cache.
 
     Args:
         cache_key: Specific cache key to invalidate (None to clear all analytics cache)
+        scope: The scope the entry was cached with by get_or_compute_analytics
     """
     if cache_key:
-        # Clear specific cache entry
-        memory_key = f"analytics_{cache_key}"
-        if memory_key in _memory_cache:
-            del _memory_cache[memory_key]
-
-        cache_file = os.path.join(ANALYTICS_CACHE_DIR, f"{cache_key}.pickle")
-        if os.path.exists(cache_file):
-            try:
-                os.remove(cache_file)
-            except OSError:
-                pass
+        _get_cache('analytics').delete(_versioned_analytics_key(cache_key, scope))
     else:
-        # Clear all analytics cache
-        analytics_keys = [key for key in _memory_cache.keys() if key.startswith('analytics_')]
-        for key in analytics_keys:
-            del _memory_cache[key]
-
-        # Clear all analytics cache files
-        if os.path.exists(ANALYTICS_CACHE_DIR):
-            for filename in os.listdir(ANALYTICS_CACHE_DIR):
-                if filename.endswith('.pickle'):
-                    try:
-                        os.remove(os.path.join(ANALYTICS_CACHE_DIR, filename))
-                    except OSError:
-                        pass
+        _get_cache('analytics').clear()
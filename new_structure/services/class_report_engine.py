@@ -0,0 +1,222 @@
+"""
+Class Report Engine - Set-based loading of class report data.
+
+Loads every mark for a (stream, term, assessment type) in a single query and
+pivots the rows in memory, instead of issuing one query per student per subject.
+Totals, ranks and statistics come from the shared results kernel.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..models.academic import Subject, Mark, Student
+from ..extensions import db
+from ..utils.results_kernel import compute_results, subject_statistics
+
+
+class ClassReportEngine:
+    """Builds the class report structure from preloaded students, subjects and marks."""
+
+    @staticmethod
+    def education_level_for_grade(grade_name: str) -> str:
+        """
+        Determine the subject education level from a grade name like 'Grade 5'.
+
+        Returns an empty string when the grade number cannot be determined.
+        """
+        try:
+            parts = grade_name.split()
+            grade_num = int(parts[1]) if len(parts) > 1 else int(grade_name)
+        except (AttributeError, ValueError):
+            return ""
+        if 1 <= grade_num <= 3:
+            return "lower_primary"
+        if 4 <= grade_num <= 6:
+            return "upper_primary"
+        if 7 <= grade_num <= 9:
+            return "junior_secondary"
+        return ""
+
+    @staticmethod
+    def load_subjects(education_level: str, selected_subject_ids: Optional[Iterable[int]] = None
+                      ) -> Tuple[List[Subject], Dict[str, List[Subject]]]:
+        """
+        Load report subjects and the composite component map in one query.
+
+        Args:
+            education_level: The education level (e.g., 'upper_primary')
+            selected_subject_ids: Optional list of subject IDs to restrict regular subjects to
+
+        Returns:
+            Tuple of (regular subjects, {composite name: [component subjects]})
+        """
+        selected = set(selected_subject_ids) if selected_subject_ids else None
+
+        if not education_level:
+            # Mirror the legacy fallback: all subjects, no composite grouping
+            query = Subject.query
+            if selected:
+                query = query.filter(Subject.id.in_(selected))
+            subjects = query.order_by(Subject.id).all()
+            regular = [s for s in subjects if not s.is_component and not s.is_composite]
+            return regular, {}
+
+        subjects = Subject.query.filter_by(education_level=education_level).order_by(Subject.id).all()
+
+        regular = []
+        component_map = {}
+        for subject in subjects:
+            if subject.is_component:
+                if subject.composite_parent:
+                    component_map.setdefault(subject.composite_parent, []).append(subject)
+            elif not subject.is_composite:
+                if selected is None or subject.id in selected:
+                    regular.append(subject)
+
+        regular.sort(key=lambda s: s.name)
+        component_map = OrderedDict(sorted(component_map.items()))
+        return regular, component_map
+
+    @staticmethod
+    def load_marks(stream_id: int, term_id: int, assessment_type_id: int,
+                   subject_ids: Iterable[int]) -> Dict[Tuple[int, int], float]:
+        """
+        Load every mark for a stream/term/assessment in a single query.
+
+        Args:
+            stream_id: ID of the stream
+            term_id: ID of the term
+            assessment_type_id: ID of the assessment type
+            subject_ids: Subject IDs to load marks for
+
+        Returns:
+            Dictionary mapping (student_id, subject_id) to percentage
+        """
+        subject_ids = list(subject_ids)
+        if not subject_ids:
+            return {}
+
+        student_ids = db.session.query(Student.id).filter(Student.stream_id == stream_id)
+        rows = db.session.query(
+            Mark.student_id, Mark.subject_id, Mark.percentage
+        ).filter(
+            Mark.student_id.in_(student_ids),
+            Mark.subject_id.in_(subject_ids),
+            Mark.term_id == term_id,
+            Mark.assessment_type_id == assessment_type_id
+        ).order_by(Mark.id).all()
+
+        marks = {}
+        for student_id, subject_id, percentage in rows:
+            # Keep the first row per pair, matching the legacy .first() lookups
+            marks.setdefault((student_id, subject_id), percentage or 0)
+        return marks
+
+    @staticmethod
+    def pivot(student_ids: List[int], subject_ids: List[int],
+              marks: Dict[Tuple[int, int], float]) -> np.ndarray:
+        """Pivot (student_id, subject_id) marks into a students x subjects matrix (NaN for missing)."""
+        matrix = np.full((len(student_ids), len(subject_ids)), np.nan)
+        for row, student_id in enumerate(student_ids):
+            for column, subject_id in enumerate(subject_ids):
+                value = marks.get((student_id, subject_id))
+                if value is not None:
+                    matrix[row, column] = value
+        return matrix
+
+    @staticmethod
+    def build(stream_id: int, term_id: int, assessment_type_id: int, education_level: str,
+              selected_subject_ids: Optional[Iterable[int]] = None) -> Dict:
+        """
+        Build class report data for a stream with a constant number of queries.
+
+        Args:
+            stream_id: ID of the stream
+            term_id: ID of the term
+            assessment_type_id: ID of the assessment type
+            education_level: Education level of the grade
+            selected_subject_ids: Optional list of subject IDs to include in the report
+
+        Returns:
+            Dictionary with class_data, stats, subjects, subject_components, component_marks_data
+            and subject_statistics
+        """
+        students = Student.query.filter_by(stream_id=stream_id).all()
+        regular_subjects, component_map = ClassReportEngine.load_subjects(
+            education_level, selected_subject_ids
+        )
+
+        subject_ids = [s.id for s in regular_subjects]
+        for components in component_map.values():
+            subject_ids.extend(c.id for c in components)
+        marks = ClassReportEngine.load_marks(stream_id, term_id, assessment_type_id, subject_ids)
+
+        regular_names = [s.name for s in regular_subjects]
+        composite_names = list(component_map.keys())
+        student_ids = [student.id for student in students]
+
+        matrix = ClassReportEngine.pivot(student_ids, [s.id for s in regular_subjects], marks)
+        composites = []
+        component_matrices = {}
+        for composite_name, components in component_map.items():
+            values = ClassReportEngine.pivot(student_ids, [c.id for c in components], marks)
+            weights = [c.component_weight if c.component_weight is not None else 1.0 for c in components]
+            component_matrices[composite_name] = values
+            composites.append((values, weights))
+
+        results = compute_results(matrix, composites)
+        subject_names = regular_names + composite_names
+        full_matrix = results['matrix']
+
+        class_data = []
+        for row, student in enumerate(students):
+            student_marks = {}
+            for column, subject_name in enumerate(subject_names):
+                value = full_matrix[row, column]
+                if not np.isnan(value):
+                    student_marks[subject_name] = float(value) if value > 0 else 0
+
+            student_component_marks = {}
+            for composite_name, components in component_map.items():
+                if composite_name in student_marks:
+                    values = component_matrices[composite_name][row]
+                    student_component_marks[composite_name] = {
+                        component.name: (0 if np.isnan(value) else float(value))
+                        for component, value in zip(components, values)
+                    }
+
+            class_data.append({
+                'student': student.name,
+                'student_id': student.id,
+                'marks': student_marks,
+                'raw_marks': dict(student_marks),
+                'component_marks': student_component_marks,
+                'total_marks': float(results['totals'][row]),
+                'total_possible_marks': int(results['present_counts'][row]) * 100,
+                'average_percentage': float(results['averages'][row]),
+                'subject_count': int(results['subject_counts'][row]),
+                'rank': int(results['competition_ranks'][row]),
+                'performance_category': results['bands'][row]
+            })
+
+        class_data = [class_data[i] for i in results['order']]
+        stats = results['categories']
+
+        final_subjects = sorted(subject_names)
+
+        component_marks_data = {}
+        if component_map:
+            component_marks_data = {
+                student_data['student_id']: student_data['component_marks'] for student_data in class_data
+            }
+
+        return {
+            'class_data': class_data,
+            'stats': stats,
+            'subjects': final_subjects,
+            'subject_components': dict(component_map),
+            'component_marks_data': component_marks_data,
+            'subject_statistics': subject_statistics(results, subject_names)
+        }
@@ -6,6 +6,7 @@ from ..models.assignment import TeacherSubjectAssignment
 from ..models.user import Teacher
 from ..extensions import db
 from sqlalchemy import and_
+from .marks_status_board_service import MarksStatusBoardService
 
 
 class CollaborativeMarksService:
@@ -16,116 +17,40 @@ class CollaborativeMarksService:
         """
         Get the marks upload status for subjects in a class.
         If teacher_id is provided, only show subjects assigned to that teacher.
+        Read-only: computed from the grade's marks status board (see MarksStatusBoardService).
 
         Returns:
             dict: Status information for each subject
         """
         try:
-            # Get all subjects for the grade's education level
-            grade = Grade.query.get(grade_id)
-            if not grade:
+            board = MarksStatusBoardService.grade_board(grade_id, term_id, assessment_type_id, stream_ids=[stream_id])
+            if board is None:
                 return {"error": "Grade not found"}
+            return MarksStatusBoardService.class_status(board, stream_id, teacher_id)
 
-            # Get subjects based on teacher assignments if teacher_id is provided
-            if teacher_id:
-                # Get subjects assigned to this teacher for this class
-                teacher_assignments = TeacherSubjectAssignment.query.filter_by(
-                    teacher_id=teacher_id,
-                    grade_id=grade_id,
-                    stream_id=stream_id
-                ).all()
-
-                # If teacher is class teacher, show all subjects for the education level
-                is_class_teacher = any(assignment.is_class_teacher for assignment in teacher_assignments)
-
-                if is_class_teacher:
-                    # Include only uploadable subjects: regular subjects and component subjects
-                    subjects = Subject.query.filter(
-                        Subject.education_level == grade.education_level,
-                        (Subject.is_composite == False)  # excludes composite parents
-                    ).all()
-                else:
-                    # Only show subjects assigned to this teacher
-                    subject_ids = [assignment.subject_id for assignment in teacher_assignments]
-                    subjects = (
-                        Subject.query.filter(
-                            Subject.id.in_(subject_ids),
-                            (Subject.is_composite == False)
-                        ).all() if subject_ids else []
-                    )
-            else:
-                # Get subjects for the grade's education level (admin/headteacher view) excluding composite parents
-                subjects = Subject.query.filter(
-                    Subject.education_level == grade.education_level,
-                    (Subject.is_composite == False)
-                ).all()
-
-            status_data = {
-                'grade': grade.name,
-                'stream': Stream.query.get(stream_id).name if stream_id else 'Unknown',
-                'term': Term.query.get(term_id).name if term_id else 'Unknown',
-                'assessment_type': AssessmentType.query.get(assessment_type_id).name if assessment_type_id else 'Unknown',
-                'subjects': [],
-                'overall_completion': 0,
-                'total_subjects': len(subjects),
-                'completed_subjects': 0,
-                'can_generate_report': False
-            }
-
-            for subject in subjects:
-                # Get or create status for this subject
-                status = SubjectMarksStatus.query.filter_by(
-                    grade_id=grade_id,
-                    stream_id=stream_id,
-                    subject_id=subject.id,
-                    term_id=term_id,
-                    assessment_type_id=assessment_type_id
-                ).first()
-
-                if not status:
-                    # Create initial status
-                    status = SubjectMarksStatus.update_status(
-                        grade_id, stream_id, subject.id, term_id, assessment_type_id
-                    )
-
-                # Get assigned teacher for this subject
-                assigned_teacher = TeacherSubjectAssignment.query.filter_by(
-                    subject_id=subject.id,
-                    grade_id=grade_id,
-                    stream_id=stream_id
-                ).first()
-
-                subject_info = {
-                    'id': subject.id,
-                    'name': subject.name,
-                    'is_uploaded': status.is_uploaded if status else False,
-                    'completion_percentage': status.completion_percentage if status else 0,
-                    'total_students': status.total_students if status else 0,
-                    'students_with_marks': status.students_with_marks if status else 0,
-                    'assigned_teacher': assigned_teacher.teacher.username if assigned_teacher and assigned_teacher.teacher else 'Unassigned',
-                    'uploaded_by': status.uploaded_by.username if status and status.uploaded_by else None,
-                    'upload_date': status.upload_date.strftime('%Y-%m-%d %H:%M') if status and status.upload_date else None,
-                    'can_upload': True  # Will be refined based on teacher permissions
-                }
-
-                status_data['subjects'].append(subject_info)
-
-                if status and status.is_uploaded:
-                    status_data['completed_subjects'] += 1
+        except Exception as e:
+            print(f"Error getting class marks status: {str(e)}")
+            return {"error": str(e)}
 
-            # Calculate overall completion
-            if status_data['total_subjects'] > 0:
-                status_data['overall_completion'] = (status_data['completed_subjects'] / status_data['total_subjects']) * 100
-                status_data['can_generate_report'] = status_data['completed_subjects'] == status_data['total_subjects']
-            else:
-                # No uploadable subjects – treat as 0% and locked (avoid false positive report readiness)
-                status_data['overall_completion'] = 0
-                status_data['can_generate_report'] = False
+    @staticmethod
+    def get_grade_marks_status(grade_id, term_id, assessment_type_id, teacher_id=None):
+        """
+        Get the marks upload status for every stream of a grade at once.
 
-            return status_data
+        Returns:
+            dict: Stream ID -> status in the format of get_class_marks_status
+        """
+        try:
+            board = MarksStatusBoardService.grade_board(grade_id, term_id, assessment_type_id)
+            if board is None:
+                return {"error": "Grade not found"}
+            return {
+                stream['id']: MarksStatusBoardService.class_status(board, stream['id'], teacher_id)
+                for stream in board['streams']
+            }
 
         except Exception as e:
-            print(f"Error getting class marks status: {str(e)}")
+            print(f"Error getting grade marks status: {str(e)}")
             return {"error": str(e)}
 
     @staticmethod
@@ -246,14 +171,14 @@ class CollaborativeMarksService:
                 'classes_ready_for_reports': 0
             }
 
+            # Get latest term and assessment type (you might want to make this configurable)
+            latest_term = Term.query.order_by(Term.id.desc()).first()
+            latest_assessment = AssessmentType.query.order_by(AssessmentType.id.desc()).first()
+
             for assignment in class_assignments:
                 grade = assignment.grade
                 stream = assignment.stream
 
-                # Get latest term and assessment type (you might want to make this configurable)
-                latest_term = Term.query.order_by(Term.id.desc()).first()
-                latest_assessment = AssessmentType.query.order_by(AssessmentType.id.desc()).first()
-
                 if latest_term and latest_assessment:
                     class_status = CollaborativeMarksService.get_class_marks_status(
                         grade.id, stream.id, latest_term.id, latest_assessment.id, teacher_id
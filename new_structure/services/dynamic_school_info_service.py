@@ -1,23 +1,116 @@
 """
 Dynamic School Information Service for Hillview School Management System.
 Ensures school information (including logos) is dynamically updated across all pages and reports.
+
+School information, colors, grading system and logos are built once into a branding
+snapshot shared by all requests of the process. The snapshot is rebuilt when the
+'config' cache scope moves (school setup, branding, customization or configuration
+saved, see cache_invalidation_service.py) and is memoized on flask.g, so the
+context processor and filters cost at most one version lookup per request.
 """
 
+import base64
+import mimetypes
 import os
-from flask import current_app, url_for
-from ..models.school_setup import SchoolSetup, SchoolBranding, SchoolCustomization
+import threading
+from flask import current_app, url_for, g, has_request_context
+from ..models.school_setup import SchoolSetup
 from ..extensions import db
+from .cache_invalidation_service import CacheInvalidationService, CONFIG_SCOPE
 
 class DynamicSchoolInfoService:
     """Service for managing dynamic school information across the application."""
-    
+
+    _snapshots = {}  # Database URL -> branding snapshot
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_branding_snapshot(cls):
+        """
+        Get the branding snapshot for the current school configuration.
+
+        Returns:
+            Dictionary with school_info, school_colors, grading_info, report_logo_url,
+            report_logo_data_uri and version. Treat it as read-only.
+        """
+        if has_request_context() and '_school_branding' in g:
+            return g._school_branding
+
+        version = CacheInvalidationService.scope_version(CONFIG_SCOPE)
+        key = str(db.engine.url)
+        snapshot = cls._snapshots.get(key)
+        if snapshot is None or version is None or snapshot['version'] != version:
+            with cls._lock:
+                snapshot = cls._snapshots.get(key)
+                if snapshot is None or version is None or snapshot['version'] != version:
+                    snapshot = cls._snapshots[key] = cls._build_snapshot(version)
+
+        if has_request_context():
+            g._school_branding = snapshot
+        return snapshot
+
     @staticmethod
-    def get_school_info():
-        """Get comprehensive school information for templates."""
+    def _forget_request_snapshot(scopes):
+        """Drop the request's memoized snapshot once a school setting change commits."""
+        if CONFIG_SCOPE in scopes and has_request_context():
+            g.pop('_school_branding', None)
+
+    @classmethod
+    def _build_snapshot(cls, version):
+        """Load school setup once and precompute everything templates and reports need."""
+        from .school_config_service import SchoolConfigService
+
         setup = SchoolSetup.get_current_setup()
-        branding = SchoolBranding.get_current_branding()
-        customization = SchoolCustomization.get_current_customization()
-        
+
+        report_logo_path = SchoolConfigService.get_school_logo_path()
+        return {
+            'version': version,
+            'school_info': cls._load_school_info(setup),
+            'school_colors': cls._load_school_colors(setup),
+            'grading_info': cls._load_grading_system_info(setup),
+            # Logo used on generated reports, as a URL and embedded for PDF rendering
+            'report_logo_url': url_for('static', filename=report_logo_path),
+            'report_logo_data_uri': cls._logo_data_uri(
+                os.path.join(current_app.static_folder, report_logo_path)
+            ),
+        }
+
+    @staticmethod
+    def _logo_data_uri(path):
+        """Base64 data URI of an image file, or None if it cannot be read."""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        mime_type = mimetypes.guess_type(path)[0] or 'image/png'
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    @classmethod
+    def get_school_info(cls):
+        """Get comprehensive school information for templates."""
+        return dict(cls.get_branding_snapshot()['school_info'])
+
+    @classmethod
+    def get_report_logo(cls, embedded=False):
+        """
+        Get the logo used on generated reports.
+
+        Args:
+            embedded: Return a base64 data URI (for PDF rendering, which cannot fetch
+                /static URLs) instead of the static URL
+
+        Returns:
+            Logo URL or data URI
+        """
+        snapshot = cls.get_branding_snapshot()
+        if embedded and snapshot['report_logo_data_uri']:
+            return snapshot['report_logo_data_uri']
+        return snapshot['report_logo_url']
+
+    @staticmethod
+    def _load_school_info(setup):
+        """Build the school information dictionary from the school setup."""
         # Get logo URL
         logo_url = DynamicSchoolInfoService.get_logo_url(setup.logo_filename)
         
@@ -93,10 +186,14 @@ class DynamicSchoolInfoService:
         else:
             return url_for('static', filename='images/default_logo.png')
     
-    @staticmethod
-    def get_school_colors():
+    @classmethod
+    def get_school_colors(cls):
         """Get school color scheme."""
-        setup = SchoolSetup.get_current_setup()
+        return dict(cls.get_branding_snapshot()['school_colors'])
+
+    @staticmethod
+    def _load_school_colors(setup):
+        """Build the color scheme from the school setup."""
         return {
             'primary': setup.primary_color or '#1f7d53',
             'secondary': setup.secondary_color or '#18230f',
@@ -121,11 +218,14 @@ class DynamicSchoolInfoService:
             'secondary_color': info['secondary_color']
         }
     
-    @staticmethod
-    def get_grading_system_info():
+    @classmethod
+    def get_grading_system_info(cls):
         """Get comprehensive grading system information."""
-        setup = SchoolSetup.get_current_setup()
-        
+        return dict(cls.get_branding_snapshot()['grading_info'])
+
+    @staticmethod
+    def _load_grading_system_info(setup):
+        """Build the grading system information from the school setup."""
         # Define grading system details
         grading_systems = {
             'CBC': {
@@ -173,10 +273,10 @@ class DynamicSchoolInfoService:
             'pass_mark': setup.pass_mark_percentage or 50.0
         }
     
-    @staticmethod
-    def get_grade_for_percentage(percentage, system='CBC'):
+    @classmethod
+    def get_grade_for_percentage(cls, percentage, system='CBC'):
         """Get grade for a given percentage in the specified system."""
-        grading_info = DynamicSchoolInfoService.get_grading_system_info()
+        grading_info = cls.get_branding_snapshot()['grading_info']
         
         if system == 'primary':
             system = grading_info['primary_system']
@@ -207,13 +307,13 @@ class DynamicSchoolInfoService:
         
         return 'N/A'
     
-    @staticmethod
-    def inject_school_info():
+    @classmethod
+    def inject_school_info(cls):
         """Template context processor to inject school info into all templates."""
         return {
-            'school_info': DynamicSchoolInfoService.get_school_info(),
-            'school_colors': DynamicSchoolInfoService.get_school_colors(),
-            'grading_info': DynamicSchoolInfoService.get_grading_system_info()
+            'school_info': cls.get_school_info(),
+            'school_colors': cls.get_school_colors(),
+            'grading_info': cls.get_grading_system_info()
         }
     
     @staticmethod
@@ -255,3 +355,6 @@ class DynamicSchoolInfoService:
                 print(f"Could not create default logo: {e}")
         
         return default_logo_path
+
+
+CacheInvalidationService.subscribe(DynamicSchoolInfoService._forget_request_snapshot)
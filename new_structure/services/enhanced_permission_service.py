@@ -7,6 +7,7 @@ from ..models.permission import ClassTeacherPermission
 from ..models.user import Teacher
 from ..models.academic import Grade, Stream
 from ..extensions import db
+from .permission_decision_service import PermissionDecisionService, DEFAULT_ALLOWED_FUNCTIONS
 from flask import session
 from functools import wraps
 
@@ -28,76 +29,35 @@ class EnhancedPermissionService:
             Boolean indicating if access is allowed
         """
         try:
-            print(f"🔍 Enhanced Permission Service Debug:")
-            print(f"  Function: {function_name}")
-            print(f"  Teacher ID: {teacher_id}")
-            
-            # Check if function is allowed by default
-            print(f"  Checking if {function_name} is in default allowed functions...")
-            
-            try:
-                is_default_allowed = DefaultFunctionPermissions.is_default_allowed(function_name)
-                print(f"  Is default allowed: {is_default_allowed}")
-            except Exception as e:
-                print(f"  🚨 Error checking default allowed: {e}")
-                import traceback
-                traceback.print_exc()
-                is_default_allowed = False
-            
-            if is_default_allowed:
-                print(f"  ✅ Allowing access (default allowed)")
-                return True
+            return PermissionDecisionService.has_function_permission(
+                teacher_id, function_name, grade_id, stream_id
+            )
+        except Exception as e:
+            # For safety, allow default functions and deny restricted ones
+            print(f"🚨 Permission check error for {function_name}: {e}")
+            db.session.rollback()
+            return function_name in DEFAULT_ALLOWED_FUNCTIONS
 
-            # Check if function requires explicit permission
-            print(f"  Checking if {function_name} is restricted...")
-            try:
-                is_restricted = DefaultFunctionPermissions.is_restricted(function_name)
-                print(f"  Is restricted: {is_restricted}")
-            except Exception as e:
-                print(f"  🚨 Error checking restricted: {e}")
-                import traceback
-                traceback.print_exc()
-                is_restricted = False
-            
-            if is_restricted:
-                print(f"  Checking explicit permission...")
-                try:
-                    has_explicit = FunctionPermission.has_function_permission(
-                        teacher_id, function_name, grade_id, stream_id
-                    )
-                    print(f"  Has explicit permission: {has_explicit}")
-                    return has_explicit
-                except Exception as e:
-                    print(f"  🚨 Error checking explicit permission: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return False
+    @staticmethod
+    def can(teacher_id, function_names, grade_id=None, stream_id=None):
+        """
+        Check several function permissions at once, e.g. for the action buttons of a page.
 
-            # Unknown function - deny by default
-            print(f"  ❌ Unknown function - denying by default")
-            return False
+        Args:
+            teacher_id: ID of the teacher
+            function_names: Names of the functions to check
+            grade_id: Optional grade ID for scoped permissions
+            stream_id: Optional stream ID for scoped permissions
 
+        Returns:
+            Dictionary of function name -> boolean
+        """
+        try:
+            return PermissionDecisionService.can(teacher_id, function_names, grade_id, stream_id)
         except Exception as e:
-            # Fallback: If there's any database error, handle gracefully
-            print(f"🚨 Permission check error for {function_name}: {e}")
-            import traceback
-            traceback.print_exc()
-
-            # For safety, allow default functions and deny restricted ones
-            try:
-                print(f"  Attempting fallback permission check...")
-                if DefaultFunctionPermissions.is_default_allowed(function_name):
-                    print(f"  ✅ Fallback: Allowing default function")
-                    return True
-                else:
-                    # Deny access to restricted functions if there's a permission system error
-                    print(f"  ❌ Fallback: Denying access to {function_name} due to permission system error")
-                    return False  # Proper security: deny access when in doubt
-            except Exception as fallback_error:
-                print(f"🚨 Fallback permission check also failed: {fallback_error}")
-                import traceback
-                traceback.print_exc()
-                return False
+            print(f"🚨 Bulk permission check error: {e}")
+            db.session.rollback()
+            return {name: name in DEFAULT_ALLOWED_FUNCTIONS for name in function_names}
     
     @staticmethod
     def grant_function_permission(teacher_id, function_name, granted_by_id, 
@@ -1,384 +1,204 @@
 """
 Excel export services for the Hillview School Management System.
+
+Workbooks are written with openpyxl in write-only mode: rows are streamed to disk as
+they are appended instead of being held as cell objects, so memory stays flat however
+many learners a grade has.
 """
-import pandas as pd
 import os
-from io import BytesIO
-import matplotlib.pyplot as plt
-import numpy as np
+import tempfile
 from datetime import datetime
 
-def generate_grade_marksheet_excel(grade, term, assessment_type, subjects, data, statistics):
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import Rule
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.styles.differential import DifferentialStyle
+from openpyxl.utils import get_column_letter
+
+_THIN = Side(style='thin')
+_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+TITLE_STYLE = {
+    'font': Font(bold=True, size=14),
+    'alignment': Alignment(horizontal='center', vertical='center'),
+    'border': _BORDER,
+    'fill': PatternFill('solid', fgColor='D9E1F2')
+}
+DATE_STYLE = {'font': Font(italic=True), 'alignment': Alignment(horizontal='right')}
+HEADER_STYLE = {
+    'font': Font(bold=True),
+    'alignment': Alignment(wrap_text=True, vertical='top'),
+    'border': _BORDER,
+    'fill': PatternFill('solid', fgColor='D7E4BC')
+}
+SECTION_STYLE = {'font': Font(bold=True, size=12), 'border': _BORDER, 'fill': PatternFill('solid', fgColor='D7E4BC')}
+
+# Performance band prefix -> (fill colour, font colour)
+BAND_COLOURS = {
+    'EE': ('C6EFCE', '006100'),
+    'ME': ('FFEB9C', '9C5700'),
+    'AE': ('FFCC99', '974706'),
+    'BE': ('FFC7CE', '9C0006'),
+}
+
+
+def _cell(worksheet, value, style):
+    cell = WriteOnlyCell(worksheet, value=value)
+    for attribute, setting in style.items():
+        setattr(cell, attribute, setting)
+    return cell
+
+
+def _title_row(worksheet, title, width):
+    """Append the title row: the title merged over `width` columns, then the generation date."""
+    worksheet.merged_cells.add(f"A1:{get_column_letter(width)}1")
+    worksheet.append([_cell(worksheet, title, TITLE_STYLE)] + [None] * (width - 1) + [
+        _cell(worksheet, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", DATE_STYLE)
+    ])
+
+
+def generate_grade_marksheet_excel(grade, term, assessment_type, subjects, data, statistics, path=None):
     """
     Generate an Excel file for a grade marksheet.
-    
+
     Args:
         grade (str): Grade level
         term (str): Term name
         assessment_type (str): Assessment type name
-        subjects (list): List of subject objects
+        subjects (list): Subject names
         data (list): List of student data dictionaries
         statistics (dict): Dictionary of statistics
-        
+        path (str): File to write; a new temporary file if not given
+
     Returns:
-        BytesIO: Excel file as a BytesIO object
+        str: Path of the Excel file
     """
-    # Create a BytesIO object to store the Excel file
-    output = BytesIO()
-    
-    # Create a Pandas Excel writer using the BytesIO object
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        # Create the main marksheet
-        create_marksheet_sheet(writer, grade, term, assessment_type, subjects, data)
-        
-        # Create the statistics sheet
-        create_statistics_sheet(writer, grade, term, assessment_type, subjects, statistics)
-        
-        # Create the charts sheet
-        create_charts_sheet(writer, grade, term, assessment_type, statistics)
-        
-        # Create a sheet for each stream
-        for stream_name, stream_data in statistics['stream_data'].items():
-            create_stream_sheet(writer, grade, stream_name, term, assessment_type, subjects, 
-                               [d for d in data if d['stream'] == stream_name], stream_data)
-    
-    # Seek to the beginning of the BytesIO object
-    output.seek(0)
-    
-    return output
-
-def create_marksheet_sheet(writer, grade, term, assessment_type, subjects, data):
-    """Create the main marksheet sheet in the Excel file."""
-    # Extract subject names
-    subject_names = [subject.name for subject in subjects]
-    
-    # Create a DataFrame for the marksheet
-    df_data = []
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+
+    workbook = Workbook(write_only=True)
+
+    # Create the main marksheet
+    create_marksheet_sheet(workbook, grade, term, assessment_type, subjects, data)
+
+    # Create the statistics sheet
+    create_statistics_sheet(workbook, grade, term, assessment_type, subjects, statistics)
+
+    # Create a sheet for each stream
+    for stream_name, stream_data in statistics['stream_data'].items():
+        create_stream_sheet(workbook, grade, stream_name, term, assessment_type, subjects,
+                            [d for d in data if d['stream'] == stream_name], stream_data)
+
+    workbook.save(path)
+    return path
+
+
+def _marks_sheet(workbook, sheet_name, title, subjects, data, leading_columns):
+    """
+    Write a ranked marks table.
+
+    Args:
+        leading_columns: (header, width, value function) for the columns before the subjects
+    """
+    worksheet = workbook.create_sheet(sheet_name)
+
+    # Column widths must be set before the first row is written
+    widths = [width for _, width, _ in leading_columns] + [10] * len(subjects) + [10, 12, 10]
+    for index, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(index)].width = width
+
+    # Colour the grade column by performance band
+    grade_column = get_column_letter(len(widths))
+    grade_range = f"{grade_column}3:{grade_column}{max(3, len(data) + 2)}"
+    for prefix, (fill, font) in BAND_COLOURS.items():
+        rule = Rule(type='beginsWith', operator='beginsWith', text=prefix,
+                    dxf=DifferentialStyle(fill=PatternFill('solid', bgColor=fill), font=Font(color=font)))
+        rule.formula = [f'LEFT({grade_column}3,{len(prefix)})="{prefix}"']
+        worksheet.conditional_formatting.add(grade_range, rule)
+
+    _title_row(worksheet, title, len(leading_columns))
+
+    headers = [header for header, _, _ in leading_columns] + list(subjects) + ['Total', 'Average (%)', 'Grade']
+    worksheet.append([_cell(worksheet, header, HEADER_STYLE) for header in headers])
+
     for student in data:
-        row = {
-            'Rank': student['rank'],
-            'Name': student['name'],
-            'Stream': student['stream'],
-            'Admission Number': student.get('admission_number', ''),
-            'Gender': student.get('gender', '').capitalize()
-        }
-        
-        # Add subject marks
-        for subject_name in subject_names:
-            row[subject_name] = student['marks'].get(subject_name, '-')
-        
-        # Add totals and averages
-        row['Total'] = student['total']
-        row['Average (%)'] = student['percentage']
-        row['Grade'] = student['grade']
-        
-        df_data.append(row)
-    
-    # Create DataFrame
-    df = pd.DataFrame(df_data)
-    
-    # Write the DataFrame to the Excel file
-    df.to_excel(writer, sheet_name='Grade Marksheet', index=False)
-    
-    # Get the xlsxwriter workbook and worksheet objects
-    workbook = writer.book
-    worksheet = writer.sheets['Grade Marksheet']
-    
-    # Add a header with the grade, term, and assessment type
-    header_format = workbook.add_format({
-        'bold': True,
-        'font_size': 14,
-        'align': 'center',
-        'valign': 'vcenter',
-        'border': 1,
-        'bg_color': '#D9E1F2'
-    })
-    
-    # Merge cells for the header
-    worksheet.merge_range('A1:E1', f"{grade} - {term} - {assessment_type}", header_format)
-    
-    # Add the date
-    date_format = workbook.add_format({
-        'italic': True,
-        'align': 'right'
-    })
-    worksheet.write('F1', f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", date_format)
-    
-    # Format the column headers
-    header_format = workbook.add_format({
-        'bold': True,
-        'text_wrap': True,
-        'valign': 'top',
-        'fg_color': '#D7E4BC',
-        'border': 1
-    })
-    
-    # Apply the header format to all column headers
-    for col_num, value in enumerate(df.columns.values):
-        worksheet.write(1, col_num, value, header_format)
-    
-    # Set column widths
-    worksheet.set_column('A:A', 5)  # Rank
-    worksheet.set_column('B:B', 25)  # Name
-    worksheet.set_column('C:C', 8)   # Stream
-    worksheet.set_column('D:D', 15)  # Admission Number
-    worksheet.set_column('E:E', 8)   # Gender
-    
-    # Set subject column widths
-    for i in range(len(subject_names)):
-        worksheet.set_column(5 + i, 5 + i, 10)
-    
-    # Set total and average column widths
-    worksheet.set_column(5 + len(subject_names), 5 + len(subject_names), 10)  # Total
-    worksheet.set_column(6 + len(subject_names), 6 + len(subject_names), 12)  # Average
-    worksheet.set_column(7 + len(subject_names), 7 + len(subject_names), 10)  # Grade
-    
-    # Add conditional formatting for the grades
-    grade_col = 7 + len(subject_names)
-    worksheet.conditional_format(2, grade_col, 1 + len(data), grade_col, {
-        'type': 'text',
-        'criteria': 'containing',
-        'value': 'Excellent',
-        'format': workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})
-    })
-    worksheet.conditional_format(2, grade_col, 1 + len(data), grade_col, {
-        'type': 'text',
-        'criteria': 'containing',
-        'value': 'Very Good',
-        'format': workbook.add_format({'bg_color': '#FFEB9C', 'font_color': '#9C5700'})
-    })
-    worksheet.conditional_format(2, grade_col, 1 + len(data), grade_col, {
-        'type': 'text',
-        'criteria': 'containing',
-        'value': 'Good',
-        'format': workbook.add_format({'bg_color': '#FFEB9C', 'font_color': '#9C5700'})
-    })
-    worksheet.conditional_format(2, grade_col, 1 + len(data), grade_col, {
-        'type': 'text',
-        'criteria': 'containing',
-        'value': 'Average',
-        'format': workbook.add_format({'bg_color': '#FFCC99', 'font_color': '#974706'})
-    })
-    worksheet.conditional_format(2, grade_col, 1 + len(data), grade_col, {
-        'type': 'text',
-        'criteria': 'containing',
-        'value': 'Below Average',
-        'format': workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
-    })
-    worksheet.conditional_format(2, grade_col, 1 + len(data), grade_col, {
-        'type': 'text',
-        'criteria': 'containing',
-        'value': 'Poor',
-        'format': workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
-    })
-
-def create_statistics_sheet(writer, grade, term, assessment_type, subjects, statistics):
+        worksheet.append(
+            [value(student) for _, _, value in leading_columns]
+            + [student['marks'].get(subject_name, '-') for subject_name in subjects]
+            + [student['total'], student['percentage'], student['grade']]
+        )
+    return worksheet
+
+
+def create_marksheet_sheet(workbook, grade, term, assessment_type, subjects, data):
+    """Create the main marksheet sheet in the Excel file."""
+    return _marks_sheet(workbook, 'Grade Marksheet', f"{grade} - {term} - {assessment_type}", subjects, data, [
+        ('Rank', 5, lambda student: student['rank']),
+        ('Name', 25, lambda student: student['name']),
+        ('Stream', 8, lambda student: student['stream']),
+        ('Admission Number', 15, lambda student: student.get('admission_number', '')),
+        ('Gender', 8, lambda student: (student.get('gender') or '').capitalize()),
+    ])
+
+
+def create_statistics_sheet(workbook, grade, term, assessment_type, subjects, statistics):
     """Create a statistics sheet in the Excel file."""
-    # Get the workbook and create a new worksheet
-    workbook = writer.book
-    worksheet = workbook.add_worksheet('Statistics')
-    
-    # Add a header with the grade, term, and assessment type
-    header_format = workbook.add_format({
-        'bold': True,
-        'font_size': 14,
-        'align': 'center',
-        'valign': 'vcenter',
-        'border': 1,
-        'bg_color': '#D9E1F2'
-    })
-    
-    # Merge cells for the header
-    worksheet.merge_range('A1:D1', f"{grade} - {term} - {assessment_type} - Statistics", header_format)
-    
-    # Add the date
-    date_format = workbook.add_format({
-        'italic': True,
-        'align': 'right'
-    })
-    worksheet.write('E1', f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", date_format)
-    
-    # Add section headers
-    section_format = workbook.add_format({
-        'bold': True,
-        'font_size': 12,
-        'bg_color': '#D7E4BC',
-        'border': 1
-    })
-    
+    worksheet = workbook.create_sheet('Statistics')
+    _title_row(worksheet, f"{grade} - {term} - {assessment_type} - Statistics", 4)
+    row = 1
+
+    def append(values=()):
+        nonlocal row
+        worksheet.append(list(values))
+        row += 1
+
+    def section(title):
+        append()
+        worksheet.merged_cells.add(f"A{row + 1}:D{row + 1}")
+        append([_cell(worksheet, title, SECTION_STYLE)])
+
+    def share(count):
+        return f"{(count / statistics['total_students']) * 100:.1f}%" if statistics['total_students'] > 0 else "0%"
+
     # Overall Statistics
-    row = 3
-    worksheet.merge_range(f'A{row}:D{row}', 'Overall Statistics', section_format)
-    row += 1
-    
-    # Add overall statistics
-    worksheet.write(f'A{row}', 'Total Students:')
-    worksheet.write(f'B{row}', statistics['total_students'])
-    row += 1
-    
-    worksheet.write(f'A{row}', 'Overall Average:')
-    worksheet.write(f'B{row}', f"{statistics['overall_average']}%")
-    row += 2
-    
+    section('Overall Statistics')
+    append(['Total Students:', statistics['total_students']])
+    append(['Overall Average:', f"{statistics['overall_average']}%"])
+
     # Stream Statistics
-    worksheet.merge_range(f'A{row}:D{row}', 'Stream Statistics', section_format)
-    row += 1
-    
-    # Add headers for stream statistics
-    worksheet.write(f'A{row}', 'Stream')
-    worksheet.write(f'B{row}', 'Students')
-    worksheet.write(f'C{row}', 'Average (%)')
-    row += 1
-    
-    # Add stream statistics
+    section('Stream Statistics')
+    append(['Stream', 'Students', 'Average (%)'])
     for stream_name, stream_data in statistics['stream_data'].items():
-        worksheet.write(f'A{row}', stream_name)
-        worksheet.write(f'B{row}', stream_data['count'])
-        worksheet.write(f'C{row}', stream_data['average'])
-        row += 1
-    
-    row += 1
-    
+        append([stream_name, stream_data['count'], stream_data['average']])
+
     # Subject Statistics
-    worksheet.merge_range(f'A{row}:D{row}', 'Subject Statistics', section_format)
-    row += 1
-    
-    # Add headers for subject statistics
-    worksheet.write(f'A{row}', 'Subject')
-    worksheet.write(f'B{row}', 'Average (%)')
-    row += 1
-    
-    # Add subject statistics
+    section('Subject Statistics')
+    append(['Subject', 'Average (%)'])
     for subject_name, average in statistics['subject_averages'].items():
-        worksheet.write(f'A{row}', subject_name)
-        worksheet.write(f'B{row}', average)
-        row += 1
-    
-    row += 1
-    
+        append([subject_name, average])
+
     # Performance Statistics
-    worksheet.merge_range(f'A{row}:D{row}', 'Performance Statistics', section_format)
-    row += 1
-    
-    # Add headers for performance statistics
-    worksheet.write(f'A{row}', 'Grade')
-    worksheet.write(f'B{row}', 'Count')
-    worksheet.write(f'C{row}', 'Percentage')
-    row += 1
-    
-    # Add performance statistics
+    section('Performance Statistics')
+    append(['Grade', 'Count', 'Percentage'])
     for grade_label, count in statistics['performance_counts'].items():
-        worksheet.write(f'A{row}', grade_label)
-        worksheet.write(f'B{row}', count)
-        worksheet.write(f'C{row}', f"{(count / statistics['total_students']) * 100:.1f}%" if statistics['total_students'] > 0 else "0%")
-        row += 1
-    
-    row += 1
-    
+        append([grade_label, count, share(count)])
+
     # Gender Statistics
-    worksheet.merge_range(f'A{row}:D{row}', 'Gender Statistics', section_format)
-    row += 1
-    
-    # Add headers for gender statistics
-    worksheet.write(f'A{row}', 'Gender')
-    worksheet.write(f'B{row}', 'Count')
-    worksheet.write(f'C{row}', 'Percentage')
-    row += 1
-    
-    # Add gender statistics
+    section('Gender Statistics')
+    append(['Gender', 'Count', 'Percentage'])
     for gender, count in statistics['gender_counts'].items():
-        worksheet.write(f'A{row}', gender.capitalize())
-        worksheet.write(f'B{row}', count)
-        worksheet.write(f'C{row}', f"{(count / statistics['total_students']) * 100:.1f}%" if statistics['total_students'] > 0 else "0%")
-        row += 1
+        append([gender.capitalize(), count, share(count)])
+    return worksheet
 
-def create_charts_sheet(writer, grade, term, assessment_type, statistics):
-    """Create a charts sheet in the Excel file."""
-    # This is a placeholder for chart generation
-    # In a real implementation, you would create charts using matplotlib or xlsxwriter
-    pass
 
-def create_stream_sheet(writer, grade, stream, term, assessment_type, subjects, data, stream_data):
+def create_stream_sheet(workbook, grade, stream, term, assessment_type, subjects, data, stream_data):
     """Create a sheet for a specific stream in the Excel file."""
-    # Extract subject names
-    subject_names = [subject.name for subject in subjects]
-    
-    # Create a DataFrame for the stream marksheet
-    df_data = []
-    for student in data:
-        row = {
-            'Rank': student['rank'],
-            'Name': student['name'].split(' (')[0],  # Remove the stream name from the student name
-            'Admission Number': student.get('admission_number', ''),
-            'Gender': student.get('gender', '').capitalize()
-        }
-        
-        # Add subject marks
-        for subject_name in subject_names:
-            row[subject_name] = student['marks'].get(subject_name, '-')
-        
-        # Add totals and averages
-        row['Total'] = student['total']
-        row['Average (%)'] = student['percentage']
-        row['Grade'] = student['grade']
-        
-        df_data.append(row)
-    
-    # Create DataFrame
-    df = pd.DataFrame(df_data)
-    
-    # Write the DataFrame to the Excel file
-    sheet_name = f"Stream {stream}"
-    df.to_excel(writer, sheet_name=sheet_name, index=False)
-    
-    # Get the xlsxwriter workbook and worksheet objects
-    workbook = writer.book
-    worksheet = writer.sheets[sheet_name]
-    
-    # Add a header with the grade, stream, term, and assessment type
-    header_format = workbook.add_format({
-        'bold': True,
-        'font_size': 14,
-        'align': 'center',
-        'valign': 'vcenter',
-        'border': 1,
-        'bg_color': '#D9E1F2'
-    })
-    
-    # Merge cells for the header
-    worksheet.merge_range('A1:D1', f"{grade} Stream {stream} - {term} - {assessment_type}", header_format)
-    
-    # Add the date
-    date_format = workbook.add_format({
-        'italic': True,
-        'align': 'right'
-    })
-    worksheet.write('E1', f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", date_format)
-    
-    # Format the column headers
-    header_format = workbook.add_format({
-        'bold': True,
-        'text_wrap': True,
-        'valign': 'top',
-        'fg_color': '#D7E4BC',
-        'border': 1
-    })
-    
-    # Apply the header format to all column headers
-    for col_num, value in enumerate(df.columns.values):
-        worksheet.write(1, col_num, value, header_format)
-    
-    # Set column widths
-    worksheet.set_column('A:A', 5)  # Rank
-    worksheet.set_column('B:B', 25)  # Name
-    worksheet.set_column('C:C', 15)  # Admission Number
-    worksheet.set_column('D:D', 8)   # Gender
-    
-    # Set subject column widths
-    for i in range(len(subject_names)):
-        worksheet.set_column(4 + i, 4 + i, 10)
-    
-    # Set total and average column widths
-    worksheet.set_column(4 + len(subject_names), 4 + len(subject_names), 10)  # Total
-    worksheet.set_column(5 + len(subject_names), 5 + len(subject_names), 12)  # Average
-    worksheet.set_column(6 + len(subject_names), 6 + len(subject_names), 10)  # Grade
+    title = f"{grade} Stream {stream} - {term} - {assessment_type}"
+    return _marks_sheet(workbook, f"Stream {stream}", title, subjects, data, [
+        ('Rank', 5, lambda student: student['rank']),
+        # Remove the stream name from the student name
+        ('Name', 25, lambda student: student['name'].split(' (')[0]),
+        ('Admission Number', 15, lambda student: student.get('admission_number', '')),
+        ('Gender', 8, lambda student: (student.get('gender') or '').capitalize()),
+    ])
@@ -6,6 +6,7 @@ from ..models.academic import Subject, Mark, Grade, Stream, Term, AssessmentType
 from ..models.assignment import TeacherSubjectAssignment
 from ..models.user import Teacher
 from ..extensions import db
+from .assignment_summary_service import AssignmentSummaryService
 from sqlalchemy import and_, or_
 from typing import Dict, List, Optional, Tuple
 
@@ -18,6 +19,7 @@ class FlexibleMarksService:
         """
         Get all classes where a teacher has subject assignments.
         This includes both their assigned class (if they're a class teacher) and other classes where they teach subjects.
+        Built from the teacher's cached assignment rows (see AssignmentSummaryService).
 
         Args:
             teacher_id: ID of the teacher
@@ -26,51 +28,7 @@ class FlexibleMarksService:
             List of dictionaries containing class info and subjects taught
         """
         try:
-            # Get all assignments for this teacher
-            assignments = TeacherSubjectAssignment.query.filter_by(teacher_id=teacher_id).all()
-
-            if not assignments:
-                return []
-
-            # Group assignments by grade/stream
-            class_assignments = {}
-
-            for assignment in assignments:
-                grade_obj = Grade.query.get(assignment.grade_id)
-                stream_obj = Stream.query.get(assignment.stream_id) if assignment.stream_id else None
-                subject_obj = Subject.query.get(assignment.subject_id)
-
-                if not grade_obj or not subject_obj:
-                    continue
-
-                # Create class key
-                stream_name = stream_obj.name if stream_obj else "All"
-                class_key = f"{grade_obj.name}_{stream_name}"
-
-                if class_key not in class_assignments:
-                    class_assignments[class_key] = {
-                        'grade_name': grade_obj.name,
-                        'stream_name': stream_name,
-                        'education_level': grade_obj.education_level,
-                        'is_class_teacher': assignment.is_class_teacher,
-                        'subjects': [],
-                        'grade_id': grade_obj.id,
-                        'stream_id': stream_obj.id if stream_obj else None
-                    }
-
-                # Add subject to this class
-                class_assignments[class_key]['subjects'].append({
-                    'id': subject_obj.id,
-                    'name': subject_obj.name,
-                    'is_composite': subject_obj.is_composite,
-                    'is_class_teacher_assignment': assignment.is_class_teacher
-                })
-
-                # Update class teacher status if any assignment is class teacher
-                if assignment.is_class_teacher:
-                    class_assignments[class_key]['is_class_teacher'] = True
-
-            return list(class_assignments.values())
+            return AssignmentSummaryService.class_assignments(teacher_id)
 
         except Exception as e:
             print(f"Error getting teacher class assignments: {str(e)}")
@@ -344,7 +302,7 @@ class FlexibleMarksService:
             Dictionary with teacher's portal access summary
         """
         try:
-            teacher = Teacher.query.get(teacher_id)
+            teacher = db.session.get(Teacher, teacher_id)
             if not teacher:
                 return {'error': 'Teacher not found'}
 
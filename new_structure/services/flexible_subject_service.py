@@ -214,6 +214,13 @@ class FlexibleSubjectService:
                                 "weight": component_2_weight
                             })
 
+                # The raw SQL above bypasses mapper events: bump the reference data version with it
+                if subject_ids:
+                    from sqlalchemy.orm import Session
+                    from .cache_invalidation_service import CacheInvalidationService
+                    with Session(bind=conn) as session:
+                        CacheInvalidationService.record_reference(session)
+
                 conn.commit()
                 print(f"✅ Successfully updated {subject_name} configuration and {len(subject_ids)} subject records")
 
@@ -0,0 +1,169 @@
+"""
+Grade Marksheet Service - builds the whole-grade marksheet.
+
+Every learner of the grade and their marks for the term and assessment type are
+read in one query. Totals, averages, ranks, bands and statistics come from the
+shared results kernel (utils/results_kernel.py), so the marksheet shows the same
+numbers as the class and grade reports. The result is JSON-compatible (subjects are
+listed by name) so it can be cached with cache_service.cache_marksheet and written
+to a workbook with excel_export.generate_grade_marksheet_excel.
+"""
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import and_, select
+
+from ..extensions import db
+from ..models.academic import Student, Mark
+from ..utils.results_kernel import compute_results, BAND_LABELS
+from .reference_data_service import ReferenceDataService
+
+
+class GradeMarksheetService:
+    """Service for building grade marksheet data."""
+
+    @staticmethod
+    def _load_marks(stream_ids, term_id: int, assessment_type_id: int):
+        """Learners of the streams with their marks (one row per mark, or one without), by stream and learner."""
+        return db.session.execute(select(
+            Student.id, Student.name, Student.admission_number, Student.gender, Student.stream_id,
+            Mark.subject_id, Mark.mark, Mark.total_marks
+        ).outerjoin(Mark, and_(
+            Mark.student_id == Student.id,
+            Mark.term_id == term_id,
+            Mark.assessment_type_id == assessment_type_id
+        )).where(Student.stream_id.in_(stream_ids))
+            .order_by(Student.stream_id, Student.id, Mark.id)).all()
+
+    @staticmethod
+    def build(grade_id: int, term_id: int, assessment_type_id: int) -> Dict:
+        """
+        Build the marksheet of every stream of a grade.
+
+        Columns are the subjects of the grade's education level, plus any other subject
+        a learner of the grade has a mark in.
+
+        Args:
+            grade_id: ID of the grade
+            term_id: ID of the term
+            assessment_type_id: ID of the assessment type
+
+        Returns:
+            Dictionary with subjects (names), data (one row per learner, ranked by
+            average) and statistics, or a dictionary with an error message
+        """
+        reference = ReferenceDataService.current()
+        grade = reference.grade_by_id.get(grade_id)
+        if grade is None:
+            return {'error': 'Grade not found'}
+
+        streams = reference.streams_by_grade.get(grade_id, ())
+        if not streams:
+            return {'error': f"No streams found for grade {grade.name}"}
+        stream_names = {stream.id: stream.name for stream in streams}
+
+        rows = GradeMarksheetService._load_marks(list(stream_names), term_id, assessment_type_id)
+
+        marked_subjects = {row[5] for row in rows if row[5] is not None}
+        level_subjects = {subject.id for subject in reference.subjects_by_level.get(grade.education_level, ())}
+        subjects = [subject for subject in reference.subjects
+                    if subject.id in level_subjects or subject.id in marked_subjects]
+        if not subjects:
+            return {'error': 'No subjects found'}
+        subject_names = [subject.name for subject in subjects]
+        names_by_id = {subject.id: subject.name for subject in subjects}
+
+        # One entry per learner; the first mark of a subject wins
+        all_data = []
+        entry = percentages = None
+        current_id = None
+        for student_id, name, admission_number, gender, stream_id, subject_id, mark, total_marks in rows:
+            if student_id != current_id:
+                current_id = student_id
+                stream_name = stream_names[stream_id]
+                percentages = {}
+                entry = {
+                    'name': f"{name} ({stream_name})",
+                    'stream': stream_name,
+                    'admission_number': admission_number,
+                    'gender': gender,
+                    'marks': dict.fromkeys(subject_names, "-"),
+                    'percentages': percentages
+                }
+                all_data.append(entry)
+            subject_name = names_by_id.get(subject_id)
+            if subject_name is None or subject_name in percentages:
+                continue
+            # Store the raw mark and the standardized mark (out of 100)
+            entry['marks'][subject_name] = mark
+            percentages[subject_name] = ((mark or 0) / (total_marks if total_marks and total_marks > 0 else 100)) * 100
+
+        if not all_data:
+            return {'error': f"No learners found for grade {grade.name}"}
+
+        matrix = np.full((len(all_data), len(subject_names)), np.nan)
+        name_columns = {name: index for index, name in enumerate(subject_names)}
+        for row_index, entry in enumerate(all_data):
+            for name, value in entry['percentages'].items():
+                matrix[row_index, name_columns[name]] = value
+
+        # Totals, averages, ranks and bands from the shared results kernel
+        results = compute_results(matrix, rank_by='average')
+        for index, student_data in enumerate(all_data):
+            student_data['total'] = round(float(results['totals'][index]), 1)
+            student_data['percentage'] = float(results['averages'][index])
+            student_data['grade'] = results['bands'][index]
+            student_data['rank'] = int(results['competition_ranks'][index])
+
+        # Collect statistics for each stream
+        stream_data = {}
+        stream_labels = np.array([student_data['stream'] for student_data in all_data])
+        for stream in streams:
+            selected = stream_labels == stream.name
+            if not selected.any():
+                continue
+            stream_results = compute_results(matrix[selected])
+            stream_data[stream.name] = {
+                'total': round(float(results['totals'][selected].sum()), 1),
+                'count': int(selected.sum()),
+                'average': round(float(results['averages'][selected].mean()), 1),
+                'subject_averages': {
+                    name: round(float(stream_results['subject_mean'][i]), 1) for i, name in enumerate(subject_names)
+                }
+            }
+
+        # Sort data by average percentage (descending)
+        all_data = [all_data[i] for i in results['order']]
+
+        # Calculate overall subject averages and the overall average
+        subject_averages = {
+            name: round(float(results['subject_mean'][i]), 1) for i, name in enumerate(subject_names)
+        }
+        counted = results['matrix'][results['matrix'] > 0]
+        overall_average = float(counted.mean()) if counted.size else 0
+
+        # Calculate performance statistics
+        performance_counts = {label: 0 for label in BAND_LABELS}
+        for label in results['bands']:
+            performance_counts[label] += 1
+
+        # Calculate gender statistics
+        gender_counts = {'male': 0, 'female': 0, 'other': 0}
+        for student_data in all_data:
+            gender = (student_data['gender'] or '').lower()
+            gender_counts[gender if gender in ('male', 'female') else 'other'] += 1
+
+        statistics = {
+            'total_students': len(all_data),
+            'overall_average': round(overall_average, 1),
+            'subject_averages': subject_averages,
+            'stream_data': stream_data,
+            'performance_counts': performance_counts,
+            'gender_counts': gender_counts
+        }
+
+        return {
+            'subjects': subject_names,
+            'data': all_data,
+            'statistics': statistics
+        }
@@ -9,6 +9,10 @@ from ..extensions import db
 from ..services import get_class_report_data
 from ..services.report_service import generate_class_report_pdf_from_html
 from ..services.staff_assignment_service import StaffAssignmentService
+from ..services.report_job_service import ReportJobService, JobCancelled
+from ..services.reference_data_service import ReferenceDataService
+from ..services.marks_status_board_service import MarksStatusBoardService
+from ..utils.results_kernel import compute_results, matrix_from_rows, subject_statistics
 import os
 import tempfile
 import zipfile
@@ -28,72 +32,37 @@ class GradeReportService:
             dict: Status information for each stream in the grade
         """
         try:
-            # Get grade object
-            grade = Grade.query.filter_by(name=grade_name).first()
+            reference = ReferenceDataService.current()
+            grade = reference.grade_by_name.get(grade_name)
             if not grade:
                 return {"error": "Grade not found"}
 
-            # Get all streams for this grade
-            streams = Stream.query.filter_by(grade_id=grade.id).order_by(Stream.name).all()
-
-            if not streams:
+            if not reference.streams_by_grade.get(grade.id):
                 return {"error": "No streams found for this grade"}
 
             # Get term and assessment type objects
-            term_obj = Term.query.filter_by(name=term).first()
-            assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
+            term_obj = reference.term_by_name.get(term)
+            assessment_type_obj = reference.assessment_type_by_name.get(assessment_type)
 
             if not (term_obj and assessment_type_obj):
                 return {"error": "Invalid term or assessment type"}
 
+            # Student and mark counts for every stream at once (read-only)
+            board = MarksStatusBoardService.grade_board(grade.id, term_obj.id, assessment_type_obj.id)
+            streams = MarksStatusBoardService.stream_summaries(board)
+
             grade_data = {
                 'grade': grade_name,
                 'term': term,
                 'assessment_type': assessment_type,
-                'streams': [],
+                'streams': streams,
                 'total_streams': len(streams),
-                'streams_with_marks': 0,
-                'total_students': 0,
-                'students_with_marks': 0,
+                'streams_with_marks': sum(1 for stream in streams if stream['has_marks']),
+                'total_students': sum(stream['total_students'] for stream in streams),
+                'students_with_marks': sum(stream['students_with_marks'] for stream in streams),
                 'can_generate_reports': False
             }
 
-            for stream in streams:
-                # Get students in this stream
-                students = Student.query.filter_by(stream_id=stream.id).all()
-                total_students = len(students)
-
-                # Check if stream has marks
-                students_with_marks = 0
-                if students:
-                    # Count students who have at least one mark for this term/assessment
-                    students_with_marks = db.session.query(Student.id).join(Mark).filter(
-                        Student.stream_id == stream.id,
-                        Mark.term_id == term_obj.id,
-                        Mark.assessment_type_id == assessment_type_obj.id
-                    ).distinct().count()
-
-                has_marks = students_with_marks > 0
-                completion_percentage = (students_with_marks / total_students * 100) if total_students > 0 else 0
-
-                stream_info = {
-                    'id': stream.id,
-                    'name': stream.name,
-                    'display_name': f"Stream {stream.name}",
-                    'total_students': total_students,
-                    'students_with_marks': students_with_marks,
-                    'completion_percentage': completion_percentage,
-                    'has_marks': has_marks,
-                    'can_generate_report': has_marks and completion_percentage >= 50  # At least 50% completion
-                }
-
-                grade_data['streams'].append(stream_info)
-                grade_data['total_students'] += total_students
-                grade_data['students_with_marks'] += students_with_marks
-
-                if has_marks:
-                    grade_data['streams_with_marks'] += 1
-
             # Determine if grade-level reports can be generated
             grade_data['can_generate_reports'] = grade_data['streams_with_marks'] > 0
             grade_data['overall_completion'] = (grade_data['students_with_marks'] / grade_data['total_students'] * 100) if grade_data['total_students'] > 0 else 0
@@ -250,37 +219,30 @@ class GradeReportService:
             if not consolidated_data['all_students']:
                 return stats
 
-            # Calculate subject averages across all streams
-            for subject in consolidated_data['subjects']:
-                subject_marks = []
-                for student in consolidated_data['all_students']:
-                    if subject in student.get('marks', {}):
-                        mark = student['marks'][subject]
-                        if mark and mark > 0:
-                            subject_marks.append(mark)
-
-                if subject_marks:
-                    stats['subject_averages'][subject] = round(sum(subject_marks) / len(subject_marks), 2)
-
-            # Calculate overall grade average
-            all_averages = [student.get('average_percentage', 0) for student in consolidated_data['all_students']]
-            if all_averages:
-                stats['grade_average'] = round(sum(all_averages) / len(all_averages), 2)
-
-            # Calculate stream averages
+            # Rank and aggregate the whole grade with the shared results kernel
+            all_students = consolidated_data['all_students']
+            subjects = consolidated_data['subjects']
+            results = compute_results(matrix_from_rows(all_students, subjects), rank_by='average')
+            averages = results['averages']
+
+            for index, subject in enumerate(subjects):
+                if results['subject_counts_present'][index] > 0:
+                    stats['subject_averages'][subject] = round(float(results['subject_mean'][index]), 2)
+            stats['subject_performance'] = subject_statistics(results, subjects)
+            stats['grade_average'] = round(float(averages.mean()), 2)
+            stats['categories'] = results['categories']
+
+            # Stream averages from the same per-student averages
+            offset = 0
             for stream in consolidated_data['streams']:
-                stream_averages = [student.get('average_percentage', 0) for student in stream['students']]
-                if stream_averages:
-                    stats['stream_averages'][stream['name']] = round(sum(stream_averages) / len(stream_averages), 2)
+                count = len(stream['students'])
+                if count:
+                    stats['stream_averages'][stream['name']] = round(float(averages[offset:offset + count].mean()), 2)
+                offset += count
 
             # Find top performers (top 10% or minimum 5 students)
-            sorted_students = sorted(
-                consolidated_data['all_students'],
-                key=lambda x: x.get('average_percentage', 0),
-                reverse=True
-            )
-            top_count = max(5, len(sorted_students) // 10)  # Top 10% or minimum 5
-            stats['top_performers'] = sorted_students[:top_count]
+            top_count = max(5, len(all_students) // 10)  # Top 10% or minimum 5
+            stats['top_performers'] = [all_students[i] for i in results['order'][:top_count]]
 
             return stats
 
@@ -332,7 +294,8 @@ class GradeReportService:
             return None
 
     @staticmethod
-    def generate_batch_grade_reports(grade_name, term, assessment_type, include_individual=True, include_consolidated=True, selected_streams=None):
+    def generate_batch_grade_reports(grade_name, term, assessment_type, include_individual=True, include_consolidated=True,
+                                     selected_streams=None, output_dir=None, progress=None):
         """
         Generate batch reports for a grade including individual stream reports and consolidated report.
 
@@ -343,6 +306,8 @@ class GradeReportService:
             include_individual: Whether to include individual stream reports
             include_consolidated: Whether to include consolidated grade report
             selected_streams: List of stream names to include (None for all)
+            output_dir: Directory for the ZIP file (defaults to the temp directory)
+            progress: Optional report job callback progress(current, total=None, message=None)
 
         Returns:
             str: Path to ZIP file containing all reports or None if failed
@@ -370,16 +335,23 @@ class GradeReportService:
             # Create ZIP file
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             zip_filename = f"Grade_{grade_name}_Reports_{term}_{assessment_type}_{timestamp}.zip"
-            temp_dir = tempfile.gettempdir()
+            temp_dir = output_dir or tempfile.gettempdir()
             zip_path = os.path.join(temp_dir, zip_filename)
 
             successful_reports = 0
             failed_reports = 0
+            total_steps = (len(streams_with_marks) if include_individual else 0) + (1 if include_consolidated else 0)
+            completed_steps = 0
+            if progress:
+                progress(0, total_steps, f"Generating {total_steps} reports")
 
             with zipfile.ZipFile(zip_path, 'w') as zipf:
                 # Generate individual stream reports
                 if include_individual:
                     for stream_info in streams_with_marks:
+                        if progress:
+                            progress(completed_steps, message=f"Generating report for Stream {stream_info['name']}")
+                        completed_steps += 1
                         try:
                             stream_name = stream_info['name']
                             print(f"📄 Generating report for Stream {stream_name}...")
@@ -409,6 +381,8 @@ class GradeReportService:
 
                 # Generate consolidated grade report
                 if include_consolidated:
+                    if progress:
+                        progress(completed_steps, message="Generating consolidated grade report")
                     try:
                         print(f"📊 Generating consolidated grade report...")
 
@@ -442,10 +416,25 @@ class GradeReportService:
 
             return zip_path
 
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error generating batch grade reports: {str(e)}")
             return None
 
+    @staticmethod
+    def run_batch_report_job(params, output_dir, progress):
+        """Report job handler for generate_batch_grade_reports."""
+        zip_path = GradeReportService.generate_batch_grade_reports(
+            params['grade_name'], params['term'], params['assessment_type'],
+            params.get('include_individual', True), params.get('include_consolidated', True),
+            params.get('selected_streams'), output_dir=output_dir, progress=progress
+        )
+        if not zip_path:
+            raise ValueError(f"Failed to generate batch reports for Grade {params['grade_name']}")
+        filename = f"Grade_{params['grade_name']}_Batch_Reports_{params['term']}_{params['assessment_type']}.zip"
+        return zip_path, filename
+
     @staticmethod
     def _get_consolidated_report_template():
         """Get HTML template for consolidated grade report."""
@@ -697,3 +686,6 @@ class GradeReportService:
 </body>
 </html>
         """
+
+
+ReportJobService.register_handler('batch_grade_reports', GradeReportService.run_batch_report_job)
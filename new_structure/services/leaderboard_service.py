@@ -0,0 +1,145 @@
+"""
+Leaderboard Service - top-N rows per group in one query.
+
+Leaderboards such as the top three learners per grade, stream and subject used to
+run one LIMIT query per group. LeaderboardService.top_n() returns every group's top
+rows at once: on databases with window functions (MySQL 8, MariaDB 10.2, SQLite
+3.25 and PostgreSQL) the ranking is done by ROW_NUMBER() OVER (PARTITION BY ...
+ORDER BY score DESC) in the database; elsewhere the same rows are streamed once
+and the top N of each group are kept in bounded heaps.
+
+Both paths order each group by score (highest first, NULL last) and then by the
+tie-breaking columns ascending, so they return the same rows.
+
+Set LEADERBOARD_WINDOW_FUNCTIONS to False to force the streaming path.
+"""
+import heapq
+import logging
+import sqlite3
+from itertools import count
+from typing import Dict, List, Sequence, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import func, select
+
+from ..extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip on the streaming path
+STREAM_BATCH_SIZE = 1000
+
+
+class _Descending:
+    """Sort key wrapper that reverses the order of a tie-breaking value."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class LeaderboardService:
+    """Selects the top rows of every group of a query."""
+
+    _window_support: Dict[str, bool] = {}  # Database URL -> window functions available
+
+    @classmethod
+    def supports_window_functions(cls) -> bool:
+        """Whether the current database supports ROW_NUMBER() OVER (...)."""
+        if has_app_context() and current_app.config.get('LEADERBOARD_WINDOW_FUNCTIONS') is False:
+            return False
+
+        key = str(db.engine.url)
+        if key not in cls._window_support:
+            dialect = db.engine.dialect
+            if dialect.name == 'sqlite':
+                supported = sqlite3.sqlite_version_info >= (3, 25, 0)
+            elif dialect.name in ('mysql', 'mariadb'):
+                with db.engine.connect():  # server_version_info is read on first connect
+                    version = dialect.server_version_info or (0,)
+                supported = version >= ((10, 2) if getattr(dialect, 'is_mariadb', False) else (8, 0))
+            else:
+                supported = dialect.name in ('postgresql', 'mssql', 'oracle')
+            cls._window_support[key] = supported
+            logger.info(f"Leaderboards use {'window functions' if supported else 'streamed top-N selection'}")
+        return cls._window_support[key]
+
+    @classmethod
+    def top_n(cls, query, partition_by: Sequence[str], score: str, limit: int,
+              tiebreak: Sequence[str] = ()) -> Dict[Tuple, List]:
+        """
+        Get the highest-scoring rows of every group of a query.
+
+        Args:
+            query: Select (or ORM Query) returning the partition, score and tie-breaking
+                columns by name, with any joins, filters and GROUP BY already applied
+            partition_by: Names of the columns that define a group
+            score: Name of the column to rank by, highest first
+            limit: Number of rows to keep per group
+            tiebreak: Names of columns ordering rows with equal scores (ascending)
+
+        Returns:
+            Dictionary of group key (tuple of partition values) -> rows in rank order,
+            with groups in ascending key order
+        """
+        if hasattr(query, 'statement'):
+            query = query.statement
+        if limit <= 0:
+            return {}
+        if cls.supports_window_functions():
+            return cls._top_n_window(query, partition_by, score, limit, tiebreak)
+        return cls._top_n_streamed(query, partition_by, score, limit, tiebreak)
+
+    @staticmethod
+    def _top_n_window(query, partition_by, score, limit, tiebreak) -> Dict[Tuple, List]:
+        columns = query.selected_columns
+        score_column = columns[score]
+        # NULL scores last, as on the streaming path
+        order_by = [score_column.is_(None), score_column.desc()] + [columns[name].asc() for name in tiebreak]
+        ranked = query.add_columns(func.row_number().over(
+            partition_by=[columns[name] for name in partition_by],
+            order_by=order_by
+        ).label('leaderboard_position')).subquery()
+
+        result = db.session.execute(
+            select(*[ranked.c[name] for name in columns.keys()])
+            .where(ranked.c.leaderboard_position <= limit)
+            .order_by(*[ranked.c[name] for name in partition_by], ranked.c.leaderboard_position)
+        )
+        groups: Dict[Tuple, List] = {}
+        for row in result:
+            groups.setdefault(tuple(getattr(row, name) for name in partition_by), []).append(row)
+        return groups
+
+    @staticmethod
+    def _top_n_streamed(query, partition_by, score, limit, tiebreak) -> Dict[Tuple, List]:
+        # Min-heaps of (score key, reversed tie-break key, arrival, row): the heap root is the
+        # row that would drop out first, so each group holds at most `limit` rows
+        heaps: Dict[Tuple, List] = {}
+        arrival = count()
+        result = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for row in result:
+            value = getattr(row, score)
+            entry = (
+                (value is not None, value if value is not None else 0),
+                tuple(_Descending(getattr(row, name)) for name in tiebreak),
+                -next(arrival),
+                row
+            )
+            heap = heaps.setdefault(tuple(getattr(row, name) for name in partition_by), [])
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry[:3] > heap[0][:3]:
+                heapq.heapreplace(heap, entry)
+
+        groups = {}
+        for key in sorted(heaps, key=lambda k: tuple((v is not None, v) for v in k)):
+            groups[key] = [entry[3] for entry in sorted(heaps[key], key=lambda e: e[:3], reverse=True)]
+        return groups
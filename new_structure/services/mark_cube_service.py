@@ -0,0 +1,404 @@
+"""
+Mark Cube Service - pre-aggregated mark statistics for the analytics API.
+
+The mark_cube table (models.academic.MarkCube) holds, per term, assessment type,
+grade, stream, subject and gender, the number of marks, the sum and sum of squares
+of their percentages, the lowest and highest percentage and a count per CBC band.
+Rows with no subject aggregate all subjects of their cell, so learner counts stay
+exact when a rollup spans subjects. MarkCubeService.rollup() adds cells up to any
+combination of filters and grouping with one small GROUP BY over the cube, so the
+analytics endpoints do not slow down as marks accumulate.
+
+The cube is kept current from the change events of CacheInvalidationService: before
+a transaction that changed marks commits, each grade/term/assessment slice it touched
+is rebuilt from its marks in the same transaction (a learner whose gender changed
+bumps the mark scopes of their marks, so those slices are rebuilt too). Grade and
+stream are the ones recorded on each mark, i.e. the class the mark was entered for.
+
+The mark_cube_state table records, per slice, the version of its marks scope the
+slice was built from. Reads compare it with the current versions and rebuild the
+slices that moved on (a refresh at commit failed, or marks were written in a way
+the commit hook did not see), so staleness is shared by every worker process.
+Both tables are created by `flask init-db`; nothing here runs DDL.
+
+Learners are counted per term and assessment type: a rollup over several of them
+reports the largest count, as the same learners sit each assessment.
+"""
+import logging
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, inspect, insert, null, or_, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models import Mark, Student, MarkCube, MarkCubeState, CacheScopeVersion
+from ..utils.performance import CBC_BANDS
+from .cache_invalidation_service import CacheInvalidationService, ANY
+
+logger = logging.getLogger(__name__)
+
+BAND_COLUMNS = [f"band_{label.lower()}" for _, label in CBC_BANDS]
+DIMENSIONS = ('term_id', 'assessment_type_id', 'grade_id', 'stream_id', 'subject_id', 'gender')
+_STATISTIC_COLUMNS = ['mark_count', 'scored_count', 'learner_count', 'percentage_sum', 'percentage_sum_squares',
+                      'min_percentage', 'max_percentage'] + BAND_COLUMNS
+
+# Leaf mark scopes bumped by every mark change, e.g. 'marks:g3:s2:t1:a2'
+_SLICE_SCOPE = re.compile(r'^marks:g(\d+):s[^:]+:t(\d+):a(\d+)$')
+
+# session.info key: learners whose gender changed in the transaction
+_GENDER_CHANGED = 'mark_cube_gender_changed'
+
+
+class CubeStats:
+    """Additive mark statistics of one or more cube cells."""
+
+    __slots__ = ('mark_count', 'scored_count', 'percentage_sum', 'percentage_sum_squares',
+                 'min_percentage', 'max_percentage', 'band_counts', 'learners')
+
+    def __init__(self):
+        self.mark_count = 0
+        self.scored_count = 0
+        self.percentage_sum = 0.0
+        self.percentage_sum_squares = 0.0
+        self.min_percentage = None
+        self.max_percentage = None
+        self.band_counts = [0] * len(BAND_COLUMNS)
+        self.learners = {}  # (term_id, assessment_type_id) -> learners
+
+    def add(self, other: 'CubeStats') -> 'CubeStats':
+        """Add another set of statistics to this one (returns self)."""
+        self.mark_count += other.mark_count
+        self.scored_count += other.scored_count
+        self.percentage_sum += other.percentage_sum
+        self.percentage_sum_squares += other.percentage_sum_squares
+        if other.min_percentage is not None and (self.min_percentage is None
+                                                 or other.min_percentage < self.min_percentage):
+            self.min_percentage = other.min_percentage
+        if other.max_percentage is not None and (self.max_percentage is None
+                                                 or other.max_percentage > self.max_percentage):
+            self.max_percentage = other.max_percentage
+        self.band_counts = [a + b for a, b in zip(self.band_counts, other.band_counts)]
+        for key, learners in other.learners.items():
+            self.learners[key] = self.learners.get(key, 0) + learners
+        return self
+
+    @property
+    def average(self) -> Optional[float]:
+        """Mean percentage, or None without scored marks."""
+        return self.percentage_sum / self.scored_count if self.scored_count else None
+
+    @property
+    def std_dev(self) -> Optional[float]:
+        """Population standard deviation of the percentages, or None without scored marks."""
+        if not self.scored_count:
+            return None
+        mean = self.percentage_sum / self.scored_count
+        return math.sqrt(max(self.percentage_sum_squares / self.scored_count - mean * mean, 0.0))
+
+    @property
+    def learner_count(self) -> int:
+        """Learners with marks (the largest count of any one term and assessment type)."""
+        return max(self.learners.values(), default=0)
+
+    @property
+    def bands(self) -> Dict[str, int]:
+        """Marks per CBC band label."""
+        return {label: count for (_, label), count in zip(CBC_BANDS, self.band_counts)}
+
+
+class MarkCubeService:
+    """Maintains the mark cube and rolls it up for analytics."""
+
+    _tables: Set[str] = set()  # Database URLs known to have the cube tables
+
+    # ------------------------------------------------------------------ reads
+
+    @classmethod
+    def rollup(cls, group_by: Sequence[str] = (), term_id: Optional[int] = None,
+               assessment_type_id: Optional[int] = None, grade_id: Optional[int] = None,
+               stream_id: Optional[int] = None, subject_id: Optional[int] = None,
+               gender: Optional[str] = None) -> Dict[Tuple, CubeStats]:
+        """
+        Roll the cube up to the given grouping and filters.
+
+        Per-subject cells are used when grouping or filtering by subject, the
+        all-subject cells otherwise.
+
+        Args:
+            group_by: Dimension names to group by (see DIMENSIONS)
+            term_id, assessment_type_id, grade_id, stream_id, subject_id, gender:
+                Optional filters (None = all)
+
+        Returns:
+            Dictionary of group key (tuple of dimension values) -> CubeStats
+        """
+        cls.ensure_current(grade_id=grade_id, term_id=term_id, assessment_type_id=assessment_type_id)
+        table = MarkCube.__table__
+        group_columns = [table.c[name] for name in group_by]
+        slice_columns = [table.c.term_id, table.c.assessment_type_id]
+        query = select(
+            *group_columns, *slice_columns,
+            *[func.sum(table.c[name]) for name in ('mark_count', 'scored_count', 'learner_count',
+                                                   'percentage_sum', 'percentage_sum_squares')],
+            func.min(table.c.min_percentage), func.max(table.c.max_percentage),
+            *[func.sum(table.c[name]) for name in BAND_COLUMNS]
+        )
+        by_subject = 'subject_id' in group_by or subject_id is not None
+        conditions = [table.c.subject_id.isnot(None) if by_subject else table.c.subject_id.is_(None)]
+        for name, value in (('term_id', term_id), ('assessment_type_id', assessment_type_id),
+                            ('grade_id', grade_id), ('stream_id', stream_id), ('subject_id', subject_id),
+                            ('gender', gender)):
+            if value is not None:
+                conditions.append(table.c[name] == value)
+        query = query.where(and_(*conditions)).group_by(*group_columns, *slice_columns)
+
+        width = len(group_columns)
+        groups: Dict[Tuple, CubeStats] = {}
+        for row in db.session.execute(query):
+            mark_count, scored_count, learners, total, squares, lowest, highest = row[width + 2:width + 9]
+            stats = CubeStats()
+            stats.mark_count = int(mark_count or 0)
+            stats.scored_count = int(scored_count or 0)
+            stats.percentage_sum = float(total or 0)
+            stats.percentage_sum_squares = float(squares or 0)
+            stats.min_percentage = float(lowest) if lowest is not None else None
+            stats.max_percentage = float(highest) if highest is not None else None
+            stats.band_counts = [int(count or 0) for count in row[width + 9:]]
+            stats.learners = {tuple(row[width:width + 2]): int(learners or 0)}
+            key = tuple(row[:width])
+            if key in groups:
+                groups[key].add(stats)
+            else:
+                groups[key] = stats
+        return groups
+
+    @classmethod
+    def ensure_current(cls, grade_id: Optional[int] = None, term_id: Optional[int] = None,
+                       assessment_type_id: Optional[int] = None) -> None:
+        """
+        Rebuild the cube slices matching the filters (None = all) whose marks changed since they were built.
+
+        A slice is stale when the version in its mark_cube_state row differs from the
+        current version of its marks scope. Without any state rows (a new cube) the
+        whole cube is built.
+        """
+        state = MarkCubeState.__table__
+        conditions = [state.c[name] == value for name, value in (
+            ('grade_id', grade_id), ('term_id', term_id), ('assessment_type_id', assessment_type_id)
+        ) if value is not None]
+        try:
+            with db.engine.begin() as connection:
+                built = {tuple(row[:3]): row[3] for row in connection.execute(
+                    select(state.c.grade_id, state.c.term_id, state.c.assessment_type_id, state.c.version)
+                    .where(*conditions)
+                )}
+                if not built and connection.execute(select(state.c.grade_id).limit(1)).first() is None:
+                    logger.info("Building the mark cube")
+                    cls.rebuild_all(connection)
+                    return
+                scope = CacheInvalidationService.dependency_scopes(
+                    grade_id=grade_id, term_id=term_id, assessment_type_id=assessment_type_id)[0]
+                current = cls._slice_versions(connection, [scope])
+                stale = [key for key in set(built) | set(current) if built.get(key) != current.get(key, 0)]
+                if stale:
+                    logger.info(f"Refreshing {len(stale)} stale mark cube slices")
+                    cls.refresh_slices(connection, stale)
+        except IntegrityError:
+            # Another process rebuilt the same slices at the same time; its rows are current
+            logger.info("Mark cube slices were refreshed concurrently")
+
+    @staticmethod
+    def _slice_versions(connection, scopes: Iterable[str]) -> Dict[Tuple[int, int, int], int]:
+        """
+        Current version of each slice covered by mark scopes (e.g. marks:g3:s*:t*:a*).
+
+        Like CacheInvalidationService.versions, a slice's version is the sum of the
+        versions of its leaf scopes (one per stream), read here in one query for all slices.
+
+        Returns:
+            Dictionary of (grade_id, term_id, assessment_type_id) -> version
+        """
+        column = CacheScopeVersion.__table__.c
+        versions = defaultdict(int)
+        for scope, version in connection.execute(select(column.scope, column.version).where(
+            or_(*(column.scope.like(scope.replace(ANY, '%')) for scope in scopes))
+        )):
+            match = _SLICE_SCOPE.match(scope)
+            if match:
+                versions[tuple(int(part) for part in match.groups())] += version
+        return dict(versions)
+
+    @staticmethod
+    def _slice_scope(grade_id, term_id, assessment_type_id) -> str:
+        return CacheInvalidationService.mark_scope(grade_id, ANY, term_id, assessment_type_id)
+
+    # ----------------------------------------------------------------- writes
+
+    @staticmethod
+    def _cells(by_subject: bool, *conditions):
+        """SELECT of cube rows aggregated from the marks matching conditions."""
+        percentage = Mark.percentage
+        bounds = [bound for bound, _ in CBC_BANDS]
+        bands = []
+        for index in range(len(CBC_BANDS)):
+            if index == len(CBC_BANDS) - 1:
+                condition = percentage < bounds[index - 1]
+            elif index == 0:
+                condition = percentage >= bounds[index]
+            else:
+                condition = and_(percentage >= bounds[index], percentage < bounds[index - 1])
+            bands.append(func.sum(case((condition, 1), else_=0)))
+
+        keys = [Mark.term_id, Mark.assessment_type_id, Mark.grade_id, Mark.stream_id, Student.gender]
+        query = select(
+            *keys[:4], Mark.subject_id if by_subject else null(), keys[4],
+            func.count(Mark.id),
+            func.count(percentage),
+            func.count(func.distinct(Mark.student_id)),
+            func.coalesce(func.sum(percentage), 0.0),
+            func.coalesce(func.sum(percentage * percentage), 0.0),
+            func.min(percentage),
+            func.max(percentage),
+            *bands
+        ).select_from(Mark).outerjoin(Student, Mark.student_id == Student.id)
+        if conditions:
+            query = query.where(and_(*conditions))
+        return query.group_by(*keys, *([Mark.subject_id] if by_subject else []))
+
+    @classmethod
+    def _insert_cells(cls, connection, *conditions) -> None:
+        columns = list(DIMENSIONS) + _STATISTIC_COLUMNS
+        for by_subject in (True, False):
+            connection.execute(insert(MarkCube.__table__).from_select(columns, cls._cells(by_subject, *conditions)))
+
+    @classmethod
+    def refresh_slices(cls, connection, slices: Iterable[Tuple[int, int, int]]) -> None:
+        """
+        Rebuild the cube rows of grade/term/assessment slices from their marks.
+
+        Args:
+            connection: Connection of the transaction that changed the marks
+            slices: (grade_id, term_id, assessment_type_id) tuples
+        """
+        slices = sorted(set(slices))  # Sorted so concurrent transactions lock slices in the same order
+        versions = cls._slice_versions(connection, [cls._slice_scope(*key) for key in slices])
+        table, state = MarkCube.__table__, MarkCubeState.__table__
+        for grade_id, term_id, assessment_type_id in slices:
+            for target in (table, state):
+                connection.execute(delete(target).where(
+                    target.c.grade_id == grade_id,
+                    target.c.term_id == term_id,
+                    target.c.assessment_type_id == assessment_type_id
+                ))
+            cls._insert_cells(connection, Mark.grade_id == grade_id, Mark.term_id == term_id,
+                              Mark.assessment_type_id == assessment_type_id)
+        connection.execute(insert(state), [
+            {'grade_id': grade_id, 'term_id': term_id, 'assessment_type_id': assessment_type_id,
+             'version': versions.get((grade_id, term_id, assessment_type_id), 0)}
+            for grade_id, term_id, assessment_type_id in slices
+        ])
+
+    @classmethod
+    def rebuild_all(cls, connection=None) -> int:
+        """
+        Rebuild the whole cube from the mark table.
+
+        Args:
+            connection: Connection to use; the session's when not given (the caller commits)
+
+        Returns:
+            Number of cube rows written
+        """
+        connection = connection if connection is not None else db.session.connection()
+        versions = cls._slice_versions(connection, [cls._slice_scope(ANY, ANY, ANY)])
+        table, state = MarkCube.__table__, MarkCubeState.__table__
+        connection.execute(delete(table))
+        connection.execute(delete(state))
+        cls._insert_cells(connection)
+        slices = set(connection.execute(
+            select(Mark.grade_id, Mark.term_id, Mark.assessment_type_id).where(Mark.grade_id.isnot(None)).distinct()
+        ).all()) | set(versions)
+        if slices:
+            connection.execute(insert(state), [
+                {'grade_id': grade_id, 'term_id': term_id, 'assessment_type_id': assessment_type_id,
+                 'version': versions.get((grade_id, term_id, assessment_type_id), 0)}
+                for grade_id, term_id, assessment_type_id in slices
+            ])
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+    # ------------------------------------------------------------ event hooks
+
+    @staticmethod
+    def _changed_slices(session) -> Set[Tuple[int, int, int]]:
+        slices = set()
+        for scope in CacheInvalidationService.transaction_scopes(session):
+            match = _SLICE_SCOPE.match(scope)
+            if match:
+                slices.add(tuple(int(part) for part in match.groups()))
+        return slices
+
+    @staticmethod
+    def _record_gender_changes(session) -> None:
+        """Bump the mark scopes of learners whose gender changed; their cells move to another gender."""
+        student_ids = session.info.pop(_GENDER_CHANGED, None)
+        if student_ids:
+            CacheInvalidationService.record_marks(session, session.connection().execute(
+                select(Mark.grade_id, Mark.stream_id, Mark.term_id, Mark.assessment_type_id)
+                .where(Mark.student_id.in_(student_ids)).distinct()
+            ).all())
+
+    @classmethod
+    def _on_student_update(cls, mapper, connection, target):
+        session = object_session(target)
+        if session is not None and inspect(target).attrs.gender.history.has_changes():
+            session.info.setdefault(_GENDER_CHANGED, set()).add(target.id)
+
+    @classmethod
+    def _before_commit(cls, session):
+        # Flush first so the changes of the final flush are included
+        session.flush()
+        if not cls._table_exists(session):
+            session.info.pop(_GENDER_CHANGED, None)
+            return  # Built from the marks when first read
+        # Outside the savepoint: like every version bump, it must not be lost
+        cls._record_gender_changes(session)
+        slices = cls._changed_slices(session)
+        if not slices:
+            return
+        try:
+            connection = session.connection()
+            with connection.begin_nested():
+                cls.refresh_slices(connection, slices)
+        except SQLAlchemyError as e:
+            # Never fail the user's change because of the cube: the slices keep their
+            # old state versions, so the next read rebuilds them
+            logger.error(f"Could not refresh the mark cube: {e}")
+
+    @classmethod
+    def _table_exists(cls, session) -> bool:
+        key = str(session.get_bind().url)
+        if key not in cls._tables:
+            if not inspect(session.connection()).has_table(MarkCubeState.__tablename__):
+                return False
+            cls._tables.add(key)
+        return True
+
+    @classmethod
+    def _after_rollback(cls, session):
+        session.info.pop(_GENDER_CHANGED, None)
+
+    @classmethod
+    def register(cls) -> None:
+        """Install the session and mapper event listeners (idempotent)."""
+        if event.contains(Session, 'before_commit', cls._before_commit):
+            return
+        event.listen(Student, 'after_update', cls._on_student_update)
+        event.listen(Session, 'before_commit', cls._before_commit)
+        event.listen(Session, 'after_rollback', cls._after_rollback)
+
+
+MarkCubeService.register()
@@ -0,0 +1,228 @@
+"""
+Mark Ingest Service - bulk validation and upsert of class marks.
+
+Saving a subject for a class used to issue one lookup per learner and sanitize each
+new Mark on its own. This service converts a whole column of raw marks at once,
+prefetches the existing rows in one query and writes inserts and updates with
+SQLAlchemy bulk operations in a single transaction.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..models.academic import Mark, SubjectMarksStatus
+from ..extensions import db
+from .cache_invalidation_service import CacheInvalidationService
+
+logger = logging.getLogger(__name__)
+
+
+def _to_float(value):
+    """Parse a form/file value to float, returning NaN when it is blank or not numeric."""
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class MarkIngestService:
+    """Service for validating and saving many marks with a constant number of queries."""
+
+    @staticmethod
+    def convert_column(raw_marks: Iterable, max_marks, clip: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Validate and convert a column of raw marks in one vectorized pass.
+
+        Applies the same rules as MarkConversionService.sanitize_raw_mark and
+        calculate_percentage: the maximum is capped at 100 (values below 1 become 100),
+        raw marks are kept within 0..max and percentages are rounded to 1 decimal place.
+
+        Args:
+            raw_marks: Raw mark values (numbers or strings)
+            max_marks: One maximum for the whole column, or one per raw mark
+            clip: Clip out-of-range raw marks to 0..max instead of rejecting them;
+                accepted marks are always sanitized like new Mark rows
+
+        Returns:
+            Dictionary of arrays: raw_mark, max_raw_mark, percentage, valid (bool) and
+            reason (error text for invalid entries, '' otherwise)
+        """
+        raw = np.array([_to_float(v) for v in raw_marks], dtype=float)
+        if np.ndim(max_marks) == 0:
+            maximum = np.full(raw.shape, _to_float(max_marks))
+        else:
+            maximum = np.array([_to_float(v) for v in max_marks], dtype=float)
+
+        reason = np.full(raw.shape, '', dtype=object)
+        reason[np.isnan(maximum)] = 'Invalid maximum mark'
+        reason[np.isnan(raw) & (reason == '')] = 'Mark is not a number'
+
+        if not clip:
+            with np.errstate(invalid='ignore'):
+                out_of_range = (raw < 0) | (raw > maximum)
+            reason[out_of_range & (reason == '')] = 'Mark is outside the allowed range'
+
+        maximum = np.where(maximum > 100, 100.0, maximum)
+        maximum = np.where(np.isnan(maximum) | (maximum < 1), 100.0, maximum)
+        raw = np.clip(raw, 0, maximum)
+
+        valid = reason == ''
+        with np.errstate(invalid='ignore'):
+            percentage = np.round(raw / maximum * 100 * 10) / 10
+
+        return {
+            'raw_mark': raw,
+            'max_raw_mark': maximum,
+            'percentage': percentage,
+            'valid': valid,
+            'reason': reason,
+        }
+
+    @staticmethod
+    def prefetch_existing(student_ids: Iterable[int], subject_ids: Iterable[int],
+                          term_id: int, assessment_type_id: int) -> Dict[tuple, int]:
+        """
+        Load the IDs of existing marks in one query.
+
+        Returns:
+            Dictionary mapping (student_id, subject_id) to the mark ID (first row per pair,
+            matching the previous .first() lookups)
+        """
+        student_ids = list(set(student_ids))
+        subject_ids = list(set(subject_ids))
+        if not student_ids or not subject_ids:
+            return {}
+
+        rows = db.session.query(Mark.id, Mark.student_id, Mark.subject_id).filter(
+            Mark.student_id.in_(student_ids),
+            Mark.subject_id.in_(subject_ids),
+            Mark.term_id == term_id,
+            Mark.assessment_type_id == assessment_type_id
+        ).order_by(Mark.id).all()
+
+        existing = {}
+        for mark_id, student_id, subject_id in rows:
+            existing.setdefault((student_id, subject_id), mark_id)
+        return existing
+
+    @staticmethod
+    def save_marks(entries: List[Dict], term_id: int, assessment_type_id: int, grade_id: int,
+                   stream_id: Optional[int], teacher_id: Optional[int] = None, clip: bool = True,
+                   commit: bool = True, update_status: bool = True) -> Dict:
+        """
+        Validate and upsert marks for one term and assessment type in a single transaction.
+
+        Args:
+            entries: List of dicts with student_id, subject_id, raw_mark and max_raw_mark
+            term_id: ID of the term
+            assessment_type_id: ID of the assessment type
+            grade_id: Grade ID stored on new marks
+            stream_id: Stream ID stored on new marks and used for the status update
+            teacher_id: Optional uploading teacher; new marks are flagged as uploaded
+            clip: Clip out-of-range marks (True) or reject them as errors (False)
+            commit: Whether to commit the transaction
+            update_status: Whether to update SubjectMarksStatus once per subject afterwards
+
+        Returns:
+            Dictionary with inserted, updated and saved counts and a list of
+            {'index', 'student_id', 'subject_id', 'error'} dicts for rejected entries
+        """
+        result = {'inserted': 0, 'updated': 0, 'saved': 0, 'errors': []}
+        if not entries:
+            return result
+
+        converted = MarkIngestService.convert_column(
+            [entry.get('raw_mark') for entry in entries],
+            [entry.get('max_raw_mark') for entry in entries],
+            clip=clip
+        )
+
+        valid_indices = [i for i in range(len(entries)) if converted['valid'][i]]
+        for i in range(len(entries)):
+            if not converted['valid'][i]:
+                result['errors'].append({
+                    'index': i,
+                    'student_id': entries[i].get('student_id'),
+                    'subject_id': entries[i].get('subject_id'),
+                    'error': converted['reason'][i]
+                })
+
+        existing = MarkIngestService.prefetch_existing(
+            [int(entries[i]['student_id']) for i in valid_indices],
+            [int(entries[i]['subject_id']) for i in valid_indices],
+            term_id, assessment_type_id
+        )
+
+        inserts = {}
+        updates = {}
+        now = datetime.now()
+        for i in valid_indices:
+            student_id = int(entries[i]['student_id'])
+            subject_id = int(entries[i]['subject_id'])
+            raw_mark = float(converted['raw_mark'][i])
+            max_raw_mark = float(converted['max_raw_mark'][i])
+            values = {
+                'mark': raw_mark,
+                'total_marks': max_raw_mark,
+                'raw_mark': raw_mark,
+                'raw_total_marks': max_raw_mark,
+                'percentage': min(float(converted['percentage'][i]), 100.0),
+            }
+
+            mark_id = existing.get((student_id, subject_id))
+            if mark_id:
+                # Later entries for the same learner and subject win
+                updates[mark_id] = dict(values, id=mark_id)
+            else:
+                values.update({
+                    'student_id': student_id,
+                    'subject_id': subject_id,
+                    'term_id': term_id,
+                    'assessment_type_id': assessment_type_id,
+                    'grade_id': grade_id,
+                    'stream_id': stream_id,
+                })
+                if teacher_id:
+                    values.update({'is_uploaded': True, 'uploaded_by_teacher_id': teacher_id, 'upload_date': now})
+                inserts[(student_id, subject_id)] = values
+
+        try:
+            # Bulk operations skip mapper events, so record the changed scopes explicitly
+            scopes = set()
+            if inserts:
+                scopes.add((grade_id, stream_id, term_id, assessment_type_id))
+            if updates:
+                scopes.update(tuple(row) for row in db.session.query(
+                    Mark.grade_id, Mark.stream_id, Mark.term_id, Mark.assessment_type_id
+                ).filter(Mark.id.in_(list(updates))).distinct())
+            if inserts:
+                db.session.bulk_insert_mappings(Mark, list(inserts.values()))
+            if updates:
+                db.session.bulk_update_mappings(Mark, list(updates.values()))
+            CacheInvalidationService.record_marks(db.session, scopes)
+            if commit:
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Error saving marks in bulk: {e}")
+            db.session.rollback()
+            raise
+
+        result['inserted'] = len(inserts)
+        result['updated'] = len(updates)
+        result['saved'] = len(inserts) + len(updates)
+
+        if update_status and commit and stream_id and result['saved']:
+            for subject_id in sorted({int(entries[i]['subject_id']) for i in valid_indices}):
+                SubjectMarksStatus.update_status(
+                    grade_id, stream_id, subject_id, term_id, assessment_type_id, teacher_id
+                )
+
+        return result
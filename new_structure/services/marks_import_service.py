@@ -0,0 +1,405 @@
+"""
+Marks Import Service - streaming bulk import of marks from CSV and Excel files.
+
+Rows are read one at a time (csv module over the upload stream, openpyxl in
+read_only mode), resolved against in-memory lookup maps, validated in batches and
+written through MarkIngestService in chunks. Rejected rows are collected into a
+per-row error report that can be downloaded once as CSV; reports that are never
+downloaded are deleted by the next import after ERROR_REPORT_MAX_AGE seconds.
+
+Two layouts are accepted:
+- Long rows: admission_number (or student_id), subject (or subject_id), marks and
+  optional max_marks, assessment_type and term columns (download_template).
+- The wide Excel template from utils/marks_upload_template.py: 'Student Name',
+  'Admission Number' and one '<Subject> (Max: N)' column per subject, with the
+  Term/Assessment/Max Marks details in the rows above the header.
+"""
+import csv
+import glob
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..models.academic import Student, Subject, Grade, Stream, Term, AssessmentType, SubjectMarksStatus
+from ..extensions import db
+from .mark_ingest_service import MarkIngestService
+from .term_summary_service import TermSummaryService
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+ERROR_REPORT_PREFIX = 'marks_import_errors_'
+ERROR_REPORT_MAX_AGE = 24 * 3600  # Seconds an error report is kept for download
+ERROR_REPORT_COLUMNS = ['row', 'admission_number', 'subject', 'mark', 'error']
+
+_HEADER_ALIASES = {
+    'admission_number': 'admission_number', 'admission number': 'admission_number',
+    'admission_no': 'admission_number', 'adm no': 'admission_number',
+    'student_id': 'student_id', 'student id': 'student_id',
+    'student name': 'student_name', 'student_name': 'student_name', 'name': 'student_name',
+    'subject': 'subject', 'subject_name': 'subject', 'subject name': 'subject',
+    'subject_id': 'subject_id', 'subject id': 'subject_id',
+    'marks': 'mark', 'mark': 'mark', 'raw_mark': 'mark',
+    'max_marks': 'max_mark', 'max marks': 'max_mark', 'total_marks': 'max_mark', 'max_mark': 'max_mark',
+    'assessment_type': 'assessment_type', 'assessment type': 'assessment_type', 'assessment': 'assessment_type',
+    'term': 'term',
+}
+_METADATA_LABELS = {'term:': 'term', 'assessment:': 'assessment_type', 'max marks:': 'max_mark'}
+_SUBJECT_MAX_PATTERN = re.compile(r'^(?P<name>.+?)\s*\(\s*max\s*:\s*(?P<max>[\d.]+)\s*\)\s*$', re.IGNORECASE)
+
+
+def _clean(value) -> str:
+    """Normalize a cell value to a stripped string ('' for empty cells)."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class MarksImportService:
+    """Service for importing large mark files with bounded memory and a per-row error report."""
+
+    @staticmethod
+    def iter_file_rows(file_storage) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Stream (row_number, cells) from an uploaded CSV or XLSX file.
+
+        Args:
+            file_storage: Werkzeug FileStorage (or any object with filename and stream)
+
+        Returns:
+            Iterator of (1-based row number, list of cell strings)
+        """
+        extension = os.path.splitext(file_storage.filename or '')[1].lower()
+        if extension == '.csv':
+            text = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+            try:
+                for row_number, cells in enumerate(csv.reader(text), 1):
+                    yield row_number, [_clean(c) for c in cells]
+            finally:
+                text.detach()
+        elif extension == '.xlsx':
+            from openpyxl import load_workbook
+            workbook = load_workbook(file_storage.stream, read_only=True, data_only=True)
+            try:
+                worksheet = workbook.active
+                for row_number, cells in enumerate(worksheet.iter_rows(values_only=True), 1):
+                    yield row_number, [_clean(c) for c in cells]
+            finally:
+                workbook.close()
+        else:
+            raise ValueError('Unsupported file format. Please upload a CSV or Excel (.xlsx) file.')
+
+    @staticmethod
+    def iter_entries(rows: Iterator[Tuple[int, List[str]]], defaults: Dict) -> Iterator[Dict]:
+        """
+        Turn file rows into one entry per mark, detecting the header row and layout.
+
+        Args:
+            rows: Iterator from iter_file_rows
+            defaults: Default 'term', 'assessment_type' and 'max_mark' values
+
+        Returns:
+            Iterator of dicts with row, admission_number, student_id, student_name,
+            subject, subject_id, mark, max_mark, assessment_type and term
+        """
+        metadata = dict(defaults)
+        columns = None
+        subject_columns = []
+
+        for row_number, cells in rows:
+            if not any(cells):
+                continue
+
+            if columns is None:
+                label = cells[0].lower()
+                if label in _METADATA_LABELS and len(cells) > 1 and cells[1] and cells[1] != 'Not Specified':
+                    metadata[_METADATA_LABELS[label]] = cells[1]
+                    continue
+
+                keys = [_HEADER_ALIASES.get(cell.lower()) for cell in cells]
+                if not any(key in ('admission_number', 'student_id', 'student_name') for key in keys):
+                    continue  # Title, instructions or comments above the header
+                columns = {key: index for index, key in enumerate(keys) if key}
+                if 'mark' not in columns:
+                    # Wide template: every unrecognized header is a subject column
+                    for index, (cell, key) in enumerate(zip(cells, keys)):
+                        if key or not cell:
+                            continue
+                        match = _SUBJECT_MAX_PATTERN.match(cell)
+                        subject_columns.append((index, match.group('name') if match else cell,
+                                                match.group('max') if match else None))
+                continue
+
+            if cells[0].startswith('#'):
+                continue
+
+            def cell(key):
+                index = columns.get(key)
+                return cells[index] if index is not None and index < len(cells) else ''
+
+            base = {
+                'row': row_number,
+                'admission_number': cell('admission_number'),
+                'student_id': cell('student_id'),
+                'student_name': cell('student_name'),
+                'assessment_type': cell('assessment_type') or metadata.get('assessment_type'),
+                'term': cell('term') or metadata.get('term'),
+            }
+            if subject_columns:
+                for index, subject_name, column_max in subject_columns:
+                    mark = cells[index] if index < len(cells) else ''
+                    if mark == '':
+                        continue  # Absent learner
+                    yield dict(base, subject=subject_name, subject_id='', mark=mark,
+                               max_mark=column_max or metadata.get('max_mark'))
+            else:
+                yield dict(base, subject=cell('subject'), subject_id=cell('subject_id'), mark=cell('mark'),
+                           max_mark=cell('max_mark') or metadata.get('max_mark'))
+
+        if columns is None:
+            raise ValueError("No header row found. The file needs an 'Admission Number' or 'student_id' column.")
+
+    @staticmethod
+    def build_lookups(grade_id: Optional[int] = None, stream_id: Optional[int] = None) -> Dict:
+        """
+        Load the student, subject, term and assessment type lookup maps once.
+
+        Only the columns needed for resolution are loaded, so whole-grade imports keep
+        a small memory footprint.
+        """
+        student_query = db.session.query(
+            Student.id, Student.admission_number, Student.name, Student.stream_id, Stream.grade_id,
+            Grade.education_level
+        ).outerjoin(Stream, Student.stream_id == Stream.id).outerjoin(Grade, Stream.grade_id == Grade.id)
+        if stream_id:
+            student_query = student_query.filter(Student.stream_id == stream_id)
+        elif grade_id:
+            student_query = student_query.filter(Stream.grade_id == grade_id)
+
+        students_by_id, students_by_admission, students_by_name = {}, {}, {}
+        ambiguous_names = set()  # Names shared by several learners cannot identify one
+        for student_id, admission_number, name, student_stream_id, student_grade_id, level in student_query:
+            info = (student_id, student_stream_id, student_grade_id, level)
+            students_by_id[str(student_id)] = info
+            if admission_number:
+                students_by_admission[str(admission_number).strip().lower()] = info
+            if name:
+                key = name.strip().lower()
+                if key in students_by_name:
+                    ambiguous_names.add(key)
+                students_by_name.setdefault(key, info)
+
+        # Subject names repeat across education levels, so names resolve per level first
+        subjects_by_id, subjects_by_name, subjects_by_level = {}, {}, {}
+        for subject_id, name, level in db.session.query(Subject.id, Subject.name, Subject.education_level):
+            subjects_by_id[str(subject_id)] = subject_id
+            subjects_by_name.setdefault(name.strip().lower(), subject_id)
+            subjects_by_level.setdefault((level, name.strip().lower()), subject_id)
+
+        return {
+            'students_by_id': students_by_id,
+            'students_by_admission': students_by_admission,
+            'students_by_name': students_by_name,
+            'ambiguous_names': ambiguous_names,
+            'subjects_by_id': subjects_by_id,
+            'subjects_by_name': subjects_by_name,
+            'subjects_by_level': subjects_by_level,
+            'terms': {name.strip().lower(): term_id for term_id, name in db.session.query(Term.id, Term.name)},
+            'term_ids': {str(term_id) for term_id, in db.session.query(Term.id)},
+            'assessment_types': {
+                name.strip().lower(): at_id for at_id, name in db.session.query(AssessmentType.id, AssessmentType.name)
+            },
+            'assessment_type_ids': {str(at_id) for at_id, in db.session.query(AssessmentType.id)},
+        }
+
+    @staticmethod
+    def resolve(entry: Dict, lookups: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+        """Resolve one entry to IDs; returns (resolved entry, None) or (None, error message)."""
+        student = None
+        if entry['admission_number']:
+            student = lookups['students_by_admission'].get(entry['admission_number'].lower())
+        if student is None and entry['student_id']:
+            student = lookups['students_by_id'].get(entry['student_id'])
+        if student is None and entry['student_name']:
+            name = entry['student_name'].lower()
+            if name in lookups['ambiguous_names']:
+                return None, 'Ambiguous learner name; use admission number'
+            student = lookups['students_by_name'].get(name)
+        if student is None:
+            return None, 'Student not found'
+        student_id, stream_id, grade_id, education_level = student
+        if not stream_id or not grade_id:
+            return None, 'Student is not assigned to a stream'
+
+        subject_id = lookups['subjects_by_id'].get(entry['subject_id']) if entry['subject_id'] else None
+        if subject_id is None and entry['subject']:
+            name = entry['subject'].lower()
+            subject_id = lookups['subjects_by_level'].get((education_level, name), lookups['subjects_by_name'].get(name))
+        if subject_id is None:
+            return None, 'Subject not found'
+
+        term = str(entry['term'] or '')
+        term_id = int(term) if term in lookups['term_ids'] else lookups['terms'].get(term.lower())
+        if term_id is None:
+            return None, 'Term not found'
+
+        assessment = str(entry['assessment_type'] or '')
+        if assessment in lookups['assessment_type_ids']:
+            assessment_type_id = int(assessment)
+        else:
+            assessment_type_id = lookups['assessment_types'].get(assessment.lower())
+        if assessment_type_id is None:
+            return None, 'Assessment type not found'
+
+        return {
+            'student_id': student_id,
+            'subject_id': subject_id,
+            'raw_mark': entry['mark'],
+            'max_raw_mark': entry['max_mark'] or 100,
+            'term_id': term_id,
+            'assessment_type_id': assessment_type_id,
+            'grade_id': grade_id,
+            'stream_id': stream_id,
+        }, None
+
+    @staticmethod
+    def import_file(file_storage, term: Optional[str] = None, assessment_type: Optional[str] = None,
+                    max_marks=None, grade_id: Optional[int] = None, stream_id: Optional[int] = None,
+                    teacher_id: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Dict:
+        """
+        Import marks from an uploaded file in chunks.
+
+        Args:
+            file_storage: Uploaded CSV or XLSX file
+            term: Default term name or ID for rows that do not name one
+            assessment_type: Default assessment type name or ID for rows that do not name one
+            max_marks: Default maximum mark for rows that do not give one
+            grade_id: Optional grade the learners must belong to
+            stream_id: Optional stream the learners must belong to
+            teacher_id: Optional uploading teacher
+            chunk_size: Number of marks validated and written per batch
+
+        Returns:
+            Dictionary with rows, inserted, updated, saved and error counts, and an
+            error_report token for download_error_report (None when there are no errors)
+        """
+        MarksImportService.cleanup_error_reports()
+        lookups = MarksImportService.build_lookups(grade_id, stream_id)
+        defaults = {'term': term, 'assessment_type': assessment_type, 'max_mark': max_marks}
+        summary = {'rows': 0, 'inserted': 0, 'updated': 0, 'saved': 0, 'errors': 0, 'error_report': None}
+        touched = set()
+
+        report_file = None
+        report_writer = None
+
+        def record_error(entry, message):
+            nonlocal report_file, report_writer
+            if report_writer is None:
+                token = uuid.uuid4().hex
+                report_file = open(MarksImportService.error_report_path(token), 'w', newline='', encoding='utf-8')
+                report_writer = csv.writer(report_file)
+                report_writer.writerow(ERROR_REPORT_COLUMNS)
+                summary['error_report'] = token
+            report_writer.writerow([
+                entry['row'], entry['admission_number'] or entry['student_id'] or entry['student_name'],
+                entry['subject'] or entry['subject_id'], entry['mark'], message
+            ])
+            summary['errors'] += 1
+
+        def flush(batch):
+            groups = defaultdict(list)
+            for entry, resolved in batch:
+                key = (resolved['term_id'], resolved['assessment_type_id'], resolved['grade_id'], resolved['stream_id'])
+                groups[key].append((entry, resolved))
+
+            for (term_id, assessment_type_id, entry_grade_id, entry_stream_id), items in groups.items():
+                result = MarkIngestService.save_marks(
+                    [resolved for _, resolved in items], term_id, assessment_type_id, entry_grade_id,
+                    entry_stream_id, teacher_id=teacher_id, clip=False, commit=False, update_status=False
+                )
+                for error in result['errors']:
+                    record_error(items[error['index']][0], error['error'])
+                summary['inserted'] += result['inserted']
+                summary['updated'] += result['updated']
+                summary['saved'] += result['saved']
+                for _, resolved in items:
+                    touched.add((entry_grade_id, entry_stream_id, resolved['subject_id'], term_id, assessment_type_id))
+            db.session.commit()
+
+        try:
+            batch = []
+            for entry in MarksImportService.iter_entries(MarksImportService.iter_file_rows(file_storage), defaults):
+                summary['rows'] += 1
+                resolved, error = MarksImportService.resolve(entry, lookups)
+                if error:
+                    record_error(entry, error)
+                    continue
+                batch.append((entry, resolved))
+                if len(batch) >= chunk_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            if report_file:
+                report_file.close()
+
+        MarksImportService.refresh_after_import(touched, teacher_id)
+        return summary
+
+    @staticmethod
+    def refresh_after_import(touched, teacher_id: Optional[int] = None) -> None:
+        """Update upload status once per class subject and term summaries once per stream."""
+        for grade_id, stream_id, subject_id, term_id, assessment_type_id in sorted(touched):
+            SubjectMarksStatus.update_status(grade_id, stream_id, subject_id, term_id, assessment_type_id, teacher_id)
+        for stream_id, term_id, assessment_type_id in sorted({(t[1], t[3], t[4]) for t in touched}):
+            TermSummaryService.refresh_after_save(stream_id, term_id, assessment_type_id)
+
+    @staticmethod
+    def error_report_path(token: str) -> Optional[str]:
+        """Get the temp file path for an error report token, or None for a malformed token."""
+        if not token or not re.fullmatch(r'[0-9a-f]{32}', token):
+            return None
+        return os.path.join(tempfile.gettempdir(), f'{ERROR_REPORT_PREFIX}{token}.csv')
+
+    @staticmethod
+    def remove_error_report(token: str) -> None:
+        """Delete an error report (after it was downloaded)."""
+        path = MarksImportService.error_report_path(token)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete marks import error report {path}: {e}")
+
+    @staticmethod
+    def cleanup_error_reports(max_age: int = ERROR_REPORT_MAX_AGE) -> int:
+        """
+        Delete error reports older than max_age seconds that were never downloaded.
+
+        Returns:
+            Number of reports deleted
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in glob.glob(os.path.join(tempfile.gettempdir(), f'{ERROR_REPORT_PREFIX}*.csv')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass  # Removed meanwhile by another worker
+        return removed
@@ -0,0 +1,216 @@
+"""
+Marks Status Board Service - read-only marks upload status for a grade.
+
+The collaborative marks pages (class marks status, the class teacher dashboards),
+the stream status API and the grade report dashboard all show how far each stream
+is with its marks. A board answers all of them for a whole grade from a fixed
+number of grouped queries, however many streams and subjects there are: student
+counts per stream, mark counts per stream and subject, students with any mark per
+stream, and the recorded uploads (who uploaded, when). Grades, streams, subjects
+and subject assignments come from the cached reference data and assignment rows.
+
+Building a board never writes: upload status is computed from the marks as they
+are now rather than created on first view. SubjectMarksStatus rows are still
+written when marks are uploaded (SubjectMarksStatus.update_status) and are only
+read here for the uploader and upload date.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+
+from ..extensions import db
+from ..models.academic import SubjectMarksStatus, Mark, Student
+from ..models.user import Teacher
+from .assignment_summary_service import AssignmentSummaryService
+from .reference_data_service import ReferenceDataService
+
+
+class MarksStatusBoardService:
+    """Builds marks upload status boards for grades and formats them for each page."""
+
+    @staticmethod
+    def grade_board(grade_id: int, term_id: int, assessment_type_id: int,
+                    stream_ids: Optional[Iterable[int]] = None) -> Optional[Dict]:
+        """
+        Get the marks status of every stream of a grade.
+
+        Args:
+            grade_id: ID of the grade
+            term_id: ID of the term
+            assessment_type_id: ID of the assessment type
+            stream_ids: Only these streams of the grade (None for all)
+
+        Returns:
+            Dictionary with the grade, term and assessment_type reference rows (term and
+            assessment_type may be None) and 'streams', ordered by name, each with id,
+            name, total_students, students_with_marks (students with any mark),
+            mark_counts (subject_id -> marks) and uploads (subject_id ->
+            (uploader username, upload date)); None if the grade does not exist
+        """
+        reference = ReferenceDataService.current()
+        grade = reference.grade_by_id.get(grade_id)
+        if grade is None:
+            return None
+
+        streams = sorted(reference.streams_by_grade.get(grade_id, ()), key=lambda s: s.name)
+        if stream_ids is not None:
+            wanted = set(stream_ids)
+            streams = [stream for stream in streams if stream.id in wanted]
+        board_streams = {
+            stream.id: {
+                'id': stream.id,
+                'name': stream.name,
+                'total_students': 0,
+                'students_with_marks': 0,
+                'mark_counts': {},
+                'uploads': {}
+            }
+            for stream in streams
+        }
+
+        if board_streams:
+            ids = list(board_streams)
+            student_counts = db.session.query(Student.stream_id, func.count(Student.id)) \
+                .filter(Student.stream_id.in_(ids)).group_by(Student.stream_id)
+            for stream_id, count in student_counts:
+                board_streams[stream_id]['total_students'] = count
+
+            marks = db.session.query(Mark).join(Student, Student.id == Mark.student_id).filter(
+                Student.stream_id.in_(ids),
+                Mark.term_id == term_id,
+                Mark.assessment_type_id == assessment_type_id
+            )
+            mark_counts = marks.with_entities(Student.stream_id, Mark.subject_id, func.count(Mark.id)) \
+                .group_by(Student.stream_id, Mark.subject_id)
+            for stream_id, subject_id, count in mark_counts:
+                board_streams[stream_id]['mark_counts'][subject_id] = count
+            marked_students = marks.with_entities(Student.stream_id, func.count(func.distinct(Mark.student_id))) \
+                .group_by(Student.stream_id)
+            for stream_id, count in marked_students:
+                board_streams[stream_id]['students_with_marks'] = count
+
+            uploads = db.session.query(
+                SubjectMarksStatus.stream_id, SubjectMarksStatus.subject_id,
+                Teacher.username, SubjectMarksStatus.upload_date
+            ).outerjoin(Teacher, Teacher.id == SubjectMarksStatus.uploaded_by_teacher_id).filter(
+                SubjectMarksStatus.grade_id == grade_id,
+                SubjectMarksStatus.stream_id.in_(ids),
+                SubjectMarksStatus.term_id == term_id,
+                SubjectMarksStatus.assessment_type_id == assessment_type_id
+            ).order_by(SubjectMarksStatus.id)
+            for stream_id, subject_id, username, upload_date in uploads:
+                board_streams[stream_id]['uploads'].setdefault(subject_id, (username, upload_date))
+
+        return {
+            'grade': grade,
+            'term': reference.term_by_id.get(term_id),
+            'assessment_type': reference.assessment_type_by_id.get(assessment_type_id),
+            'streams': list(board_streams.values())
+        }
+
+    @staticmethod
+    def class_status(board: Dict, stream_id: int, teacher_id: Optional[int] = None) -> Dict:
+        """
+        Format the status of one stream of a board for the collaborative marks pages.
+
+        Args:
+            board: Board from grade_board() that includes the stream
+            stream_id: ID of the stream
+            teacher_id: If provided, only subjects the teacher may upload (all uploadable
+                subjects for the class teacher, otherwise the assigned subjects)
+
+        Returns:
+            Dictionary in the format of CollaborativeMarksService.get_class_marks_status
+        """
+        reference = ReferenceDataService.current()
+        grade = board['grade']
+        stream = next((s for s in board['streams'] if s['id'] == stream_id), None)
+
+        # Uploadable subjects: regular subjects and components, not composite parents
+        level_subjects = [s for s in reference.subjects_by_level.get(grade.education_level, ()) if not s.is_composite]
+        if teacher_id:
+            teacher_assignments = [
+                row for row in AssignmentSummaryService.assignment_rows(teacher_id)
+                if row.grade_id == grade.id and row.stream_id == stream_id
+            ]
+            if any(row.is_class_teacher for row in teacher_assignments):
+                subjects = level_subjects
+            else:
+                assigned = {row.subject_id for row in teacher_assignments}
+                subjects = [s for s in reference.subjects if s.id in assigned and not s.is_composite]
+        else:
+            subjects = level_subjects
+
+        # First assignment of each subject in the class, as the assigned teacher
+        assigned_teachers = {}
+        for row in AssignmentSummaryService.assignment_rows():
+            if row.grade_id == grade.id and row.stream_id == stream_id:
+                assigned_teachers.setdefault(row.subject_id, row.teacher_username)
+
+        total_students = stream['total_students'] if stream else 0
+        status_data = {
+            'grade': grade.name,
+            'stream': stream['name'] if stream else 'Unknown',
+            'term': board['term'].name if board['term'] else 'Unknown',
+            'assessment_type': board['assessment_type'].name if board['assessment_type'] else 'Unknown',
+            'subjects': [],
+            'overall_completion': 0,
+            'total_subjects': len(subjects),
+            'completed_subjects': 0,
+            'can_generate_report': False
+        }
+
+        for subject in subjects:
+            students_with_marks = stream['mark_counts'].get(subject.id, 0) if stream else 0
+            uploaded_by, upload_date = stream['uploads'].get(subject.id, (None, None)) if stream else (None, None)
+            is_uploaded = students_with_marks >= total_students and total_students > 0
+            status_data['subjects'].append({
+                'id': subject.id,
+                'name': subject.name,
+                'is_uploaded': is_uploaded,
+                'completion_percentage': (students_with_marks / total_students * 100) if total_students > 0 else 0,
+                'total_students': total_students,
+                'students_with_marks': students_with_marks,
+                'assigned_teacher': assigned_teachers.get(subject.id) or 'Unassigned',
+                'uploaded_by': uploaded_by,
+                'upload_date': upload_date.strftime('%Y-%m-%d %H:%M') if upload_date else None,
+                # Every subject listed for a teacher is one they may upload
+                'can_upload': True
+            })
+            if is_uploaded:
+                status_data['completed_subjects'] += 1
+
+        if status_data['total_subjects'] > 0:
+            status_data['overall_completion'] = (status_data['completed_subjects'] / status_data['total_subjects']) * 100
+            status_data['can_generate_report'] = status_data['completed_subjects'] == status_data['total_subjects']
+        return status_data
+
+    @staticmethod
+    def stream_summaries(board: Dict) -> List[Dict]:
+        """
+        Format the streams of a board for grade report generation.
+
+        Args:
+            board: Board from grade_board()
+
+        Returns:
+            List of dictionaries with id, name, display_name, total_students,
+            students_with_marks, completion_percentage, has_marks and can_generate_report
+        """
+        summaries = []
+        for stream in board['streams']:
+            total_students = stream['total_students']
+            students_with_marks = stream['students_with_marks']
+            has_marks = students_with_marks > 0
+            completion_percentage = (students_with_marks / total_students * 100) if total_students > 0 else 0
+            summaries.append({
+                'id': stream['id'],
+                'name': stream['name'],
+                'display_name': f"Stream {stream['name']}",
+                'total_students': total_students,
+                'students_with_marks': students_with_marks,
+                'completion_percentage': completion_percentage,
+                'has_marks': has_marks,
+                'can_generate_report': has_marks and completion_percentage >= 50  # At least 50% completion
+            })
+        return summaries
@@ -0,0 +1,173 @@
+"""
+Permission decision service: compiled, cached permission grants per teacher.
+
+A teacher's active FunctionPermission and ClassTeacherPermission rows are compiled
+once into dictionaries keyed by (function, scope) and (grade, stream), so each
+decision is a few dictionary lookups instead of up to three queries. Compiled
+grants are shared by all requests of the process and recompiled when the
+teacher's 'permissions:t<id>' cache scope moves (any grant, revoke or expiry
+update, see cache_invalidation_service.py). Expiry dates are kept with each grant
+and checked at decision time, so grants lapse on time without a recompile.
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from ..extensions import db
+from ..models.function_permission import FunctionPermission, DefaultFunctionPermissions
+from ..models.permission import ClassTeacherPermission
+from .cache_invalidation_service import CacheInvalidationService
+
+_NEVER = None  # Expiry of grants that do not expire
+
+DEFAULT_ALLOWED_FUNCTIONS = frozenset(
+    name for names in DefaultFunctionPermissions.DEFAULT_ALLOWED_FUNCTIONS.values() for name in names
+)
+RESTRICTED_FUNCTIONS = frozenset(
+    name for names in DefaultFunctionPermissions.RESTRICTED_FUNCTIONS.values() for name in names
+)
+
+
+def _merge_expiry(current, expires_at):
+    """Latest expiry of two grants for the same key (None never expires)."""
+    if current is _NEVER or expires_at is _NEVER:
+        return _NEVER
+    return max(current, expires_at)
+
+
+class TeacherGrants:
+    """A teacher's active grants, compiled for constant-time decisions."""
+
+    __slots__ = ('teacher_id', 'version', 'functions', 'classes')
+
+    def __init__(self, teacher_id: int, version: Optional[int], functions: Dict, classes: Dict):
+        """
+        Args:
+            teacher_id: ID of the teacher
+            version: Version of the teacher's permissions scope the grants were read at
+            functions: (function_name, scope key) -> expires_at, where the scope key is
+                ('global',), ('grade', grade_id) or ('stream', grade_id, stream_id)
+            classes: (grade_id, stream_id) -> expires_at
+        """
+        self.teacher_id = teacher_id
+        self.version = version
+        self.functions = functions
+        self.classes = classes
+
+    @staticmethod
+    def _valid(grants: Dict, key, now: datetime) -> bool:
+        if key not in grants:
+            return False
+        expires_at = grants[key]
+        return expires_at is _NEVER or now <= expires_at
+
+    def has_function(self, function_name: str, grade_id=None, stream_id=None, now: Optional[datetime] = None) -> bool:
+        """Explicit function grant, checked in order: stream scope -> grade scope -> global."""
+        now = now or datetime.utcnow()
+        if grade_id and stream_id and self._valid(self.functions, (function_name, ('stream', grade_id, stream_id)), now):
+            return True
+        if grade_id and self._valid(self.functions, (function_name, ('grade', grade_id)), now):
+            return True
+        return self._valid(self.functions, (function_name, ('global',)), now)
+
+    def has_class(self, grade_id: int, stream_id=None, now: Optional[datetime] = None) -> bool:
+        """Class teacher permission for a grade and stream (None for single classes)."""
+        return self._valid(self.classes, (grade_id, stream_id), now or datetime.utcnow())
+
+
+class PermissionDecisionService:
+    """Answers function and class permission checks from compiled grants."""
+
+    _grants: Dict[tuple, TeacherGrants] = {}  # (database URL, teacher_id) -> grants
+    _lock = threading.Lock()
+
+    @classmethod
+    def grants_for(cls, teacher_id: int) -> TeacherGrants:
+        """
+        Get the compiled grants of a teacher, recompiling them if they changed.
+
+        Args:
+            teacher_id: ID of the teacher
+
+        Returns:
+            TeacherGrants
+        """
+        version = CacheInvalidationService.scope_version(CacheInvalidationService.permission_scope(teacher_id))
+        key = (str(db.engine.url), teacher_id)
+        grants = cls._grants.get(key)
+        if grants is None or version is None or grants.version != version:
+            grants = cls._compile(teacher_id, version)
+            with cls._lock:
+                cls._grants[key] = grants
+        return grants
+
+    @staticmethod
+    def _compile(teacher_id: int, version: Optional[int]) -> TeacherGrants:
+        functions = {}
+        rows = db.session.query(
+            FunctionPermission.function_name, FunctionPermission.scope_type, FunctionPermission.grade_id,
+            FunctionPermission.stream_id, FunctionPermission.expires_at
+        ).filter(FunctionPermission.teacher_id == teacher_id, FunctionPermission.is_active == True)
+        for function_name, scope_type, grade_id, stream_id, expires_at in rows:
+            if scope_type == 'stream':
+                scope = ('stream', grade_id, stream_id)
+            elif scope_type == 'grade':
+                scope = ('grade', grade_id)
+            elif scope_type == 'global':
+                scope = ('global',)
+            else:
+                continue  # Other scope types were never honoured by has_function_permission
+            key = (function_name, scope)
+            functions[key] = _merge_expiry(functions[key], expires_at) if key in functions else expires_at
+
+        classes = {}
+        rows = db.session.query(
+            ClassTeacherPermission.grade_id, ClassTeacherPermission.stream_id,
+            ClassTeacherPermission.expires_at, ClassTeacherPermission.is_permanent
+        ).filter(ClassTeacherPermission.teacher_id == teacher_id, ClassTeacherPermission.is_active == True)
+        for grade_id, stream_id, expires_at, is_permanent in rows:
+            expires_at = _NEVER if is_permanent else expires_at
+            key = (grade_id, stream_id)
+            classes[key] = _merge_expiry(classes[key], expires_at) if key in classes else expires_at
+
+        return TeacherGrants(teacher_id, version, functions, classes)
+
+    @classmethod
+    def can(cls, teacher_id: int, function_names: Iterable[str], grade_id=None, stream_id=None) -> Dict[str, bool]:
+        """
+        Decide several function permissions at once (e.g. for a page of action buttons).
+
+        Default-allowed functions are always allowed, restricted functions need an
+        explicit grant in the given scope, and unknown functions are denied.
+
+        Args:
+            teacher_id: ID of the teacher
+            function_names: Function names to check
+            grade_id: Optional grade ID for scoped permissions
+            stream_id: Optional stream ID for scoped permissions
+
+        Returns:
+            Dictionary of function name -> allowed
+        """
+        grants = None
+        now = datetime.utcnow()
+        decisions = {}
+        for function_name in function_names:
+            if function_name in DEFAULT_ALLOWED_FUNCTIONS:
+                decisions[function_name] = True
+            elif function_name in RESTRICTED_FUNCTIONS:
+                grants = grants or cls.grants_for(teacher_id)
+                decisions[function_name] = grants.has_function(function_name, grade_id, stream_id, now)
+            else:
+                decisions[function_name] = False
+        return decisions
+
+    @classmethod
+    def has_function_permission(cls, teacher_id: int, function_name: str, grade_id=None, stream_id=None) -> bool:
+        """Check one function permission (see can())."""
+        return cls.can(teacher_id, [function_name], grade_id, stream_id)[function_name]
+
+    @classmethod
+    def has_class_permission(cls, teacher_id: int, grade_id: int, stream_id=None) -> bool:
+        """Check a class teacher permission for a grade and stream (None for single classes)."""
+        return cls.grants_for(teacher_id).has_class(grade_id, stream_id)
@@ -4,6 +4,8 @@ Handles permission granting, revoking, and checking for classteachers.
 """
 from ..models import ClassTeacherPermission, PermissionRequest, Teacher, Grade, Stream
 from ..extensions import db
+from .permission_decision_service import PermissionDecisionService
+from .reference_data_service import ReferenceDataService
 from flask import session
 
 class PermissionService:
@@ -23,23 +25,23 @@ class PermissionService:
             Boolean indicating if permission exists
         """
         try:
+            reference = ReferenceDataService.current()
+
             # Get grade object
-            grade = Grade.query.filter_by(name=grade_name).first()
+            grade = reference.grade_by_name.get(grade_name)
             if not grade:
                 return False
             
             # Get stream object if specified
             stream = None
             if stream_name:
-                stream = Stream.query.filter_by(name=stream_name, grade_id=grade.id).first()
+                stream = reference.stream(grade_name, stream_name)
                 if not stream:
                     return False
             
-            # Check permission
-            return ClassTeacherPermission.has_permission(
-                teacher_id=teacher_id,
-                grade_id=grade.id,
-                stream_id=stream.id if stream else None
+            # Check permission against the teacher's compiled grants
+            return PermissionDecisionService.has_class_permission(
+                teacher_id, grade.id, stream.id if stream else None
             )
             
         except Exception as e:
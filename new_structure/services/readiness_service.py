@@ -0,0 +1,134 @@
+"""
+Readiness Service - cache warm-up and readiness checks for production workers.
+
+Under gunicorn (gunicorn_config.py) the app is created once in the master process,
+warmed up, and then forked. warm_up() loads the process-wide reference data and
+school branding snapshots so every worker starts with them already in memory,
+shared copy-on-write, and closes the master's database connections so no worker
+inherits a socket.
+
+readiness() backs the /ready endpoint that load balancers poll. Unlike /health,
+which reports on the data in the database, it answers whether this process should
+receive traffic: the database is reachable, the caches are warm, and no drain has
+been requested. Creating the file named by READINESS_DRAIN_FILE makes every worker
+report not ready, so traffic can be moved away before the server is stopped.
+"""
+import logging
+import os
+import time
+from typing import Dict
+
+from sqlalchemy import text
+
+from ..extensions import db
+from .reference_data_service import ReferenceDataService
+from .dynamic_school_info_service import DynamicSchoolInfoService
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessService:
+    """Warms the process-wide caches and reports whether the process is ready."""
+
+    _warm = False
+    _warm_up_ms: Dict[str, float] = {}
+
+    @classmethod
+    def warm_up(cls, app, dispose_connections: bool = True) -> Dict:
+        """
+        Load the reference data and branding snapshots into this process.
+
+        Args:
+            app: Flask application
+            dispose_connections: Close pooled database connections afterwards (before a fork)
+
+        Returns:
+            Dictionary with success and the milliseconds each cache took to load
+        """
+        timings = {}
+        success = True
+        with app.test_request_context('/'):  # Branding builds static URLs
+            for name, load in (
+                ('reference_data', ReferenceDataService.current),
+                ('school_branding', DynamicSchoolInfoService.get_branding_snapshot),
+            ):
+                start = time.perf_counter()
+                try:
+                    load()
+                    timings[name] = round((time.perf_counter() - start) * 1000, 1)
+                except Exception as e:
+                    logger.error(f"Error warming up {name}: {e}")
+                    db.session.rollback()
+                    success = False
+            db.session.remove()
+            if dispose_connections:
+                for engine in db.engines.values():
+                    engine.dispose()
+
+        cls._warm = success
+        cls._warm_up_ms = timings
+        logger.info(f"Cache warm-up {'completed' if success else 'failed'}: {timings}")
+        return {'success': success, 'timings_ms': timings}
+
+    @staticmethod
+    def after_fork() -> None:
+        """
+        Drop the pooled connections inherited from the parent process.
+
+        The parent keeps using its own connections, so they are discarded without
+        being closed (closing would end the parent's sessions).
+        """
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    @staticmethod
+    def is_draining(app) -> bool:
+        """Check whether a drain has been requested through READINESS_DRAIN_FILE."""
+        drain_file = app.config.get('READINESS_DRAIN_FILE')
+        return bool(drain_file) and os.path.exists(drain_file)
+
+    @classmethod
+    def readiness(cls, app) -> Dict:
+        """
+        Check whether this process should receive traffic.
+
+        Retries the warm-up if it failed before the fork (e.g. the database was down).
+
+        Args:
+            app: Flask application
+
+        Returns:
+            Dictionary with ready, pid, draining, database, warm, warm_up_ms and,
+            when not ready, the reason
+        """
+        result = {
+            'ready': False,
+            'pid': os.getpid(),
+            'draining': cls.is_draining(app),
+            'database': False,
+            'warm': cls._warm,
+            'warm_up_ms': cls._warm_up_ms
+        }
+        if result['draining']:
+            result['reason'] = 'draining'
+            return result
+
+        try:
+            db.session.execute(text('SELECT 1'))
+            result['database'] = True
+        except Exception as e:
+            logger.error(f"Readiness database check failed: {e}")
+            db.session.rollback()
+            result['reason'] = 'database unavailable'
+            return result
+
+        if not cls._warm:
+            cls.warm_up(app, dispose_connections=False)
+            result['warm'] = cls._warm
+            result['warm_up_ms'] = cls._warm_up_ms
+            if not cls._warm:
+                result['reason'] = 'cache warm-up failed'
+                return result
+
+        result['ready'] = True
+        return result
@@ -0,0 +1,131 @@
+"""
+Recent Reports Service - the class report feed shown on the class teacher dashboards.
+
+Each report is a grade/stream/term/assessment combination that has marks. The feed
+is one grouped aggregate over Mark returning the mark count, class average and
+latest entry date of every combination, with the sorting and filters of the
+dashboards. Results are cached under the data version of all marks, so repeated
+dashboard loads cost a single version lookup until marks change.
+"""
+from typing import Dict, List
+from urllib.parse import quote
+
+from sqlalchemy import func
+
+from ..extensions import db
+from ..models import Grade, Stream, Term, AssessmentType, Student, Mark
+from .cache_service import get_or_compute_analytics
+
+
+class RecentReportsService:
+    """Grade/stream/term/assessment combinations that have marks, most recent first."""
+
+    @staticmethod
+    def combinations_query(sort_by: str = 'date', filter_grade: str = '', filter_term: str = '',
+                           filter_assessment: str = ''):
+        """
+        Build the grouped query of report combinations.
+
+        Args:
+            sort_by: 'date' (latest marks first), 'grade' or 'term'
+            filter_grade: Grade name to restrict to ('' for all)
+            filter_term: Term name to restrict to ('' for all)
+            filter_assessment: Assessment type name to restrict to ('' for all)
+
+        Returns:
+            Query yielding one row per combination with mark_count, percentage_total and latest_date
+        """
+        latest_date = func.max(Mark.created_at)
+        query = db.session.query(
+            Grade.id.label('grade_id'), Grade.name.label('grade'),
+            Stream.id.label('stream_id'), Stream.name.label('stream'),
+            Term.id.label('term_id'), Term.name.label('term'),
+            AssessmentType.id.label('assessment_type_id'), AssessmentType.name.label('assessment_type'),
+            func.count(Mark.id).label('mark_count'),
+            func.sum(Mark.percentage).label('percentage_total'),
+            latest_date.label('latest_date')
+        ).join(Student, Mark.student_id == Student.id)\
+         .join(Stream, Student.stream_id == Stream.id)\
+         .join(Grade, Stream.grade_id == Grade.id)\
+         .join(Term, Mark.term_id == Term.id)\
+         .join(AssessmentType, Mark.assessment_type_id == AssessmentType.id)\
+         .group_by(Grade.id, Grade.name, Stream.id, Stream.name, Term.id, Term.name,
+                   AssessmentType.id, AssessmentType.name)
+
+        if filter_grade:
+            query = query.filter(Grade.name == filter_grade)
+        if filter_term:
+            query = query.filter(Term.name == filter_term)
+        if filter_assessment:
+            query = query.filter(AssessmentType.name == filter_assessment)
+
+        if sort_by == 'grade':
+            query = query.order_by(Grade.name, latest_date.desc())
+        elif sort_by == 'term':
+            query = query.order_by(Term.name, latest_date.desc())
+        else:  # Default to date
+            query = query.order_by(latest_date.desc())
+        return query
+
+    @staticmethod
+    def to_report(row, index: int) -> Dict:
+        """
+        Format a row of combinations_query() for the templates.
+
+        Args:
+            row: Result row
+            index: 1-based position used as the report id
+
+        Returns:
+            Report dictionary
+        """
+        stream_param = f"Stream {row.stream}"
+        # Marks without a percentage count as 0 towards the class average
+        class_average = round((row.percentage_total or 0) / row.mark_count, 1) if row.mark_count else 0
+        return {
+            'id': index,
+            'grade': row.grade,
+            'stream': stream_param,
+            'term': row.term,
+            'assessment_type': row.assessment_type,
+            'date': row.latest_date.strftime('%Y-%m-%d') if row.latest_date else 'N/A',
+            'mark_count': row.mark_count,
+            'class_average': class_average,
+            'grade_id': row.grade_id,
+            'stream_id': row.stream_id,
+            'term_id': row.term_id,
+            'assessment_type_id': row.assessment_type_id,
+            'subject_id': None,  # These are class reports, not subject-specific
+            'download_url': (f"/classteacher/preview_class_report/{quote(row.grade)}/{quote(stream_param)}/"
+                             f"{quote(row.term)}/{quote(row.assessment_type)}")
+        }
+
+    @classmethod
+    def get_recent_reports(cls, limit: int = 10, sort_by: str = 'date', filter_grade: str = '',
+                           filter_term: str = '', filter_assessment: str = '',
+                           use_cache: bool = True) -> List[Dict]:
+        """
+        Get the most recent report combinations with mark counts and class averages.
+
+        Args:
+            limit: Maximum number of reports
+            sort_by: 'date', 'grade' or 'term'
+            filter_grade: Grade name to restrict to ('' for all)
+            filter_term: Term name to restrict to ('' for all)
+            filter_assessment: Assessment type name to restrict to ('' for all)
+            use_cache: Whether to use the cached feed
+
+        Returns:
+            List of report dictionaries
+        """
+        if use_cache:
+            cache_key = f"recent_reports_{limit}_{sort_by}_{filter_grade}_{filter_term}_{filter_assessment}"
+            return get_or_compute_analytics(
+                cache_key, lambda: cls.get_recent_reports(
+                    limit, sort_by, filter_grade, filter_term, filter_assessment, use_cache=False
+                ),
+                scope={}
+            )
+
+        rows = cls.combinations_query(sort_by, filter_grade, filter_term, filter_assessment).limit(limit).all()
+        return [cls.to_report(row, index) for index, row in enumerate(rows, start=1)]
@@ -0,0 +1,181 @@
+"""
+Reference Data Service - process-wide snapshot of the school's reference tables.
+
+Grades, streams, terms, assessment types, subjects and subject components change
+rarely but are read on nearly every page. ReferenceDataService.current() returns an
+immutable ReferenceData snapshot with id and name indexes, loaded once per process
+and reloaded when the 'reference' cache scope is bumped (any insert, update or
+delete on those tables, see cache_invalidation_service.py). Checking the version
+costs one primary-key lookup per request.
+
+Rows are read-only named tuples with the model's column attributes, so code that
+only needs ids, names and columns can use them in place of ORM objects. Code that
+follows relationships or modifies rows must keep querying the models.
+"""
+import logging
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import inspect, select
+
+from ..extensions import db
+from ..models import Grade, Stream, Term, AssessmentType, Subject
+from ..models.academic import SubjectComponent
+from .cache_invalidation_service import CacheInvalidationService, REFERENCE_SCOPE
+
+logger = logging.getLogger(__name__)
+
+_row_types = {}
+
+
+def _row_type(model):
+    """Named tuple type with the column attributes of a model."""
+    if model not in _row_types:
+        keys = [attr.key for attr in inspect(model).column_attrs]
+        _row_types[model] = namedtuple(f"{model.__name__}Ref", keys)
+    return _row_types[model]
+
+
+def _load_rows(model) -> Tuple:
+    row_type = _row_type(model)
+    columns = [getattr(model, key) for key in row_type._fields]
+    result = db.session.execute(select(*columns).order_by(model.id))
+    return tuple(row_type(*row) for row in result)
+
+
+def _group(rows, key) -> MappingProxyType:
+    groups: Dict = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    return MappingProxyType({k: tuple(v) for k, v in groups.items()})
+
+
+class ReferenceData:
+    """Immutable snapshot of the reference tables with lookup indexes."""
+
+    __slots__ = (
+        'version', 'grades', 'streams', 'terms', 'assessment_types', 'subjects', 'components',
+        'grade_by_id', 'grade_by_name', 'stream_by_id', 'streams_by_grade', 'term_by_id',
+        'term_by_name', 'assessment_type_by_id', 'assessment_type_by_name', 'subject_by_id',
+        'subjects_by_level', 'components_by_subject', 'component_subjects', '_stream_by_names'
+    )
+
+    def __init__(self, version: int, grades, streams, terms, assessment_types, subjects, components):
+        """
+        Args:
+            version: Version of the 'reference' scope the rows were read at
+            grades, streams, terms, assessment_types, subjects, components: Row tuples ordered by id
+        """
+        values = {
+            'version': version,
+            'grades': grades,
+            'streams': streams,
+            'terms': terms,
+            'assessment_types': assessment_types,
+            'subjects': subjects,
+            'components': components,
+            'grade_by_id': MappingProxyType({g.id: g for g in grades}),
+            'grade_by_name': MappingProxyType({g.name: g for g in grades}),
+            'stream_by_id': MappingProxyType({s.id: s for s in streams}),
+            'streams_by_grade': _group(streams, lambda s: s.grade_id),
+            'term_by_id': MappingProxyType({t.id: t for t in terms}),
+            'term_by_name': MappingProxyType({t.name: t for t in terms}),
+            'assessment_type_by_id': MappingProxyType({a.id: a for a in assessment_types}),
+            'assessment_type_by_name': MappingProxyType({a.name: a for a in assessment_types}),
+            'subject_by_id': MappingProxyType({s.id: s for s in subjects}),
+            'subjects_by_level': _group(subjects, lambda s: s.education_level),
+            # SubjectComponent rows of each composite subject
+            'components_by_subject': _group(components, lambda c: c.subject_id),
+            # Component subjects (e.g. English Grammar) by (composite name, education level)
+            'component_subjects': _group(
+                [s for s in subjects if s.is_component and s.composite_parent],
+                lambda s: (s.composite_parent, s.education_level)
+            ),
+        }
+        grade_names = {g.id: g.name for g in grades}
+        values['_stream_by_names'] = MappingProxyType(
+            {(grade_names.get(s.grade_id), s.name): s for s in streams}
+        )
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ReferenceData is immutable")
+
+    def grade_names(self):
+        """Names of all grades, in id order."""
+        return [g.name for g in self.grades]
+
+    def term_names(self):
+        """Names of all terms, in id order."""
+        return [t.name for t in self.terms]
+
+    def assessment_type_names(self):
+        """Names of all assessment types, in id order."""
+        return [a.name for a in self.assessment_types]
+
+    def subject_names(self, education_level: Optional[str] = None):
+        """Names of all subjects, or of one education level, in id order."""
+        subjects = self.subjects_by_level.get(education_level, ()) if education_level else self.subjects
+        return [s.name for s in subjects]
+
+    def stream(self, grade_name: str, stream_name: str):
+        """
+        Look up a stream by grade name and stream name.
+
+        Args:
+            grade_name: Grade name, e.g. 'Grade 5'
+            stream_name: 'Stream A' or 'A'
+
+        Returns:
+            The stream row, or None
+        """
+        if not stream_name:
+            return None
+        return self._stream_by_names.get((grade_name, str(stream_name).split()[-1]))
+
+    def education_level_for_grade(self, grade_name: str) -> str:
+        """Education level of a grade by name, or '' if the grade does not exist."""
+        grade = self.grade_by_name.get(grade_name)
+        return grade.education_level if grade else ''
+
+
+class ReferenceDataService:
+    """Loads and refreshes the process-wide ReferenceData snapshot."""
+
+    _snapshots: Dict[str, ReferenceData] = {}  # Database URL -> snapshot
+    _lock = threading.Lock()
+
+    @classmethod
+    def current(cls) -> ReferenceData:
+        """
+        Get the reference data snapshot, reloading it if the reference tables changed.
+
+        Returns:
+            ReferenceData snapshot
+        """
+        version = CacheInvalidationService.scope_version(REFERENCE_SCOPE)
+        key = str(db.engine.url)
+        snapshot = cls._snapshots.get(key)
+        if snapshot is not None and version is not None and snapshot.version == version:
+            return snapshot
+        with cls._lock:
+            snapshot = cls._snapshots.get(key)
+            if snapshot is None or version is None or snapshot.version != version:
+                snapshot = cls._snapshots[key] = cls._load(version)
+        return snapshot
+
+    @staticmethod
+    def _load(version: int) -> ReferenceData:
+        logger.info(f"Loading reference data snapshot (version {version})")
+        return ReferenceData(
+            version,
+            grades=_load_rows(Grade),
+            streams=_load_rows(Stream),
+            terms=_load_rows(Term),
+            assessment_types=_load_rows(AssessmentType),
+            subjects=_load_rows(Subject),
+            components=_load_rows(SubjectComponent),
+        )
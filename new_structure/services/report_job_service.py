@@ -0,0 +1,374 @@
+"""
+Report Job Service - durable background jobs for long-running report generation.
+
+Jobs are stored in the report_job table and executed on a SimpleTaskQueue, so a
+request only enqueues work and returns a job ID. The browser then polls the job's
+progress and downloads the finished artifact.
+
+Only serving processes run jobs: run.py and each gunicorn worker (post_fork) call
+resume(), which also starts a maintenance thread. Every REPORT_JOBS_HEARTBEAT_SECONDS
+it refreshes the heartbeat of the jobs this process is running, puts back jobs whose
+process stopped sending heartbeats (a recycled or killed worker) and starts pending
+ones. CLI commands and other short-lived processes create the app without resuming,
+so they never claim a job on threads that die with them.
+
+Handlers are registered per job type and called as
+    handler(params, output_dir, progress) -> (artifact_path, download_filename)
+where progress(current, total=None, message=None) records progress and raises
+JobCancelled once cancellation has been requested.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from ..models.report_job import ReportJob
+from ..extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when the job has been cancelled."""
+
+
+class ReportJobService:
+    """Service for enqueueing, running, tracking and cancelling report jobs."""
+
+    _handlers: Dict[str, Callable] = {}
+    _queue = None
+    _app = None
+    _serving_pid = None  # Process that called resume(); others never start jobs
+    _running = set()  # IDs of the jobs this process is running
+    _running_lock = threading.Lock()
+
+    @classmethod
+    def register_handler(cls, job_type: str, handler: Callable) -> None:
+        """Register the function that runs jobs of the given type."""
+        cls._handlers[job_type] = handler
+
+    @classmethod
+    def init_app(cls, app) -> None:
+        """Attach the service to the app. Jobs only start once a serving process calls resume()."""
+        cls._app = app
+
+    @classmethod
+    def resume(cls, app) -> None:
+        """
+        Make this process run jobs: requeue stale jobs, drop expired ones and start pending ones.
+
+        Called by run.py and by each gunicorn worker after the fork (job threads
+        started in the master would not survive the fork). Jobs are claimed
+        atomically, so several workers may resume at once. Only rows are changed:
+        the report_job table is created by `flask init-db`.
+        """
+        cls._app = app
+        if cls._serving_pid != os.getpid():
+            cls._serving_pid = os.getpid()
+            cls._running = set()
+            thread = threading.Thread(target=cls._maintain, name='report-job-maintenance', daemon=True)
+            thread.start()
+        cls._maintenance_pass()
+
+    @classmethod
+    def _maintenance_pass(cls) -> None:
+        """Refresh heartbeats, recover stale jobs, drop expired artifacts and start pending jobs."""
+        with cls._app.app_context():
+            try:
+                cls.heartbeat()
+                cls.recover_stale_jobs()
+                cls.cleanup_expired()
+                cls.dispatch()
+            except Exception as e:
+                logger.error(f"Error maintaining report jobs (run `flask init-db` if report_job is missing): {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    @classmethod
+    def _maintain(cls) -> None:
+        interval = cls._config('REPORT_JOBS_HEARTBEAT_SECONDS', 60)
+        while True:
+            time.sleep(interval)
+            cls._maintenance_pass()
+
+    @classmethod
+    def heartbeat(cls) -> int:
+        """Refresh the heartbeat of the jobs running in this process, so no other process recovers them."""
+        with cls._running_lock:
+            job_ids = list(cls._running)
+        if not job_ids:
+            return 0
+        updated = ReportJob.query.filter(
+            ReportJob.id.in_(job_ids), ReportJob.status == ReportJob.RUNNING
+        ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return updated
+
+    @classmethod
+    def _get_queue(cls):
+        if cls._queue is None:
+            from ..utils.background_tasks import SimpleTaskQueue
+            cls._queue = SimpleTaskQueue(max_workers=cls._config('REPORT_JOBS_WORKERS', 2))
+        return cls._queue
+
+    @classmethod
+    def _config(cls, key, default=None):
+        app = cls._app or current_app
+        return app.config.get(key, default)
+
+    @classmethod
+    def jobs_dir(cls) -> str:
+        """Directory that holds one sub-directory of artifacts per job."""
+        app = cls._app or current_app
+        return cls._config('REPORT_JOBS_DIR') or os.path.join(app.instance_path, 'report_jobs')
+
+    @classmethod
+    def school_key(cls) -> str:
+        """Key that scopes the concurrency limit to this school's deployment."""
+        return cls._config('SCHOOL_KEY') or 'default'
+
+    @classmethod
+    def enqueue(cls, job_type: str, params: Dict, created_by: Optional[int] = None) -> ReportJob:
+        """
+        Persist a new job and start it if the school is below its concurrency limit.
+
+        Args:
+            job_type: A registered job type
+            params: JSON-serializable handler arguments
+            created_by: ID of the teacher who requested the job
+
+        Returns:
+            The ReportJob row
+        """
+        if job_type not in cls._handlers:
+            raise ValueError(f"Unknown report job type: {job_type}")
+
+        job = ReportJob(
+            id=uuid.uuid4().hex,
+            job_type=job_type,
+            school_key=cls.school_key(),
+            created_by=created_by,
+            status=ReportJob.PENDING,
+            message='Waiting to start'
+        )
+        job.set_params(params)
+        db.session.add(job)
+        db.session.commit()
+
+        cls.dispatch()
+        db.session.refresh(job)
+        return job
+
+    @classmethod
+    def find_active(cls, job_type: str, params: Dict, created_by: Optional[int] = None) -> Optional[ReportJob]:
+        """
+        Return a pending or running job with the same type and arguments, if any.
+
+        Args:
+            job_type: A registered job type
+            params: Handler arguments, compared in their stored JSON form
+            created_by: Only match jobs requested by this teacher, when given
+
+        Returns:
+            The oldest matching ReportJob, or None
+        """
+        query = ReportJob.query.filter(
+            ReportJob.job_type == job_type,
+            ReportJob.params == json.dumps(params),
+            ReportJob.status.in_([ReportJob.PENDING, ReportJob.RUNNING])
+        )
+        if created_by is not None:
+            query = query.filter(ReportJob.created_by == created_by)
+        return query.order_by(ReportJob.created_at).first()
+
+    @classmethod
+    def dispatch(cls) -> int:
+        """
+        Start pending jobs, oldest first, up to REPORT_JOBS_MAX_PER_SCHOOL running jobs.
+
+        A running job holds a slot number below the limit, unique per school, so the
+        claim is one conditional UPDATE: when another process takes the same slot
+        first the unique constraint rejects it, and when it takes the same job the
+        UPDATE matches no row. Every worker can therefore dispatch at once. Processes
+        that have not called resume() leave jobs pending for a serving process.
+        """
+        if cls._serving_pid != os.getpid():
+            return 0
+        limit = cls._config('REPORT_JOBS_MAX_PER_SCHOOL', 2)
+        school_key = cls.school_key()
+        started = 0
+
+        taken = {slot for (slot,) in db.session.query(ReportJob.run_slot).filter(
+            ReportJob.school_key == school_key, ReportJob.run_slot.isnot(None))}
+        free_slots = [slot for slot in range(limit) if slot not in taken]
+        if not free_slots:
+            return 0
+
+        pending = db.session.query(ReportJob.id, ReportJob.attempts).filter_by(
+            school_key=school_key, status=ReportJob.PENDING
+        ).order_by(ReportJob.created_at).limit(len(free_slots)).all()
+        for job_id, attempts in pending:
+            while free_slots:
+                slot = free_slots.pop(0)
+                now = datetime.utcnow()
+                try:
+                    claimed = ReportJob.query.filter_by(id=job_id, status=ReportJob.PENDING).update({
+                        'status': ReportJob.RUNNING,
+                        'run_slot': slot,
+                        'started_at': now,
+                        'heartbeat_at': now,
+                        'attempts': (attempts or 0) + 1,
+                        'message': 'Starting'
+                    }, synchronize_session=False)
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()  # Another process took this slot; try the next one
+                    continue
+                if claimed:
+                    with cls._running_lock:
+                        cls._running.add(job_id)
+                    cls._get_queue().enqueue(cls._run, job_id)
+                    started += 1
+                else:
+                    free_slots.insert(0, slot)  # Job started elsewhere; the slot is still free
+                break
+            if not free_slots:
+                break
+        return started
+
+    @classmethod
+    def _run(cls, job_id: str) -> None:
+        """Execute a claimed job inside an app and request context (for url_for/templates)."""
+        with cls._app.test_request_context():
+            job = ReportJob.query.get(job_id)
+            if not job:
+                with cls._running_lock:
+                    cls._running.discard(job_id)
+                return
+            output_dir = os.path.join(cls.jobs_dir(), job.id)
+            os.makedirs(output_dir, exist_ok=True)
+
+            def progress(current, total=None, message=None):
+                db.session.refresh(job)
+                if job.cancel_requested:
+                    raise JobCancelled()
+                job.progress_current = current
+                if total is not None:
+                    job.progress_total = total
+                if message:
+                    job.message = message[:255]
+                job.heartbeat_at = datetime.utcnow()
+                db.session.commit()
+
+            try:
+                handler = cls._handlers[job.job_type]
+                result_path, result_filename = handler(job.get_params(), output_dir, progress)
+                db.session.refresh(job)
+                job.status = ReportJob.SUCCESS
+                job.result_path = result_path
+                job.result_filename = result_filename
+                job.progress_current = job.progress_total or job.progress_current
+                job.message = 'Ready to download'
+            except JobCancelled:
+                db.session.rollback()
+                job.status = ReportJob.CANCELLED
+                job.message = 'Cancelled'
+                shutil.rmtree(output_dir, ignore_errors=True)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Report job {job.id} ({job.job_type}) failed: {e}")
+                job.status = ReportJob.FAILED
+                job.error = str(e)
+                job.message = 'Failed'
+                shutil.rmtree(output_dir, ignore_errors=True)
+            finally:
+                job.completed_at = datetime.utcnow()
+                job.run_slot = None
+                db.session.commit()
+                with cls._running_lock:
+                    cls._running.discard(job.id)
+
+            try:
+                cls.dispatch()
+            finally:
+                db.session.remove()
+
+    @classmethod
+    def get_job(cls, job_id: str, teacher_id: Optional[int] = None) -> Optional[ReportJob]:
+        """Get a job, optionally only if it was created by the given teacher."""
+        job = ReportJob.query.get(job_id)
+        if job and teacher_id is not None and job.created_by not in (None, teacher_id):
+            return None
+        return job
+
+    @classmethod
+    def cancel(cls, job: ReportJob) -> ReportJob:
+        """
+        Cancel a pending job immediately or ask a running job to stop.
+
+        Both are conditional UPDATEs on the current status, so a job another worker
+        has just started is asked to stop rather than marked cancelled mid-render.
+        """
+        cancelled = ReportJob.query.filter_by(id=job.id, status=ReportJob.PENDING).update({
+            'status': ReportJob.CANCELLED,
+            'message': 'Cancelled',
+            'completed_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if not cancelled:
+            ReportJob.query.filter_by(id=job.id, status=ReportJob.RUNNING).update({
+                'cancel_requested': True,
+                'message': 'Cancelling'
+            }, synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(job)
+        return job
+
+    @classmethod
+    def recover_stale_jobs(cls) -> int:
+        """Requeue running jobs whose worker stopped sending heartbeats."""
+        cutoff = datetime.utcnow() - timedelta(seconds=cls._config('REPORT_JOBS_STALE_SECONDS', 600))
+        max_attempts = cls._config('REPORT_JOBS_MAX_ATTEMPTS', 3)
+        stale = ReportJob.query.filter(
+            ReportJob.status == ReportJob.RUNNING,
+            db.or_(ReportJob.heartbeat_at.is_(None), ReportJob.heartbeat_at < cutoff)
+        ).all()
+        for job in stale:
+            job.run_slot = None
+            if job.cancel_requested:
+                job.status = ReportJob.CANCELLED
+                job.completed_at = datetime.utcnow()
+            elif (job.attempts or 0) >= max_attempts:
+                job.status = ReportJob.FAILED
+                job.error = 'Interrupted too many times'
+                job.completed_at = datetime.utcnow()
+            else:
+                job.status = ReportJob.PENDING
+                job.message = 'Resuming after restart'
+                job.progress_current = 0
+        db.session.commit()
+        return len(stale)
+
+    @classmethod
+    def cleanup_expired(cls) -> int:
+        """Delete artifacts of jobs finished more than REPORT_JOBS_RETENTION_HOURS ago."""
+        cutoff = datetime.utcnow() - timedelta(hours=cls._config('REPORT_JOBS_RETENTION_HOURS', 24))
+        expired = ReportJob.query.filter(
+            ReportJob.status.in_(ReportJob.FINISHED_STATES),
+            ReportJob.completed_at < cutoff,
+            ReportJob.result_path.isnot(None)
+        ).all()
+        for job in expired:
+            shutil.rmtree(os.path.join(cls.jobs_dir(), job.id), ignore_errors=True)
+            job.result_path = None
+            job.message = 'Expired'
+        db.session.commit()
+        return len(expired)
@@ -17,19 +17,12 @@ from reportlab.lib.units import inch
 from flask import render_template_string
 from .enhanced_composite_service import EnhancedCompositeService
 
-def get_class_report_data(grade, stream, term, assessment_type, selected_subject_ids=None):
+def _resolve_report_selection(grade, stream, term, assessment_type):
     """
-    Get data for a class report.
-
-    Args:
-        grade: The grade level
-        stream: The class stream
-        term: The term
-        assessment_type: The assessment type
-        selected_subject_ids: Optional list of subject IDs to include in the report
+    Resolve report names to (stream, term, assessment type) objects.
 
     Returns:
-        Dictionary containing class report data
+        Tuple of (stream_obj, term_obj, assessment_type_obj, error message or None)
     """
     # Get the stream object - handle different stream name formats
     if stream.startswith("Stream "):
@@ -49,207 +42,96 @@ def get_class_report_data(grade, stream, term, assessment_type, selected_subject
             stream_letter = alt_stream_letter
 
     if not stream_obj:
-        return {"error": f"No students found for grade {grade} stream {stream_letter}"}
+        return None, None, None, f"No students found for grade {grade} stream {stream_letter}"
 
     # Get the term and assessment type objects
     term_obj = Term.query.filter_by(name=term).first()
     assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
 
     if not (term_obj and assessment_type_obj):
-        return {"error": "Invalid selection for term or assessment type"}
-
-    # Get the students in the stream
-    students = Student.query.filter_by(stream_id=stream_obj.id).all()
-
-    # Determine education level based on grade
-    grade_num = int(grade.split()[1]) if len(grade.split()) > 1 else int(grade)
-    if 1 <= grade_num <= 3:
-        education_level = "lower_primary"
-    elif 4 <= grade_num <= 6:
-        education_level = "upper_primary"
-    elif 7 <= grade_num <= 9:
-        education_level = "junior_secondary"
-    else:
-        education_level = ""
+        return None, None, None, "Invalid selection for term or assessment type"
 
-    # Import the composite subject service for new architecture
-    from .composite_subject_service import CompositeSubjectService
+    return stream_obj, term_obj, assessment_type_obj, None
 
-    # Get subjects for this education level using the new architecture
-    if education_level:
-        # Get subjects for upload (excludes old composite subjects, includes components)
-        all_subjects = CompositeSubjectService.get_subjects_for_upload(education_level)
 
-        # Filter by selected subject IDs if provided
-        if selected_subject_ids and len(selected_subject_ids) > 0:
-            subjects = [s for s in all_subjects if s.id in selected_subject_ids]
-        else:
-            subjects = all_subjects
-    else:
-        # Fallback to all subjects if education level can't be determined
-        subjects_query = Subject.query
-        if selected_subject_ids and len(selected_subject_ids) > 0:
-            subjects_query = subjects_query.filter(Subject.id.in_(selected_subject_ids))
-        subjects = subjects_query.all()
-
-    # Prepare class data
-    class_data = []
-    default_total_marks = 100  # Default total marks if not specified
-
-    for student in students:
-        student_marks = {}
-        student_raw_marks = {}
-        subject_count = 0
-        student_standardized_total = 0
-
-        # Import the composite subject service for new architecture
-        from .composite_subject_service import CompositeSubjectService
-
-        # Get all composite subjects for this education level
-        composite_subjects = CompositeSubjectService.get_all_composite_subjects(education_level)
+def get_class_report_data(grade, stream, term, assessment_type, selected_subject_ids=None):
+    """
+    Get data for a class report.
 
-        # Process subjects: handle both regular subjects and composite subjects
-        processed_subjects = {}
+    Args:
+        grade: The grade level
+        stream: The class stream
+        term: The term
+        assessment_type: The assessment type
+        selected_subject_ids: Optional list of subject IDs to include in the report
 
-        for subject in subjects:
-            # Skip component subjects - they'll be handled as part of composite subjects
-            if hasattr(subject, 'is_component') and subject.is_component:
-                continue
-
-            # Skip old composite subjects - they're replaced by the new architecture
-            if hasattr(subject, 'is_composite') and subject.is_composite:
-                continue
-
-            # Handle regular subjects
-            mark = Mark.query.filter_by(
-                student_id=student.id,
-                subject_id=subject.id,
-                term_id=term_obj.id,
-                assessment_type_id=assessment_type_obj.id
-            ).first()
-
-            if mark:
-                processed_subjects[subject.name] = mark.percentage
-
-        # Handle composite subjects using the new architecture
-        student_component_marks = {}
-        for composite_name in composite_subjects:
-            composite_data = CompositeSubjectService.get_composite_subject_mark(
-                student.id, composite_name, term_obj.id, assessment_type_obj.id, education_level
-            )
-
-            if composite_data:
-                processed_subjects[composite_name] = composite_data['combined_percentage']
-
-                # Store component marks for template
-                student_component_marks[composite_name] = {}
-                for component_name, component_data in composite_data['components'].items():
-                    student_component_marks[composite_name][component_name] = component_data['percentage']
-
-        # Calculate totals and averages from processed subjects
-        for subject_name, percentage in processed_subjects.items():
-            # Ensure percentage doesn't exceed 100%
-            standardized_mark = min(percentage, 100.0) if percentage > 0 else 0
-
-            # Store the standardized mark
-            student_marks[subject_name] = standardized_mark
-            student_raw_marks[subject_name] = standardized_mark  # For compatibility
-
-            # Add to standardized total for average calculation
-            if standardized_mark > 0:
-                student_standardized_total += standardized_mark
-                subject_count += 1
-
-        # Calculate total possible marks based on processed subjects (includes composite subjects)
-        total_possible_marks = len(processed_subjects) * 100  # Always 100 per subject for standardized marks
-
-        # Calculate average only for subjects that have marks
-        if subject_count > 0:
-            avg_percentage = student_standardized_total / subject_count
-        else:
-            avg_percentage = 0
-
-        class_data.append({
-            'student': student.name,
-            'student_id': student.id,  # Add student ID for component marks lookup
-            'marks': student_marks,
-            'raw_marks': student_raw_marks,
-            'component_marks': student_component_marks,  # Add component marks
-            'total_marks': student_standardized_total,
-            'total_possible_marks': total_possible_marks,
-            'average_percentage': avg_percentage,
-            'subject_count': subject_count
-        })
-
-    # Sort by total marks (descending)
-    class_data.sort(key=lambda x: x['total_marks'], reverse=True)
-
-    # Add ranking
-    for i, student_data in enumerate(class_data, 1):
-        student_data['rank'] = i
-
-    # Calculate statistics
-    stats = {'exceeding': 0, 'meeting': 0, 'approaching': 0, 'below': 0}
-    for student_data in class_data:
-        avg = student_data['average_percentage']
-        if avg >= 75:
-            stats['exceeding'] += 1
-        elif 41 <= avg < 75:
-            stats['meeting'] += 1
-        elif 21 <= avg < 41:
-            stats['approaching'] += 1
-        else:
-            stats['below'] += 1
+    Returns:
+        Dictionary containing class report data
+    """
+    stream_obj, term_obj, assessment_type_obj, error = _resolve_report_selection(grade, stream, term, assessment_type)
+    if error:
+        return {"error": error}
+
+    # Determine education level based on grade, then load all marks for the stream in bulk
+    from .class_report_engine import ClassReportEngine
+    education_level = ClassReportEngine.education_level_for_grade(grade)
+    report = ClassReportEngine.build(
+        stream_obj.id, term_obj.id, assessment_type_obj.id, education_level, selected_subject_ids
+    )
+    default_total_marks = 100  # Default total marks if not specified
 
-    # Build the final subjects list including composite subjects
-    final_subjects = []
+    return {
+        "class_data": report['class_data'],
+        "stats": report['stats'],
+        "subjects": report['subjects'],
+        "subject_components": report['subject_components'],  # Add component structure
+        "component_marks_data": report['component_marks_data'],  # Add component marks data
+        "subject_statistics": report['subject_statistics'],
+        "total_marks": default_total_marks,  # Using default total marks
+        "error": None,
+        "education_level": education_level
+    }
 
-    # Add regular subjects (non-component, non-composite)
-    for subject in subjects:
-        if not (hasattr(subject, 'is_component') and subject.is_component) and not (hasattr(subject, 'is_composite') and subject.is_composite):
-            final_subjects.append(subject.name)
 
-    # Add composite subjects
-    composite_subjects = CompositeSubjectService.get_all_composite_subjects(education_level)
-    final_subjects.extend(composite_subjects)
+def get_individual_report_data(grade, stream, term, assessment_type):
+    """
+    Get the class rows an individual report needs, read from the stored term summaries.
 
-    # Sort the final subjects list
-    final_subjects.sort()
+    Individual reports only use each learner's marks, totals and class position, which
+    StudentTermSummary already holds, so the class report is only rebuilt from marks
+    when the stream has no summaries yet.
 
-    # Prepare component structure data for template
-    subject_components = {}
-    component_marks_data = {}
+    Args:
+        grade: The grade level
+        stream: The class stream
+        term: The term
+        assessment_type: The assessment type
 
-    for composite_name in composite_subjects:
-        # Get component subjects for this composite
-        component_subjects = Subject.query.filter_by(
-            composite_parent=composite_name,
-            education_level=education_level,
-            is_component=True
-        ).all()
+    Returns:
+        Dictionary with class_data, subjects, total_marks, error and education_level
+    """
+    stream_obj, term_obj, assessment_type_obj, error = _resolve_report_selection(grade, stream, term, assessment_type)
+    if error:
+        return {"error": error}
 
-        if component_subjects:
-            subject_components[composite_name] = component_subjects
+    from .class_report_engine import ClassReportEngine
+    from .term_summary_service import TermSummaryService
+    class_data = TermSummaryService.get_class_rows(stream_obj.id, term_obj.id, assessment_type_obj.id)
+    if class_data is None:
+        return get_class_report_data(grade, stream, term, assessment_type)
 
-            # Prepare component marks data structure expected by template
-            component_marks_data = {}
-            for student_data in class_data:
-                student_id = student_data['student_id']
-                component_marks_data[student_id] = student_data.get('component_marks', {})
+    education_level = ClassReportEngine.education_level_for_grade(grade)
+    regular_subjects, component_map = ClassReportEngine.load_subjects(education_level)
 
     return {
         "class_data": class_data,
-        "stats": stats,
-        "subjects": final_subjects,
-        "subject_components": subject_components,  # Add component structure
-        "component_marks_data": component_marks_data,  # Add component marks data
-        "total_marks": default_total_marks,  # Using default total marks
+        "subjects": sorted([s.name for s in regular_subjects] + list(component_map.keys())),
+        "total_marks": 100,
         "error": None,
         "education_level": education_level
     }
 
 
-
 def generate_class_report_pdf_from_html(grade, stream, term, assessment_type, class_data, stats, total_marks, subjects, education_level="", subject_averages=None, class_average=0, selected_subject_ids=None, staff_info=None):
     """
     Generate a PDF report for a class using HTML template.
@@ -980,7 +862,7 @@ def generate_individual_report(student, grade, stream, term, assessment_type, ed
         Path to the generated PDF file or error message
     """
     # Get class data
-    class_data_result = get_class_report_data(grade, stream, term, assessment_type)
+    class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
 
     if class_data_result.get("error"):
         return {"error": class_data_result["error"]}
@@ -14,6 +14,9 @@ class RoleBasedDataService:
     def get_teacher_assignments_summary(teacher_id, role):
         """
         Get a comprehensive summary of teacher assignments based on role.
+
+        Assignments are read with their teacher, subject, grade and stream in one
+        cached query (see AssignmentSummaryService).
         
         Args:
             teacher_id: ID of the teacher
@@ -23,174 +26,11 @@ class RoleBasedDataService:
             Dictionary containing assignment summary data
         """
         try:
-            teacher = Teacher.query.get(teacher_id)
-            if not teacher:
-                return {'error': 'Teacher not found'}
-            
-            # Get all assignments for this teacher (exclude assignments with null subjects)
-            teacher_assignments = TeacherSubjectAssignment.query.filter(
-                TeacherSubjectAssignment.teacher_id == teacher_id,
-                TeacherSubjectAssignment.subject_id.isnot(None)
-            ).all()
-            
-            # Initialize summary data
-            summary = {
-                'teacher': teacher,
-                'role': role,
-                'class_teacher_assignments': [],
-                'subject_assignments': [],
-                'total_classes_managed': 0,
-                'total_subjects_taught': 0,
-                'grades_involved': set(),
-                'streams_involved': set(),
-                'subjects_involved': set()
-            }
-            
-            # Process assignments based on role
-            if role == 'headteacher':
-                # Headteacher sees everything
-                summary.update(RoleBasedDataService._get_headteacher_summary())
-                
-            elif role == 'classteacher':
-                # Class teacher sees their classes + all their subject assignments
-                summary.update(RoleBasedDataService._get_classteacher_summary(teacher_assignments))
-                
-            elif role == 'teacher':
-                # Subject teacher sees only their subject assignments
-                summary.update(RoleBasedDataService._get_subject_teacher_summary(teacher_assignments))
-            
-            return summary
-            
-        except Exception as e:
-            return {'error': f'Error getting teacher assignments: {str(e)}'}
-    
-    @staticmethod
-    def _get_headteacher_summary():
-        """Get summary data for headteacher (all data)."""
-        try:
-            all_assignments = TeacherSubjectAssignment.query.filter(
-                TeacherSubjectAssignment.subject_id.isnot(None)
-            ).all()
-            
-            class_assignments = []
-            subject_assignments = []
-            
-            for assignment in all_assignments:
-                assignment_data = RoleBasedDataService._format_assignment(assignment)
-                
-                if assignment.is_class_teacher:
-                    class_assignments.append(assignment_data)
-                
-                subject_assignments.append(assignment_data)
-            
-            return {
-                'class_teacher_assignments': class_assignments,
-                'subject_assignments': subject_assignments,
-                'total_classes_managed': len(class_assignments),
-                'total_subjects_taught': len(subject_assignments),
-                'can_manage_all': True
-            }
-            
-        except Exception as e:
-            return {'error': f'Error getting headteacher summary: {str(e)}'}
-    
-    @staticmethod
-    def _get_classteacher_summary(teacher_assignments):
-        """Get summary data for class teacher."""
-        try:
-            class_assignments = []
-            subject_assignments = []
-            grades_involved = set()
-            streams_involved = set()
-            subjects_involved = set()
-
-            # Track unique class assignments to avoid duplicates
-            unique_class_assignments = {}
-
-            for assignment in teacher_assignments:
-                assignment_data = RoleBasedDataService._format_assignment(assignment)
-
-                # Track involvement
-                if assignment.grade:
-                    grades_involved.add(assignment.grade.name)
-                if assignment.stream:
-                    streams_involved.add(assignment.stream.name)
-                if assignment.subject:
-                    subjects_involved.add(assignment.subject.name)
-
-                # Separate class teacher assignments (deduplicate by grade+stream)
-                if assignment.is_class_teacher:
-                    class_key = f"{assignment_data['grade_level']}_{assignment_data['stream_name'] or 'None'}"
-                    if class_key not in unique_class_assignments:
-                        unique_class_assignments[class_key] = assignment_data
-
-                # All assignments are subject assignments for class teachers
-                subject_assignments.append(assignment_data)
+            from .assignment_summary_service import AssignmentSummaryService
+            return AssignmentSummaryService.role_summary(teacher_id, role)
 
-            # Convert unique class assignments to list
-            class_assignments = list(unique_class_assignments.values())
-            
-            return {
-                'class_teacher_assignments': class_assignments,
-                'subject_assignments': subject_assignments,
-                'total_classes_managed': len(class_assignments),
-                'total_subjects_taught': len(subject_assignments),
-                'grades_involved': list(grades_involved),
-                'streams_involved': list(streams_involved),
-                'subjects_involved': list(subjects_involved),
-                'can_manage_classes': len(class_assignments) > 0
-            }
-            
         except Exception as e:
-            return {'error': f'Error getting classteacher summary: {str(e)}'}
-    
-    @staticmethod
-    def _get_subject_teacher_summary(teacher_assignments):
-        """Get summary data for subject teacher (includes both subject and class teacher assignments)."""
-        try:
-            subject_assignments = []
-            class_assignments = []
-            unique_class_assignments = {}
-            grades_involved = set()
-            streams_involved = set()
-            subjects_involved = set()
-
-            for assignment in teacher_assignments:
-                assignment_data = RoleBasedDataService._format_assignment(assignment)
-
-                # Track involvement
-                if assignment.grade:
-                    grades_involved.add(assignment.grade.name)
-                if assignment.stream:
-                    streams_involved.add(assignment.stream.name)
-                if assignment.subject:
-                    subjects_involved.add(assignment.subject.name)
-
-                # Separate class teacher assignments (deduplicate by grade+stream)
-                if assignment.is_class_teacher:
-                    class_key = f"{assignment_data['grade_level']}_{assignment_data['stream_name'] or 'None'}"
-                    if class_key not in unique_class_assignments:
-                        unique_class_assignments[class_key] = assignment_data
-
-                # All assignments are subject assignments
-                subject_assignments.append(assignment_data)
-
-            # Convert unique class assignments to list
-            class_assignments = list(unique_class_assignments.values())
-
-            return {
-                'class_teacher_assignments': class_assignments,
-                'subject_assignments': subject_assignments,
-                'total_classes_managed': len(class_assignments),
-                'total_subjects_taught': len(subject_assignments),
-                'grades_involved': list(grades_involved),
-                'streams_involved': list(streams_involved),
-                'subjects_involved': list(subjects_involved),
-                'can_manage_classes': len(class_assignments) > 0
-            }
-
-        except Exception as e:
-            return {'error': f'Error getting subject teacher summary: {str(e)}'}
+            return {'error': f'Error getting teacher assignments: {str(e)}'}
     
     @staticmethod
     def _format_assignment(assignment):
@@ -0,0 +1,332 @@
+"""
+Term Summary Service - maintains the materialized StudentTermSummary table.
+
+Summaries are refreshed one stream at a time from the class report engine, so they
+hold exactly the totals, averages and class positions shown on class reports. Grade
+positions are re-ranked from the stored stream rows once per affected grade.
+
+Each refresh records the cache scope versions the stream's summaries were built
+from. Marks, learners and settings can change without a refresh (bulk deletes, the
+subject teacher views, ...), so reads only trust streams whose versions still match
+and return nothing for the others; callers then compute from marks as before.
+"""
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..models.academic import Stream, Student, Mark, StudentTermSummary, TermSummaryState
+from ..extensions import db
+from ..utils.results_kernel import band_labels, competition_ranks
+from .cache_invalidation_service import CacheInvalidationService, REFERENCE_SCOPE
+from .class_report_engine import ClassReportEngine
+
+logger = logging.getLogger(__name__)
+
+
+class TermSummaryService:
+    """Service for refreshing and reading per-student term summaries."""
+
+    @staticmethod
+    def _dependency_scopes(grade_id, stream_id, term_id, assessment_type_id) -> List[str]:
+        """Scopes a stream's summaries depend on: its marks, the grade's learners, settings and subjects."""
+        return CacheInvalidationService.dependency_scopes(
+            grade_id=grade_id, stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id
+        ) + [REFERENCE_SCOPE]
+
+    @staticmethod
+    def _current_streams(streams: Iterable[Tuple[int, int]], term_id: int, assessment_type_id: int) -> Set[int]:
+        """
+        Get the IDs of the given (grade_id, stream_id) streams whose summaries are current.
+
+        A stream is current when the scope versions recorded by its last refresh
+        still match; all versions are read in one query.
+        """
+        streams = {stream_id: grade_id for grade_id, stream_id in streams if stream_id}
+        if not streams:
+            return set()
+        states = TermSummaryState.query.filter(
+            TermSummaryState.stream_id.in_(list(streams)),
+            TermSummaryState.term_id == term_id,
+            TermSummaryState.assessment_type_id == assessment_type_id
+        ).all()
+        built = {state.stream_id: json.loads(state.dependencies or '{}') for state in states}
+        scopes = {
+            stream_id: TermSummaryService._dependency_scopes(streams[stream_id], stream_id, term_id,
+                                                             assessment_type_id)
+            for stream_id in built
+        }
+        versions = CacheInvalidationService.versions(scope for stream_scopes in scopes.values()
+                                                     for scope in stream_scopes)
+        return {
+            stream_id for stream_id, stream_scopes in scopes.items()
+            if built[stream_id] == {scope: versions[scope] for scope in stream_scopes}
+        }
+
+    @staticmethod
+    def refresh_stream(stream_id: int, term_id: int, assessment_type_id: int, commit: bool = True,
+                       rank_grade: bool = True) -> int:
+        """
+        Recompute summaries for every student in a stream, then the grade positions.
+
+        Args:
+            stream_id: ID of the stream whose marks changed
+            term_id: ID of the term
+            assessment_type_id: ID of the assessment type
+            commit: Whether to commit the session when done
+            rank_grade: Whether to re-rank the stream's grade; rebuild_all ranks each grade once instead
+
+        Returns:
+            Number of summary rows written
+        """
+        stream = Stream.query.get(stream_id)
+        if not stream:
+            return 0
+
+        # Read the versions first: a change committed while building leaves the summaries stale, not wrong
+        versions = CacheInvalidationService.versions(
+            TermSummaryService._dependency_scopes(stream.grade_id, stream_id, term_id, assessment_type_id)
+        )
+        education_level = ClassReportEngine.education_level_for_grade(stream.grade.name if stream.grade else '')
+        report = ClassReportEngine.build(stream_id, term_id, assessment_type_id, education_level)
+        class_data = [row for row in report['class_data'] if row['marks']]
+        student_ids = [row['student_id'] for row in report['class_data']]
+
+        existing_query = StudentTermSummary.query.filter(
+            StudentTermSummary.term_id == term_id,
+            StudentTermSummary.assessment_type_id == assessment_type_id
+        )
+        if student_ids:
+            existing_query = existing_query.filter(db.or_(
+                StudentTermSummary.stream_id == stream_id,
+                StudentTermSummary.student_id.in_(student_ids)
+            ))
+        else:
+            existing_query = existing_query.filter(StudentTermSummary.stream_id == stream_id)
+        existing = {row.student_id: row for row in existing_query.all()}
+
+        new_rows = []
+        for student_data in class_data:
+            values = {
+                'grade_id': stream.grade_id,
+                'stream_id': stream_id,
+                'standardized_total': round(student_data['total_marks'], 4),
+                'subject_count': student_data['subject_count'],
+                'average_percentage': round(student_data['average_percentage'], 4),
+                'performance_category': student_data['performance_category'],
+                'subject_percentages': json.dumps(student_data['marks']),
+                'class_rank': student_data['rank'],
+                'class_size': len(class_data),
+            }
+            summary = existing.pop(student_data['student_id'], None)
+            if summary is None:
+                # New rows are inserted in one batch below
+                new_rows.append(dict(values, student_id=student_data['student_id'], term_id=term_id,
+                                     assessment_type_id=assessment_type_id))
+                continue
+            for key, value in values.items():
+                setattr(summary, key, value)
+
+        if new_rows:
+            db.session.bulk_insert_mappings(StudentTermSummary, new_rows)
+
+        # Students without marks (or who left the stream) no longer have a summary here
+        for stale in existing.values():
+            db.session.delete(stale)
+
+        state = TermSummaryState.query.get((stream_id, term_id, assessment_type_id))
+        if state is None:
+            state = TermSummaryState(stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id)
+            db.session.add(state)
+        state.dependencies = json.dumps(versions)
+
+        db.session.flush()
+        if rank_grade and stream.grade_id:
+            TermSummaryService.refresh_grade_ranks(stream.grade_id, term_id, assessment_type_id)
+
+        if commit:
+            db.session.commit()
+        return len(class_data)
+
+    @staticmethod
+    def refresh_grade_ranks(grade_id: int, term_id: int, assessment_type_id: int) -> None:
+        """Recompute grade positions from the stored summaries of every stream in the grade."""
+        rows = db.session.query(
+            StudentTermSummary.id, StudentTermSummary.standardized_total
+        ).filter_by(
+            grade_id=grade_id, term_id=term_id, assessment_type_id=assessment_type_id
+        ).all()
+        if not rows:
+            return
+        ranks = competition_ranks([total or 0 for _, total in rows])
+        db.session.bulk_update_mappings(StudentTermSummary, [
+            {'id': row_id, 'grade_rank': int(rank), 'grade_size': len(rows)}
+            for (row_id, _), rank in zip(rows, ranks)
+        ])
+
+    @staticmethod
+    def refresh_after_save(stream_id, term_id, assessment_type_id) -> None:
+        """
+        Refresh summaries after marks were saved; never raises.
+
+        Marks are already committed by the caller, so a failure here only leaves the
+        summaries stale until the next save or a full rebuild.
+        """
+        try:
+            TermSummaryService.refresh_stream(int(stream_id), int(term_id), int(assessment_type_id))
+        except Exception as e:
+            logger.error(f"Error refreshing term summaries for stream {stream_id}: {e}")
+            db.session.rollback()
+
+    @staticmethod
+    def rebuild_all(term_id: Optional[int] = None, assessment_type_id: Optional[int] = None) -> Dict[str, int]:
+        """
+        Rebuild summaries for every stream/term/assessment combination that has marks.
+
+        Args:
+            term_id: Optional term ID to restrict the rebuild to
+            assessment_type_id: Optional assessment type ID to restrict the rebuild to
+
+        Returns:
+            Dictionary with the number of combinations and rows rebuilt
+        """
+        query = db.session.query(Student.stream_id, Mark.term_id, Mark.assessment_type_id) \
+            .join(Student, Mark.student_id == Student.id) \
+            .filter(Student.stream_id.isnot(None))
+        if term_id:
+            query = query.filter(Mark.term_id == term_id)
+        if assessment_type_id:
+            query = query.filter(Mark.assessment_type_id == assessment_type_id)
+        combinations = query.distinct().all()
+
+        delete_query = StudentTermSummary.query
+        if term_id:
+            delete_query = delete_query.filter_by(term_id=term_id)
+        if assessment_type_id:
+            delete_query = delete_query.filter_by(assessment_type_id=assessment_type_id)
+        delete_query.delete(synchronize_session=False)
+
+        rows = 0
+        for stream_id, combo_term_id, combo_assessment_id in combinations:
+            rows += TermSummaryService.refresh_stream(stream_id, combo_term_id, combo_assessment_id,
+                                                      commit=False, rank_grade=False)
+
+        grade_combinations = db.session.query(
+            StudentTermSummary.grade_id, StudentTermSummary.term_id, StudentTermSummary.assessment_type_id
+        ).filter(StudentTermSummary.grade_id.isnot(None))
+        if term_id:
+            grade_combinations = grade_combinations.filter(StudentTermSummary.term_id == term_id)
+        if assessment_type_id:
+            grade_combinations = grade_combinations.filter(StudentTermSummary.assessment_type_id == assessment_type_id)
+        for grade_id, combo_term_id, combo_assessment_id in grade_combinations.distinct().all():
+            TermSummaryService.refresh_grade_ranks(grade_id, combo_term_id, combo_assessment_id)
+        db.session.commit()
+        return {'combinations': len(combinations), 'rows': rows}
+
+    @staticmethod
+    def get_totals_for_students(student_ids: List[int], term_id: Optional[int],
+                                assessment_type_id: Optional[int]) -> Dict[int, Tuple[int, int, int]]:
+        """
+        Get {student_id: (obtained_total, possible_total, subjects_count)} in one query.
+
+        Summaries only exist per term and assessment type, so nothing is returned
+        unless both are given, nor for students whose stream's summaries are stale;
+        callers fall back to computing from marks.
+        """
+        if not (student_ids and term_id and assessment_type_id):
+            return {}
+        rows = db.session.query(
+            StudentTermSummary.student_id,
+            StudentTermSummary.standardized_total,
+            StudentTermSummary.subject_count,
+            StudentTermSummary.grade_id,
+            StudentTermSummary.stream_id
+        ).filter(
+            StudentTermSummary.student_id.in_(student_ids),
+            StudentTermSummary.term_id == term_id,
+            StudentTermSummary.assessment_type_id == assessment_type_id
+        ).all()
+        current = TermSummaryService._current_streams({(row.grade_id, row.stream_id) for row in rows},
+                                                      term_id, assessment_type_id)
+        return {
+            row.student_id: (int(round(row.standardized_total or 0)), (row.subject_count or 0) * 100,
+                             row.subject_count or 0)
+            for row in rows if row.stream_id in current
+        }
+
+    @staticmethod
+    def get_student_totals(student_id: int, term_id: Optional[int],
+                           assessment_type_id: Optional[int]) -> Optional[Tuple[int, int, int]]:
+        """Get (obtained_total, possible_total, subjects_count) for one student, or None."""
+        return TermSummaryService.get_totals_for_students([student_id], term_id, assessment_type_id).get(student_id)
+
+    @staticmethod
+    def get_class_positions(student_ids: List[int], term_id: Optional[int],
+                            assessment_type_id: Optional[int]) -> Dict[int, Tuple[int, int]]:
+        """
+        Get {student_id: (class_rank, class_size)} as shown on class reports, in one query.
+
+        Like get_totals_for_students, nothing is returned unless both the term and
+        the assessment type are given, nor for students whose stream's summaries are stale.
+        """
+        if not (student_ids and term_id and assessment_type_id):
+            return {}
+        rows = db.session.query(
+            StudentTermSummary.student_id,
+            StudentTermSummary.class_rank,
+            StudentTermSummary.class_size,
+            StudentTermSummary.grade_id,
+            StudentTermSummary.stream_id
+        ).filter(
+            StudentTermSummary.student_id.in_(student_ids),
+            StudentTermSummary.term_id == term_id,
+            StudentTermSummary.assessment_type_id == assessment_type_id,
+            StudentTermSummary.class_rank.isnot(None)
+        ).all()
+        current = TermSummaryService._current_streams({(row.grade_id, row.stream_id) for row in rows},
+                                                      term_id, assessment_type_id)
+        return {row.student_id: (row.class_rank, row.class_size) for row in rows if row.stream_id in current}
+
+    @staticmethod
+    def get_class_rows(stream_id: int, term_id: int, assessment_type_id: int) -> Optional[List[Dict]]:
+        """
+        Get the stream's class report rows from the stored summaries, best first.
+
+        Rows have the ClassReportEngine class_data shape (without component marks), and
+        learners without marks get an empty row, as on the class report. Returns None
+        when the stream has no summaries yet or they are stale, so callers fall back
+        to the engine.
+        """
+        summaries = {
+            row.student_id: row for row in StudentTermSummary.query.filter_by(
+                stream_id=stream_id, term_id=term_id, assessment_type_id=assessment_type_id
+            ).all()
+        }
+        grade_id = next(iter(summaries.values())).grade_id if summaries else None
+        if not summaries or stream_id not in TermSummaryService._current_streams(
+                [(grade_id, stream_id)], term_id, assessment_type_id):
+            return None
+
+        # Learners without marks share the rank after every positive total
+        unmarked_rank = sum(1 for row in summaries.values() if round(row.standardized_total or 0, 6) > 0) + 1
+        unmarked_band = band_labels([0.0])[0]
+
+        class_data = []
+        for student in Student.query.filter_by(stream_id=stream_id).all():
+            summary = summaries.get(student.id)
+            marks = summary.get_subject_percentages() if summary else {}
+            class_data.append({
+                'student': student.name,
+                'student_id': student.id,
+                'marks': marks,
+                'raw_marks': dict(marks),
+                'component_marks': {},
+                'total_marks': (summary.standardized_total or 0.0) if summary else 0.0,
+                'total_possible_marks': len(marks) * 100,
+                'average_percentage': (summary.average_percentage or 0.0) if summary else 0.0,
+                'subject_count': (summary.subject_count or 0) if summary else 0,
+                'rank': summary.class_rank if summary else unmarked_rank,
+                'performance_category': summary.performance_category if summary else unmarked_band
+            })
+
+        class_data.sort(key=lambda row: row['rank'])
+        return class_data
@@ -0,0 +1,400 @@
+"""
+Trend Service - term-over-term trends of every learner and subject.
+
+Trends are computed for a whole grade at once (the learners currently in it, with
+all their marks) and stored in the student_subject_trend table, so the parent
+portal (and /api/analytics/grade-trends) read a learner's trend with indexed queries.
+For each learner, subject and term/assessment the table holds the percentage, the
+change since the learner's previous result in the subject, a rolling average of the
+last TREND_WINDOW terms/assessments and the percentile among the grade's learners
+and its change. Rows without a subject hold the learner's average over all subjects.
+
+A grade's timeline orders terms by academic year, then term, then assessment type.
+As in the results kernel, only marks above zero count.
+
+The grade_trend_state table records the cache scope versions (see
+CacheInvalidationService) of the marks and learners a grade's trends were built
+from. A read that finds them changed queues a 'trend_rebuild' report job and serves
+the stored rows marked stale, so requests never rebuild a grade themselves.
+"""
+import json
+import logging
+import os
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from ..extensions import db
+from ..models import Mark, Student, StudentSubjectTrend, GradeTrendState
+from ..utils.results_kernel import percentile_ranks, previous_values, rolling_means
+from .cache_invalidation_service import CacheInvalidationService
+from .reference_data_service import ReferenceDataService
+from .report_job_service import ReportJobService
+
+logger = logging.getLogger(__name__)
+
+TREND_WINDOW = 3  # Terms/assessments in the rolling average
+STABLE_CHANGE = 1.0  # Changes within this many percentage points are shown as stable
+REBUILD_JOB = 'trend_rebuild'
+
+
+def trend_direction(delta: Optional[float]) -> str:
+    """'up', 'down' or 'stable' for a change in percentage points (stable without one)."""
+    if delta is None or abs(delta) < STABLE_CHANGE:
+        return 'stable'
+    return 'up' if delta > 0 else 'down'
+
+
+class TrendService:
+    """Service for rebuilding and reading stored learner trends."""
+
+    # ------------------------------------------------------------------ build
+
+    @staticmethod
+    def _dependency_scopes(grade_id: int) -> List[str]:
+        """
+        Scopes a grade's trends depend on: its learners, its own marks and the grades
+        its learners' earlier marks were entered in.
+
+        The grade's own marks scope is always included, so trends built before the
+        grade had any marks go stale when the first one is saved.
+        """
+        mark_grades = set(db.session.execute(
+            select(Mark.grade_id).join(Student, Mark.student_id == Student.id)
+            .where(Student.grade_id == grade_id).distinct()
+        ).scalars().all())
+        mark_grades.add(grade_id)
+        scopes = CacheInvalidationService.student_scopes(grade_id)
+        scopes.update(CacheInvalidationService.dependency_scopes(grade_id=mark_grade)[0]
+                      for mark_grade in mark_grades)
+        return sorted(scopes)
+
+    @staticmethod
+    def _versions(scopes: List[str]) -> Dict[str, int]:
+        return CacheInvalidationService.versions(scopes)
+
+    @staticmethod
+    def _timeline(periods) -> List[Tuple[int, int]]:
+        """Order (term_id, assessment_type_id) pairs by academic year, term and assessment type."""
+        reference = ReferenceDataService.current()
+
+        def key(period):
+            term = reference.term_by_id.get(period[0])
+            return (term.academic_year or '') if term else '', period[0], period[1]
+
+        return sorted(set(periods), key=key)
+
+    @staticmethod
+    def compute(rows) -> Dict[str, Any]:
+        """
+        Compute trends from (student_id, subject_id, term_id, assessment_type_id, percentage) rows.
+
+        Returns:
+            Dictionary with the student_ids, subject_ids (None last, for the all-subject
+            average) and periods the axes stand for, and subjects x students x periods
+            arrays 'percentage', 'previous', 'delta', 'rolling_average', 'percentile'
+            and 'percentile_change' (NaN where a learner has no result)
+        """
+        student_ids = sorted({row[0] for row in rows})
+        subject_ids = sorted({row[1] for row in rows})
+        periods = TrendService._timeline((row[2], row[3]) for row in rows)
+        students = {student_id: index for index, student_id in enumerate(student_ids)}
+        subjects = {subject_id: index for index, subject_id in enumerate(subject_ids)}
+        columns = {period: index for index, period in enumerate(periods)}
+
+        values = np.full((len(subject_ids) + 1, len(student_ids), len(periods)), np.nan)
+        for student_id, subject_id, term_id, assessment_type_id, percentage in rows:
+            values[subjects[subject_id], students[student_id], columns[(term_id, assessment_type_id)]] = \
+                min(float(percentage), 100.0)
+        if subject_ids:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # Mean of a period without any subject result
+                values[-1] = np.nanmean(values[:-1], axis=0)
+
+        previous = previous_values(values)
+        percentile = percentile_ranks(values, axis=1)
+        return {
+            'student_ids': student_ids,
+            'subject_ids': subject_ids + [None],
+            'periods': periods,
+            'percentage': values,
+            'previous': previous,
+            'delta': values - previous,
+            'rolling_average': rolling_means(values, TREND_WINDOW),
+            'percentile': percentile,
+            'percentile_change': percentile - previous_values(percentile),
+        }
+
+    @staticmethod
+    def rebuild_grade(grade_id: int) -> int:
+        """
+        Recompute and store the trends of every learner currently in a grade (the caller commits).
+
+        Args:
+            grade_id: ID of the grade
+
+        Returns:
+            Number of trend rows written
+        """
+        scopes = TrendService._dependency_scopes(grade_id)
+        versions = TrendService._versions(scopes)
+        cohort = select(Student.id).where(Student.grade_id == grade_id)
+        rows = db.session.execute(
+            select(Mark.student_id, Mark.subject_id, Mark.term_id, Mark.assessment_type_id, func.avg(Mark.percentage))
+            .where(Mark.student_id.in_(cohort), Mark.percentage > 0)
+            .group_by(Mark.student_id, Mark.subject_id, Mark.term_id, Mark.assessment_type_id)
+        ).all()
+        trends = TrendService.compute(rows)
+
+        present = ~np.isnan(trends['percentage'])
+        subject_index, student_index, period_index = np.nonzero(present)
+        columns = {}
+        for name, key in (('percentage', 'percentage'), ('previous_percentage', 'previous'), ('delta', 'delta'),
+                          ('rolling_average', 'rolling_average'), ('percentile', 'percentile'),
+                          ('percentile_change', 'percentile_change')):
+            selected = np.round(trends[key][present], 4)
+            columns[name] = [None if number != number else number for number in selected.tolist()]  # NaN -> None
+        student_ids = np.asarray(trends['student_ids'])[student_index].tolist()
+        periods = trends['periods']
+
+        new_rows = []
+        for row, (subject, period) in enumerate(zip(subject_index.tolist(), period_index.tolist())):
+            term_id, assessment_type_id = periods[period]
+            values = {name: column[row] for name, column in columns.items()}
+            values.update(student_id=student_ids[row], subject_id=trends['subject_ids'][subject], grade_id=grade_id,
+                          term_id=term_id, assessment_type_id=assessment_type_id, period_index=period)
+            new_rows.append(values)
+
+        # Learners who moved up still have rows under their previous grade
+        db.session.execute(delete(StudentSubjectTrend).where(
+            (StudentSubjectTrend.grade_id == grade_id) | StudentSubjectTrend.student_id.in_(cohort)
+        ))
+        if new_rows:
+            db.session.execute(insert(StudentSubjectTrend.__table__), new_rows)
+
+        state = GradeTrendState.query.get(grade_id)
+        if state is None:
+            state = GradeTrendState(grade_id=grade_id)
+            db.session.add(state)
+        state.dependencies = json.dumps(versions)
+        db.session.flush()
+        return len(new_rows)
+
+    @staticmethod
+    def rebuild_all() -> Dict[str, int]:
+        """
+        Rebuild the trends of every grade with learners and commit.
+
+        Returns:
+            Dictionary with the number of grades and rows rebuilt
+        """
+        grade_ids = db.session.execute(
+            select(Student.grade_id).where(Student.grade_id.isnot(None)).distinct()
+        ).scalars().all()
+        rows = sum(TrendService.rebuild_grade(grade_id) for grade_id in grade_ids)
+        db.session.commit()
+        return {'grades': len(grade_ids), 'rows': rows}
+
+    @staticmethod
+    def is_current(grade_id: int) -> bool:
+        """Whether a grade's stored trends were built from its current marks and learners."""
+        state = GradeTrendState.query.get(grade_id)
+        if state is None:
+            return False
+        built = json.loads(state.dependencies or '{}')
+        # Recompute the scopes too: marks entered under another grade add one
+        return bool(built) and TrendService._versions(TrendService._dependency_scopes(grade_id)) == built
+
+    @staticmethod
+    def queue_rebuild(grade_id: int) -> None:
+        """Queue a rebuild of a grade's trends unless one is already waiting or running."""
+        params = {'grade_id': grade_id}
+        if ReportJobService.find_active(REBUILD_JOB, params) is None:
+            logger.info(f"Queueing a trend rebuild for grade {grade_id}")
+            ReportJobService.enqueue(REBUILD_JOB, params)
+
+    @staticmethod
+    def ensure_current(grade_id: int) -> bool:
+        """
+        Queue a rebuild if a grade's marks or learners changed since its trends were built.
+
+        Args:
+            grade_id: ID of the grade
+
+        Returns:
+            True if the stored trends are current, False if they are stale (or missing)
+        """
+        try:
+            if TrendService.is_current(grade_id):
+                return True
+            TrendService.queue_rebuild(grade_id)
+        except SQLAlchemyError as e:
+            # Serve the stored trends; the next read queues the rebuild again
+            logger.error(f"Could not queue a trend rebuild for grade {grade_id}: {e}")
+            db.session.rollback()
+        return False
+
+    @staticmethod
+    def run_rebuild_job(params, output_dir, progress):
+        """Report job handler: rebuild a grade's trends if they are still stale. Produces no artifact."""
+        os.rmdir(output_dir)
+        grade_id = params['grade_id']
+        progress(0, 1, f"Rebuilding trends for grade {grade_id}")
+        if not TrendService.is_current(grade_id):
+            try:
+                TrendService.rebuild_grade(grade_id)
+                db.session.commit()
+            except IntegrityError:
+                # Built at the same time by another job (e.g. the CLI); it holds the same rows
+                db.session.rollback()
+        return None, None
+
+    # ------------------------------------------------------------------ reads
+
+    @staticmethod
+    def _point(row, reference) -> Dict[str, Any]:
+        term = reference.term_by_id.get(row.term_id)
+        assessment_type = reference.assessment_type_by_id.get(row.assessment_type_id)
+        return {
+            'term_id': row.term_id,
+            'term': term.name if term else None,
+            'academic_year': term.academic_year if term else None,
+            'assessment_type_id': row.assessment_type_id,
+            'assessment_type': assessment_type.name if assessment_type else None,
+            'percentage': row.percentage,
+            'previous_percentage': row.previous_percentage,
+            'delta': row.delta,
+            'trend': trend_direction(row.delta),
+            'rolling_average': row.rolling_average,
+            'percentile': row.percentile,
+            'percentile_change': row.percentile_change,
+        }
+
+    @staticmethod
+    def get_student_trends(student_id: int, grade_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get a learner's trends, overall and per subject, in timeline order.
+
+        Args:
+            student_id: ID of the learner
+            grade_id: The learner's current grade, if the caller already has it
+
+        Returns:
+            Dictionary with 'overall' (list of points), 'subjects' (list of
+            {subject_id, subject_name, points, latest}), 'latest' (the latest overall point)
+            and 'stale' (True while a rebuild with newer marks is queued)
+        """
+        if grade_id is None:
+            grade_id = db.session.query(Student.grade_id).filter(Student.id == student_id).scalar()
+        if grade_id is None:
+            return {'student_id': student_id, 'overall': [], 'subjects': [], 'latest': None, 'stale': False}
+        current = TrendService.ensure_current(grade_id)
+
+        reference = ReferenceDataService.current()
+        overall = []
+        subjects = {}
+        for row in StudentSubjectTrend.query.filter_by(student_id=student_id)\
+                .order_by(StudentSubjectTrend.period_index).all():
+            if row.subject_id is None:
+                overall.append(TrendService._point(row, reference))
+            else:
+                subjects.setdefault(row.subject_id, []).append(TrendService._point(row, reference))
+
+        subject_trends = []
+        for subject_id, points in subjects.items():
+            subject = reference.subject_by_id.get(subject_id)
+            subject_trends.append({
+                'subject_id': subject_id,
+                'subject_name': subject.name if subject else str(subject_id),
+                'points': points,
+                'latest': points[-1],
+            })
+        subject_trends.sort(key=lambda item: item['subject_name'])
+        return {
+            'student_id': student_id,
+            'grade_id': grade_id,
+            'overall': overall,
+            'subjects': subject_trends,
+            'latest': overall[-1] if overall else None,
+            'stale': not current,
+        }
+
+    @staticmethod
+    def get_grade_trends(grade_id: int, term_id: Optional[int] = None, assessment_type_id: Optional[int] = None,
+                         movers: int = 5) -> Dict[str, Any]:
+        """
+        Summarize a grade's trends for one term/assessment (the latest by default).
+
+        Args:
+            grade_id: ID of the grade
+            term_id: Term ID (with assessment_type_id; latest period when not given)
+            assessment_type_id: Assessment type ID
+            movers: Number of most improved and most declined learners to list
+
+        Returns:
+            Dictionary with per-subject averages, changes and improved/declined counts,
+            and the learners whose overall average moved most; 'stale' is True while a
+            rebuild with newer marks is queued
+        """
+        current = TrendService.ensure_current(grade_id)
+        trend = StudentSubjectTrend
+        in_grade = trend.grade_id == grade_id
+        if term_id is None or assessment_type_id is None:
+            latest = db.session.query(trend.term_id, trend.assessment_type_id).filter(in_grade)\
+                .order_by(trend.period_index.desc()).first()
+            if latest is None:
+                return {'grade_id': grade_id, 'term_id': None, 'assessment_type_id': None,
+                        'subjects': [], 'most_improved': [], 'most_declined': [], 'stale': not current}
+            term_id, assessment_type_id = latest
+        in_period = [in_grade, trend.term_id == term_id, trend.assessment_type_id == assessment_type_id]
+
+        reference = ReferenceDataService.current()
+        subjects = []
+        for row in db.session.query(
+            trend.subject_id,
+            func.count(trend.id).label('learners'),
+            func.avg(trend.percentage).label('average'),
+            func.avg(trend.delta).label('average_delta'),
+            func.sum(case((trend.delta >= STABLE_CHANGE, 1), else_=0)).label('improved'),
+            func.sum(case((trend.delta <= -STABLE_CHANGE, 1), else_=0)).label('declined')
+        ).filter(*in_period).group_by(trend.subject_id).all():
+            subject = reference.subject_by_id.get(row.subject_id)
+            subjects.append({
+                'subject_id': row.subject_id,
+                'subject_name': (subject.name if subject else str(row.subject_id)) if row.subject_id else 'All Subjects',
+                'learners': row.learners,
+                'average_percentage': round(float(row.average), 2),
+                'average_change': round(float(row.average_delta), 2) if row.average_delta is not None else None,
+                'trend': trend_direction(row.average_delta),
+                'improved': int(row.improved or 0),
+                'declined': int(row.declined or 0),
+            })
+        subjects.sort(key=lambda item: (item['subject_id'] is not None, item['subject_name']))
+
+        def learners(order):
+            rows = db.session.query(trend, Student.name, Student.admission_number)\
+                .join(Student, trend.student_id == Student.id)\
+                .filter(*in_period, trend.subject_id.is_(None), trend.delta.isnot(None))\
+                .order_by(order, trend.student_id).limit(movers).all()
+            return [dict(TrendService._point(row, reference), student_id=row.student_id, name=name,
+                         admission_number=admission_number) for row, name, admission_number in rows]
+
+        term = reference.term_by_id.get(term_id)
+        assessment_type = reference.assessment_type_by_id.get(assessment_type_id)
+        return {
+            'grade_id': grade_id,
+            'term_id': term_id,
+            'term': term.name if term else None,
+            'assessment_type_id': assessment_type_id,
+            'assessment_type': assessment_type.name if assessment_type else None,
+            'subjects': subjects,
+            'most_improved': learners(trend.delta.desc()),
+            'most_declined': learners(trend.delta.asc()),
+            'stale': not current,
+        }
+
+
+ReportJobService.register_handler(REBUILD_JOB, TrendService.run_rebuild_job)
@@ -43,6 +43,16 @@ class CacheManager:
                 socket_timeout=5,
                 retry_on_timeout=True
             )
+            # Separate client for binary payloads (pickled values), which cannot be decoded as text
+            self.binary_client = redis.Redis(
+                host=host,
+                port=port,
+                db=db,
+                password=password,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True
+            )
             # Test connection
             self.redis_client.ping()
             self.is_available = True
@@ -50,6 +60,7 @@ class CacheManager:
         except (redis.ConnectionError, redis.TimeoutError) as e:
             logger.warning(f"⚠️ Redis not available, falling back to in-memory cache: {e}")
             self.redis_client = None
+            self.binary_client = None
             self.is_available = False
             self._memory_cache = {}
     
@@ -116,6 +127,44 @@ class CacheManager:
             logger.error(f"Cache set error for key {key}: {e}")
         return False
     
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """
+        Get a raw binary value from Redis
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Stored bytes, or None if not found or Redis is unavailable
+        """
+        if not self.is_available:
+            return None
+        try:
+            return self.binary_client.get(key)
+        except Exception as e:
+            logger.error(f"Cache get error for key {key}: {e}")
+        return None
+    
+    def set_bytes(self, key: str, value: bytes, ttl: int = 3600) -> bool:
+        """
+        Set a raw binary value in Redis with TTL
+        
+        Args:
+            key: Cache key
+            value: Serialized value
+            ttl: Time to live in seconds (default: 1 hour)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.is_available:
+            return False
+        try:
+            return bool(self.binary_client.setex(key, max(1, int(ttl)), value))
+        except Exception as e:
+            logger.error(f"Cache set error for key {key}: {e}")
+        return False
+    
     def delete(self, key: str) -> bool:
         """
         Delete key from cache
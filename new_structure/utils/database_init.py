@@ -21,7 +21,8 @@ def create_all_tables():
         from ..models.user import Teacher
         from ..models.academic import (
             SchoolConfiguration, Subject, Grade, Stream, Term,
-            AssessmentType, Student, Mark
+            AssessmentType, Student, Mark, StudentTermSummary, TermSummaryState, MarkCube, MarkCubeState,
+            StudentSubjectTrend, GradeTrendState
         )
         from ..models.assignment import TeacherSubjectAssignment
         # Note: Import permission models to register them with SQLAlchemy
@@ -35,6 +36,8 @@ def create_all_tables():
             pass  # Function permission models are optional
         from ..models.parent import Parent, ParentStudent
         from ..models.report_config import ReportConfiguration
+        from ..models.report_job import ReportJob
+        from ..models.cache_version import CacheScopeVersion
         from ..models.school_setup import SchoolSetup
         
         # Create all tables
@@ -325,6 +328,31 @@ def initialize_database_completely():
             'error': str(e)
         }
 
+def ensure_database_initialized(force=False):
+    """
+    Check the database and run the complete initialization if it is not healthy.
+
+    Used by `flask init-db` and, when DATABASE_CHECK_ON_STARTUP is set, by create_app.
+
+    Args:
+        force: Initialize even if the integrity check passes
+
+    Returns:
+        Dictionary with success, whether initialization ran, the integrity status
+        before it and any error
+    """
+    status = check_database_integrity()
+    if status['status'] == 'healthy' and not force:
+        return {'success': True, 'initialized': False, 'status': status}
+
+    result = initialize_database_completely()
+    return {
+        'success': result['success'],
+        'initialized': True,
+        'status': result.get('status', status),
+        'error': result.get('error')
+    }
+
 def repair_database():
     """
     Repair database by recreating missing tables and data
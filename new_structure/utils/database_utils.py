@@ -241,6 +241,7 @@ def safe_delete_teacher(teacher_id):
 
     try:
         from sqlalchemy import text
+        from ..services.cache_invalidation_service import CacheInvalidationService
 
         # First get teacher name without loading relationships
         teacher_name_result = db.session.execute(
@@ -274,6 +275,7 @@ def safe_delete_teacher(teacher_id):
                 text("DELETE FROM teacher_subject_assignment WHERE teacher_id = :teacher_id"),
                 {"teacher_id": teacher_id}
             ).rowcount
+            CacheInvalidationService.record_assignments(db.session, [teacher_id])
             print(f"Deleted {deleted_assignments} subject assignments")
         except Exception as e:
             print(f"Note: teacher_subject_assignment table cleanup: {e}")
@@ -284,6 +286,7 @@ def safe_delete_teacher(teacher_id):
                 text("DELETE FROM class_teacher_permissions WHERE teacher_id = :teacher_id"),
                 {"teacher_id": teacher_id}
             ).rowcount
+            CacheInvalidationService.record_permissions(db.session, [teacher_id])
             print(f"Deleted {deleted_class_perms} class permissions")
         except Exception as e:
             print(f"Note: class_teacher_permissions table cleanup: {e}")
@@ -294,6 +297,7 @@ def safe_delete_teacher(teacher_id):
                 text("DELETE FROM function_permissions WHERE teacher_id = :teacher_id"),
                 {"teacher_id": teacher_id}
             ).rowcount
+            CacheInvalidationService.record_permissions(db.session, [teacher_id])
             print(f"Deleted {deleted_func_perms} function permissions")
         except Exception as e:
             print(f"Note: function_permissions table cleanup: {e}")
@@ -12,65 +12,56 @@ import threading
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from functools import wraps
-from collections import defaultdict, deque
+from collections import defaultdict
+
+from .telemetry import LATENCY_BUCKETS, bucket_counts, bucket_quantile, telemetry as default_telemetry
 
 class PerformanceMonitor:
-    """Monitor application performance metrics"""
+    """Monitor application performance metrics (kept in the shared request telemetry)"""
     
-    def __init__(self, max_samples: int = 1000):
-        self.max_samples = max_samples
-        self.request_times = deque(maxlen=max_samples)
-        self.endpoint_stats = defaultdict(lambda: {'count': 0, 'total_time': 0, 'errors': 0})
-        self.error_counts = defaultdict(int)
-        self.lock = threading.RLock()
+    def __init__(self, telemetry=None):
+        self.telemetry = telemetry or default_telemetry
     
     def record_request(self, endpoint: str, duration: float, status_code: int = 200):
         """Record request performance data"""
-        with self.lock:
-            self.request_times.append(duration)
-            stats = self.endpoint_stats[endpoint]
-            stats['count'] += 1
-            stats['total_time'] += duration
-            
-            if status_code >= 400:
-                stats['errors'] += 1
-                self.error_counts[status_code] += 1
+        if self.telemetry.is_measuring():
+            return  # The request hooks already record this request
+        self.telemetry.record(endpoint, 'CALL', status_code, duration)
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get performance statistics"""
-        with self.lock:
-            if not self.request_times:
-                return {'status': 'no_data'}
-            
-            avg_response_time = sum(self.request_times) / len(self.request_times)
-            max_response_time = max(self.request_times)
-            min_response_time = min(self.request_times)
-            
-            # Calculate percentiles
-            sorted_times = sorted(self.request_times)
-            p95_index = int(0.95 * len(sorted_times))
-            p99_index = int(0.99 * len(sorted_times))
-            
-            endpoint_performance = {}
-            for endpoint, stats in self.endpoint_stats.items():
-                if stats['count'] > 0:
-                    endpoint_performance[endpoint] = {
-                        'requests': stats['count'],
-                        'avg_time': stats['total_time'] / stats['count'],
-                        'error_rate': stats['errors'] / stats['count'] * 100
-                    }
-            
-            return {
-                'status': 'healthy',
-                'total_requests': len(self.request_times),
-                'avg_response_time': round(avg_response_time, 3),
-                'min_response_time': round(min_response_time, 3),
-                'max_response_time': round(max_response_time, 3),
-                'p95_response_time': round(sorted_times[p95_index], 3) if p95_index < len(sorted_times) else 0,
-                'p99_response_time': round(sorted_times[p99_index], 3) if p99_index < len(sorted_times) else 0,
-                'error_counts': dict(self.error_counts),
-                'endpoint_performance': endpoint_performance
+        """Get performance statistics, with percentiles read from the latency histograms"""
+        totals = self.telemetry.totals()
+        endpoints = self.telemetry.endpoint_stats(totals)
+        total_requests = sum(stats['requests'] for stats in endpoints.values())
+        if not total_requests:
+            return {'status': 'no_data'}
+        
+        latency_counts = bucket_counts(totals)
+        endpoint_performance = {}
+        error_counts = defaultdict(int)
+        total_time = 0.0
+        for (endpoint, method), stats in endpoints.items():
+            name = endpoint if method == 'CALL' else f"{method} {endpoint}"
+            endpoint_performance[name] = {
+                'requests': stats['requests'],
+                'avg_time': stats['avg_seconds'],
+                'error_rate': (stats['errors'] + stats['client_errors']) / stats['requests'] * 100,
+                'avg_queries': stats['avg_queries']
             }
+            error_counts['4xx'] += stats['client_errors']
+            error_counts['5xx'] += stats['errors']
+            total_time += stats['avg_seconds'] * stats['requests']
+        
+        return {
+            'status': 'healthy',
+            'total_requests': total_requests,
+            'avg_response_time': round(total_time / total_requests, 3),
+            'p50_response_time': round(bucket_quantile(0.5, LATENCY_BUCKETS, latency_counts), 3),
+            'p95_response_time': round(bucket_quantile(0.95, LATENCY_BUCKETS, latency_counts), 3),
+            'p99_response_time': round(bucket_quantile(0.99, LATENCY_BUCKETS, latency_counts), 3),
+            'error_counts': {status: count for status, count in error_counts.items() if count},
+            'endpoint_performance': endpoint_performance
+        }
 
 class StructuredLogger:
     """Structured logging with JSON output"""
@@ -2,6 +2,18 @@
 Performance calculation utilities for the Hillview School Management System.
 """
 
+# Detailed CBC grading bands as (lower bound percentage, label), highest first.
+CBC_BANDS = [
+    (90, "EE1"),  # Exceeding Expectation 1
+    (75, "EE2"),  # Exceeding Expectation 2
+    (58, "ME1"),  # Meeting Expectation 1
+    (41, "ME2"),  # Meeting Expectation 2
+    (31, "AE1"),  # Approaching Expectation 1
+    (21, "AE2"),  # Approaching Expectation 2
+    (11, "BE1"),  # Below Expectation 1
+    (0, "BE2"),   # Below Expectation 2
+]
+
 def get_performance_category(percentage):
     """
     Convert a percentage to a performance category using detailed CBC grading.
@@ -12,22 +24,10 @@ def get_performance_category(percentage):
     Returns:
         String representing the performance category (EE1, EE2, ME1, ME2, AE1, AE2, BE1, BE2)
     """
-    if percentage >= 90:
-        return "EE1"  # Exceeding Expectation 1
-    elif percentage >= 75:
-        return "EE2"  # Exceeding Expectation 2
-    elif percentage >= 58:
-        return "ME1"  # Meeting Expectation 1
-    elif percentage >= 41:
-        return "ME2"  # Meeting Expectation 2
-    elif percentage >= 31:
-        return "AE1"  # Approaching Expectation 1
-    elif percentage >= 21:
-        return "AE2"  # Approaching Expectation 2
-    elif percentage >= 11:
-        return "BE1"  # Below Expectation 1
-    else:
-        return "BE2"  # Below Expectation 2
+    for lower_bound, label in CBC_BANDS[:-1]:
+        if percentage >= lower_bound:
+            return label
+    return CBC_BANDS[-1][1]
 
 def get_grade_and_points(average):
     """
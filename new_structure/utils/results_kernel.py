@@ -0,0 +1,256 @@
+"""
+Vectorized ranking and statistics kernel for class and grade results.
+
+All report paths (class reports, grade reports, grade marksheets and analytics)
+compute totals, averages, ranks and CBC bands through compute_results so that
+they show the same numbers.
+
+Conventions (matching the class report):
+- The input is a students x subjects matrix of percentages with NaN for missing marks.
+- Percentages are capped at 100.
+- Only marks above zero count towards a learner's total, average and subject count,
+  and towards per-subject statistics.
+"""
+import numpy as np
+
+from .performance import CBC_BANDS
+
+# Band lower bounds in ascending order, excluding the open-ended lowest band
+_BAND_EDGES = np.array([bound for bound, _ in reversed(CBC_BANDS[:-1])], dtype=float)
+
+BAND_LABELS = [label for _, label in CBC_BANDS]
+CATEGORY_PREFIXES = {'exceeding': 'EE', 'meeting': 'ME', 'approaching': 'AE', 'below': 'BE'}
+
+
+def band_indices(percentages):
+    """
+    Map percentages to CBC band indices (0 = EE1 ... 7 = BE2).
+
+    Matches utils.performance.get_performance_category; NaN maps to the lowest band.
+    """
+    values = np.nan_to_num(np.asarray(percentages, dtype=float), nan=-1.0)
+    ascending = np.searchsorted(_BAND_EDGES, values, side='right')
+    return len(BAND_LABELS) - 1 - ascending
+
+
+def band_labels(percentages):
+    """Map percentages to CBC band labels (EE1, EE2, ..., BE2)."""
+    return [BAND_LABELS[i] for i in band_indices(percentages)]
+
+
+def competition_ranks(scores, decimals=6):
+    """Standard competition ranks for descending scores (1, 2, 2, 4)."""
+    values = np.round(np.asarray(scores, dtype=float), decimals)
+    ascending = np.sort(values)
+    return (len(values) - np.searchsorted(ascending, values, side='right') + 1).astype(int)
+
+
+def dense_ranks(scores, decimals=6):
+    """Dense ranks for descending scores (1, 2, 2, 3)."""
+    values = np.round(np.asarray(scores, dtype=float), decimals)
+    unique_desc = np.unique(values)[::-1]
+    return (np.searchsorted(-unique_desc, -values, side='left') + 1).astype(int)
+
+
+def combine_components(component_percentages, weights):
+    """
+    Collapse component columns into one weighted composite column.
+
+    Missing components are left out of both the weighted sum and the weight total,
+    so a learner with only one component mark gets that component's percentage.
+
+    Args:
+        component_percentages: students x components array (NaN for missing)
+        weights: Component weights
+
+    Returns:
+        1-D array of combined percentages (NaN where no component has a mark)
+    """
+    values = np.asarray(component_percentages, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    present = ~np.isnan(values)
+    weight_totals = (present * weights).sum(axis=1)
+    weighted = np.where(present, values, 0.0) @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        combined = np.where(weight_totals > 0, weighted / weight_totals, np.nan)
+    combined[present.any(axis=1) & ~(weight_totals > 0)] = 0.0
+    return combined
+
+
+def compute_results(percentages, composites=None, rank_by='total'):
+    """
+    Compute totals, averages, ranks, bands and subject statistics in one pass.
+
+    Args:
+        percentages: students x subjects array of percentages (NaN for missing marks)
+        composites: Optional list of (component students x k array, weights) tuples;
+            each is collapsed into one extra column appended after the regular subjects
+        rank_by: 'total' or 'average' - the score learners are ranked by
+
+    Returns:
+        Dictionary of NumPy arrays and summaries:
+            matrix, totals, averages, subject_counts, present_counts, competition_ranks,
+            dense_ranks, order, bands, categories, subject_mean, subject_min, subject_max,
+            subject_std, subject_counts_present, subject_band_histogram
+    """
+    matrix = np.asarray(percentages, dtype=float)
+    if matrix.ndim != 2:
+        raise ValueError("percentages must be a students x subjects matrix")
+    if composites:
+        collapsed = [combine_components(values, weights) for values, weights in composites]
+        matrix = np.column_stack([matrix] + collapsed)
+
+    matrix = np.minimum(matrix, 100.0)
+    counted = matrix > 0  # False for NaN
+    present_counts = (~np.isnan(matrix)).sum(axis=1)
+    subject_counts = counted.sum(axis=1)
+    totals = np.where(counted, matrix, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(subject_counts > 0, totals / np.maximum(subject_counts, 1), 0.0)
+
+    scores = totals if rank_by == 'total' else averages
+    order = np.argsort(-scores, kind='stable')
+    bands = band_indices(averages)
+
+    band_counts = np.bincount(bands, minlength=len(BAND_LABELS))
+    categories = {
+        name: int(sum(band_counts[i] for i, label in enumerate(BAND_LABELS) if label.startswith(prefix)))
+        for name, prefix in CATEGORY_PREFIXES.items()
+    }
+
+    n_subjects = matrix.shape[1]
+    counted_values = np.where(counted, matrix, np.nan)
+    subject_counts_present = counted.sum(axis=0)
+    has_values = subject_counts_present > 0
+    subject_mean = np.zeros(n_subjects)
+    subject_min = np.zeros(n_subjects)
+    subject_max = np.zeros(n_subjects)
+    subject_std = np.zeros(n_subjects)
+    if has_values.any():
+        columns = counted_values[:, has_values]
+        subject_mean[has_values] = np.nanmean(columns, axis=0)
+        subject_min[has_values] = np.nanmin(columns, axis=0)
+        subject_max[has_values] = np.nanmax(columns, axis=0)
+        subject_std[has_values] = np.nanstd(columns, axis=0)
+
+    histogram = np.zeros((n_subjects, len(BAND_LABELS)), dtype=int)
+    if n_subjects and matrix.shape[0]:
+        subject_bands = band_indices(matrix)
+        for band in range(len(BAND_LABELS)):
+            histogram[:, band] = ((subject_bands == band) & counted).sum(axis=0)
+
+    return {
+        'matrix': matrix,
+        'totals': totals,
+        'averages': averages,
+        'subject_counts': subject_counts,
+        'present_counts': present_counts,
+        'competition_ranks': competition_ranks(scores) if len(scores) else np.array([], dtype=int),
+        'dense_ranks': dense_ranks(scores) if len(scores) else np.array([], dtype=int),
+        'order': order,
+        'bands': [BAND_LABELS[i] for i in bands],
+        'categories': categories,
+        'subject_mean': subject_mean,
+        'subject_min': subject_min,
+        'subject_max': subject_max,
+        'subject_std': subject_std,
+        'subject_counts_present': subject_counts_present,
+        'subject_band_histogram': histogram,
+    }
+
+
+def subject_statistics(results, subject_names, decimals=2):
+    """Convert per-subject kernel arrays into {subject: {mean, min, max, std, count, bands}}."""
+    stats = {}
+    for index, name in enumerate(subject_names):
+        stats[name] = {
+            'mean': round(float(results['subject_mean'][index]), decimals),
+            'min': round(float(results['subject_min'][index]), decimals),
+            'max': round(float(results['subject_max'][index]), decimals),
+            'std': round(float(results['subject_std'][index]), decimals),
+            'count': int(results['subject_counts_present'][index]),
+            'bands': dict(zip(BAND_LABELS, (int(c) for c in results['subject_band_histogram'][index]))),
+        }
+    return stats
+
+
+def matrix_from_rows(rows, subject_names, key='marks'):
+    """Build a students x subjects matrix from a list of {key: {subject: percentage}} dicts."""
+    matrix = np.full((len(rows), len(subject_names)), np.nan)
+    columns = {name: index for index, name in enumerate(subject_names)}
+    for row_index, row in enumerate(rows):
+        for name, value in (row.get(key) or {}).items():
+            column = columns.get(name)
+            if column is not None and isinstance(value, (int, float)):
+                matrix[row_index, column] = value
+    return matrix
+
+
+def previous_values(values):
+    """
+    For every entry, the last non-NaN value before it along the last axis (NaN if none).
+
+    Used for term-over-term deltas: periods without a result are skipped, so the
+    previous value is the learner's previous result, not the previous column.
+    """
+    values = np.asarray(values, dtype=float)
+    periods = values.shape[-1]
+    if periods == 0:
+        return values.copy()
+    positions = np.where(np.isnan(values), -1, np.arange(periods))
+    latest = np.maximum.accumulate(positions, axis=-1)
+    before = np.concatenate([np.full(values.shape[:-1] + (1,), -1), latest[..., :-1]], axis=-1)
+    result = np.take_along_axis(values, np.maximum(before, 0), axis=-1)
+    result[before < 0] = np.nan
+    return result
+
+
+def rolling_means(values, window):
+    """Mean of the non-NaN values in the last `window` positions along the last axis (NaN where missing)."""
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    sums = np.cumsum(np.where(present, values, 0.0), axis=-1)
+    counts = np.cumsum(present, axis=-1)
+
+    def shifted(cumulative):
+        # cumulative[..., p - window], 0 before the start
+        lead = min(window, values.shape[-1])
+        return np.concatenate([np.zeros(values.shape[:-1] + (lead,)), cumulative[..., :values.shape[-1] - lead]],
+                              axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums - shifted(sums)) / (counts - shifted(counts))
+    means[~present] = np.nan
+    return means
+
+
+def percentile_ranks(values, axis=0, decimals=4):
+    """
+    Mid-rank percentiles (0-100) of the non-NaN values along an axis (NaN where missing).
+
+    A value's percentile is the share of values below it plus half the share equal
+    to it, so the middle learner of a class is at 50 and ties share a percentile.
+    All columns are ranked with one sort: each column's values are offset into their
+    own range of a single sorted array.
+    """
+    values = np.moveaxis(np.round(np.asarray(values, dtype=float), decimals), axis, -1)
+    shape = values.shape
+    if np.isnan(values).all():
+        return np.moveaxis(np.full(shape, np.nan), -1, axis)
+    rows = values.reshape(-1, shape[-1])
+    present = ~np.isnan(rows)
+    result = np.full(rows.shape, np.nan)
+
+    low = np.nanmin(rows)
+    span = np.nanmax(rows) - low + 1.0
+    offsets = np.arange(rows.shape[0])[:, None] * span
+    keyed = rows - low + offsets
+    ordered = np.sort(keyed[present])
+    starts = np.searchsorted(ordered, offsets, side='left')
+    below = np.searchsorted(ordered, keyed, side='left') - starts
+    equal = np.searchsorted(ordered, keyed, side='right') - np.searchsorted(ordered, keyed, side='left')
+    counts = present.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ranked = 100.0 * (below + 0.5 * equal) / counts
+    result[present] = ranked[present]
+    return np.moveaxis(result.reshape(shape), -1, axis)
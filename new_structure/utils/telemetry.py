@@ -0,0 +1,590 @@
+"""
+Request telemetry for the Hillview School Management System.
+
+Hooks installed by Telemetry.init_app() measure every request:
+    - latency, counted in fixed buckets per endpoint (LATENCY_BUCKETS)
+    - SQL statements and their time, from SQLAlchemy before/after_cursor_execute,
+      with the statement count bucketed per endpoint (QUERY_BUCKETS) so N+1
+      patterns stand out
+    - template render time (Flask's before_render_template/template_rendered signals)
+    - response size
+Histograms have fixed buckets, so recording is a few additions and percentiles are
+read from bucket counts instead of sorting samples.
+
+Each process adds its measurements up locally and flushes them every
+TELEMETRY_FLUSH_SECONDS to a store shared by all workers of the deployment:
+    redis  - HINCRBYFLOAT on one hash (Redis configured with CACHE_TYPE = 'redis')
+    files  - one totals file per worker process in TELEMETRY_DIR, added up on read
+             (the default without Redis); files of exited workers are folded into
+             one retired-totals file, so the directory holds about one file per
+             live worker however often workers are recycled
+    memory - this process only (tests)
+render_prometheus() formats the totals of all workers in the Prometheus text
+format served by /metrics.
+"""
+import glob
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' files are left in place
+    fcntl = None
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; a final +Inf bucket is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)  # SQL statements per request
+
+METRIC_PREFIX = 'hillview'
+_SEPARATOR = '\t'
+_REDIS_KEY = 'hillview:telemetry'
+
+
+def _bucket_labels(bounds) -> List[str]:
+    return [f"{bound:g}" for bound in bounds] + ['+Inf']
+
+
+_LATENCY_LABELS = _bucket_labels(LATENCY_BUCKETS)
+_QUERY_LABELS = _bucket_labels(QUERY_BUCKETS)
+
+
+def _series(name: str, endpoint: str, method: str, extra: str = '') -> str:
+    return _SEPARATOR.join((name, endpoint, method, extra))
+
+
+def bucket_quantile(quantile: float, bounds, counts) -> Optional[float]:
+    """
+    Estimate a quantile from histogram bucket counts (as Prometheus' histogram_quantile).
+
+    Args:
+        quantile: Quantile between 0 and 1
+        bounds: Upper bounds of the finite buckets
+        counts: Count of each bucket (not cumulative), the +Inf bucket last
+
+    Returns:
+        Estimated value (linear within the bucket), the largest finite bound if it
+        falls in the +Inf bucket, or None without observations
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0.0
+    for index, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if index == len(bounds):
+                return float(bounds[-1])
+            lower = bounds[index - 1] if index else 0.0
+            return lower + (bounds[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return float(bounds[-1])
+
+
+def bucket_counts(totals: Dict[str, float], name: str = 'duration') -> List[float]:
+    """
+    Add up one histogram's bucket counts over every endpoint.
+
+    Args:
+        totals: Totals from Telemetry.totals()
+        name: 'duration' (LATENCY_BUCKETS) or 'queries' (QUERY_BUCKETS)
+
+    Returns:
+        Count of each bucket (not cumulative), the +Inf bucket last
+    """
+    labels = _LATENCY_LABELS if name == 'duration' else _QUERY_LABELS
+    positions = {label: index for index, label in enumerate(labels)}
+    counts = [0.0] * len(labels)
+    prefix = f"{name}_bucket{_SEPARATOR}"
+    for series, value in totals.items():
+        if series.startswith(prefix):
+            counts[positions[series.rsplit(_SEPARATOR, 1)[1]]] += value
+    return counts
+
+
+class _RequestStats:
+    """Measurements of the request being handled (stored in flask.g)."""
+
+    __slots__ = ('start', 'queries', 'sql_seconds', 'template_seconds', 'template_starts', 'recorded')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_starts = []
+        self.recorded = False
+
+
+def _current_stats() -> Optional[_RequestStats]:
+    return g.get('_telemetry') if has_request_context() else None
+
+
+# ---------------------------------------------------------------------- stores
+
+class MemoryStore:
+    """Totals of this process only."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, deltas: Dict[str, float]) -> None:
+        with self._lock:
+            for series, value in deltas.items():
+                self._totals[series] += value
+
+    def load(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._totals)
+
+
+class FileStore(MemoryStore):
+    """Per-process totals written to a shared directory and added up on read."""
+
+    name = 'files'
+    RETIRED_FILE = 'retired.json'
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.host = socket.gethostname().replace('-', '_')
+        self._pid = None
+        self.path = None
+
+    def _own_file(self) -> str:
+        """
+        This process's totals file, chosen on first use in each process.
+
+        The store is created in the gunicorn master when the app is preloaded, so a
+        forked worker starts a file (and totals) of its own instead of overwriting the
+        one it inherited. A fresh name per process start means a restarted worker's
+        counts never go down.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._totals = defaultdict(float)
+                    self.path = os.path.join(
+                        self.directory, f"worker-{self.host}-{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+                    self._pid = os.getpid()
+        return self.path
+
+    def _write(self, path: str, totals: Dict[str, float]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(totals, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict[str, float]]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug(f"Skipping telemetry file {path}: {e}")
+            return None
+
+    def _exited_worker_files(self) -> List[str]:
+        """Files of this host's worker processes that are no longer running."""
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.json')):
+            # worker-<host>-<pid>-<id>.json; files written before the host was added have no host part
+            parts = os.path.basename(path)[len('worker-'):-len('.json')].rsplit('-', 2)
+            if len(parts) == 3 and parts[0] != self.host:
+                continue
+            try:
+                pid = int(parts[-2])
+            except (IndexError, ValueError):
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                exited.append(path)
+            except OSError:
+                pass  # Running under another user
+        return exited
+
+    @contextmanager
+    def _directory_lock(self):
+        """Exclusive lock on the directory while retired totals are read or folded (no-op without fcntl)."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.fold.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _fold(self, exited: List[str]) -> int:
+        retired_path = os.path.join(self.directory, self.RETIRED_FILE)
+        retired = defaultdict(float, self._read(retired_path) or {})
+        folded = []
+        for path in exited:
+            worker_totals = self._read(path)
+            if worker_totals is None:
+                continue  # Folded by another process while we waited for the lock
+            for series, value in worker_totals.items():
+                retired[series] += value
+            folded.append(path)
+        if folded:
+            self._write(retired_path, retired)
+            for path in folded:
+                os.remove(path)
+        return len(folded)
+
+    def fold_exited_workers(self) -> int:
+        """
+        Add the totals of exited workers to the retired-totals file and delete their files.
+
+        Called on every read and from gunicorn's child_exit hook, under an exclusive
+        lock on the directory so no file is ever counted twice.
+
+        Returns:
+            Number of worker files folded
+        """
+        if fcntl is None or not os.path.isdir(self.directory):
+            return 0
+        try:
+            with self._directory_lock():
+                return self._fold(self._exited_worker_files())
+        except OSError as e:
+            logger.warning(f"Could not fold telemetry files of exited workers: {e}")
+            return 0
+
+    def add(self, deltas: Dict[str, float]) -> None:
+        path = self._own_file()
+        super().add(deltas)
+        try:
+            self._write(path, super().load())
+        except OSError as e:
+            logger.warning(f"Could not write telemetry file {path}: {e}")
+
+    def load(self) -> Dict[str, float]:
+        totals = defaultdict(float)
+        if not os.path.isdir(self.directory):
+            return {}
+        try:
+            with self._directory_lock():
+                if fcntl is not None:
+                    self._fold(self._exited_worker_files())
+                paths = glob.glob(os.path.join(self.directory, 'worker-*.json'))
+                paths.append(os.path.join(self.directory, self.RETIRED_FILE))
+                for path in paths:
+                    for series, value in (self._read(path) or {}).items():
+                        totals[series] += value
+        except OSError as e:
+            logger.warning(f"Could not read telemetry files: {e}")
+        return dict(totals)
+
+
+class RedisStore:
+    """Totals of all workers in one Redis hash."""
+
+    name = 'redis'
+
+    def __init__(self, client, key: str = _REDIS_KEY):
+        self.client = client
+        self.key = key
+
+    def add(self, deltas: Dict[str, float]) -> None:
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for series, value in deltas.items():
+                pipeline.hincrbyfloat(self.key, series, value)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not flush telemetry to Redis: {e}")
+
+    def load(self) -> Dict[str, float]:
+        try:
+            return {series: float(value) for series, value in self.client.hgetall(self.key).items()}
+        except Exception as e:
+            logger.warning(f"Could not read telemetry from Redis: {e}")
+            return {}
+
+
+# ------------------------------------------------------------------- telemetry
+
+class Telemetry:
+    """Per-endpoint request histograms and counters, shared across worker processes."""
+
+    def __init__(self, store=None, flush_seconds: float = 10.0):
+        self.store = store or MemoryStore()
+        self.flush_seconds = flush_seconds
+        self._pending = defaultdict(float)  # Measurements not yet flushed to the store
+        self._pending_pid = os.getpid()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    # ------------------------------------------------------------ recording
+
+    def record(self, endpoint: str, method: str, status_code: int, seconds: float, queries: int = 0,
+               sql_seconds: float = 0.0, template_seconds: float = 0.0, response_bytes: int = 0) -> None:
+        """
+        Record one request.
+
+        Args:
+            endpoint: Endpoint name (e.g. 'analytics_api.get_subject_performance')
+            method: HTTP method
+            status_code: Response status code
+            seconds: Time to build the response
+            queries: SQL statements executed
+            sql_seconds: Time spent executing them
+            template_seconds: Time spent rendering templates
+            response_bytes: Response body size
+        """
+        latency_bucket = _LATENCY_LABELS[bisect_left(LATENCY_BUCKETS, seconds)]
+        query_bucket = _QUERY_LABELS[bisect_left(QUERY_BUCKETS, queries)]
+        with self._lock:
+            if self._pending_pid != os.getpid():
+                # Forked from the process that recorded these; they are flushed there
+                self._pending, self._pending_pid = defaultdict(float), os.getpid()
+            pending = self._pending
+            pending[_series('requests', endpoint, method, f"{status_code // 100}xx")] += 1
+            pending[_series('duration_bucket', endpoint, method, latency_bucket)] += 1
+            pending[_series('duration_sum', endpoint, method)] += seconds
+            pending[_series('queries_bucket', endpoint, method, query_bucket)] += 1
+            pending[_series('queries_sum', endpoint, method)] += queries
+            pending[_series('sql_seconds', endpoint, method)] += sql_seconds
+            pending[_series('template_seconds', endpoint, method)] += template_seconds
+            pending[_series('response_bytes', endpoint, method)] += response_bytes
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send the measurements recorded since the last flush to the store."""
+        with self._lock:
+            deltas, self._pending = self._pending, defaultdict(float)
+            self._last_flush = time.monotonic()
+        if deltas:
+            self.store.add(deltas)
+
+    def totals(self) -> Dict[str, float]:
+        """Totals of every worker sharing the store (this process's pending measurements included)."""
+        self.flush()
+        return self.store.load()
+
+    @staticmethod
+    def is_measuring() -> bool:
+        """Whether the current request is measured by the request hooks."""
+        return _current_stats() is not None
+
+    # --------------------------------------------------------------- reading
+
+    def endpoint_stats(self, totals: Optional[Dict[str, float]] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Summarize the totals per endpoint and method.
+
+        Returns:
+            Dictionary of (endpoint, method) -> {requests, errors (5xx), client_errors (4xx),
+            avg_seconds, p50_seconds, p95_seconds, p99_seconds, avg_queries, p95_queries,
+            sql_seconds, template_seconds, avg_response_bytes}
+        """
+        totals = self.totals() if totals is None else totals
+        grouped = defaultdict(lambda: defaultdict(float))
+        for series, value in totals.items():
+            name, endpoint, method, extra = series.split(_SEPARATOR)
+            grouped[(endpoint, method)][(name, extra)] += value
+
+        stats = {}
+        for key, values in grouped.items():
+            latency_counts = [values.get(('duration_bucket', label), 0) for label in _LATENCY_LABELS]
+            query_counts = [values.get(('queries_bucket', label), 0) for label in _QUERY_LABELS]
+            requests = sum(latency_counts)
+            if not requests:
+                continue
+            stats[key] = {
+                'requests': int(requests),
+                'errors': int(values.get(('requests', '5xx'), 0)),
+                'client_errors': int(values.get(('requests', '4xx'), 0)),
+                'avg_seconds': values.get(('duration_sum', ''), 0) / requests,
+                'p50_seconds': bucket_quantile(0.5, LATENCY_BUCKETS, latency_counts),
+                'p95_seconds': bucket_quantile(0.95, LATENCY_BUCKETS, latency_counts),
+                'p99_seconds': bucket_quantile(0.99, LATENCY_BUCKETS, latency_counts),
+                'avg_queries': values.get(('queries_sum', ''), 0) / requests,
+                'p95_queries': bucket_quantile(0.95, QUERY_BUCKETS, query_counts),
+                'sql_seconds': values.get(('sql_seconds', ''), 0),
+                'template_seconds': values.get(('template_seconds', ''), 0),
+                'avg_response_bytes': values.get(('response_bytes', ''), 0) / requests,
+            }
+        return stats
+
+    def render_prometheus(self, totals: Optional[Dict[str, float]] = None) -> str:
+        """Format the totals in the Prometheus text exposition format."""
+        totals = self.totals() if totals is None else totals
+        grouped = defaultdict(dict)
+        for series, value in totals.items():
+            name, endpoint, method, extra = series.split(_SEPARATOR)
+            grouped[name][(endpoint, method, extra)] = value
+
+        def labels(endpoint, method, **extra):
+            pairs = [('endpoint', endpoint), ('method', method)] + list(extra.items())
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        lines = []
+
+        def counter(name, metric, help_text, label=None):
+            if name not in grouped:
+                return
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+            for (endpoint, method, extra), value in sorted(grouped[name].items()):
+                extra_labels = {label: extra} if label else {}
+                lines.append(f"{METRIC_PREFIX}_{metric}{labels(endpoint, method, **extra_labels)} {value:g}")
+
+        def histogram(name, metric, help_text, bucket_labels):
+            buckets = grouped.get(f"{name}_bucket")
+            if not buckets:
+                return
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} histogram")
+            for endpoint, method in sorted({(endpoint, method) for endpoint, method, _ in buckets}):
+                cumulative = 0.0
+                for label in bucket_labels:
+                    cumulative += buckets.get((endpoint, method, label), 0)
+                    lines.append(f"{METRIC_PREFIX}_{metric}_bucket{labels(endpoint, method, le=label)} {cumulative:g}")
+                total = grouped.get(f"{name}_sum", {}).get((endpoint, method, ''), 0)
+                lines.append(f"{METRIC_PREFIX}_{metric}_sum{labels(endpoint, method)} {total:g}")
+                lines.append(f"{METRIC_PREFIX}_{metric}_count{labels(endpoint, method)} {cumulative:g}")
+
+        counter('requests', 'http_requests_total', 'Requests by endpoint, method and status class.', 'status')
+        histogram('duration', 'http_request_duration_seconds', 'Time to build the response.', _LATENCY_LABELS)
+        histogram('queries', 'http_request_sql_queries', 'SQL statements executed per request.', _QUERY_LABELS)
+        counter('sql_seconds', 'http_request_sql_seconds_total', 'Time spent executing SQL statements.')
+        counter('template_seconds', 'http_request_template_seconds_total', 'Time spent rendering templates.')
+        counter('response_bytes', 'http_response_bytes_total', 'Response body bytes sent.')
+        return '\n'.join(lines) + '\n'
+
+    # ----------------------------------------------------------------- hooks
+
+    def init_app(self, app) -> None:
+        """
+        Install the request, SQL and template hooks and choose the shared store.
+
+        Settings: TELEMETRY_ENABLED, TELEMETRY_STORE ('redis', 'files' or 'memory';
+        default redis when CACHE_TYPE is 'redis' and Redis answers, else files),
+        TELEMETRY_DIR (files store; default <instance>/telemetry) and
+        TELEMETRY_FLUSH_SECONDS.
+        """
+        if not app.config.get('TELEMETRY_ENABLED', True):
+            return
+        self.flush_seconds = app.config.get('TELEMETRY_FLUSH_SECONDS', self.flush_seconds)
+        self.store = self._create_store(app.config, app.instance_path)
+        app.extensions['telemetry'] = self
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._on_template_start, app, weak=False)
+        template_rendered.connect(self._on_template_end, app, weak=False)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+
+    @staticmethod
+    def _create_store(config, instance_path: str):
+        store = config.get('TELEMETRY_STORE') or ('redis' if config.get('CACHE_TYPE') == 'redis' else 'files')
+        if store == 'redis':
+            try:
+                from .cache_manager import CacheManager
+                manager = CacheManager(host=config.get('REDIS_HOST', 'localhost'), port=config.get('REDIS_PORT', 6379),
+                                       db=config.get('REDIS_DB', 0), password=config.get('REDIS_PASSWORD'))
+                if manager.is_available:
+                    return RedisStore(manager.redis_client)
+            except ImportError:
+                logger.warning("redis package not installed; telemetry is shared through files")
+            store = 'files'
+        if store == 'files':
+            return FileStore(config.get('TELEMETRY_DIR') or os.path.join(instance_path, 'telemetry'))
+        return MemoryStore()
+
+    @staticmethod
+    def _before_request():
+        g._telemetry = _RequestStats()
+
+    def _record_request(self, stats: _RequestStats, status_code: int, response_bytes: int) -> None:
+        stats.recorded = True
+        self.record(request.endpoint or 'unmatched', request.method, status_code,
+                    time.perf_counter() - stats.start, stats.queries, stats.sql_seconds,
+                    stats.template_seconds, response_bytes)
+
+    def _after_request(self, response):
+        stats = _current_stats()
+        if stats is not None and not stats.recorded:
+            self._record_request(stats, response.status_code, response.content_length or 0)
+        return response
+
+    def _teardown_request(self, exc=None):
+        # Unhandled errors skip after_request
+        stats = _current_stats()
+        if stats is not None and not stats.recorded:
+            self._record_request(stats, 500, 0)
+
+    @staticmethod
+    def _on_template_start(sender, template=None, context=None, **extra):
+        stats = _current_stats()
+        if stats is not None:
+            stats.template_starts.append(time.perf_counter())
+
+    @staticmethod
+    def _on_template_end(sender, template=None, context=None, **extra):
+        stats = _current_stats()
+        if stats is not None and stats.template_starts:
+            started = stats.template_starts.pop()
+            if not stats.template_starts:  # Nested renders are part of the outer one
+                stats.template_seconds += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('telemetry_starts', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    starts = conn.info.get('telemetry_starts')
+    if stats is not None and starts:
+        stats.queries += 1
+        stats.sql_seconds += time.perf_counter() - starts.pop()
+
+
+def _handle_error(exception_context):
+    # A failed statement skips after_cursor_execute: count it and drop its start time
+    conn = exception_context.connection
+    executing = conn is not None and exception_context.execution_context is not None
+    starts = conn.info.get('telemetry_starts') if executing else None
+    if starts:
+        started = starts.pop()
+        stats = _current_stats()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += time.perf_counter() - started
+
+
+telemetry = Telemetry()
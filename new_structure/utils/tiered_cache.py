@@ -0,0 +1,388 @@
+"""
+Tiered cache for the Hillview School Management System.
+
+Lookups go through three tiers, fastest first:
+    1. an in-process LRU bounded by a byte budget, with per-entry TTL
+    2. Redis, through utils/cache_manager.CacheManager (shared by all workers)
+    3. files on disk (survive restarts when Redis is not deployed)
+Expired disk files are removed when read, and writes periodically sweep the
+directory of expired files and of the least recently used ones over a byte budget.
+A hit in a slower tier is promoted to the faster ones. All memory-tier state is
+guarded by a lock, and get_or_compute() makes concurrent misses on the same key
+wait for a single computation instead of each recomputing the value.
+"""
+import json
+import logging
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_EXPIRY_HEADER = struct.Struct('>d')
+DISK_SWEEP_INTERVAL = 300  # Seconds between sweeps of the disk tier
+
+
+class PickleSerializer:
+    """Serializes arbitrary Python objects with pickle."""
+    extension = '.pickle'
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class JSONSerializer:
+    """Serializes JSON-compatible data (dates and other objects become strings)."""
+    extension = '.json'
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, default=str).encode('utf-8')
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        return json.loads(data.decode('utf-8'))
+
+
+class _Flight:
+    """A computation in progress that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TieredCache:
+    """Memory -> Redis -> disk cache for one namespace of keys."""
+
+    def __init__(self, namespace: str, serializer=PickleSerializer, max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: int = 3600, disk_dir: Optional[str] = None, redis_manager=None,
+                 disk_max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            namespace: Prefix that separates this cache's keys in Redis
+            serializer: Object with dumps(value) -> bytes, loads(bytes) -> value and extension
+            max_bytes: Memory budget of the in-process tier (serialized size of entries)
+            default_ttl: Time to live in seconds when set() is called without one
+            disk_dir: Directory for the disk tier, or None to disable it
+            redis_manager: CacheManager instance for the Redis tier, or None to disable it
+            disk_max_bytes: Size budget of the disk tier, enforced by the periodic sweep
+        """
+        self.namespace = namespace
+        self.serializer = serializer
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.disk_dir = disk_dir
+        self.redis = redis_manager if redis_manager is not None and redis_manager.is_available else None
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries = OrderedDict()  # key -> (value, size, expires_at), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+        self._next_sweep = 0.0
+        self._stats = {
+            'memory_hits': 0, 'redis_hits': 0, 'disk_hits': 0, 'misses': 0,
+            'sets': 0, 'evictions': 0, 'expirations': 0, 'coalesced': 0, 'disk_removals': 0
+        }
+
+    # ------------------------------------------------------------------ tiers
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _pack(self, payload: bytes, expires_at: float) -> bytes:
+        return _EXPIRY_HEADER.pack(expires_at) + payload
+
+    def _unpack(self, data: bytes):
+        """Return (value, expires_at) from a stored record, or (_MISSING, None) if expired."""
+        expires_at = _EXPIRY_HEADER.unpack_from(data)[0]
+        if expires_at <= time.time():
+            self._count('expirations')
+            return _MISSING, None
+        return self.serializer.loads(data[_EXPIRY_HEADER.size:]), expires_at
+
+    def _redis_key(self, key: str) -> str:
+        return f"hillview:tiered:{self.namespace}:{key}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}{self.serializer.extension}")
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, size, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self._bytes -= size
+                self._stats['expirations'] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: Any, size: int, expires_at: float) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return  # Larger than the whole budget: leave it to Redis and disk
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def _disk_get(self, key: str):
+        """Return (value, expires_at, raw record) from the disk tier, removing an expired file."""
+        if not self.disk_dir:
+            return _MISSING, None, None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            value, expires_at = self._unpack(data)
+        except FileNotFoundError:
+            return _MISSING, None, None
+        except Exception as e:
+            # Unreadable or older-format file: treat as a miss
+            logger.debug(f"Ignoring cache file for {self.namespace}/{key}: {e}")
+            return _MISSING, None, None
+        if value is _MISSING:
+            self._disk_remove(path)
+            return _MISSING, None, None
+        try:
+            os.utime(path)  # Least recently used files are swept first
+        except OSError:
+            pass
+        return value, expires_at, data
+
+    def _disk_set(self, key: str, record: bytes) -> None:
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(record)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.warning(f"Could not write cache file for {self.namespace}/{key}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            due = now >= self._next_sweep
+            if due:
+                self._next_sweep = now + DISK_SWEEP_INTERVAL
+        if due:
+            self.sweep_disk(keep=self._disk_path(key))
+
+    def _disk_remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        self._count('disk_removals')
+        return True
+
+    def sweep_disk(self, keep: Optional[str] = None) -> int:
+        """
+        Delete expired disk files, then the least recently used ones until the tier fits disk_max_bytes.
+
+        Version-tokened keys leave their superseded entries behind on every data change,
+        so this is what bounds the disk tier. Writes call it every DISK_SWEEP_INTERVAL seconds.
+
+        Args:
+            keep: Path that must not be removed (the entry just written)
+
+        Returns:
+            Number of files removed
+        """
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return 0
+        now = time.time()
+        entries = []
+        total = 0
+        removed = 0
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.endswith(self.serializer.extension):
+                    continue
+                try:
+                    stat = entry.stat()
+                    with open(entry.path, 'rb') as f:
+                        header = f.read(_EXPIRY_HEADER.size)
+                    expired = len(header) < _EXPIRY_HEADER.size or _EXPIRY_HEADER.unpack(header)[0] <= now
+                except OSError:
+                    continue
+                if expired and entry.path != keep:
+                    if self._disk_remove(entry.path):
+                        removed += 1
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            if path != keep and self._disk_remove(path):
+                total -= size
+                removed += 1
+        return removed
+
+    # ------------------------------------------------------------------ API
+
+    def _lookup(self, key: str, record: bool = True) -> Any:
+        value = self._memory_get(key)
+        if value is not _MISSING:
+            if record:
+                self._count('memory_hits')
+            return value
+
+        if self.redis is not None:
+            data = self.redis.get_bytes(self._redis_key(key))
+            if data is not None:
+                try:
+                    value, expires_at = self._unpack(data)
+                except Exception as e:
+                    logger.debug(f"Ignoring Redis value for {self.namespace}/{key}: {e}")
+                    value = _MISSING
+                if value is not _MISSING:
+                    if record:
+                        self._count('redis_hits')
+                    self._memory_set(key, value, len(data), expires_at)
+                    return value
+
+        value, expires_at, data = self._disk_get(key)
+        if value is not _MISSING:
+            if record:
+                self._count('disk_hits')
+            self._memory_set(key, value, len(data), expires_at)
+            if self.redis is not None:
+                self.redis.set_bytes(self._redis_key(key), data, expires_at - time.time())
+            return value
+
+        if record:
+            self._count('misses')
+        return _MISSING
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if no tier has a fresh copy."""
+        value = self._lookup(key)
+        return None if value is _MISSING else value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Store a value in every tier for ttl seconds (default_ttl when omitted)."""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl
+        record = self._pack(self.serializer.dumps(value), expires_at)
+        self._count('sets')
+        self._memory_set(key, value, len(record), expires_at)
+        if self.redis is not None:
+            self.redis.set_bytes(self._redis_key(key), record, ttl)
+        self._disk_set(key, record)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[int] = None,
+                       should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value, computing and storing it on a miss.
+
+        Concurrent callers that miss on the same key wait for the first caller's
+        computation and share its result (or exception).
+
+        Args:
+            key: Cache key
+            compute: Function producing the value
+            ttl: Time to live in seconds
+            should_cache: Optional predicate; results it rejects are returned but not stored
+
+        Returns:
+            The cached or computed value
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            # Another leader may have stored the value between our miss and taking the lock
+            value = self._lookup(key, record=False)
+            if value is _MISSING:
+                value = compute()
+                if value is not None and (should_cache is None or should_cache(value)):
+                    self.set(key, value, ttl)
+            flight.result = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def delete(self, key: str) -> None:
+        """Remove a key from every tier."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+        if self.redis is not None:
+            self.redis.delete(self._redis_key(key))
+        if self.disk_dir:
+            self._disk_remove(self._disk_path(key))
+
+    def clear(self) -> None:
+        """Remove every key of this namespace from every tier."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.redis is not None:
+            self.redis.clear_pattern(self._redis_key('*'))
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for filename in os.listdir(self.disk_dir):
+                if filename.endswith(self.serializer.extension):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, filename))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters plus the memory tier's current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._entries)
+            stats['memory_bytes'] = self._bytes
+        stats['namespace'] = self.namespace
+        stats['redis'] = self.redis is not None
+        return stats
@@ -1,63 +1,76 @@
 """
 Views package for the Hillview School Management System.
-This file imports and exposes view blueprints for registration with the Flask app.
+This file lists the view blueprints for registration with the Flask app.
+
+Blueprint modules are imported when the app registers them (load_blueprints), not
+when this package is imported, so code that only needs one view module does not
+pay for all of them and create_app can time each import. The `blueprints` list is
+still available for code that imports it directly.
 """
-from .auth import auth_bp
-from .teacher import teacher_bp
-from .classteacher import classteacher_bp
-from .admin import admin_bp
-from .bulk_assignments import bulk_assignments_bp
-from .setup import setup_bp
-from .staff_management import staff_bp
-from .permission_management import permission_bp
-from .headteacher_universal import universal_bp
-from .analytics_api import analytics_api_bp
-from .school_setup import school_setup_bp
-from .subject_config_api import subject_config_api
-from .missing_routes import missing_routes_bp
-from .mobile_performance_api import mobile_performance_api
-
-# Import parent portal blueprints with error handling
-try:
-    from .parent_simple import parent_simple_bp
-    parent_bp_available = True
-except ImportError:
-    parent_simple_bp = None
-    parent_bp_available = False
-
-# Import parent management blueprint with error handling
-try:
-    from .parent_management import parent_management_bp
-    parent_mgmt_bp_available = True
-except ImportError:
-    parent_management_bp = None
-    parent_mgmt_bp_available = False
-
-# Import email configuration blueprint with error handling - TEMPORARILY DISABLED
-# try:
-#     from .email_config import email_config_bp
-#     email_config_bp_available = True
-# except ImportError:
-email_config_bp = None
-email_config_bp_available = False
-
-# List of all blueprints to register with the app
-blueprints = [
-    auth_bp, teacher_bp, classteacher_bp, admin_bp,
-    bulk_assignments_bp, setup_bp, staff_bp,
-    permission_bp, universal_bp, analytics_api_bp,
-    school_setup_bp, subject_config_api, missing_routes_bp,
-    mobile_performance_api
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (module, blueprint attribute, optional) in registration order. Optional modules
+# are skipped quietly when they cannot be imported.
+BLUEPRINT_MODULES = [
+    ('auth', 'auth_bp', False),
+    ('teacher', 'teacher_bp', False),
+    ('classteacher', 'classteacher_bp', False),
+    ('admin', 'admin_bp', False),
+    ('bulk_assignments', 'bulk_assignments_bp', False),
+    ('setup', 'setup_bp', False),
+    ('staff_management', 'staff_bp', False),
+    ('permission_management', 'permission_bp', False),
+    ('headteacher_universal', 'universal_bp', False),
+    ('analytics_api', 'analytics_api_bp', False),
+    ('school_setup', 'school_setup_bp', False),
+    ('subject_config_api', 'subject_config_api', False),
+    ('missing_routes', 'missing_routes_bp', False),
+    ('mobile_performance_api', 'mobile_performance_api', False),
+    ('metrics_api', 'metrics_bp', False),
+    # Parent portal blueprints
+    ('parent_simple', 'parent_simple_bp', True),
+    ('parent_management', 'parent_management_bp', True),
+    # Email configuration blueprint - TEMPORARILY DISABLED
+    # ('email_config', 'email_config_bp', True),
 ]
 
-# Add parent blueprint if available
-if parent_bp_available and parent_simple_bp:
-    blueprints.append(parent_simple_bp)
 
-# Add parent management blueprint if available
-if parent_mgmt_bp_available and parent_management_bp:
-    blueprints.append(parent_management_bp)
+def load_blueprints(disabled=(), profile=None):
+    """
+    Import the blueprint modules and return their blueprints.
+
+    Args:
+        disabled: Module names to leave out (see the BLUEPRINTS_DISABLED setting)
+        profile: Optional StartupProfile to record each module's import time in
+
+    Returns:
+        List of blueprints in registration order
+    """
+    loaded = []
+    for module_name, attribute, optional in BLUEPRINT_MODULES:
+        if module_name in disabled:
+            continue
+        try:
+            if profile is not None:
+                with profile.phase(f'import views.{module_name}'):
+                    module = importlib.import_module(f'.{module_name}', __name__)
+            else:
+                module = importlib.import_module(f'.{module_name}', __name__)
+            loaded.append(getattr(module, attribute))
+        except ImportError as e:
+            if not optional:
+                raise
+            logger.info(f"Optional blueprint module {module_name} not available: {e}")
+    return loaded
+
 
-# Add email configuration blueprint if available
-if email_config_bp_available and email_config_bp:
-    blueprints.append(email_config_bp)
\ No newline at end of file
+def __getattr__(name):
+    """Import all blueprints on first access to the module-level `blueprints` list."""
+    if name == 'blueprints':
+        global blueprints
+        blueprints = load_blueprints()
+        return blueprints
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
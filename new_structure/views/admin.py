@@ -27,11 +27,13 @@ class RCEProtection:
 from functools import wraps
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Create a blueprint for admin routes
 admin_bp = Blueprint('admin', __name__, url_prefix='/headteacher')
 
+MAX_ANALYTICS_DAYS = 3660  # Longest recent-days window of the analytics (about ten years)
+
 # Input validation functions
 def validate_admin_input(value, field_name, max_length=100):
     """Validate admin input for security."""
@@ -78,6 +80,20 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _analytics_window():
+    """Optional term, assessment type, academic year and recent-days filters of the school-wide analytics."""
+    days = request.args.get('days', type=int)
+    if days is not None and days <= 0:
+        days = None
+    return {
+        'term_id': request.args.get('term_id', type=int),
+        'assessment_type_id': request.args.get('assessment_type_id', type=int),
+        'academic_year': request.args.get('academic_year') or None,
+        # Clamped: a huge value would overflow timedelta and the date arithmetic
+        'since': datetime.now() - timedelta(days=min(days, MAX_ANALYTICS_DAYS)) if days else None
+    }
+
+
 @admin_bp.route('/analytics')
 @admin_required
 def analytics_dashboard():
@@ -96,7 +112,7 @@ def analytics_dashboard():
             # If no report data available, fall back to traditional analytics
             if not analytics_data.get('has_data', False):
                 from ..services.analytics_service import AnalyticsService
-                fallback_data = AnalyticsService.get_headteacher_analytics()
+                fallback_data = AnalyticsService.get_headteacher_analytics(**_analytics_window())
 
                 # Merge the data, prioritizing report-based structure
                 analytics_data.update({
@@ -117,7 +133,7 @@ def analytics_dashboard():
             print(f"Error loading report-based analytics: {e}")
             # Fall back to traditional analytics
             from ..services.analytics_service import AnalyticsService
-            analytics_data = AnalyticsService.get_headteacher_analytics()
+            analytics_data = AnalyticsService.get_headteacher_analytics(**_analytics_window())
 
         if 'error' in analytics_data:
             flash(f'Error loading analytics: {analytics_data["error"]}', 'error')
@@ -504,6 +520,7 @@ def manage_teachers():
                         try:
                             # First, manually delete related records to avoid cascade issues
                             from sqlalchemy import text
+                            from ..services.cache_invalidation_service import CacheInvalidationService
 
                             # Delete from teacher_subjects table if it exists
                             try:
@@ -516,6 +533,7 @@ def manage_teachers():
                             try:
                                 db.session.execute(text("DELETE FROM teacher_subject_assignment WHERE teacher_id = :teacher_id"),
                                                  {"teacher_id": teacher_id})
+                                CacheInvalidationService.record_assignments(db.session, [teacher_id])
                             except Exception as e:
                                 print(f"Note: teacher_subject_assignment table cleanup: {e}")
 
@@ -8,6 +8,8 @@ from datetime import datetime
 from ..services.academic_analytics_service import AcademicAnalyticsService
 from ..services.role_based_data_service import RoleBasedDataService
 from ..services.report_based_analytics_service import ReportBasedAnalyticsService
+from ..services.leaderboard_service import LeaderboardService
+from ..services.trend_service import TrendService
 from ..services import is_authenticated, get_role
 from ..models import Term, AssessmentType, Grade, Stream
 from ..models.academic import ComponentMark
@@ -962,21 +964,7 @@ def get_top_subject_performers():
         # Import required models
         from ..models.academic import Mark, Student, Subject, Grade, Stream, Term, AssessmentType
         from ..models.assignment import TeacherSubjectAssignment
-        from sqlalchemy import func, desc
-
-        # Check if we have any marks data at all
-        total_marks = Mark.query.count()
-        total_students = Student.query.count()
-        total_subjects = Subject.query.count()
-        current_app.logger.info(f"Database stats - Marks: {total_marks}, Students: {total_students}, Subjects: {total_subjects}")
-
-        if total_marks == 0:
-            return jsonify({
-                'success': True,
-                'top_subject_performers': {},
-                'total_combinations': 0,
-                'message': f'No marks data available. Database has {total_students} students and {total_subjects} subjects but no marks recorded.'
-            })
+        from sqlalchemy import func
 
         # Build base query with proper joins - step by step for better error handling
         try:
@@ -1051,18 +1039,26 @@ def get_top_subject_performers():
             # Filter by assessment type (exam type)
             base_query = base_query.filter(AssessmentType.name.like(f'%{exam_type}%'))
 
-        # Get all combinations of grade, stream, subject
+        # Top 3 of every grade/stream/subject combination in one query
         try:
-            combinations_query = base_query.with_entities(
+            ranked_query = base_query.with_entities(
                 Grade.id.label('grade_id'),
                 Grade.name.label('grade_name'),
                 Stream.id.label('stream_id'),
                 Stream.name.label('stream_name'),
                 Subject.id.label('subject_id'),
-                Subject.name.label('subject_name')
-            ).distinct()
-
-            combinations = combinations_query.all()
+                Subject.name.label('subject_name'),
+                Student.id.label('student_id'),
+                Student.name.label('student_name'),
+                Student.admission_number.label('admission_number'),
+                Mark.id.label('mark_id'),
+                Mark.mark.label('marks'),
+                Mark.total_marks.label('total_marks'),
+                func.round((Mark.mark * 100.0 / Mark.total_marks), 2).label('percentage')
+            )
+            combinations = LeaderboardService.top_n(
+                ranked_query, ('grade_id', 'stream_id', 'subject_id'), 'percentage', 3, tiebreak=('mark_id',)
+            )
             current_app.logger.info(f"Found {len(combinations)} combinations")
 
         except Exception as combinations_error:
@@ -1077,6 +1073,15 @@ def get_top_subject_performers():
         result = {}
 
         if not combinations:
+            if Mark.query.first() is None:
+                total_students = Student.query.count()
+                total_subjects = Subject.query.count()
+                return jsonify({
+                    'success': True,
+                    'top_subject_performers': {},
+                    'total_combinations': 0,
+                    'message': f'No marks data available. Database has {total_students} students and {total_subjects} subjects but no marks recorded.'
+                })
             current_app.logger.info("No combinations found, returning empty result")
             return jsonify({
                 'success': True,
@@ -1085,41 +1090,32 @@ def get_top_subject_performers():
                 'message': 'No data available for the selected criteria'
             })
 
-        for combo in combinations:
-            grade_key = f"Grade {combo.grade_name}"
-            stream_key = f"Stream {combo.stream_name}" if combo.stream_name else "No Stream"
-            subject_key = combo.subject_name
+        # Students per combination, counted in one grouped query
+        student_counts = {
+            (row.grade_id, row.stream_id, row.subject_id): row.total_students
+            for row in base_query.with_entities(
+                Grade.id.label('grade_id'),
+                Stream.id.label('stream_id'),
+                Subject.id.label('subject_id'),
+                func.count(func.distinct(Student.id)).label('total_students')
+            ).group_by(Grade.id, Stream.id, Subject.id)
+        }
+
+        for key, performers in combinations.items():
+            first = performers[0]
+            grade_key = f"Grade {first.grade_name}"
+            stream_key = f"Stream {first.stream_name}" if first.stream_name else "No Stream"
+            subject_key = first.subject_name
 
             if grade_key not in result:
                 result[grade_key] = {}
             if stream_key not in result[grade_key]:
                 result[grade_key][stream_key] = {}
 
-            # Get top 3 performers for this combination
-            top_performers_query = base_query.filter(
-                Grade.id == combo.grade_id,
-                Subject.id == combo.subject_id
-            )
-
-            # Add stream filter only if stream exists
-            if combo.stream_id:
-                top_performers_query = top_performers_query.filter(Stream.id == combo.stream_id)
-            else:
-                top_performers_query = top_performers_query.filter(Student.stream_id.is_(None))
-
-            top_performers_query = top_performers_query.with_entities(
-                Student.id.label('student_id'),
-                Student.name.label('student_name'),
-                Student.admission_number.label('admission_number'),
-                Mark.mark.label('marks'),
-                Mark.total_marks.label('total_marks'),
-                func.round((Mark.mark * 100.0 / Mark.total_marks), 2).label('percentage')
-            ).order_by(desc('percentage')).limit(3)
-
             top_performers = []
-            for performer in top_performers_query.all():
+            for performer in performers:
                 # Calculate grade letter based on percentage
-                percentage = float(performer.percentage)
+                percentage = float(performer.percentage or 0)
                 grade_letter = calculate_grade_letter(percentage)
 
                 top_performers.append({
@@ -1133,23 +1129,9 @@ def get_top_subject_performers():
                     'position': len(top_performers) + 1
                 })
 
-            # Count total students for this combination
-            total_students_query = base_query.filter(
-                Grade.id == combo.grade_id,
-                Subject.id == combo.subject_id
-            )
-
-            # Add stream filter only if stream exists
-            if combo.stream_id:
-                total_students_query = total_students_query.filter(Stream.id == combo.stream_id)
-            else:
-                total_students_query = total_students_query.filter(Student.stream_id.is_(None))
-
-            total_students = total_students_query.with_entities(func.count(func.distinct(Student.id))).scalar()
-
             result[grade_key][stream_key][subject_key] = {
                 'top_performers': top_performers,
-                'total_students': total_students
+                'total_students': student_counts.get(key, 0)
             }
 
         return jsonify({
@@ -1558,6 +1540,34 @@ def get_class_stream_performance():
         }), 500
 
 
+@analytics_api_bp.route('/grade-trends')
+@analytics_required
+def get_grade_trends():
+    """Get a grade's term-over-term trends (per subject and most improved/declined learners)."""
+    try:
+        grade_id = request.args.get('grade_id', type=int)
+        term_id = request.args.get('term_id', type=int)
+        assessment_type_id = request.args.get('assessment_type_id', type=int)
+        if not grade_id:
+            return jsonify({
+                'success': False,
+                'message': 'grade_id is required'
+            }), 400
+
+        result = TrendService.get_grade_trends(grade_id, term_id=term_id, assessment_type_id=assessment_type_id)
+
+        return jsonify({
+            'success': True,
+            'grade_trends': result
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error getting grade trends: {str(e)}'
+        }), 500
+
+
 @analytics_api_bp.route('/enhanced-top-performers')
 @analytics_required
 def get_enhanced_top_performers():
@@ -4,10 +4,11 @@ Class Teacher views for the Hillview School Management System.
 import json
 import logging
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, jsonify, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, jsonify, make_response, current_app
 from werkzeug.security import generate_password_hash
 from sqlalchemy import text
 import pandas as pd
+import numpy as np
 import os
 import traceback
 from io import BytesIO
@@ -16,25 +17,37 @@ from ..models import Grade, Stream, Subject, Term, AssessmentType, Student, Mark
 from ..models.academic import SubjectMarksStatus, ComponentMark
 from ..utils.constants import educational_level_mapping
 from ..services import is_authenticated, get_role, get_class_report_data, generate_individual_report, generate_class_report_pdf, RoleBasedDataService
-from ..services.report_service import generate_class_report_pdf_from_html
+from ..services.report_service import generate_class_report_pdf_from_html, get_individual_report_data
 from ..services.mark_conversion_service import MarkConversionService
 from ..services.subject_aggregation_service import aggregate_subjects_for_display, get_aggregated_abbreviated_subjects
 from ..extensions import db
 from ..utils import get_performance_category, get_performance_remarks
+from ..utils.results_kernel import BAND_LABELS, compute_results, matrix_from_rows
 from ..services.cache_service import (
     cache_marksheet, get_cached_marksheet,
     cache_report, get_cached_report,
-    cache_pdf, get_cached_pdf,
     invalidate_cache
 )
 from ..services.collaborative_marks_service import CollaborativeMarksService
 from ..services.grade_report_service import GradeReportService
+from ..services.marks_status_board_service import MarksStatusBoardService
+from ..services.grade_marksheet_service import GradeMarksheetService
 from ..services.enhanced_permission_service import EnhancedPermissionService, function_permission_required
 from ..services.report_config_service import ReportConfigService
 from ..utils.database_health import check_database_health, create_missing_tables, safe_table_operation
 from ..services.permission_service import PermissionService
 from ..models.function_permission import DefaultFunctionPermissions
 from ..services.flexible_marks_service import FlexibleMarksService
+from ..services.term_summary_service import TermSummaryService
+from ..services.mark_ingest_service import MarkIngestService
+from ..services.marks_import_service import MarksImportService
+from ..services.report_job_service import ReportJobService
+from ..services.batch_report_renderer import BatchReportRenderer, html_to_pdf
+from ..services.artifact_cache import ArtifactCache
+from ..services.recent_reports_service import RecentReportsService
+from ..services.reference_data_service import ReferenceDataService
+from ..services.dynamic_school_info_service import DynamicSchoolInfoService
+from ..models.report_job import ReportJob
 from functools import wraps
 
 # Create a blueprint for class teacher routes
@@ -47,6 +60,13 @@ logger = logging.getLogger(__name__)
 @classteacher_bp.app_template_filter('get_education_level')
 def get_education_level_blueprint(grade):
     """Filter to determine the education level for a grade (blueprint version)."""
+    try:
+        education_level = ReferenceDataService.current().education_level_for_grade(grade)
+        if education_level:
+            return education_level
+    except Exception as e:
+        logger.warning(f"Reference data unavailable for education level lookup: {e}")
+
     education_level_mapping = {
         'lower_primary': ['Grade 1', 'Grade 2', 'Grade 3'],
         'upper_primary': ['Grade 4', 'Grade 5', 'Grade 6'],
@@ -190,40 +210,13 @@ def simplified_dashboard():
         assignment_summary = {'total_subjects_taught': 0, 'grades_involved': []}
     
     # Get recent reports
-    marks_query = Mark.query.join(Student).join(Stream).join(Grade).join(Term).join(AssessmentType).order_by(Mark.created_at.desc())
-    marks = marks_query.limit(50).all()
-    
-    recent_reports = []
-    seen_combinations = set()
-    for mark in marks:
-        combination = (mark.student.stream.grade.name, mark.student.stream.name, mark.term.name, mark.assessment_type.name)
-        if combination not in seen_combinations:
-            seen_combinations.add(combination)
-            
-            # Get mark count for this combination
-            mark_count = Mark.query.join(Student).join(Stream).join(Grade).join(Term).join(AssessmentType).filter(
-                Grade.name == mark.student.stream.grade.name,
-                Stream.name == mark.student.stream.name,
-                Term.name == mark.term.name,
-                AssessmentType.name == mark.assessment_type.name
-            ).count()
-            
-            recent_reports.append({
-                'grade': mark.student.stream.grade.name,
-                'stream': f"Stream {mark.student.stream.name}",
-                'term': mark.term.name,
-                'assessment_type': mark.assessment_type.name,
-                'date': mark.created_at.strftime('%Y-%m-%d') if mark.created_at else 'N/A',
-                'mark_count': mark_count
-            })
-            
-            if len(recent_reports) >= 10:
-                break
+    recent_reports = RecentReportsService.get_recent_reports(limit=10)
     
     # Get data for forms
-    grades = [grade.name for grade in Grade.query.all()]
-    terms = [term.name for term in Term.query.all()]
-    assessment_types = [assessment_type.name for assessment_type in AssessmentType.query.all()]
+    reference = ReferenceDataService.current()
+    grades = reference.grade_names()
+    terms = reference.term_names()
+    assessment_types = reference.assessment_type_names()
     
     # Get management statistics
     total_students = Student.query.count()
@@ -1745,12 +1738,13 @@ def dashboard():
     )
 
     # Get data for the form
-    grades = [grade.name for grade in Grade.query.all()]
-    grades_dict = {grade.name: grade.id for grade in Grade.query.all()}
-    terms = [term.name for term in Term.query.all()]
-    assessment_types = [assessment_type.name for assessment_type in AssessmentType.query.all()]
+    reference = ReferenceDataService.current()
+    grades = reference.grade_names()
+    grades_dict = {grade.name: grade.id for grade in reference.grades}
+    terms = reference.term_names()
+    assessment_types = reference.assessment_type_names()
     streams = []  # Empty list - streams will be populated via JavaScript
-    subjects = [subject.name for subject in Subject.query.all()]
+    subjects = reference.subject_names()
 
     # Initialize variables
     error_message = None
@@ -1778,68 +1772,10 @@ def dashboard():
     show_download_button = request.args.get('show_download', type=int, default=0) == 1
     show_individual_report_button = request.args.get('show_individual', type=int, default=0) == 1
 
-    # Build the query with joins
-    marks_query = Mark.query.join(Student).join(Stream).join(Grade).join(Term).join(AssessmentType)
-
-    # Apply filters if provided
-    if filter_grade:
-        marks_query = marks_query.filter(Grade.name == filter_grade)
-    if filter_term:
-        marks_query = marks_query.filter(Term.name == filter_term)
-
-    # Apply sorting
-    if sort_by == 'grade':
-        marks_query = marks_query.order_by(Grade.name)
-    elif sort_by == 'term':
-        marks_query = marks_query.order_by(Term.name)
-    else:  # Default to date
-        marks_query = marks_query.order_by(Mark.created_at.desc())
-
-    # Execute the query
-    marks = marks_query.all()
-
-    # Process the results
-    seen_combinations = set()
-    for mark in marks:
-        combination = (mark.student.stream.grade.name, mark.student.stream.name, mark.term.name, mark.assessment_type.name)
-        if combination not in seen_combinations:
-            seen_combinations.add(combination)
-            # Get the count of marks for this combination
-            mark_count = Mark.query.join(Student).join(Stream).join(Grade).join(Term).join(AssessmentType).filter(
-                Grade.name == mark.student.stream.grade.name,
-                Stream.name == mark.student.stream.name,
-                Term.name == mark.term.name,
-                AssessmentType.name == mark.assessment_type.name
-            ).count()
-
-            # Calculate class average for this grade/stream/term/assessment combination
-            class_marks = Mark.query.filter_by(
-                term_id=mark.term.id,
-                assessment_type_id=mark.assessment_type.id
-            ).join(Student).join(Stream).join(Grade).filter(
-                Grade.name == mark.student.stream.grade.name,
-                Stream.name == mark.student.stream.name
-            ).all()
-
-            # Calculate the class average percentage
-            if class_marks:
-                total_percentage = sum(m.percentage for m in class_marks if m.percentage is not None)
-                class_average = round(total_percentage / len(class_marks), 1) if class_marks else 0
-            else:
-                class_average = 0
-
-            recent_reports.append({
-                'grade': mark.student.stream.grade.name,
-                'stream': f"Stream {mark.student.stream.name}",
-                'term': mark.term.name,
-                'assessment_type': mark.assessment_type.name,
-                'date': mark.created_at.strftime('%Y-%m-%d') if mark.created_at else 'N/A',
-                'mark_count': mark_count,
-                'class_average': class_average,  # Add the real class average
-                'id': len(recent_reports) + 1  # Add an ID for easier reference
-            })
-            if len(recent_reports) >= 10:  # Increased limit to 10 recent reports
-                break
+    # One grouped query over marks (cached until marks change)
+    recent_reports = RecentReportsService.get_recent_reports(
+        limit=10, sort_by=sort_by, filter_grade=filter_grade, filter_term=filter_term
+    )
 
     # Handle form submission
     if request.method == "POST":
@@ -2306,130 +2242,20 @@ def dashboard():
                 return redirect(url_for('classteacher.dashboard'))
 
             try:
-                # Check file extension
-                file_ext = os.path.splitext(file.filename)[1].lower()
-
-                if file_ext == '.csv':
-                    df = pd.read_csv(file)
-                elif file_ext in ['.xlsx', '.xls']:
-                    df = pd.read_excel(file)
-                else:
-                    flash("Unsupported file format. Please upload a CSV or Excel file.", "error")
-                    return redirect(url_for('classteacher.dashboard'))
-
-                # Process the file
-                marks_added = 0
-                marks_updated = 0
-                errors = 0
-
-                # Get all students in this stream
-                students = {student.name: student for student in Student.query.filter_by(stream_id=stream_obj.id).all()}
-
-                # Get all subjects for this education level
-                all_subjects = Subject.query.filter_by(education_level=education_level).all()
-
-                # Define core subjects that should appear first
-                core_subjects = ["Mathematics", "English", "Kiswahili", "Science", "Integrated Science",
-                                "Science and Technology", "Integrated Science and Health Education"]
-
-                # Sort subjects with core subjects first
-                sorted_subjects = []
-
-                # First add core subjects in the specified order
-                for core_subject in core_subjects:
-                    for subject in all_subjects:
-                        if subject.name == core_subject or subject.name.upper() == core_subject.upper():
-                            sorted_subjects.append(subject)
-
-                # Then add remaining subjects alphabetically
-                remaining_subjects = [s for s in all_subjects if s not in sorted_subjects]
-                remaining_subjects.sort(key=lambda x: x.name)
-                sorted_subjects.extend(remaining_subjects)
-
-                # Create a dictionary of subject name to subject object
-                subjects = {subject.name: subject for subject in sorted_subjects}
-
-                # Check if we have the required columns
-                if 'Student Name' not in df.columns and 'Admission Number' not in df.columns:
-                    flash("File must contain either 'Student Name' or 'Admission Number' column.", "error")
-                    return redirect(url_for('classteacher.dashboard'))
-
-                # Process each row (student)
-                for _, row in df.iterrows():
-                    # Identify the student
-                    student = None
-
-                    if 'Student Name' in df.columns and row['Student Name'] in students:
-                        student = students[row['Student Name']]
-                    elif 'Admission Number' in df.columns:
-                        # Find student by admission number
-                        student_obj = Student.query.filter_by(
-                            admission_number=str(row['Admission Number']),
-                            stream_id=stream_obj.id
-                        ).first()
-                        if student_obj:
-                            student = student_obj
-
-                    if not student:
-                        errors += 1
-                        continue
-
-                    # Process each subject column
-                    for subject_name in subjects.keys():
-                        if subject_name in df.columns:
-                            mark_value = row[subject_name]
-
-                            # Skip empty or non-numeric values
-                            if pd.isna(mark_value) or not (isinstance(mark_value, (int, float)) or (isinstance(mark_value, str) and mark_value.isdigit())):
-                                continue
-
-                            try:
-                                # Convert to integer
-                                raw_mark = int(float(mark_value))
-
-                                # Sanitize the raw mark and total marks to ensure they're within acceptable ranges
-                                raw_mark, sanitized_total_marks = MarkConversionService.sanitize_raw_mark(raw_mark, total_marks)
-
-                                # Calculate percentage using our service
-                                percentage = MarkConversionService.calculate_percentage(raw_mark, sanitized_total_marks)
-
-                                # Check if mark already exists
-                                existing_mark = Mark.query.filter_by(
-                                    student_id=student.id,
-                                    subject_id=subjects[subject_name].id,
-                                    term_id=term_obj.id,
-                                    assessment_type_id=assessment_type_obj.id
-                                ).first()
-
-                                if existing_mark:
-                                    # Update existing mark with both old and new field names
-                                    existing_mark.mark = raw_mark  # Old field name
-                                    existing_mark.total_marks = sanitized_total_marks  # Old field name
-                                    existing_mark.raw_mark = raw_mark  # New field name
-                                    existing_mark.max_raw_mark = sanitized_total_marks  # New field name
-                                    existing_mark.percentage = percentage
-                                    marks_updated += 1
-                                else:
-                                    # Create new mark with both old and new field names
-                                    new_mark = Mark(
-                                        student_id=student.id,
-                                        subject_id=subjects[subject_name].id,
-                                        term_id=term_obj.id,
-                                        assessment_type_id=assessment_type_obj.id,
-                                        mark=raw_mark,  # Old field name
-                                        total_marks=sanitized_total_marks,  # Old field name
-                                        raw_mark=raw_mark,  # New field name
-                                        max_raw_mark=sanitized_total_marks,  # New field name
-                                        percentage=percentage
-                                    )
-                                    db.session.add(new_mark)
-                                    marks_added += 1
-                            except Exception as e:
-                                print(f"Error processing bulk mark: {e}")
-                                errors += 1
-
-                # Commit changes to the database
-                db.session.commit()
+                # Stream the file through the bulk import; learners must belong to the selected stream
+                result = MarksImportService.import_file(
+                    file,
+                    term=str(term_obj.id),
+                    assessment_type=str(assessment_type_obj.id),
+                    max_marks=total_marks,
+                    stream_id=stream_obj.id,
+                    teacher_id=session.get('teacher_id')
+                )
+                marks_added = result['inserted']
+                marks_updated = result['updated']
+                errors = result['errors']
+                if result['error_report']:
+                    session['marks_import_error_report'] = result['error_report']
 
                 # Invalidate any existing cache for this grade/stream/term/assessment combination
                 invalidate_cache(grade_level, stream_name, term, assessment_type)
@@ -2796,9 +2622,10 @@ def all_reports():
         })
 
     # Get all grades, terms, and assessment types for the filter dropdowns
-    grades = [grade.name for grade in Grade.query.all()]
-    terms = [term.name for term in Term.query.all()]
-    assessment_types = [assessment_type.name for assessment_type in AssessmentType.query.all()]
+    reference = ReferenceDataService.current()
+    grades = reference.grade_names()
+    terms = reference.term_names()
+    assessment_types = reference.assessment_type_names()
 
     return render_template(
         'all_reports.html',
@@ -2927,7 +2754,7 @@ def manage_students():
     students = students_paginated.items
 
     # Get all grades for the template
-    grades = [{"id": grade.id, "name": grade.name} for grade in Grade.query.all()]
+    grades = [{"id": grade.id, "name": grade.name} for grade in ReferenceDataService.current().grades]
 
     # Handle form submissions
     if request.method == 'POST':
@@ -4105,69 +3932,38 @@ def update_class_marks(grade, stream, term, assessment_type):
     # Get students in this stream
     students = Student.query.filter_by(stream_id=stream_obj.id).all()
 
-    # Process form data
+    # Collect form data for every student and subject, then save in one bulk upsert
     marks_updated = 0
     component_marks_updated = 0
+    entries = []
 
     for student in students:
         for subject in filtered_subjects:
             # Only regular subjects (composites already excluded)
-                # Regular subject (not composite)
-                mark_key = f"mark_{student.id}_{subject.id}"
-                total_marks_key = f"total_marks_{subject.id}"
-
-                if mark_key in request.form and total_marks_key in request.form:
-                    try:
-                        # Get the raw mark and total marks from the form
-                        raw_mark = int(request.form[mark_key])
-                        max_raw_mark = int(request.form[total_marks_key])
-
-                        # Sanitize the raw mark and total marks to ensure they're within acceptable ranges
-                        raw_mark, max_raw_mark = MarkConversionService.sanitize_raw_mark(raw_mark, max_raw_mark)
+            mark_key = f"mark_{student.id}_{subject.id}"
+            total_marks_key = f"total_marks_{subject.id}"
 
-                        # Calculate percentage using our service
-                        percentage = MarkConversionService.calculate_percentage(raw_mark, max_raw_mark)
-
-                        # Find existing mark or create new one
-                        mark = Mark.query.filter_by(
-                            student_id=student.id,
-                            subject_id=subject.id,
-                            term_id=term_obj.id,
-                            assessment_type_id=assessment_type_obj.id
-                        ).first()
-
-                        if mark:
-                            # Update existing mark with both old and new field names
-                            mark.mark = raw_mark  # Old field name
-                            mark.total_marks = max_raw_mark  # Old field name
-                            mark.raw_mark = raw_mark  # New field name
-                            mark.max_raw_mark = max_raw_mark  # New field name
-                            mark.percentage = percentage
-                        else:
-                            # Create new mark with both old and new field names
-                            mark = Mark(
-                                student_id=student.id,
-                                subject_id=subject.id,
-                                term_id=term_obj.id,
-                                assessment_type_id=assessment_type_obj.id,
-                                grade_id=stream_obj.grade_id,  # Use grade from stream_obj (from URL)
-                                stream_id=stream_obj.id,  # Use stream from stream_obj (from URL)
-                                mark=raw_mark,  # Old field name
-                                total_marks=max_raw_mark,  # Old field name
-                                raw_mark=raw_mark,  # New field name
-                                max_raw_mark=max_raw_mark,  # New field name
-                                percentage=percentage
-                            )
-                            db.session.add(mark)
-
-                        marks_updated += 1
-                    except ValueError:
-                        # Skip invalid values
-                        pass
+            if mark_key in request.form and total_marks_key in request.form:
+                try:
+                    # Integer marks only, as before; sanitizing happens in the ingest service
+                    entries.append({
+                        'student_id': student.id,
+                        'subject_id': subject.id,
+                        'raw_mark': int(request.form[mark_key]),
+                        'max_raw_mark': int(request.form[total_marks_key])
+                    })
+                except ValueError:
+                    # Skip invalid values
+                    pass
 
     # Commit changes to database
     try:
-        db.session.commit()
+        result = MarkIngestService.save_marks(
+            entries, term_id=term_obj.id, assessment_type_id=assessment_type_obj.id,
+            grade_id=stream_obj.grade_id, stream_id=stream_obj.id
+        )
+        marks_updated = result['saved']
+        TermSummaryService.refresh_after_save(stream_obj.id, term_obj.id, assessment_type_obj.id)
         if component_marks_updated > 0:
             flash(f"Successfully updated {marks_updated} marks and {component_marks_updated} component marks.", "success")
         else:
@@ -4184,17 +3980,6 @@ def update_class_marks(grade, stream, term, assessment_type):
 @teacher_or_classteacher_required
 def download_class_report(grade, stream, term, assessment_type):
     """Route for downloading class reports as PDF."""
-    # Check if we have a cached PDF
-    cached_pdf = get_cached_pdf(grade, stream, term, assessment_type, "class_report")
-    if cached_pdf:
-        return send_file(
-            cached_pdf,
-            as_attachment=True,
-            download_name=f"{grade}_{stream}_{term}_{assessment_type}_Class_Report.pdf",
-            mimetype='application/pdf'
-        )
-
-    # If no cache or cache miss, generate the report
     stream_obj = Stream.query.join(Grade).filter(Grade.name == grade, Stream.name == stream[-1]).first()
     term_obj = Term.query.filter_by(name=term).first()
     assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
@@ -4230,6 +4015,17 @@ def download_class_report(grade, stream, term, assessment_type):
             # Override selected_subjects to only include teacher's assigned subjects
             selected_subjects = teacher_subject_ids
 
+    # Serve the cached PDF when none of the report's inputs have changed
+    filename = f"{grade}_Stream_{stream[-1]}_{term}_{assessment_type}_Report.pdf"
+    notify_parents = request.form.get('notify_parents') == 'on'
+    cache_key = ArtifactCache.data_fingerprint(
+        stream_obj.grade_id, term_obj.id, assessment_type_obj.id, stream_id=stream_obj.id,
+        variant={'kind': 'class_report', 'subjects': sorted(selected_subjects or [])}
+    )
+    cached_pdf = ArtifactCache.get(cache_key, '.pdf')
+    if cached_pdf and not notify_parents:
+        return send_file(cached_pdf, as_attachment=True, download_name=filename, mimetype='application/pdf')
+
     # Get class report data first with selected subjects
     report_data = get_class_report_data(grade, stream, term, assessment_type, selected_subject_ids=selected_subjects)
 
@@ -4308,7 +4104,6 @@ def download_class_report(grade, stream, term, assessment_type):
     )
 
     # Notify parents if report generation was successful and notification is requested
-    notify_parents = request.form.get('notify_parents') == 'on'
     if pdf_file and notify_parents:
         try:
             from ..services.parent_notification_service import ParentNotificationService
@@ -4342,12 +4137,9 @@ def download_class_report(grade, stream, term, assessment_type):
     cache_report(grade, stream, term, assessment_type, report_data)
 
     # Cache the PDF file
-    with open(pdf_file, 'rb') as f:
-        pdf_data = f.read()
-    cache_pdf(grade, stream, term, assessment_type, "class_report", pdf_data)
+    ArtifactCache.put(cache_key, '.pdf', pdf_file)
 
     # Return the PDF file
-    filename = f"{grade}_Stream_{stream[-1]}_{term}_{assessment_type}_Report.pdf"
     return send_file(
         pdf_file,
         as_attachment=True,
@@ -4383,7 +4175,7 @@ def print_individual_report(grade, stream, term, assessment_type, student_name):
         education_level = "junior secondary"
 
     # Get class report data first
-    class_data_result = get_class_report_data(grade, stream, term, assessment_type)
+    class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
 
     if class_data_result.get("error"):
         flash(class_data_result.get("error"), "error")
@@ -4607,7 +4399,7 @@ def preview_individual_report(grade, stream, term, assessment_type, student_name
         education_level = "junior secondary"
 
     # Get class report data first
-    class_data_result = get_class_report_data(grade, stream, term, assessment_type)
+    class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
 
     if class_data_result.get("error"):
         flash(class_data_result.get("error"), "error")
@@ -5234,16 +5026,6 @@ def generate_grade_marksheet(grade, term, assessment_type, action):
             data=cached_marksheet['data'],
             statistics=cached_marksheet['statistics']
         )
-    elif cached_marksheet and action == 'download':
-        # Check if we have a cached PDF
-        cached_pdf = get_cached_pdf(grade, "all", term, assessment_type, "marksheet")
-        if cached_pdf:
-            return send_file(
-                cached_pdf,
-                as_attachment=True,
-                download_name=f"{grade}_{term}_{assessment_type}_Grade_Marksheet.xlsx",
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
 
     # If no cache or cache miss, generate the marksheet
     # Fetch grade and related data
@@ -5258,166 +5040,30 @@ def generate_grade_marksheet(grade, term, assessment_type, action):
         flash("Invalid term or assessment type", "error")
         return redirect(url_for('classteacher.dashboard'))
 
-    # Fetch all streams for the grade
-    streams = Stream.query.filter_by(grade_id=grade_obj.id).all()
-    if not streams:
-        flash(f"No streams found for grade {grade}", "error")
-        return redirect(url_for('classteacher.dashboard'))
-
-    # Fetch all subjects
-    subjects = Subject.query.all()
-    if not subjects:
-        flash("No subjects found", "error")
-        return redirect(url_for('classteacher.dashboard'))
-
-    # Prepare data for the marksheet
-    all_data = []
-    for stream in streams:
-        students = Student.query.filter_by(stream_id=stream.id).all()
-        for student in students:
-            student_marks = {}
-            student_total = 0
-            subject_count = 0
-
-            # Get marks for each subject
-            student_standardized_total = 0
-            for subject in subjects:
-                mark = Mark.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    term_id=term_obj.id,
-                    assessment_type_id=assessment_type_obj.id
-                ).first()
-
-                if mark:
-                    # Store the raw mark
-                    student_marks[subject.name] = mark.mark
-
-                    # Calculate standardized mark (out of 100)
-                    total_marks = mark.total_marks if mark.total_marks > 0 else 100
-                    standardized_mark = (mark.mark / total_marks) * 100
-
-                    # Add to standardized total for average calculation
-                    student_standardized_total += standardized_mark
-                    subject_count += 1
-                else:
-                    student_marks[subject.name] = "-"
-
-            # Calculate average percentage (already standardized to 100)
-            average_percentage = student_standardized_total / subject_count if subject_count > 0 else 0
-            grade_label = get_performance_category(average_percentage)
-
-            # Include stream name with student name for clarity
-            student_data = {
-                'name': f"{student.name} ({stream.name})",
-                'marks': student_marks,
-                'total': student_total,
-                'percentage': average_percentage,
-                'grade': grade_label
-            }
-            all_data.append(student_data)
+    # Serve the cached workbook when none of the marksheet's inputs have changed
+    if action == 'download':
+        cache_key = ArtifactCache.data_fingerprint(
+            grade_obj.id, term_obj.id, assessment_type_obj.id, variant={'kind': 'grade_marksheet'}
+        )
+        cached_file = ArtifactCache.get(cache_key, '.xlsx')
+        if cached_file:
+            return send_file(
+                cached_file,
+                as_attachment=True,
+                download_name=f"{grade}_{term}_{assessment_type}_Grade_Marksheet.xlsx",
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
 
-    if not all_data:
-        flash(f"No marks found for grade {grade}, term {term}, assessment {assessment_type}", "error")
+    # Learners and marks in one query, results from the shared kernel
+    marksheet_data = GradeMarksheetService.build(grade_obj.id, term_obj.id, assessment_type_obj.id)
+    if 'error' in marksheet_data:
+        flash(marksheet_data['error'], "error")
         return redirect(url_for('classteacher.dashboard'))
-
-    # Sort data by percentage (descending)
-    all_data.sort(key=lambda x: x['percentage'], reverse=True)
-
-    # Calculate statistics for the marksheet
-    stream_data = {}
-    subject_totals = {subject.name: 0 for subject in subjects}
-    subject_counts = {subject.name: 0 for subject in subjects}
-    overall_total = 0
-    overall_count = 0
-
-    # Collect statistics for each stream
-    for stream in streams:
-        stream_students = [s for s in all_data if s['name'].endswith(f"({stream.name})")]
-        stream_total = sum(s['total'] for s in stream_students)
-        stream_count = len(stream_students) * len(subjects)  # Total possible marks
-
-        # Calculate stream average
-        stream_average = stream_total / stream_count if stream_count > 0 else 0
-
-        # Calculate subject averages for this stream
-        stream_subject_totals = {subject.name: 0 for subject in subjects}
-        stream_subject_counts = {subject.name: 0 for subject in subjects}
-
-        for student in stream_students:
-            for subject in subjects:
-                mark = student['marks'].get(subject.name)
-                if mark != "-":
-                    stream_subject_totals[subject.name] += mark
-                    stream_subject_counts[subject.name] += 1
-
-                    # Update overall subject totals
-                    subject_totals[subject.name] += mark
-                    subject_counts[subject.name] += 1
-
-                    # Update overall totals
-                    overall_total += mark
-                    overall_count += 1
-
-        # Calculate stream subject averages
-        stream_subject_averages = {}
-        for subject_name in stream_subject_totals:
-            if stream_subject_counts[subject_name] > 0:
-                stream_subject_averages[subject_name] = round(stream_subject_totals[subject_name] / stream_subject_counts[subject_name], 1)
-            else:
-                stream_subject_averages[subject_name] = 0
-
-        # Store stream statistics
-        stream_data[stream.name] = {
-            'total': stream_total,
-            'count': len(stream_students),
-            'average': round(stream_average, 1),
-            'subject_averages': stream_subject_averages
-        }
-
-    # Calculate overall subject averages
-    subject_averages = {}
-    for subject_name in subject_totals:
-        if subject_counts[subject_name] > 0:
-            subject_averages[subject_name] = round(subject_totals[subject_name] / subject_counts[subject_name], 1)
-        else:
-            subject_averages[subject_name] = 0
-
-    # Calculate overall average
-    overall_average = overall_total / overall_count if overall_count > 0 else 0
-
-    # Calculate performance statistics
-    performance_counts = {}
-    for category in ['Excellent', 'Very Good', 'Good', 'Average', 'Below Average', 'Poor']:
-        performance_counts[category] = len([d for d in all_data if d['grade'] == category])
-
-    # Calculate gender statistics
-    gender_counts = {
-        'male': 0,
-        'female': 0,
-        'other': 0
-    }
-
-    # Add rank to each student
-    for i, student_data in enumerate(all_data):
-        student_data['rank'] = i + 1
-
-    # Prepare statistics for the template
-    statistics = {
-        'total_students': len(all_data),
-        'overall_average': round(overall_average, 1),
-        'subject_averages': subject_averages,
-        'stream_data': stream_data,
-        'performance_counts': performance_counts,
-        'gender_counts': gender_counts
-    }
+    subjects = marksheet_data['subjects']
+    all_data = marksheet_data['data']
+    statistics = marksheet_data['statistics']
 
     # Cache the marksheet data
-    marksheet_data = {
-        'subjects': subjects,
-        'data': all_data,
-        'statistics': statistics
-    }
     cache_marksheet(grade, "all", term, assessment_type, marksheet_data)
 
     # Handle preview or download action
@@ -5436,7 +5082,7 @@ def generate_grade_marksheet(grade, term, assessment_type, action):
             # Import the Excel export service
             from ..services.excel_export import generate_grade_marksheet_excel
 
-            # Generate Excel file
+            # Stream the workbook to a temporary file, then keep a copy in the artifact cache
             excel_file = generate_grade_marksheet_excel(
                 grade=grade,
                 term=term,
@@ -5445,13 +5091,14 @@ def generate_grade_marksheet(grade, term, assessment_type, action):
                 data=all_data,
                 statistics=statistics
             )
-
-            # Cache the Excel file
-            cached_file = cache_pdf(grade, "all", term, assessment_type, "marksheet", open(excel_file, 'rb').read())
+            try:
+                cached_file = ArtifactCache.put(cache_key, '.xlsx', excel_file)
+            finally:
+                os.remove(excel_file)
 
             # Return the Excel file
             return send_file(
-                excel_file,
+                cached_file,
                 as_attachment=True,
                 download_name=f"{grade}_{term}_{assessment_type}_Grade_Marksheet.xlsx",
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -5583,7 +5230,7 @@ def get_streams(grade_id):
     """API endpoint to get streams for a specific grade."""
     try:
         grade_id = int(grade_id)
-        streams = Stream.query.filter_by(grade_id=grade_id).all()
+        streams = ReferenceDataService.current().streams_by_grade.get(grade_id, ())
         return jsonify({"streams": [{"id": stream.id, "name": stream.name} for stream in streams]})
     except ValueError:
         return jsonify({"error": "Invalid grade ID"}), 400
@@ -5706,17 +5353,6 @@ def view_student_reports(grade, stream, term, assessment_type):
 @classteacher_required
 def download_individual_report(grade, stream, term, assessment_type, student_name):
     """Route for downloading an individual student report as PDF using the same format as preview."""
-    # Check if we have a cached PDF for this student
-    cached_pdf = get_cached_pdf(grade, stream, term, assessment_type, f"student_{student_name.replace(' ', '_')}")
-    if cached_pdf:
-        return send_file(
-            cached_pdf,
-            as_attachment=True,
-            download_name=f"Individual_Report_{grade}_{stream}_{student_name.replace(' ', '_')}.pdf",
-            mimetype='application/pdf'
-        )
-
-    # If no cache or cache miss, generate the report
     stream_obj = Stream.query.join(Grade).filter(Grade.name == grade, Stream.name == stream[-1]).first()
     term_obj = Term.query.filter_by(name=term).first()
     assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
@@ -5730,6 +5366,16 @@ def download_individual_report(grade, stream, term, assessment_type, student_nam
         flash(f"No data available for student {student_name}.", "error")
         return redirect(url_for('classteacher.dashboard'))
 
+    # Serve the cached PDF when none of the report's inputs have changed
+    filename = f"Individual_Report_{grade}_{stream}_{student_name.replace(' ', '_')}.pdf"
+    cache_key = ArtifactCache.data_fingerprint(
+        stream_obj.grade_id, term_obj.id, assessment_type_obj.id, stream_id=stream_obj.id,
+        variant={'kind': 'individual_report', 'student_id': student.id}
+    )
+    cached_pdf = ArtifactCache.get(cache_key, '.pdf')
+    if cached_pdf:
+        return send_file(cached_pdf, as_attachment=True, download_name=filename, mimetype='application/pdf')
+
     # Generate PDF using the same format as preview
     pdf_file = generate_individual_report_pdf_like_preview(
         student, grade, stream, term, assessment_type,
@@ -5741,15 +5387,13 @@ def download_individual_report(grade, stream, term, assessment_type, student_nam
         return redirect(url_for('classteacher.view_student_reports', grade=grade, stream=stream, term=term, assessment_type=assessment_type))
 
     # Cache the PDF file
-    with open(pdf_file, 'rb') as f:
-        pdf_data = f.read()
-    cache_pdf(grade, stream, term, assessment_type, f"student_{student_name.replace(' ', '_')}", pdf_data)
+    ArtifactCache.put(cache_key, '.pdf', pdf_file)
 
     # Return the PDF file
     return send_file(
         pdf_file,
         as_attachment=True,
-        download_name=f"Individual_Report_{grade}_{stream}_{student_name.replace(' ', '_')}.pdf",
+        download_name=filename,
         mimetype='application/pdf'
     )
 
@@ -5773,7 +5417,7 @@ def generate_individual_report_pdf_like_preview(student, grade, stream, term, as
             education_level = "junior secondary"
 
         # Get class report data first (same as preview)
-        class_data_result = get_class_report_data(grade, stream, term, assessment_type)
+        class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
 
         if class_data_result.get("error"):
             return None
@@ -6060,7 +5704,7 @@ def generate_simple_individual_report_pdf(student, grade, stream, term, assessme
         from datetime import datetime
 
         # Get class report data first (same as preview)
-        class_data_result = get_class_report_data(grade, stream, term, assessment_type)
+        class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
 
         if class_data_result.get("error"):
             return None
@@ -6262,16 +5906,157 @@ Report generated on {current_date}
         print(f"Error generating simple individual report PDF: {str(e)}")
         return None
 
+# Basic styling for reports saved as standalone HTML (when wkhtmltopdf is not installed)
+STANDALONE_REPORT_CSS = """
+<style>
+body { font-family: Arial, sans-serif; margin: 20px; }
+.action-buttons, .print-controls, .delete-btn, .modal { display: none !important; }
+.report-container { max-width: 800px; margin: 0 auto; }
+table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+th, td { border: 1px solid #ddd; padding: 8px; text-align: center; }
+th { background-color: #f2f2f2; }
+.header { text-align: center; margin-bottom: 20px; }
+.student-details { margin: 20px 0; }
+.remarks { margin: 20px 0; }
+.footer { margin-top: 20px; text-align: center; font-size: 12px; color: #666; }
+</style>
+"""
+
+
+def _individual_report_shared_context(grade, stream, term, term_obj):
+    """Context shared by every learner's individual report in a batch (computed once)."""
+    from ..services.school_config_service import SchoolConfigService
+    from ..services.staff_assignment_service import StaffAssignmentService
+
+    template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'preview_individual_report.html')
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template_content = f.read()
+
+    academic_year = term_obj.academic_year if hasattr(term_obj, 'academic_year') and term_obj.academic_year else "2023"
+    stream_letter = stream.replace("Stream ", "") if stream.startswith("Stream ") else (stream[-1] if len(stream) > 1 else stream)
+
+    # Get term information from report configuration (same as print view)
+    next_term_opening_str = 'TBD'
+    report_config_data = ReportConfigService.get_comprehensive_report_data(grade, stream_letter, term)
+    if report_config_data and report_config_data.get('term_info'):
+        next_term_opening = report_config_data['term_info'].get('opening_date')
+        if next_term_opening:
+            next_term_opening_str = next_term_opening.strftime('%B %d, %Y') if hasattr(next_term_opening, 'strftime') else str(next_term_opening)
+
+    return {
+        'template_content': template_content,
+        'academic_year': academic_year,
+        'current_date': datetime.now().strftime("%Y-%m-%d"),
+        'school_info': SchoolConfigService.get_school_info_dict(),
+        # Embedded so the logo renders in PDFs and standalone HTML files inside the ZIP
+        'logo_url': DynamicSchoolInfoService.get_report_logo(embedded=True),
+        'staff_info': StaffAssignmentService.get_report_staff_info(grade, stream_letter),
+        'subject_teachers': StaffAssignmentService.get_subject_teachers(grade, stream_letter),
+        'term_info': {
+            'next_term_opening_date': next_term_opening_str,
+            'current_term': term,
+            'academic_year': academic_year
+        },
+    }
+
+
+def _render_individual_report_html(student, student_data, class_data_result, grade, stream, term, assessment_type, shared):
+    """Render one learner's individual report (same format as the preview) from precomputed class data."""
+    from flask import render_template_string
+    from ..utils import get_grade_and_points, get_performance_remarks
+
+    # Get education level based on grade (same as preview)
+    education_level = ""
+    grade_num = int(grade.split()[1]) if len(grade.split()) > 1 else int(grade)
+    if 1 <= grade_num <= 3:
+        education_level = "lower primary"
+    elif 4 <= grade_num <= 6:
+        education_level = "upper primary"
+    elif 7 <= grade_num <= 9:
+        education_level = "junior secondary"
+
+    # Calculate mean grade and points (same as preview)
+    avg_percentage = student_data.get("average_percentage", 0)
+    mean_grade, mean_points = get_grade_and_points(avg_percentage)
+
+    # Prepare table data for the report with composite subject handling (same as preview)
+    table_data = []
+    composite_data = {}
+
+    # Get only subjects that have marks in the class report data
+    subjects_with_marks = class_data_result.get("subjects", [])
+
+    for subject_name in subjects_with_marks:
+        mark = student_data.get("marks", {}).get(subject_name, 0)
+        if mark and mark > 0:
+            # Clean up decimal precision
+            if isinstance(mark, float):
+                mark = int(round(mark)) if mark == int(mark) else round(mark, 1)
+            else:
+                mark = int(mark)
+
+            grade_letter, points = get_grade_and_points(mark)
+            remarks = get_performance_remarks(mark, 100)
+
+            # Create table row data (same structure as preview)
+            row_data = {
+                'subject': subject_name.upper(),
+                'entrance': 0,  # Not used for single assessments
+                'mid_term': 0,  # Not used for single assessments
+                'end_term': mark if assessment_type.lower() in ['end_term', 'endterm'] else 0,
+                'current_assessment': mark,
+                'avg': mark,
+                'remarks': remarks
+            }
+            table_data.append(row_data)
+
+    # Calculate totals (same as preview)
+    total_marks = student_data.get("total_marks", 0)
+    total_possible_marks = len(subjects_with_marks) * class_data_result.get("total_marks", 100)
+    total_points = mean_points * len(subjects_with_marks)
+
+    # Generate admission number (same as preview)
+    admission_no = student.admission_number if hasattr(student, 'admission_number') and student.admission_number else f"KPS{grade}{stream[-1]}{student.id}"
+
+    # Render the template with the same data as preview
+    return render_template_string(
+        shared['template_content'],
+        student=student,
+        student_data=student_data,
+        grade=grade,
+        stream=stream,
+        term=term,
+        assessment_type=assessment_type,
+        education_level=education_level,
+        current_date=shared['current_date'],
+        table_data=table_data,
+        composite_data=composite_data,
+        total=total_marks,
+        avg_percentage=avg_percentage,
+        mean_grade=mean_grade,
+        mean_points=mean_points,
+        total_possible_marks=total_possible_marks,
+        total_points=total_points,
+        admission_no=admission_no,
+        academic_year=shared['academic_year'],
+        print_mode=True,  # Enable print mode for clean output
+        school_info=shared['school_info'],  # Pass school information
+        logo_url=shared['logo_url'],  # Pass dynamic logo URL
+        staff_info=shared['staff_info'],
+        term_info=shared['term_info'],
+        subject_teachers=shared['subject_teachers']
+    )
+
+
 def generate_individual_report_like_preview_for_zip(student, grade, stream, term, assessment_type, stream_obj, term_obj, assessment_type_obj, pdf_available=False):
     """Generate individual report using the exact same format as the preview template."""
     try:
         import tempfile
         import os
         from datetime import datetime
-        from flask import render_template_string
 
         # Get class report data first (same as preview)
-        class_data_result = get_class_report_data(grade, stream, term, assessment_type)
+        class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
 
         if class_data_result.get("error"):
             return None
@@ -6286,103 +6071,9 @@ def generate_individual_report_like_preview_for_zip(student, grade, stream, term
         if not student_data:
             return None
 
-        # Get education level based on grade (same as preview)
-        education_level = ""
-        grade_num = int(grade.split()[1]) if len(grade.split()) > 1 else int(grade)
-        if 1 <= grade_num <= 3:
-            education_level = "lower primary"
-        elif 4 <= grade_num <= 6:
-            education_level = "upper primary"
-        elif 7 <= grade_num <= 9:
-            education_level = "junior secondary"
-
-        # Calculate mean grade and points (same as preview)
-        avg_percentage = student_data.get("average_percentage", 0)
-        from ..utils import get_grade_and_points, get_performance_remarks
-        mean_grade, mean_points = get_grade_and_points(avg_percentage)
-
-        # Prepare table data for the report with composite subject handling (same as preview)
-        table_data = []
-        composite_data = {}
-
-        # Get only subjects that have marks in the class report data
-        subjects_with_marks = class_data_result.get("subjects", [])
-
-        for subject_name in subjects_with_marks:
-            mark = student_data.get("marks", {}).get(subject_name, 0)
-            if mark and mark > 0:
-                # Clean up decimal precision
-                if isinstance(mark, float):
-                    mark = int(round(mark)) if mark == int(mark) else round(mark, 1)
-                else:
-                    mark = int(mark)
-
-                grade_letter, points = get_grade_and_points(mark)
-                remarks = get_performance_remarks(mark, 100)
-
-                # Create table row data (same structure as preview)
-                row_data = {
-                    'subject': subject_name.upper(),
-                    'entrance': 0,  # Not used for single assessments
-                    'mid_term': 0,  # Not used for single assessments
-                    'end_term': mark if assessment_type.lower() in ['end_term', 'endterm'] else 0,
-                    'current_assessment': mark,
-                    'avg': mark,
-                    'remarks': remarks
-                }
-                table_data.append(row_data)
-
-        # Calculate totals (same as preview)
-        total_marks = student_data.get("total_marks", 0)
-        total_possible_marks = len(subjects_with_marks) * class_data_result.get("total_marks", 100)
-        total_points = mean_points * len(subjects_with_marks)
-
-        # Generate admission number (same as preview)
-        admission_no = student.admission_number if hasattr(student, 'admission_number') and student.admission_number else f"KPS{grade}{stream[-1]}{student.id}"
-
-        # Get academic year (same as preview)
-        academic_year = term_obj.academic_year if hasattr(term_obj, 'academic_year') and term_obj.academic_year else "2023"
-
-        # Get current date
-        current_date = datetime.now().strftime("%Y-%m-%d")
-
-        # Get school information for dynamic display
-        from ..services.school_config_service import SchoolConfigService
-        school_info = SchoolConfigService.get_school_info_dict()
-
-        # Get dynamic logo URL from school setup
-        logo_path = SchoolConfigService.get_school_logo_path()
-        logo_url = url_for('static', filename=logo_path)
-
-        # Read the template file and render it (same as preview)
-        template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'preview_individual_report.html')
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template_content = f.read()
-
-        # Render the template with the same data as preview
-        rendered_html = render_template_string(
-            template_content,
-            student=student,
-            student_data=student_data,
-            grade=grade,
-            stream=stream,
-            term=term,
-            assessment_type=assessment_type,
-            education_level=education_level,
-            current_date=current_date,
-            table_data=table_data,
-            composite_data=composite_data,
-            total=total_marks,
-            avg_percentage=avg_percentage,
-            mean_grade=mean_grade,
-            mean_points=mean_points,
-            total_possible_marks=total_possible_marks,
-            total_points=total_points,
-            admission_no=admission_no,
-            academic_year=academic_year,
-            print_mode=True,  # Enable print mode for clean output
-            school_info=school_info,  # Pass school information
-            logo_url=logo_url  # Pass dynamic logo URL
+        rendered_html = _render_individual_report_html(
+            student, student_data, class_data_result, grade, stream, term, assessment_type,
+            _individual_report_shared_context(grade, stream, term, term_obj)
         )
 
         # Generate file
@@ -6392,32 +6083,10 @@ def generate_individual_report_like_preview_for_zip(student, grade, stream, term
         if pdf_available:
             # Try to generate PDF
             try:
-                import pdfkit
                 filename = f"Individual_Report_{grade.replace(' ', '_')}_{stream}_{student.name.replace(' ', '_')}_{timestamp}.pdf"
                 pdf_path = os.path.join(temp_dir, filename)
-
-                # Add print-specific CSS for PDF
-                print_css = """
-                <style>
-                @page { size: A4; margin: 1cm; }
-                body { font-family: Arial, sans-serif; margin: 0; padding: 0; }
-                .action-buttons, .print-controls, .delete-btn, .modal { display: none !important; }
-                .report-container { max-width: none; margin: 0; padding: 20px; }
-                </style>
-                """
-                html_with_css = rendered_html.replace('</head>', f'{print_css}</head>')
-
-                options = {
-                    'page-size': 'A4',
-                    'orientation': 'Portrait',
-                    'margin-top': '0.75in',
-                    'margin-right': '0.75in',
-                    'margin-bottom': '0.75in',
-                    'margin-left': '0.75in',
-                    'encoding': 'UTF-8',
-                    'no-outline': None
-                }
-                pdfkit.from_string(html_with_css, pdf_path, options=options)
+                with open(pdf_path, 'wb') as f:
+                    f.write(html_to_pdf(rendered_html))
                 return pdf_path
             except Exception as e:
                 print(f"PDF generation failed: {e}")
@@ -6427,22 +6096,7 @@ def generate_individual_report_like_preview_for_zip(student, grade, stream, term
         filename = f"Individual_Report_{grade.replace(' ', '_')}_{stream}_{student.name.replace(' ', '_')}_{timestamp}.html"
         html_path = os.path.join(temp_dir, filename)
 
-        # Add some basic styling for standalone HTML
-        standalone_css = """
-        <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .action-buttons, .print-controls, .delete-btn, .modal { display: none !important; }
-        .report-container { max-width: 800px; margin: 0 auto; }
-        table { border-collapse: collapse; width: 100%; margin: 20px 0; }
-        th, td { border: 1px solid #ddd; padding: 8px; text-align: center; }
-        th { background-color: #f2f2f2; }
-        .header { text-align: center; margin-bottom: 20px; }
-        .student-details { margin: 20px 0; }
-        .remarks { margin: 20px 0; }
-        .footer { margin-top: 20px; text-align: center; font-size: 12px; color: #666; }
-        </style>
-        """
-        html_with_css = rendered_html.replace('</head>', f'{standalone_css}</head>')
+        html_with_css = rendered_html.replace('</head>', f'{STANDALONE_REPORT_CSS}</head>')
 
         with open(html_path, 'w', encoding='utf-8') as f:
             f.write(html_with_css)
@@ -6454,139 +6108,170 @@ def generate_individual_report_like_preview_for_zip(student, grade, stream, term
         print(f"Error generating individual report like preview: {str(e)}")
         return None
 
-@classteacher_bp.route('/generate_all_individual_reports/<grade>/<stream>/<term>/<assessment_type>')
-@classteacher_required
-def generate_all_individual_reports(grade, stream, term, assessment_type):
-    """Route for generating and downloading all individual reports as a ZIP file using the same format as preview."""
+def _wkhtmltopdf_available():
+    """Check whether pdfkit and the wkhtmltopdf binary are installed, without rendering a probe PDF."""
     try:
-        print(f"🚀 Starting ZIP generation for {grade} {stream} {term} {assessment_type}")
+        import pdfkit  # noqa: F401
+    except ImportError:
+        return False
+    import shutil
+    return shutil.which('wkhtmltopdf') is not None
 
-        stream_obj = Stream.query.join(Grade).filter(Grade.name == grade, Stream.name == stream[-1]).first()
-        term_obj = Term.query.filter_by(name=term).first()
-        assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
 
-        if not (stream_obj and term_obj and assessment_type_obj):
-            error_msg = "Invalid grade, stream, term, or assessment type"
-            # Check if this is an AJAX request
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-                return jsonify({'error': error_msg}), 400
-            flash(error_msg, "error")
-            return redirect(url_for('classteacher.dashboard'))
+def _run_individual_reports_job(params, output_dir, progress):
+    """
+    Report job handler: render every learner's individual report into one ZIP file.
 
-        # Get students in this stream
-        students = Student.query.filter_by(stream_id=stream_obj.id).all()
-        print(f"📊 Found {len(students)} students in {grade} Stream {stream[-1]}")
-
-        if not students:
-            error_msg = f"No students found for {grade} Stream {stream[-1]}"
-            # Check if this is an AJAX request
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-                return jsonify({'error': error_msg}), 400
-            flash(error_msg, "error")
-            return redirect(url_for('classteacher.dashboard'))
+    Class data is computed once for the whole stream. With wkhtmltopdf the pages are
+    converted to PDF on a process pool (REPORT_RENDER_WORKERS) and written into the
+    ZIP as they finish; otherwise the standalone HTML pages are zipped.
+    """
+    import zipfile
 
-        # Check if we can generate PDFs (optional - will fallback to text if not available)
-        pdf_available = False
-        try:
-            import pdfkit
-            import os
-            # Test if wkhtmltopdf is working
-            test_html = "<html><body><h1>Test</h1></body></html>"
-            temp_test_file = os.path.join(tempfile.gettempdir(), "wkhtmltopdf_test.pdf")
-            pdfkit.from_string(test_html, temp_test_file, options={'page-size': 'A4'})
-            if os.path.exists(temp_test_file):
-                os.remove(temp_test_file)
-                pdf_available = True
-                print("✅ PDF generation available")
-            else:
-                print("⚠️ wkhtmltopdf not working, will use text fallback")
-        except Exception as e:
-            print(f"⚠️ PDF generation not available: {e}, will use text fallback")
+    grade, stream = params['grade'], params['stream']
+    term, assessment_type = params['term'], params['assessment_type']
 
-        # Import necessary modules
-        import zipfile
-        import tempfile
-        import os
-        from datetime import datetime
-
-        # Create a temporary directory to store the PDFs
-        temp_dir = tempfile.mkdtemp()
-        print(f"📁 Created temp directory: {temp_dir}")
+    stream_obj = Stream.query.join(Grade).filter(Grade.name == grade, Stream.name == stream[-1]).first()
+    term_obj = Term.query.filter_by(name=term).first()
+    assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
+    if not (stream_obj and term_obj and assessment_type_obj):
+        raise ValueError("Invalid grade, stream, term, or assessment type")
 
-        # Create a ZIP file
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"Individual_Reports_{grade.replace(' ', '_')}_{stream}_{term}_{assessment_type}_{timestamp}.zip"
-        zip_path = os.path.join(temp_dir, zip_filename)
-        print(f"📦 Creating ZIP file: {zip_filename}")
+    students = Student.query.filter_by(stream_id=stream_obj.id).all()
+    if not students:
+        raise ValueError(f"No students found for {grade} Stream {stream[-1]}")
 
-        # Generate PDFs for each student and add them to the ZIP file
+    no_reports = f"No reports could be generated. Please ensure students have marks for {term} {assessment_type}."
+    class_data_result = get_individual_report_data(grade, stream, term, assessment_type)
+    if class_data_result.get("error"):
+        raise ValueError(no_reports)
+    student_data_by_name = {data["student"]: data for data in class_data_result["class_data"]}
+    report_students = [s for s in students if s.name in student_data_by_name]
+    if not report_students:
+        raise ValueError(no_reports)
+
+    shared = _individual_report_shared_context(grade, stream, term, term_obj)
+    pdf_available = _wkhtmltopdf_available()
+    extension = '.pdf' if pdf_available else '.html'
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_filename = f"Individual_Reports_{grade.replace(' ', '_')}_{stream}_{term}_{assessment_type}_{timestamp}.zip"
+    zip_path = os.path.join(output_dir, zip_filename)
+
+    def tasks():
+        # Pages are rendered lazily, only as worker slots free up
+        for student in report_students:
+            html = _render_individual_report_html(
+                student, student_data_by_name[student.name], class_data_result,
+                grade, stream, term, assessment_type, shared
+            )
+            arcname = f"Individual_Report_{grade.replace(' ', '_')}_{stream}_{student.name.replace(' ', '_')}{extension}"
+            yield arcname, html
+
+    total = len(report_students)
+    progress(0, total, f"Generating {total} reports")
+    if pdf_available:
+        result = BatchReportRenderer.render_zip(
+            tasks(), zip_path, html_to_pdf,
+            workers=current_app.config.get('REPORT_RENDER_WORKERS'),
+            progress=lambda done: progress(done, message=f"Generated {done} of {total} reports")
+        )
+        successful_reports = result['rendered']
+    else:
         successful_reports = 0
-        failed_reports = 0
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+            for arcname, html in tasks():
+                zipf.writestr(arcname, html.replace('</head>', f'{STANDALONE_REPORT_CSS}</head>'))
+                successful_reports += 1
+                progress(successful_reports, message=f"Generated {successful_reports} of {total} reports")
 
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for i, student in enumerate(students, 1):
-                try:
-                    print(f"📄 Processing student {i}/{len(students)}: {student.name}")
+    if successful_reports == 0:
+        raise ValueError(no_reports)
+    return zip_path, zip_filename
 
-                    # Use the same format as preview - generate report file (PDF or HTML)
-                    report_file = generate_individual_report_like_preview_for_zip(
-                        student, grade, stream, term, assessment_type,
-                        stream_obj, term_obj, assessment_type_obj, pdf_available
-                    )
 
-                    if report_file and os.path.exists(report_file):
-                        # Determine file extension from the actual file
-                        file_extension = os.path.splitext(report_file)[1]  # Gets .pdf, .html, or .txt
-                        report_filename = f"Individual_Report_{grade.replace(' ', '_')}_{stream}_{student.name.replace(' ', '_')}{file_extension}"
-                        zipf.write(report_file, report_filename)
-                        successful_reports += 1
-                        print(f"✅ Generated report for {student.name}")
+ReportJobService.register_handler('individual_reports_zip', _run_individual_reports_job)
 
-                        # Clean up individual report file
-                        try:
-                            os.remove(report_file)
-                        except:
-                            pass
-                    else:
-                        failed_reports += 1
-                        print(f"⚠️ No report generated for {student.name} (no marks found)")
 
-                except Exception as e:
-                    failed_reports += 1
-                    print(f"❌ Error generating report for {student.name}: {str(e)}")
-                    continue
+def _wants_json():
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', '')
 
-        print(f"📊 Generation complete: {successful_reports} successful, {failed_reports} failed")
 
-        if successful_reports == 0:
-            error_msg = f"No reports could be generated. Please ensure students have marks for {term} {assessment_type}."
-            # Check if this is an AJAX request
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-                return jsonify({'error': error_msg}), 400
-            flash(error_msg, "error")
-            return redirect(url_for('classteacher.dashboard'))
+def _start_report_job(job_type, params):
+    """
+    Enqueue a report job and answer with its status (JSON) or the progress page.
 
-        flash(f"Successfully generated {successful_reports} individual reports in ZIP format!", "success")
+    A reload, prefetch or back-navigation repeats the request, so a pending or running
+    job the teacher already started with the same arguments is shown instead of a new one.
+    """
+    teacher_id = session.get('teacher_id')
+    job = ReportJobService.find_active(job_type, params, created_by=teacher_id)
+    if job is None:
+        job = ReportJobService.enqueue(job_type, params, created_by=teacher_id)
+    status_url = url_for('classteacher.report_job_status', job_id=job.id)
+    if _wants_json():
+        return jsonify({'success': True, 'job': job.to_dict(), 'status_url': status_url,
+                        'download_url': url_for('classteacher.download_report_job', job_id=job.id),
+                        'cancel_url': url_for('classteacher.cancel_report_job', job_id=job.id)}), 202
+    return render_template('report_job_progress.html', job=job.to_dict(), status_url=status_url,
+                           download_url=url_for('classteacher.download_report_job', job_id=job.id),
+                           cancel_url=url_for('classteacher.cancel_report_job', job_id=job.id))
 
-        # Return the ZIP file
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            download_name=zip_filename,
-            mimetype='application/zip'
-        )
 
-    except Exception as e:
-        print(f"💥 Critical error in ZIP generation: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        error_msg = f"Error generating reports: {str(e)}"
-        # Check if this is an AJAX request
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-            return jsonify({'error': error_msg}), 500
+@classteacher_bp.route('/generate_all_individual_reports/<grade>/<stream>/<term>/<assessment_type>')
+@classteacher_required
+def generate_all_individual_reports(grade, stream, term, assessment_type):
+    """Start a background job that builds a ZIP of all individual reports (same format as preview)."""
+    stream_obj = Stream.query.join(Grade).filter(Grade.name == grade, Stream.name == stream[-1]).first()
+    term_obj = Term.query.filter_by(name=term).first()
+    assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
+
+    if not (stream_obj and term_obj and assessment_type_obj):
+        error_msg = "Invalid grade, stream, term, or assessment type"
+        if _wants_json():
+            return jsonify({'error': error_msg}), 400
         flash(error_msg, "error")
         return redirect(url_for('classteacher.dashboard'))
 
+    return _start_report_job('individual_reports_zip', {
+        'grade': grade, 'stream': stream, 'term': term, 'assessment_type': assessment_type
+    })
+
+
+@classteacher_bp.route('/report_jobs/<job_id>')
+@classteacher_required
+def report_job_status(job_id):
+    """Return the status and progress of a background report job."""
+    job = ReportJobService.get_job(job_id, session.get('teacher_id'))
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    data = job.to_dict()
+    if job.status == ReportJob.SUCCESS and job.result_path:
+        data['download_url'] = url_for('classteacher.download_report_job', job_id=job.id)
+    return jsonify({'success': True, 'job': data})
+
+
+@classteacher_bp.route('/report_jobs/<job_id>/download')
+@classteacher_required
+def download_report_job(job_id):
+    """Download the artifact of a finished report job."""
+    job = ReportJobService.get_job(job_id, session.get('teacher_id'))
+    if not job or job.status != ReportJob.SUCCESS or not job.result_path or not os.path.exists(job.result_path):
+        flash("The report is not available. It may still be running or has expired.", "error")
+        return redirect(url_for('classteacher.dashboard'))
+    return send_file(job.result_path, as_attachment=True, download_name=job.result_filename,
+                     mimetype='application/zip')
+
+
+@classteacher_bp.route('/report_jobs/<job_id>/cancel', methods=['POST'])
+@classteacher_required
+def cancel_report_job(job_id):
+    """Cancel a pending or running report job."""
+    job = ReportJobService.get_job(job_id, session.get('teacher_id'))
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    ReportJobService.cancel(job)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 @classteacher_bp.route('/download_class_list', methods=['GET'])
 @classteacher_required
 def download_class_list():
@@ -8971,6 +8656,7 @@ def manage_teachers():
                         try:
                             # First, manually delete related records to avoid cascade issues
                             from sqlalchemy import text
+                            from ..services.cache_invalidation_service import CacheInvalidationService
 
                             # Delete from teacher_subjects table if it exists
                             try:
@@ -8983,6 +8669,7 @@ def manage_teachers():
                             try:
                                 db.session.execute(text("DELETE FROM teacher_subject_assignment WHERE teacher_id = :teacher_id"),
                                                  {"teacher_id": teacher_id})
+                                CacheInvalidationService.record_assignments(db.session, [teacher_id])
                             except Exception as e:
                                 print(f"Note: teacher_subject_assignment table cleanup: {e}")
 
@@ -9794,97 +9481,23 @@ def view_all_reports():
     page = request.args.get('page', 1, type=int)
     per_page = 20  # Number of reports per page
 
-    # Build the query with joins
-    marks_query = Mark.query.join(Student).join(Stream).join(Grade).join(Term).join(AssessmentType)
-
-    # Apply filters if provided
-    if filter_grade:
-        marks_query = marks_query.filter(Grade.name == filter_grade)
-    if filter_term:
-        marks_query = marks_query.filter(Term.name == filter_term)
-    if filter_assessment:
-        marks_query = marks_query.filter(AssessmentType.name == filter_assessment)
-
-    # Apply sorting
-    if sort_by == 'grade':
-        marks_query = marks_query.order_by(Grade.name)
-    elif sort_by == 'term':
-        marks_query = marks_query.order_by(Term.name)
-    else:  # Default to date
-        marks_query = marks_query.order_by(Mark.created_at.desc())
-
-    # Get unique combinations of grade, stream, term, assessment_type
-    from sqlalchemy import func
-    unique_combinations = db.session.query(
-        Grade.name,
-        Stream.name,
-        Term.name,
-        AssessmentType.name,
-        func.count(Mark.id).label('mark_count'),
-        func.max(Mark.created_at).label('latest_date')
-    ).join(Student, Mark.student_id == Student.id)\
-     .join(Stream, Student.stream_id == Stream.id)\
-     .join(Grade, Stream.grade_id == Grade.id)\
-     .join(Term, Mark.term_id == Term.id)\
-     .join(AssessmentType, Mark.assessment_type_id == AssessmentType.id)\
-     .group_by(Grade.name, Stream.name, Term.name, AssessmentType.name)
-
-    # Apply filters to the unique combinations query
-    if filter_grade:
-        unique_combinations = unique_combinations.filter(Grade.name == filter_grade)
-    if filter_term:
-        unique_combinations = unique_combinations.filter(Term.name == filter_term)
-    if filter_assessment:
-        unique_combinations = unique_combinations.filter(AssessmentType.name == filter_assessment)
-
-    # Apply sorting to the unique combinations query
-    if sort_by == 'grade':
-        unique_combinations = unique_combinations.order_by(Grade.name)
-    elif sort_by == 'term':
-        unique_combinations = unique_combinations.order_by(Term.name)
-    else:  # Default to date
-        unique_combinations = unique_combinations.order_by(func.max(Mark.created_at).desc())
+    # Unique combinations of grade, stream, term and assessment type with their counts
+    unique_combinations = RecentReportsService.combinations_query(
+        sort_by, filter_grade, filter_term, filter_assessment
+    )
 
     # Paginate the results
     pagination = unique_combinations.paginate(page=page, per_page=per_page, error_out=False)
 
     # Format the results
-    reports = []
-    for grade, stream, term, assessment_type, mark_count, latest_date in pagination.items:
-        # Get the actual database objects to get their IDs
-        grade_obj = Grade.query.filter_by(name=grade).first()
-        stream_obj = Stream.query.join(Grade).filter(Grade.name == grade, Stream.name == stream).first()
-        term_obj = Term.query.filter_by(name=term).first()
-        assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
-
-        # Create download URL for class report (since these are class-level reports, not subject-specific)
-        # The stream parameter should match the format expected by the route
-        stream_param = f"Stream {stream}"
-
-        # Construct URL manually since url_for might have issues in this context
-        from urllib.parse import quote
-        download_url = f"/classteacher/preview_class_report/{quote(grade)}/{quote(stream_param)}/{quote(term)}/{quote(assessment_type)}"
-
-        reports.append({
-            'id': len(reports) + 1,
-            'grade': grade,
-            'stream': f"Stream {stream}",
-            'term': term,
-            'assessment_type': assessment_type,
-            'date': latest_date.strftime('%Y-%m-%d') if latest_date else 'N/A',
-            'mark_count': mark_count,
-            'grade_id': grade_obj.id if grade_obj else None,
-            'stream_id': stream_obj.id if stream_obj else None,
-            'term_id': term_obj.id if term_obj else None,
-            'assessment_type_id': assessment_type_obj.id if assessment_type_obj else None,
-            'subject_id': None,  # These are class reports, not subject-specific
-            'download_url': download_url
-        })
+    reports = [RecentReportsService.to_report(row, index)
+               for index, row in enumerate(pagination.items, start=1)]
 
     # Get all grades, terms, and assessment types for filters
-    grades = [grade.name for grade in Grade.query.all()]
-    terms = [term.name for term in Term.query.all()]
-    assessment_types = [assessment_type.name for assessment_type in AssessmentType.query.all()]
+    reference = ReferenceDataService.current()
+    grades = reference.grade_names()
+    terms = reference.term_names()
+    assessment_types = reference.assessment_type_names()
 
     return render_template(
         'all_reports.html',
@@ -10023,28 +9636,20 @@ def delete_subject_report():
 @classteacher_required
 def api_get_stream_status(grade, term, assessment_type):
     """API endpoint to check if streams have marks for a specific grade, term, and assessment type."""
-    grade_obj = Grade.query.filter_by(name=grade).first()
-    term_obj = Term.query.filter_by(name=term).first()
-    assessment_type_obj = AssessmentType.query.filter_by(name=assessment_type).first()
+    reference = ReferenceDataService.current()
+    grade_obj = reference.grade_by_name.get(grade)
+    term_obj = reference.term_by_name.get(term)
+    assessment_type_obj = reference.assessment_type_by_name.get(assessment_type)
 
     if not (grade_obj and term_obj and assessment_type_obj):
         return jsonify({"error": "Invalid grade, term, or assessment type"}), 400
 
-    streams = Stream.query.filter_by(grade_id=grade_obj.id).all()
-    result = []
-
-    for stream in streams:
-        # Check if there are any marks for this stream
-        has_marks = Mark.query.join(Student).filter(
-            Student.stream_id == stream.id,
-            Mark.term_id == term_obj.id,
-            Mark.assessment_type_id == assessment_type_obj.id
-        ).first() is not None
-
-        result.append({
-            "name": stream.name,
-            "has_marks": has_marks
-        })
+    # Mark counts for every stream at once (see MarksStatusBoardService)
+    board = MarksStatusBoardService.grade_board(grade_obj.id, term_obj.id, assessment_type_obj.id)
+    result = [
+        {"name": stream['name'], "has_marks": stream['students_with_marks'] > 0}
+        for stream in board['streams']
+    ]
 
     return jsonify({"streams": result})
 
@@ -10102,12 +9707,6 @@ def class_marks_status(grade_id, stream_id, term_id, assessment_type_id):
             flash(f"Error loading class status: {status_data['error']}", "error")
             return redirect(url_for('classteacher.collaborative_marks_dashboard'))
 
-        # Check if current teacher can upload marks for each subject
-        for subject in status_data['subjects']:
-            subject['can_upload'] = CollaborativeMarksService.can_teacher_upload_subject(
-                current_teacher_id, subject['id'], grade_id, stream_id
-            )
-
         # Add navigation data
         status_data['grade_id'] = grade_id
         status_data['stream_id'] = stream_id
@@ -10283,6 +9882,7 @@ def submit_subject_marks(grade_id, stream_id, subject_id, term_id, assessment_ty
 
         # Commit changes
         db.session.commit()
+        TermSummaryService.refresh_after_save(stream_id, term_id, assessment_type_id)
 
         # Update collaborative marks status
         status_result = CollaborativeMarksService.update_marks_status_after_upload(
@@ -10421,32 +10021,18 @@ def generate_consolidated_grade_report(grade_name, term, assessment_type):
 @classteacher_bp.route('/generate_batch_grade_reports/<grade_name>/<term>/<assessment_type>')
 @classteacher_required
 def generate_batch_grade_reports(grade_name, term, assessment_type):
-    """Generate batch reports for a grade (individual streams + consolidated)."""
+    """Start a background job that builds batch reports for a grade (individual streams + consolidated)."""
     try:
         # Get options from query parameters
         include_individual = request.args.get('individual', 'true').lower() == 'true'
         include_consolidated = request.args.get('consolidated', 'true').lower() == 'true'
         selected_streams = request.args.getlist('streams')
 
-        zip_file = GradeReportService.generate_batch_grade_reports(
-            grade_name, term, assessment_type,
-            include_individual, include_consolidated,
-            selected_streams if selected_streams else None
-        )
-
-        if not zip_file:
-            flash(f"Failed to generate batch reports for Grade {grade_name}", "error")
-            return redirect(url_for('classteacher.grade_streams_status',
-                                  grade_name=grade_name, term=term, assessment_type=assessment_type))
-
-        # Return the ZIP file
-        filename = f"Grade_{grade_name}_Batch_Reports_{term}_{assessment_type}.zip"
-        return send_file(
-            zip_file,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/zip'
-        )
+        return _start_report_job('batch_grade_reports', {
+            'grade_name': grade_name, 'term': term, 'assessment_type': assessment_type,
+            'include_individual': include_individual, 'include_consolidated': include_consolidated,
+            'selected_streams': selected_streams or None
+        })
 
     except Exception as e:
         print(f"Error generating batch grade reports: {str(e)}")
@@ -10803,6 +10389,7 @@ def upload_marks():
         selected_subject = None
         selected_assessment = None
         max_marks = None
+        import_result = None
         
         if request.method == 'POST':
             print(f"🔍 POST request received")
@@ -10860,58 +10447,23 @@ def upload_marks():
                 term_id = default_term.id
                 print(f"🔍 Using term_id: {term_id}")
                 
-                # Process each student's marks
-                students_updated = 0
-                for key, value in request.form.items():
-                    if key.startswith('marks_') and value.strip():
-                        student_id = key.replace('marks_', '')
-                        try:
-                            raw_mark = float(value)
-                            if 0 <= raw_mark <= max_marks:
-                                from ..services.mark_conversion_service import MarkConversionService
-                                percentage = MarkConversionService.calculate_percentage(raw_mark, max_marks)
-                                
-                                # Check for existing mark with no-autoflush to prevent premature flush
-                                with db.session.no_autoflush:
-                                    existing_mark = Mark.query.filter_by(
-                                        student_id=student_id,
-                                        subject_id=selected_subject,
-                                        assessment_type_id=selected_assessment,
-                                        term_id=term_id  # Include term_id in the filter
-                                    ).first()
-                                
-                                if existing_mark:
-                                    existing_mark.raw_mark = raw_mark
-                                    existing_mark.raw_total_marks = max_marks
-                                    existing_mark.percentage = percentage
-                                    existing_mark.mark = raw_mark  # For backward compatibility
-                                    existing_mark.total_marks = max_marks  # For backward compatibility
-                                else:
-                                    new_mark = Mark(
-                                        student_id=student_id,
-                                        subject_id=selected_subject,
-                                        assessment_type_id=selected_assessment,  # Fixed: use assessment_type_id
-                                        grade_id=selected_grade,
-                                        stream_id=selected_stream,
-                                        term_id=term_id,  # Use valid term_id from database
-                                        raw_mark=raw_mark,
-                                        raw_total_marks=max_marks,
-                                        percentage=percentage,
-                                        mark=raw_mark,  # For backward compatibility
-                                        total_marks=max_marks,  # For backward compatibility
-                                        is_uploaded=True,
-                                        uploaded_by_teacher_id=teacher_id,
-                                        upload_date=db.func.current_timestamp()
-                                    )
-                                    db.session.add(new_mark)
-                                
-                                students_updated += 1
-                                print(f"🔍 Updated student {student_id}: {raw_mark}/{max_marks} = {percentage:.1f}%")
-                        except ValueError as e:
-                            print(f"🚨 Error processing mark for student {student_id}: {e}")
-                            continue
-                
-                db.session.commit()
+                # Collect every student's mark and save them in one bulk upsert
+                entries = [
+                    {'student_id': int(key.replace('marks_', '')), 'subject_id': int(selected_subject),
+                     'raw_mark': value, 'max_raw_mark': max_marks}
+                    for key, value in request.form.items()
+                    if key.startswith('marks_') and value.strip() and key.replace('marks_', '').isdigit()
+                ]
+                result = MarkIngestService.save_marks(
+                    entries, term_id=term_id, assessment_type_id=int(selected_assessment),
+                    grade_id=int(selected_grade), stream_id=int(selected_stream),
+                    teacher_id=teacher_id, clip=False
+                )
+                students_updated = result['saved']
+                for error in result['errors']:
+                    print(f"🚨 Error processing mark for student {error['student_id']}: {error['error']}")
+
+                TermSummaryService.refresh_after_save(selected_stream, term_id, selected_assessment)
                 
                 # Get subject name for better feedback
                 subject_name = Subject.query.get(selected_subject).name if selected_subject else "Unknown Subject"
@@ -10927,64 +10479,36 @@ def upload_marks():
             
             # Handle bulk upload
             elif 'bulk_upload' in request.form:
-                if 'bulk_file' not in request.files:
+                file = request.files.get('bulk_file')
+                if not file or file.filename == '':
                     flash('No file selected.', 'error')
+                elif not file.filename.lower().endswith(('.csv', '.xlsx')):
+                    flash('Please upload a CSV or Excel (.xlsx) file.', 'error')
                 else:
-                    file = request.files['bulk_file']
-                    if file.filename == '':
-                        flash('No file selected.', 'error')
-                    elif file and file.filename.endswith('.csv'):
-                        try:
-                            # Process CSV file
-                            import csv
-                            import io
-                            
-                            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                            csv_input = csv.DictReader(stream)
-                            
-                            uploaded_count = 0
-                            for row in csv_input:
-                                # Expected CSV format: student_id, subject_id, assessment_type, marks, max_marks
-                                try:
-                                    student_id = row['student_id']
-                                    subject_id = row['subject_id']
-                                    assessment_type = row['assessment_type']
-                                    marks = float(row['marks'])
-                                    max_marks = float(row['max_marks'])
-                                    
-                                    # Validate and save
-                                    if 0 <= marks <= max_marks:
-                                        existing_mark = Mark.query.filter_by(
-                                            student_id=student_id,
-                                            subject_id=subject_id,
-                                            assessment_type=assessment_type
-                                        ).first()
-                                        
-                                        if existing_mark:
-                                            existing_mark.marks = marks
-                                        else:
-                                            new_mark = Mark(
-                                                student_id=student_id,
-                                                subject_id=subject_id,
-                                                assessment_type=assessment_type,
-                                                marks=marks,
-                                                max_marks=max_marks
-                                            )
-                                            db.session.add(new_mark)
-                                        
-                                        uploaded_count += 1
-                                except (KeyError, ValueError) as e:
-                                    continue
-                            
-                            db.session.commit()
-                            flash(f'Successfully uploaded marks for {uploaded_count} entries.', 'success')
-                            return redirect(url_for('classteacher.dashboard'))
-                            
-                        except Exception as e:
-                            flash(f'Error processing file: {str(e)}', 'error')
-                    else:
-                        flash('Please upload a CSV file.', 'error')
-        
+                    try:
+                        # Rows without a term column go to the current term
+                        default_term = Term.query.filter_by(is_current=True).first() or Term.query.first()
+                        result = MarksImportService.import_file(
+                            file,
+                            term=str(default_term.id) if default_term else None,
+                            assessment_type=request.form.get('assessment_type'),
+                            max_marks=request.form.get('max_marks'),
+                            teacher_id=teacher_id
+                        )
+                        import_result = result
+                        if result['saved']:
+                            flash(f"Successfully uploaded {result['saved']} marks "
+                                  f"({result['inserted']} new, {result['updated']} updated).", 'success')
+                        if result['errors']:
+                            session['marks_import_error_report'] = result['error_report']
+                            flash(f"{result['errors']} rows were rejected. Download the error report for details.", 'warning')
+                        elif not result['saved']:
+                            flash('No marks were found in the file.', 'warning')
+                    except ValueError as e:
+                        flash(str(e), 'error')
+                    except Exception as e:
+                        flash(f'Error processing file: {str(e)}', 'error')
+
         # Get school info
         from ..services.school_config_service import SchoolConfigService
         school_info = SchoolConfigService.get_school_info_dict()
@@ -11000,7 +10524,8 @@ def upload_marks():
             selected_stream=selected_stream,
             selected_subject=selected_subject,
             selected_assessment=selected_assessment,
-            max_marks=max_marks
+            max_marks=max_marks,
+            import_result=import_result
         )
         
     except Exception as e:
@@ -11271,6 +10796,7 @@ def submit_single_subject_marks(grade_id, stream_id, subject_id, term_id, assess
 
         # Commit changes
         db.session.commit()
+        TermSummaryService.refresh_after_save(stream_id, term_id, assessment_type_id)
 
         # Update collaborative marks status
         status_result = CollaborativeMarksService.update_marks_status_after_upload(
@@ -11310,13 +10836,13 @@ def download_template():
         writer = csv.writer(output)
         
         # Write header
-        writer.writerow(['student_id', 'subject_id', 'assessment_type', 'marks', 'max_marks'])
+        writer.writerow(['admission_number', 'subject', 'assessment_type', 'marks', 'max_marks'])
         
         # Write sample data with comments
         writer.writerow(['# Sample data - replace with actual values'])
-        writer.writerow(['1', '1', 'CAT 1', '85', '100'])
-        writer.writerow(['2', '1', 'CAT 1', '78', '100'])
-        writer.writerow(['3', '1', 'CAT 1', '92', '100'])
+        writer.writerow(['HV001', 'Mathematics', 'CAT 1', '85', '100'])
+        writer.writerow(['HV002', 'Mathematics', 'CAT 1', '78', '100'])
+        writer.writerow(['HV003', 'Mathematics', 'CAT 1', '92', '100'])
         
         output.seek(0)
         
@@ -11332,6 +10858,21 @@ def download_template():
         return redirect(url_for('classteacher.upload_marks'))
 
 
+@classteacher_bp.route('/download_import_errors/<token>')
+@classteacher_required
+def download_import_errors(token):
+    """Download the per-row error report of the last bulk marks import (once; it is deleted after)."""
+    path = MarksImportService.error_report_path(token)
+    if not path or session.get('marks_import_error_report') != token or not os.path.exists(path):
+        flash('Error report not found. Please upload the file again.', 'error')
+        return redirect(url_for('classteacher.upload_marks'))
+    with open(path, 'rb') as f:
+        report = BytesIO(f.read())
+    MarksImportService.remove_error_report(token)
+    session.pop('marks_import_error_report', None)
+    return send_file(report, mimetype='text/csv', as_attachment=True, download_name='marks_import_errors.csv')
+
+
 @classteacher_bp.route('/subject_report/<int:grade_id>/<int:stream_id>/<int:subject_id>/<int:term_id>/<int:assessment_type_id>')
 @classteacher_required
 def subject_report(grade_id, stream_id, subject_id, term_id, assessment_type_id):
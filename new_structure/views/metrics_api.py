@@ -0,0 +1,31 @@
+"""
+Metrics endpoint for the Hillview School Management System.
+Serves the request telemetry of all workers in the Prometheus text format.
+"""
+
+import hmac
+
+from flask import Blueprint, Response, request, session, current_app, jsonify
+
+from ..services import is_authenticated, get_role
+from ..utils.telemetry import telemetry
+
+# Create metrics blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _metrics_allowed():
+    """Scrapers send METRICS_TOKEN as a bearer token; headteachers may read the metrics directly."""
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:].strip(), token):
+        return True
+    return is_authenticated(session) and get_role(session) == 'headteacher'
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus text exposition of the request telemetry."""
+    if not _metrics_allowed():
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    return Response(telemetry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -347,6 +347,29 @@ def performance_configuration():
                 'error': str(e)
             }), 500
 
+@mobile_performance_api.route('/request-guard')
+@admin_required
+def get_request_guard_stats():
+    """
+    Get the request guard counters of this worker process
+    
+    Query Parameters:
+        reset (bool): Reset the counters after reading them
+    """
+    guard = current_app.extensions.get('request_guard')
+    if guard is None:
+        return jsonify({'success': False, 'error': 'Request guard is not enabled'}), 404
+    
+    stats = guard.stats()
+    if request.args.get('reset', '').lower() == 'true':
+        guard.reset_stats()
+    
+    return jsonify({
+        'success': True,
+        'data': stats,
+        'timestamp': datetime.now().isoformat()
+    })
+
 @mobile_performance_api.route('/health')
 def performance_health_check():
     """Health check for performance monitoring system"""
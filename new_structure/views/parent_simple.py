@@ -17,6 +17,8 @@ except ImportError:
     ParentEmailLog = None  # Optional feature not yet available
 from ..models.academic import Student, Grade, Stream
 from ..services.parent_email_service import ParentEmailService
+from ..services.term_summary_service import TermSummaryService
+from ..services.trend_service import TrendService
 
 # Create blueprint for parent portal
 parent_simple_bp = Blueprint('parent', __name__, url_prefix='/parent')
@@ -401,31 +403,59 @@ def child_progress(child_id):
         
         child, grade, stream = child_query
         
-        # Mock progress data - TODO: Replace with real data from marks tables
+        # Trends are stored per grade by TrendService (rebuilt in the background after marks change)
+        trends = TrendService.get_student_trends(child.id, grade_id=child.grade_id)
+        latest = trends['latest']
+
+        class_rank = None
+        if latest:
+            position = TermSummaryService.get_class_positions(
+                [child.id], latest['term_id'], latest['assessment_type_id']
+            ).get(child.id)
+            class_rank = position[0] if position else None
+
+        subjects_progress = []
+        recommendations = []
+        for subject in trends['subjects']:
+            point = subject['latest']
+            if point['previous_percentage'] is None:
+                trend_text = 'First result'
+            elif point['trend'] == 'stable':
+                trend_text = 'No change'
+            else:
+                trend_text = f"{point['delta']:+.1f}% from last assessment"
+            subjects_progress.append({
+                'name': subject['subject_name'],
+                'current_score': round(point['percentage'], 1),
+                'trend': point['trend'],
+                'trend_text': trend_text,
+                'rolling_average': round(point['rolling_average'], 1),
+                'percentile': round(point['percentile'])
+            })
+            if point['trend'] == 'down':
+                recommendations.append({
+                    'area': subject['subject_name'],
+                    'suggestion': f"Marks fell {abs(point['delta']):.1f} points since the last assessment; "
+                                  f"review recent topics with the subject teacher"
+                })
+
+        # Attendance and teacher comments are not recorded yet
         progress_data = {
-            'overall_average': 85.5,
-            'class_rank': 5,
-            'attendance_rate': 95.2,
-            'total_subjects': 8,
-            'subjects_progress': [
-                {'name': 'Mathematics', 'current_score': 87, 'trend': 'up', 'trend_text': '+3% from last term'},
-                {'name': 'English', 'current_score': 84, 'trend': 'stable', 'trend_text': 'No change'},
-                {'name': 'Science', 'current_score': 89, 'trend': 'up', 'trend_text': '+5% from last term'},
-            ],
-            'total_attendance': 95.2,
-            'days_present': 190,
-            'days_absent': 10,
-            'school_days': 200,
-            'recommendations': [
-                {'area': 'Mathematics', 'suggestion': 'Focus on algebra concepts and practice more word problems'},
-                {'area': 'Study Habits', 'suggestion': 'Maintain consistent daily study schedule'}
-            ],
-            'teacher_comments': [
-                {'subject': 'Mathematics', 'teacher': 'Mr. Smith', 'comment': 'Shows great improvement in problem-solving', 'date': '2025-01-15'},
-                {'subject': 'English', 'teacher': 'Ms. Johnson', 'comment': 'Excellent reading comprehension skills', 'date': '2025-01-14'}
-            ]
+            'overall_average': round(latest['percentage'], 1) if latest else None,
+            'class_rank': class_rank,
+            'attendance_rate': None,
+            'total_subjects': len(subjects_progress),
+            'subjects_progress': subjects_progress,
+            'overall_trend': trends['overall'],
+            'total_attendance': None,
+            'days_present': None,
+            'days_absent': None,
+            'school_days': None,
+            'recommendations': recommendations,
+            'teacher_comments': [],
+            'trends_updating': trends['stale']
         }
-        
+
         child_info = {
             'id': child.id,
             'name': child.name,
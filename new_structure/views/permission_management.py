@@ -485,15 +485,26 @@ def check_function_access():
     """Check if current user has access to a specific function."""
     try:
         function_name = request.args.get('function')
+        function_names = [name for name in request.args.get('functions', '').split(',') if name]
         grade_id = request.args.get('grade_id', type=int)
         stream_id = request.args.get('stream_id', type=int)
 
-        if not function_name:
+        if not function_name and not function_names:
             return jsonify({'success': False, 'message': 'Function parameter required'})
 
         teacher_id = session.get('teacher_id')
         role = get_role(session)
 
+        # Several functions at once (functions=a,b,c), e.g. for a page of action buttons
+        if function_names:
+            if role == 'headteacher':
+                access = {name: True for name in function_names}
+            elif role == 'classteacher':
+                access = EnhancedPermissionService.can(teacher_id, function_names, grade_id, stream_id)
+            else:
+                access = {name: False for name in function_names}
+            return jsonify({'success': True, 'access': access})
+
         # Headteacher always has access
         if role == 'headteacher':
             has_access = True
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers.
+
+Serve with the gunicorn configuration from the repository root:
+    gunicorn -c new_structure/gunicorn_config.py new_structure.wsgi:app
+
+The configuration name is read from HILLVIEW_CONFIG (default 'production').
+"""
+import os
+
+from new_structure import create_app
+
+app = create_app(os.environ.get('HILLVIEW_CONFIG', 'production'))